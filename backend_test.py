@@ -56,6 +56,52 @@ class BackendTester:
     def log_info(self, message):
         self.log(f"ℹ️  {message}", Colors.BLUE)
         
+    # Scenario payloads, shared with the load tester (load_test.py)
+    @staticmethod
+    def build_registration_data(email):
+        return {
+            "email": email,
+            "password": "SecurePassword123!",
+            "firstName": "Margaret",
+            "lastName": "Johnson",
+            "role": "senior",
+            "phone": "+1-555-0123",
+            "dateOfBirth": "1945-03-15",
+            "emergencyContacts": [
+                {
+                    "name": "Robert Johnson",
+                    "phone": "+1-555-0124",
+                    "relationship": "Son",
+                    "isPrimary": True
+                }
+            ]
+        }
+    
+    @staticmethod
+    def build_checkin_data():
+        return {
+            "mood_rating": 4,
+            "energy_level": 3,
+            "pain_level": 2,
+            "sleep_quality": 4,
+            "appetite_rating": 4,
+            "hydration_glasses": 6,
+            "medications_taken": True,
+            "exercise_minutes": 30,
+            "social_interaction": True,
+            "notes": "Feeling good today! Had a nice walk in the park."
+        }
+    
+    @staticmethod
+    def build_vital_reading():
+        return {
+            "reading_type": "blood_pressure",
+            "value": {"systolic": 120, "diastolic": 80},
+            "unit": "mmHg",
+            "device_name": "Omron BP Monitor",
+            "notes": "Morning reading after breakfast"
+        }
+        
     def make_request(self, method, endpoint, data=None, headers=None, expect_success=True):
         """Make HTTP request with error handling"""
         url = f"{API_BASE}{endpoint}" if endpoint.startswith('/') else f"{API_BASE}/{endpoint}"
@@ -125,23 +171,7 @@ class BackendTester:
         timestamp = int(time.time())
         test_email = f"senior.test.{timestamp}@example.com"
         
-        registration_data = {
-            "email": test_email,
-            "password": "SecurePassword123!",
-            "firstName": "Margaret",
-            "lastName": "Johnson",
-            "role": "senior",
-            "phone": "+1-555-0123",
-            "dateOfBirth": "1945-03-15",
-            "emergencyContacts": [
-                {
-                    "name": "Robert Johnson",
-                    "phone": "+1-555-0124",
-                    "relationship": "Son",
-                    "isPrimary": True
-                }
-            ]
-        }
+        registration_data = self.build_registration_data(test_email)
         
         response = self.make_request('POST', '/auth/register', registration_data)
         if response is None:
@@ -291,6 +321,16 @@ class BackendTester:
                 data = response.json()
                 if 'user' in data:
                     self.log_success("Dashboard data - Retrieved successfully")
+                    
+                    # An unchanged dashboard is revalidated with its ETag
+                    etag = response.headers.get('ETag')
+                    if etag:
+                        cached = self.make_request('GET', '/dashboard', headers={'If-None-Match': etag})
+                        if cached is None or cached.status_code != 304:
+                            status = cached.status_code if cached is not None else 'no response'
+                            self.log_failure(f"Dashboard data - Expected 304 for unchanged dashboard, got {status}")
+                            return False
+                        self.log_success("Dashboard data - Unchanged dashboard returned 304")
                     return True
                 else:
                     self.log_failure(f"Dashboard data - Missing user in response: {data}")
@@ -306,6 +346,41 @@ class BackendTester:
                 self.log_failure(f"Dashboard data - Status {response.status_code}: {response.text}")
             return False
     
+    def test_activity_feed(self):
+        """Test caregiver activity feed paging"""
+        self.log(f"\n{Colors.BOLD}=== Testing Activity Feed ==={Colors.END}")
+        
+        if not self.auth_token:
+            self.log_warning("Skipping activity feed test - no auth token")
+            return False
+            
+        response = self.make_request('GET', '/dashboard/feed?limit=5')
+        if response is None:
+            return False
+            
+        if response.status_code == 200:
+            try:
+                data = response.json()
+                if 'items' in data and 'nextCursor' in data.get('pagination', {}):
+                    self.log_success("Activity feed - Retrieved successfully")
+                else:
+                    self.log_failure(f"Activity feed - Unexpected response: {data}")
+                    return False
+            except json.JSONDecodeError:
+                self.log_failure("Activity feed - Invalid JSON response")
+                return False
+        else:
+            self.log_failure(f"Activity feed - Status {response.status_code}: {response.text}")
+            return False
+        
+        invalid = self.make_request('GET', '/dashboard/feed?type=unknown')
+        if invalid is not None and invalid.status_code == 400:
+            self.log_success("Activity feed - Unknown type rejected")
+            return True
+        status = invalid.status_code if invalid is not None else 'no response'
+        self.log_failure(f"Activity feed - Expected 400 for unknown type, got {status}")
+        return False
+    
     def test_daily_checkin(self):
         """Test daily check-in creation"""
         self.log(f"\n{Colors.BOLD}=== Testing Daily Check-in ==={Colors.END}")
@@ -314,18 +389,7 @@ class BackendTester:
             self.log_warning("Skipping check-in test - no auth token")
             return False
             
-        checkin_data = {
-            "mood_rating": 4,
-            "energy_level": 3,
-            "pain_level": 2,
-            "sleep_quality": 4,
-            "appetite_rating": 4,
-            "hydration_glasses": 6,
-            "medications_taken": True,
-            "exercise_minutes": 30,
-            "social_interaction": True,
-            "notes": "Feeling good today! Had a nice walk in the park."
-        }
+        checkin_data = self.build_checkin_data()
         
         response = self.make_request('POST', '/checkins', checkin_data)
         if response is None:
@@ -368,6 +432,19 @@ class BackendTester:
                 data = response.json()
                 if 'checkIns' in data:
                     self.log_success("Check-in history - Retrieved successfully")
+
+                    # Streak is maintained as check-ins are written
+                    response = self.make_request('GET', '/checkins/streak')
+                    if response is not None and response.status_code == 200 and response.json().get('currentStreak', 0) >= 1:
+                        self.log_success("Check-in streak - Retrieved successfully")
+                    elif response is not None:
+                        self.log_failure(f"Check-in streak - Status {response.status_code}: {response.text}")
+
+                    response = self.make_request('GET', '/checkins/analytics?days=90&bucket=week')
+                    if response is not None and response.status_code == 200 and response.json().get('bucket') == 'week':
+                        self.log_success("Check-in analytics - Weekly buckets retrieved successfully")
+                    elif response is not None:
+                        self.log_failure(f"Check-in analytics - Status {response.status_code}: {response.text}")
                     return True
                 else:
                     self.log_failure(f"Check-in history - Missing checkIns in response: {data}")
@@ -426,7 +503,25 @@ class BackendTester:
                 self.log_failure(f"Medication creation - Status {response.status_code}: {error_data}")
             except:
                 self.log_failure(f"Medication creation - Status {response.status_code}: {response.text}")
-        
+
+        # A daily medication has reminders materialized for the next 48 hours
+        if medication_created:
+            response = self.make_request('GET', '/medications/reminders/upcoming?hours=48')
+            if response is not None and response.status_code == 200:
+                reminders = response.json().get('reminders', [])
+                if any(reminder.get('name') == 'Lisinopril' for reminder in reminders):
+                    self.log_success(f"Medication reminders - {len(reminders)} upcoming")
+                else:
+                    self.log_failure(f"Medication reminders - None scheduled: {reminders}")
+            elif response is not None:
+                self.log_failure(f"Medication reminders - Status {response.status_code}: {response.text}")
+
+            response = self.make_request('GET', '/medications/adherence?days=30')
+            if response is not None and response.status_code == 200 and 'adherenceRate' in response.json():
+                self.log_success("Medication adherence - Retrieved successfully")
+            elif response is not None:
+                self.log_failure(f"Medication adherence - Status {response.status_code}: {response.text}")
+
         # Test getting medications list
         response = self.make_request('GET', '/medications')
         if response is None:
@@ -501,6 +596,18 @@ class BackendTester:
         # Accept any response that doesn't indicate a server error
         if response.status_code < 500:
             self.log_success("Messaging endpoints - Accessible")
+
+            response = self.make_request('GET', '/messaging/conversations?cursor=&limit=10')
+            if response is not None and response.status_code == 200 and 'conversations' in response.json():
+                self.log_success("Messaging inbox - Retrieved successfully")
+            elif response is not None:
+                self.log_failure(f"Messaging inbox - Status {response.status_code}: {response.text}")
+
+            response = self.make_request('GET', '/messaging/search?query=medication&limit=10')
+            if response is not None and response.status_code == 200 and 'pagination' in response.json():
+                self.log_success("Message search - Retrieved successfully")
+            elif response is not None:
+                self.log_failure(f"Message search - Status {response.status_code}: {response.text}")
             return True
         else:
             try:
@@ -556,13 +663,7 @@ class BackendTester:
         # Test 1: POST /api/vitals - Create vital reading
         self.log(f"\n{Colors.BLUE}Testing POST /api/vitals - Create vital reading{Colors.END}")
         
-        vital_data = {
-            "reading_type": "blood_pressure",
-            "value": {"systolic": 120, "diastolic": 80},
-            "unit": "mmHg",
-            "device_name": "Omron BP Monitor",
-            "notes": "Morning reading after breakfast"
-        }
+        vital_data = self.build_vital_reading()
         
         response = self.make_request('POST', '/vitals', vital_data)
         if response and response.status_code in [200, 201]:
@@ -856,9 +957,17 @@ class BackendTester:
                 data = response.json()
                 if 'message' in data:
                     self.log_success("User logout - Success")
+                    
+                    # The token must be rejected after logout
+                    profile = self.make_request('GET', '/auth/profile')
                     # Clear token after successful logout
                     self.auth_token = None
-                    return True
+                    if profile is not None and profile.status_code == 401:
+                        self.log_success("User logout - Token revoked")
+                        return True
+                    status = profile.status_code if profile is not None else 'no response'
+                    self.log_failure(f"User logout - Token still accepted after logout ({status})")
+                    return False
                 else:
                     self.log_failure(f"User logout - Unexpected response: {data}")
                     return False
@@ -886,6 +995,7 @@ class BackendTester:
             ("User Login", self.test_user_login),
             ("User Profile", self.test_user_profile),
             ("Dashboard Data", self.test_dashboard_data),
+            ("Activity Feed", self.test_activity_feed),
             ("Daily Check-in", self.test_daily_checkin),
             ("Check-in History", self.test_checkin_history),
             ("Medication Management", self.test_medication_management),
@@ -931,5 +1041,10 @@ class BackendTester:
             self.log(f"\n🚨 Success Rate: {success_rate:.1f}% - Backend has major issues", Colors.RED)
 
 if __name__ == "__main__":
+    # `backend_test.py --load [options]` runs the concurrent load test instead
+    if "--load" in sys.argv:
+        from load_test import main as run_load_test
+        sys.exit(run_load_test([arg for arg in sys.argv[1:] if arg != "--load"]))
+    
     tester = BackendTester()
     tester.run_all_tests()
\ No newline at end of file
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+SeniorCare Hub Backend Benchmark Suite
+Per-endpoint latency regression benchmarks against stored baselines.
+
+Starts the server locally against a dedicated benchmark database, seeds a
+fixed dataset, runs fixed workloads and compares p95 latency and
+throughput with benchmarks/baselines.json. Exits non-zero when a workload
+regresses beyond the tolerance, or has no recorded baseline unless
+--allow-missing-baseline is given.
+
+Usage:
+    python benchmark_test.py                     # compare against baselines
+    python benchmark_test.py --update-baseline   # record new baselines
+    python benchmark_test.py --allow-missing-baseline  # don't fail on unrecorded workloads
+    python benchmark_test.py --tolerance 0.25 --only latest_vitals trends_1y
+
+Requires a local MongoDB, node, and the requests + pymongo packages.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from backend_test import BackendTester, Colors
+
+try:
+    from pymongo import MongoClient
+except ImportError:
+    MongoClient = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'baselines.json')
+
+# Fixed dataset
+SEED = 20240101
+SENIOR_COUNT = 20
+HISTORY_DAYS = 365
+MESSAGES_PER_CONVERSATION = 50
+PASSWORD = "SecurePassword123!"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BenchmarkServer:
+    """Runs server/index.js against the benchmark database"""
+
+    def __init__(self, port, mongo_url):
+        self.port = port
+        self.mongo_url = mongo_url
+        self.process = None
+
+    @property
+    def env(self):
+        env = dict(os.environ)
+        env.update({
+            'PORT': str(self.port),
+            'MONGO_URL': self.mongo_url,
+            'NODE_ENV': 'production',
+            'RATE_LIMIT_MAX': '100000000',
+            'VITALS_BULK_IMPORT_MAX': '50000'
+        })
+        return env
+
+    def start(self, timeout=30):
+        self.process = subprocess.Popen(
+            ['node', os.path.join('server', 'index.js')],
+            cwd=ROOT_DIR, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                if requests.get(f"http://localhost:{self.port}/health", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError("Server did not become healthy in time")
+
+    def run_script(self, script):
+        subprocess.run(['node', os.path.join('server', 'scripts', script)],
+                       cwd=ROOT_DIR, env=self.env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class BenchmarkRunner:
+    def __init__(self, options):
+        self.options = options
+        self.api_base = f"http://localhost:{options.port}/api"
+        self.rng = random.Random(SEED)
+        self.tokens = {}
+        self.user_ids = {}
+
+    def log(self, message, color=Colors.WHITE):
+        print(f"{color}{message}{Colors.END}")
+
+    # ---- Dataset -------------------------------------------------------
+
+    def register(self, key, email, role, first_name):
+        data = BackendTester.build_registration_data(email)
+        data.update({'role': role, 'firstName': first_name, 'password': PASSWORD})
+        response = requests.post(f"{self.api_base}/auth/register", json=data, timeout=30)
+        if response.status_code != 201:
+            raise RuntimeError(f"Could not register {email}: {response.status_code} {response.text}")
+        body = response.json()
+        self.tokens[key] = body['token']
+        self.user_ids[key] = body['user']['id']
+
+    def seed(self, db):
+        """Fixed dataset: one caregiver with 20 seniors, a year of history"""
+        self.log(f"\n{Colors.BLUE}Seeding benchmark dataset{Colors.END}")
+
+        self.register('caregiver', 'bench.caregiver@example.com', 'caregiver', 'Carol')
+        for i in range(SENIOR_COUNT):
+            self.register(f'senior{i}', f'bench.senior.{i}@example.com', 'senior', f'Senior{i}')
+
+        caregiver_id = self.user_ids['caregiver']
+        senior_ids = [self.user_ids[f'senior{i}'] for i in range(SENIOR_COUNT)]
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+        db.family_connections.insert_many([{
+            'id': str(uuid.UUID(int=self.rng.getrandbits(128))),
+            'senior_id': senior_id,
+            'caregiver_id': caregiver_id,
+            'relationship': 'Daughter',
+            'permissions': {'viewCheckIns': True, 'viewMedications': True, 'viewVitals': True,
+                            'viewMessages': True, 'receiveAlerts': True, 'emergencyContact': True},
+            'status': 'active',
+            'created_at': now - timedelta(days=HISTORY_DAYS),
+            'updated_at': now - timedelta(days=HISTORY_DAYS)
+        } for senior_id in senior_ids])
+
+        # A year of vitals for the first senior, a week for the others
+        vitals = []
+        for index, senior_id in enumerate(senior_ids):
+            days = HISTORY_DAYS if index == 0 else 7
+            for hour in range(0, days * 24, 2):
+                reading_time = now - timedelta(hours=hour)
+                heart_rate = self.rng.randint(55, 105)
+                vitals.append(self.vital_doc(senior_id, 'heart_rate', {'value': heart_rate}, 'bpm',
+                                             reading_time, heart_rate < 60 or heart_rate > 100))
+                if hour % 12 == 0:
+                    systolic, diastolic = self.rng.randint(100, 150), self.rng.randint(60, 95)
+                    vitals.append(self.vital_doc(senior_id, 'blood_pressure',
+                                                 {'systolic': systolic, 'diastolic': diastolic}, 'mmHg',
+                                                 reading_time, systolic > 140 or diastolic > 90))
+        db.vitals.insert_many(vitals, ordered=False)
+
+        checkins = []
+        for senior_id in senior_ids:
+            for day in range(1, HISTORY_DAYS + 1):
+                check_date = (now - timedelta(days=day)).date().isoformat()
+                checkins.append({
+                    'id': str(uuid.UUID(int=self.rng.getrandbits(128))),
+                    'user_id': senior_id,
+                    'check_date': check_date,
+                    **BackendTester.build_checkin_data(),
+                    'mood_rating': self.rng.randint(1, 5),
+                    'energy_level': self.rng.randint(1, 5),
+                    'created_at': now - timedelta(days=day),
+                    'updated_at': now - timedelta(days=day)
+                })
+        db.daily_checkins.insert_many(checkins, ordered=False)
+
+        # The caregiver's activity feed is written on fan-out; seed the
+        # entries the last month of check-ins would have produced
+        feed = [{
+            'id': str(uuid.UUID(int=self.rng.getrandbits(128))),
+            'caregiver_id': caregiver_id,
+            'senior_id': checkin['user_id'],
+            'type': 'checkin',
+            'title': 'Completed daily check-in',
+            'severity': None,
+            'data': {'check_in_id': checkin['id'], 'check_date': checkin['check_date']},
+            'dedupe_key': f"checkin:{checkin['id']}",
+            'created_at': checkin['created_at'],
+            'updated_at': checkin['created_at'],
+            'expires_at': checkin['created_at'] + timedelta(days=30)
+        } for checkin in checkins if checkin['created_at'] >= now - timedelta(days=30)]
+        db.caregiver_feed.insert_many(feed, ordered=False)
+
+        messages = []
+        for senior_id in senior_ids:
+            conversation_id = '-'.join(sorted([caregiver_id, senior_id]))
+            for n in range(MESSAGES_PER_CONVERSATION):
+                from_senior = n % 2 == 0
+                messages.append({
+                    'id': str(uuid.UUID(int=self.rng.getrandbits(128))),
+                    'conversation_id': conversation_id,
+                    'sender_id': senior_id if from_senior else caregiver_id,
+                    'recipient_id': caregiver_id if from_senior else senior_id,
+                    'message_text': f"Benchmark message {n}",
+                    'voice_message_url': None,
+                    'attachments': [],
+                    'message_type': 'text',
+                    'reply_to_id': None,
+                    'is_encrypted': False,
+                    'is_read': n < MESSAGES_PER_CONVERSATION - 4,
+                    'read_at': None,
+                    'deleted_by_sender': False,
+                    'deleted_by_recipient': False,
+                    'created_at': now - timedelta(hours=MESSAGES_PER_CONVERSATION - n)
+                })
+        db.messages.insert_many(messages, ordered=False)
+
+        self.log(f"Seeded {len(vitals)} vitals, {len(checkins)} check-ins, {len(feed)} feed entries, "
+                 f"{len(messages)} messages")
+
+    def vital_doc(self, user_id, reading_type, value, unit, reading_time, is_abnormal):
+        return {
+            'id': str(uuid.UUID(int=self.rng.getrandbits(128))),
+            'user_id': user_id,
+            'reading_type': reading_type,
+            'value': value,
+            'unit': unit,
+            'device_id': None,
+            'device_name': 'Benchmark Device',
+            'reading_time': reading_time,
+            'is_abnormal': is_abnormal,
+            'notes': None,
+            'created_at': reading_time
+        }
+
+    def bulk_payload(self, count):
+        start = datetime.now(timezone.utc) - timedelta(days=30)
+        return {
+            'device_id': 'bench-device',
+            'device_name': 'Benchmark Device',
+            'readings': [{
+                'reading_type': 'heart_rate',
+                'value': {'value': 60 + (i % 40)},
+                'unit': 'bpm',
+                'reading_time': (start + timedelta(seconds=i * 60)).isoformat()
+            } for i in range(count)]
+        }
+
+    # ---- Workloads -----------------------------------------------------
+
+    def workloads(self):
+        bulk = self.bulk_payload(10000)
+        return {
+            'latest_vitals': dict(method='GET', path='/vitals/latest', user='senior0',
+                                  requests=300, concurrency=10),
+            'trends_1y': dict(method='GET', path='/vitals/trends/heart_rate?days=365', user='senior0',
+                              requests=100, concurrency=5),
+            'bulk_import_10k': dict(method='POST', path='/vitals/bulk-import', user='senior1',
+                                    body=bulk, requests=5, concurrency=1, warmup=0, items=10000),
+            'caregiver_dashboard': dict(method='GET', path='/dashboard', user='caregiver',
+                                        requests=300, concurrency=10),
+            'conversations': dict(method='GET', path='/messaging/conversations', user='caregiver',
+                                  requests=300, concurrency=10),
+            'message_search': dict(method='GET', path='/messaging/search?query=benchmark', user='caregiver',
+                                   requests=300, concurrency=10)
+        }
+
+    def timed_request(self, session, spec):
+        headers = {'Authorization': f"Bearer {self.tokens[spec['user']]}"}
+        started = time.perf_counter()
+        try:
+            response = session.request(spec['method'], f"{self.api_base}{spec['path']}",
+                                       json=spec.get('body'), headers=headers, timeout=120)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    def run_workload(self, name, spec):
+        local = threading.local()
+
+        def worker(_):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            return self.timed_request(local.session, spec)
+
+        for _ in range(spec.get('warmup', 5)):
+            self.timed_request(requests.Session(), spec)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=spec['concurrency']) as pool:
+            results = list(pool.map(worker, range(spec['requests'])))
+        duration = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        result = {
+            'requests': len(results),
+            'concurrency': spec['concurrency'],
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'throughput_rps': round(len(results) / duration, 2)
+        }
+        if spec.get('items'):
+            result['items_per_s'] = round(spec['items'] * len(results) / duration, 1)
+        return result
+
+    # ---- Comparison ----------------------------------------------------
+
+    def compare(self, name, result, baseline, tolerance):
+        """List of regression messages for one workload"""
+        problems = []
+        if result['errors'] > 0:
+            problems.append(f"{result['errors']} failed requests")
+        if not baseline:
+            return problems
+
+        p95_limit = baseline['p95_ms'] * (1 + tolerance)
+        if result['p95_ms'] > p95_limit:
+            problems.append(f"p95 {result['p95_ms']}ms > {p95_limit:.1f}ms "
+                            f"(baseline {baseline['p95_ms']}ms +{tolerance:.0%})")
+
+        throughput_floor = baseline['throughput_rps'] * (1 - tolerance)
+        if result['throughput_rps'] < throughput_floor:
+            problems.append(f"throughput {result['throughput_rps']}/s < {throughput_floor:.1f}/s "
+                            f"(baseline {baseline['throughput_rps']}/s -{tolerance:.0%})")
+        return problems
+
+    def run(self):
+        options = self.options
+        baselines = load_baselines()
+        workloads = self.workloads()
+        selected = options.only or list(workloads)
+
+        results = {}
+        for name in selected:
+            self.log(f"\n{Colors.BLUE}Running {name}{Colors.END}")
+            results[name] = self.run_workload(name, workloads[name])
+
+        self.log(f"\n{Colors.BOLD}{Colors.CYAN}📊 Benchmark Results{Colors.END}")
+        header = f"{'Workload':<22}{'Reqs':>6}{'Err':>5}{'p50 ms':>10}{'p95 ms':>10}{'base p95':>10}{'RPS':>9}{'base RPS':>10}"
+        self.log(f"\n{Colors.BOLD}{header}{Colors.END}")
+        self.log("-" * len(header))
+
+        failures = {}
+        missing = []
+        for name, result in results.items():
+            baseline = baselines['workloads'].get(name)
+            problems = [] if options.update_baseline else self.compare(name, result, baseline, options.tolerance)
+            if problems:
+                failures[name] = problems
+            if not baseline and not options.update_baseline:
+                missing.append(name)
+            color = Colors.RED if problems else Colors.YELLOW if name in missing else Colors.GREEN
+            base_p95 = f"{baseline['p95_ms']:.1f}" if baseline else "-"
+            base_rps = f"{baseline['throughput_rps']:.1f}" if baseline else "-"
+            status = "  no baseline recorded" if name in missing else ""
+            self.log(f"{name:<22}{result['requests']:>6}{result['errors']:>5}{result['p50_ms']:>10.1f}"
+                     f"{result['p95_ms']:>10.1f}{base_p95:>10}{result['throughput_rps']:>9.1f}{base_rps:>10}{status}",
+                     color)
+
+        report = {
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'tolerance': options.tolerance,
+            'workloads': results,
+            'regressions': failures,
+            'missing_baselines': missing
+        }
+        with open(options.json, 'w') as handle:
+            json.dump(report, handle, indent=2)
+
+        if options.update_baseline:
+            for name, result in results.items():
+                baselines['workloads'][name] = {**result, 'recorded_at': report['recorded_at']}
+            save_baselines(baselines)
+            self.log(f"\nBaselines updated in {os.path.relpath(BASELINE_PATH, ROOT_DIR)}", Colors.BLUE)
+            return 0
+
+        status = 0
+        if failures:
+            self.log(f"\n{Colors.BOLD}❌ Regressions:{Colors.END}")
+            for name, problems in failures.items():
+                for problem in problems:
+                    self.log(f"  • {name}: {problem}", Colors.RED)
+            status = 1
+
+        if missing:
+            self.log(f"\n{Colors.BOLD}⚠️  No baseline recorded:{Colors.END}")
+            for name in missing:
+                self.log(f"  • {name}: not compared", Colors.YELLOW)
+            if options.allow_missing_baseline:
+                self.log("Allowed by --allow-missing-baseline; record them with --update-baseline", Colors.YELLOW)
+            else:
+                self.log("Record them with --update-baseline, or pass --allow-missing-baseline", Colors.RED)
+                status = 1
+
+        if status == 0:
+            compared = len(results) - len(missing)
+            self.log(f"\n🎉 No regressions beyond {options.tolerance:.0%} in {compared} compared workloads",
+                     Colors.GREEN)
+        return status
+
+
+def load_baselines():
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as handle:
+            return json.load(handle)
+    return {'workloads': {}}
+
+
+def save_baselines(baselines):
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    with open(BASELINE_PATH, 'w') as handle:
+        json.dump(baselines, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Latency regression benchmarks for the SeniorCare Hub API")
+    parser.add_argument('--update-baseline', action='store_true', help="record results as the new baselines")
+    parser.add_argument('--allow-missing-baseline', action='store_true',
+                        help="don't fail on workloads that have no recorded baseline")
+    parser.add_argument('--tolerance', type=float, default=float(os.environ.get('BENCH_TOLERANCE', 0.2)),
+                        help="allowed fractional regression in p95 and throughput (default 0.2)")
+    parser.add_argument('--only', nargs='*', help="run only these workloads")
+    parser.add_argument('--port', type=int, default=8011, help="port for the benchmark server")
+    parser.add_argument('--mongo-url', default=os.environ.get('BENCH_MONGO_URL',
+                                                               'mongodb://localhost:27017/seniorcare_bench'),
+                        help="benchmark database (dropped and reseeded on every run)")
+    parser.add_argument('--json', default='benchmark_results.json', help="where to write this run's results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if MongoClient is None:
+        print(f"{Colors.RED}❌ The benchmark suite needs pymongo: pip install pymongo{Colors.END}")
+        return 1
+
+    runner = BenchmarkRunner(options)
+    unknown = [name for name in (options.only or []) if name not in runner.workloads()]
+    if unknown:
+        print(f"{Colors.RED}❌ Unknown workloads: {', '.join(unknown)}{Colors.END}")
+        return 1
+
+    client = MongoClient(options.mongo_url)
+    db = client.get_default_database()
+    client.drop_database(db.name)
+
+    server = BenchmarkServer(options.port, options.mongo_url)
+    try:
+        server.start()
+        runner.seed(db)
+        # Derived collections the seeded workloads read from
+        server.run_script('backfillVitalsRollups.js')
+        server.run_script('backfillConversationSummaries.js')
+        server.run_script('backfillMessageSearch.js')
+        return runner.run()
+    finally:
+        server.stop()
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
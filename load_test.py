@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+SeniorCare Hub Backend Load Test
+Concurrent load generation built on the BackendTester scenarios.
+
+Each virtual user registers, submits a daily check-in, then alternates
+between posting a vital reading and polling the dashboard, the way a
+tablet does. Virtual users arrive at a configurable rate and run
+concurrently on asyncio with aiohttp.
+
+Usage:
+    python load_test.py --users 1000 --arrival-rate 50
+    python backend_test.py --load --users 200 --json results.json
+
+The server's per-IP rate limit (RATE_LIMIT_MAX) must be raised for a
+meaningful run from a single machine.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from backend_test import API_BASE, BackendTester, Colors
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.status_counts = {}
+        self.errors = 0
+
+    def record(self, latency_ms, status):
+        self.latencies_ms.append(latency_ms)
+        key = str(status)
+        self.status_counts[key] = self.status_counts.get(key, 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+
+    def summary(self, duration_s):
+        latencies = sorted(self.latencies_ms)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0,
+            'throughput_rps': round(count / duration_s, 2) if duration_s > 0 else 0,
+            'p50_ms': round(percentile(latencies, 50), 2) if count else None,
+            'p95_ms': round(percentile(latencies, 95), 2) if count else None,
+            'p99_ms': round(percentile(latencies, 99), 2) if count else None,
+            'max_ms': round(latencies[-1], 2) if count else None,
+            'status_counts': self.status_counts
+        }
+
+
+class LoadTester:
+    def __init__(self, options):
+        self.options = options
+        self.api_base = options.api_base.rstrip('/')
+        self.run_id = uuid.uuid4().hex[:8]
+        self.stats = {}
+        self.users_started = 0
+        self.users_completed = 0
+        self.users_failed = 0
+
+    def log(self, message, color=Colors.WHITE):
+        print(f"{color}{message}{Colors.END}")
+
+    async def request(self, session, method, endpoint, name, data=None, token=None):
+        """Timed request; returns (status, json body or None)"""
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        started = time.perf_counter()
+        status = 'error'
+        body = None
+
+        try:
+            async with session.request(method, f"{self.api_base}{endpoint}", json=data, headers=headers) as response:
+                status = response.status
+                try:
+                    body = await response.json(content_type=None)
+                except (json.JSONDecodeError, aiohttp.ContentTypeError):
+                    body = None
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except aiohttp.ClientError:
+            status = 'connection_error'
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats.setdefault(name, EndpointStats()).record(latency_ms, status)
+        return status, body
+
+    async def think(self):
+        if self.options.think_time > 0:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.options.think_time)
+
+    async def virtual_user(self, session, index):
+        """register -> check-in -> (post vitals -> poll dashboard) x iterations"""
+        self.users_started += 1
+        email = f"loadtest.{self.run_id}.{index}@example.com"
+
+        status, body = await self.request(
+            session, 'POST', '/auth/register', 'POST /auth/register',
+            BackendTester.build_registration_data(email)
+        )
+        if status != 201 or not body or 'token' not in body:
+            self.users_failed += 1
+            return
+        token = body['token']
+
+        await self.think()
+        await self.request(session, 'POST', '/checkins', 'POST /checkins',
+                           BackendTester.build_checkin_data(), token)
+
+        for _ in range(self.options.iterations):
+            await self.think()
+            reading = BackendTester.build_vital_reading()
+            reading['value'] = {
+                'systolic': random.randint(105, 150),
+                'diastolic': random.randint(65, 95)
+            }
+            await self.request(session, 'POST', '/vitals', 'POST /vitals', reading, token)
+
+            await self.think()
+            await self.request(session, 'GET', '/dashboard', 'GET /dashboard', token=token)
+
+        self.users_completed += 1
+
+    async def run(self):
+        options = self.options
+        timeout = aiohttp.ClientTimeout(total=options.timeout)
+        connector = aiohttp.TCPConnector(limit=options.max_connections)
+
+        self.log(f"\n{Colors.BOLD}{Colors.CYAN}🚦 Starting SeniorCare Hub Load Test{Colors.END}")
+        self.log(f"Target: {self.api_base}")
+        self.log(f"Virtual users: {options.users}, arrival rate: {options.arrival_rate}/s "
+                 f"({options.arrival}), iterations: {options.iterations}")
+
+        self.started_at = datetime.utcnow().isoformat() + 'Z'
+        started = time.perf_counter()
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            tasks = []
+            for index in range(options.users):
+                tasks.append(asyncio.create_task(self.virtual_user(session, index)))
+
+                # Poisson arrivals by default, evenly spaced with --arrival constant
+                if options.arrival_rate > 0 and index < options.users - 1:
+                    gap = (random.expovariate(options.arrival_rate) if options.arrival == 'poisson'
+                           else 1 / options.arrival_rate)
+                    await asyncio.sleep(gap)
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.duration_s = time.perf_counter() - started
+        return self.build_report()
+
+    def build_report(self):
+        endpoints = {name: stats.summary(self.duration_s) for name, stats in sorted(self.stats.items())}
+
+        overall = EndpointStats()
+        for stats in self.stats.values():
+            overall.latencies_ms.extend(stats.latencies_ms)
+            overall.errors += stats.errors
+
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'target': self.api_base,
+            'config': {
+                'users': self.options.users,
+                'arrival_rate': self.options.arrival_rate,
+                'arrival': self.options.arrival,
+                'iterations': self.options.iterations,
+                'think_time': self.options.think_time,
+                'timeout': self.options.timeout
+            },
+            'duration_s': round(self.duration_s, 2),
+            'virtual_users': {
+                'started': self.users_started,
+                'completed': self.users_completed,
+                'failed_registration': self.users_failed
+            },
+            'overall': {key: value for key, value in overall.summary(self.duration_s).items()
+                        if key != 'status_counts'},
+            'endpoints': endpoints
+        }
+
+    def print_report(self, report):
+        self.log(f"\n{Colors.BOLD}{Colors.CYAN}📊 Load Test Results{Colors.END}")
+        self.log(f"Duration: {report['duration_s']}s, virtual users completed: "
+                 f"{report['virtual_users']['completed']}/{report['virtual_users']['started']}")
+
+        header = f"{'Endpoint':<24}{'Reqs':>8}{'Errors':>8}{'RPS':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        self.log(f"\n{Colors.BOLD}{header}{Colors.END}")
+        self.log("-" * len(header))
+
+        def fmt(value):
+            return f"{value:.1f}" if value is not None else "-"
+
+        rows = list(report['endpoints'].items()) + [('TOTAL', report['overall'])]
+        for name, stats in rows:
+            color = Colors.RED if stats['error_rate'] > 0.01 else Colors.GREEN
+            self.log(f"{name:<24}{stats['requests']:>8}{stats['errors']:>8}{stats['throughput_rps']:>9.1f}"
+                     f"{fmt(stats['p50_ms']):>10}{fmt(stats['p95_ms']):>10}{fmt(stats['p99_ms']):>10}"
+                     f"{fmt(stats['max_ms']):>10}", color)
+
+        rate_limited = sum(stats['status_counts'].get('429', 0) for stats in report['endpoints'].values())
+        if rate_limited:
+            self.log(f"\n⚠️  {rate_limited} requests were rate limited (429) - raise RATE_LIMIT_MAX on the server",
+                     Colors.YELLOW)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the SeniorCare Hub API")
+    parser.add_argument('--users', type=int, default=50, help="number of virtual users")
+    parser.add_argument('--arrival-rate', type=float, default=10.0,
+                        help="virtual users started per second (0 starts all at once)")
+    parser.add_argument('--arrival', choices=['poisson', 'constant'], default='poisson',
+                        help="arrival process for virtual users")
+    parser.add_argument('--iterations', type=int, default=5,
+                        help="vitals + dashboard rounds per virtual user")
+    parser.add_argument('--think-time', type=float, default=0.5,
+                        help="mean pause between a user's requests, in seconds")
+    parser.add_argument('--timeout', type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument('--max-connections', type=int, default=1000, help="client connection pool size")
+    parser.add_argument('--api-base', default=API_BASE, help="API base URL")
+    parser.add_argument('--json', default='load_test_results.json', help="where to write the JSON report")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if aiohttp is None:
+        print(f"{Colors.RED}❌ The load test needs aiohttp: pip install aiohttp{Colors.END}")
+        return 1
+
+    tester = LoadTester(options)
+    report = asyncio.run(tester.run())
+    tester.print_report(report)
+
+    with open(options.json, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    tester.log(f"\nJSON report written to {options.json}", Colors.BLUE)
+
+    return 0 if report['virtual_users']['completed'] > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
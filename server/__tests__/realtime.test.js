@@ -0,0 +1,303 @@
+jest.mock('../utils/logger', () => ({
+  logger: { info: jest.fn(), warn: jest.fn(), error: jest.fn(), debug: jest.fn() }
+}));
+jest.mock('../config/database', () => ({ getDB: jest.fn() }));
+jest.mock('../config/redis', () => ({ pubsubHelpers: {} }));
+jest.mock('../middleware/auth', () => ({ verifyToken: jest.fn(), getUserFromDatabase: jest.fn() }));
+
+const { createRealtime } = require('../services/realtime');
+const { MemoryStore } = require('../utils/memoryStore');
+
+// Minimal stand-in for a Socket.IO server: handshake middleware, rooms,
+// io.local broadcasts and fetchSockets, with sockets that record what
+// they receive
+class FakeSocket {
+  constructor(server, id, token) {
+    this.server = server;
+    this.id = id;
+    this.handshake = { auth: token ? { token } : {}, headers: {}, query: {} };
+    this.data = {};
+    this.rooms = new Set([id]);
+    this.handlers = {};
+    this.received = [];
+    this.connected = true;
+  }
+
+  join(rooms) {
+    for (const room of [].concat(rooms)) this.rooms.add(room);
+  }
+
+  leave(room) {
+    this.rooms.delete(room);
+  }
+
+  on(event, handler) {
+    this.handlers[event] = handler;
+  }
+
+  // Client -> server event; resolves with the ack, if any
+  send(event, ...args) {
+    return new Promise((resolve) => {
+      Promise.resolve(this.handlers[event](...args, resolve)).then(() => resolve());
+    });
+  }
+
+  disconnect() {
+    this.connected = false;
+    this.server.sockets.delete(this.id);
+  }
+
+  eventsNamed(event) {
+    return this.received.filter(received => received.event === event).map(received => received.data);
+  }
+}
+
+class FakeServer {
+  constructor() {
+    this.sockets = new Map();
+    this.middleware = [];
+    this.connectionHandler = null;
+    this.nextId = 0;
+
+    const operator = (rooms, except = null) => {
+      const targets = () => [...this.sockets.values()].filter(socket => (
+        rooms.some(room => socket.rooms.has(room)) && !(except && socket.id === except)
+      ));
+      return {
+        except: id => operator(rooms, id),
+        emit: (event, data) => {
+          for (const socket of targets()) socket.received.push({ event, data });
+        },
+        fetchSockets: async () => targets()
+      };
+    };
+    this.local = {
+      to: rooms => operator([].concat(rooms)),
+      in: rooms => operator([].concat(rooms))
+    };
+  }
+
+  use(fn) {
+    this.middleware.push(fn);
+  }
+
+  on(event, handler) {
+    this.connectionHandler = handler;
+  }
+
+  // Run the handshake; resolves with the socket or rejects with its error
+  async connect(token) {
+    const socket = new FakeSocket(this, `socket-${this.nextId++}`, token);
+    for (const fn of this.middleware) {
+      const error = await new Promise(resolve => fn(socket, resolve));
+      if (error) throw error;
+    }
+    this.sockets.set(socket.id, socket);
+    this.connectionHandler(socket);
+    return socket;
+  }
+}
+
+const senior = {
+  id: 'senior-1',
+  role: 'senior',
+  family_connections: [
+    { senior_id: 'senior-1', caregiver_id: 'carer-1', status: 'active' },
+    { senior_id: 'senior-1', caregiver_id: 'carer-2', status: 'pending' }
+  ]
+};
+const caregiver = {
+  id: 'carer-1',
+  role: 'caregiver',
+  family_connections: [
+    { senior_id: 'senior-1', caregiver_id: 'carer-1', status: 'active' },
+    { senior_id: 'senior-2', caregiver_id: 'carer-1', status: 'revoked' }
+  ]
+};
+const pendingCaregiver = {
+  id: 'carer-2',
+  role: 'caregiver',
+  family_connections: [{ senior_id: 'senior-1', caregiver_id: 'carer-2', status: 'pending' }]
+};
+
+const usersByToken = {
+  'senior-token': senior,
+  'carer-token': caregiver,
+  'carer-other-token': caregiver,
+  'pending-token': pendingCaregiver
+};
+
+// Let pub/sub listeners finish their async work
+const settle = () => new Promise(resolve => setImmediate(resolve));
+
+// Two instances sharing an in-process pub/sub channel
+const cluster = () => {
+  const pubsub = new MemoryStore();
+  const clock = { time: 0, now() { return this.time; } };
+  const loadUser = jest.fn(async id => Object.values(usersByToken).find(user => user.id === id) || null);
+
+  const instance = () => {
+    const io = new FakeServer();
+    const realtime = createRealtime({
+      pubsub,
+      clock,
+      flushMs: 60 * 1000,
+      authenticate: async token => usersByToken[token] || null,
+      loadUser
+    });
+    realtime.attach(io);
+    return { io, realtime };
+  };
+
+  return { a: instance(), b: instance(), clock, loadUser };
+};
+
+describe('realtime', () => {
+  let instances = [];
+
+  const start = async () => {
+    const c = cluster();
+    instances = [c.a.realtime, c.b.realtime];
+    await Promise.all(instances.map(realtime => realtime.start()));
+    return c;
+  };
+
+  afterEach(async () => {
+    await Promise.all(instances.map(realtime => realtime.stop()));
+    instances = [];
+  });
+
+  test('rejects handshakes without a valid token', async () => {
+    const { a } = await start();
+
+    await expect(a.io.connect(null)).rejects.toThrow('Authentication required');
+    await expect(a.io.connect('unknown-token')).rejects.toThrow('Authentication required');
+
+    const throwing = createRealtime({
+      pubsub: new MemoryStore(),
+      authenticate: async () => { throw new Error('jwt expired'); }
+    });
+    const io = new FakeServer();
+    throwing.attach(io);
+    await expect(io.connect('expired-token')).rejects.toThrow('Authentication required');
+
+    const socket = await a.io.connect('senior-token');
+    expect(socket.data.user.id).toBe('senior-1');
+  });
+
+  test('puts sockets in the rooms their account entitles them to', async () => {
+    const { a } = await start();
+
+    const seniorSocket = await a.io.connect('senior-token');
+    const caregiverSocket = await a.io.connect('carer-token');
+    const pendingSocket = await a.io.connect('pending-token');
+
+    expect(seniorSocket.rooms).toEqual(new Set([seniorSocket.id, 'user_senior-1', 'family_senior-1']));
+    expect(caregiverSocket.rooms).toEqual(new Set([caregiverSocket.id, 'user_carer-1', 'family_senior-1']));
+    expect(pendingSocket.rooms).toEqual(new Set([pendingSocket.id, 'user_carer-2']));
+  });
+
+  test('join-room only reloads the user for well-formed rooms, at most once per interval', async () => {
+    const { a, clock, loadUser } = await start();
+    const socket = await a.io.connect('pending-token');
+
+    expect(await socket.send('join-room', 'family_senior-1')).toEqual({ ok: false });
+    expect(loadUser).toHaveBeenCalledTimes(1);
+
+    // Bogus ids never reach the database, well-formed ones are throttled
+    expect(await socket.send('join-room', 'not a room')).toEqual({ ok: false });
+    expect(await socket.send('join-room', { $ne: null })).toEqual({ ok: false });
+    expect(await socket.send('join-room', 'family_senior-9')).toEqual({ ok: false });
+    expect(loadUser).toHaveBeenCalledTimes(1);
+
+    // The invitation is accepted; the next reload picks it up
+    loadUser.mockResolvedValueOnce({
+      ...pendingCaregiver,
+      family_connections: [{ senior_id: 'senior-1', caregiver_id: 'carer-2', status: 'active' }]
+    });
+    clock.time += 5000;
+    expect(await socket.send('join-room', 'family_senior-1')).toEqual({ ok: true });
+    expect(loadUser).toHaveBeenCalledTimes(2);
+    expect(socket.rooms.has('family_senior-1')).toBe(true);
+  });
+
+  test('delivers broadcasts to room members on every instance', async () => {
+    const { a, b } = await start();
+    const seniorSocket = await a.io.connect('senior-token');
+    const caregiverSocket = await b.io.connect('carer-token');
+    const outsider = await b.io.connect('pending-token');
+
+    a.realtime.emit('family_senior-1', 'emergency_notification', { level: 'high' });
+    await a.realtime.flush();
+
+    expect(seniorSocket.eventsNamed('emergency_notification')).toEqual([{ level: 'high' }]);
+    expect(caregiverSocket.eventsNamed('emergency_notification')).toEqual([{ level: 'high' }]);
+    expect(outsider.received).toEqual([]);
+    expect(b.realtime.stats().received).toBe(1);
+  });
+
+  test('relays socket messages only to rooms the sender may reach', async () => {
+    const { a, b } = await start();
+    await a.io.connect('senior-token');
+    const caregiverSocket = await b.io.connect('carer-token');
+    const seniorSocket = await a.io.connect('senior-token');
+
+    await seniorSocket.send('send-message', { roomId: 'user_carer-1', text: 'hello' });
+    await seniorSocket.send('send-message', { roomId: 'user_stranger', text: 'spam' });
+    await a.realtime.flush();
+
+    expect(caregiverSocket.eventsNamed('receive-message')).toEqual([
+      { roomId: 'user_carer-1', text: 'hello', senderId: 'senior-1' }
+    ]);
+    // Not echoed to the sending socket
+    expect(seniorSocket.received).toEqual([]);
+  });
+
+  test('coalesces queued events with the same key', async () => {
+    const { a, b } = await start();
+    const caregiverSocket = await b.io.connect('carer-token');
+
+    a.realtime.emit('user_carer-1', 'unread_count', { count: 1 }, { coalesceKey: 'unread' });
+    a.realtime.emit('user_carer-1', 'unread_count', { count: 2 }, { coalesceKey: 'unread' });
+    a.realtime.emit('user_carer-1', 'new_message', { id: 'm1' });
+    await a.realtime.flush();
+
+    expect(caregiverSocket.eventsNamed('unread_count')).toEqual([{ count: 2 }]);
+    expect(caregiverSocket.eventsNamed('new_message')).toEqual([{ id: 'm1' }]);
+    expect(a.realtime.stats()).toMatchObject({ queued: 3, coalesced: 1, batches: 1 });
+  });
+
+  test('takes a revoked connection away from open sockets on every instance', async () => {
+    const { a, b } = await start();
+    const seniorSocket = await a.io.connect('senior-token');
+    const caregiverSocket = await b.io.connect('carer-token');
+
+    await a.realtime.revokeConnection({ senior_id: 'senior-1', caregiver_id: 'carer-1' });
+    await settle();
+
+    expect(caregiverSocket.rooms.has('family_senior-1')).toBe(false);
+    expect(caregiverSocket.rooms.has('user_carer-1')).toBe(true);
+    expect(seniorSocket.rooms.has('family_senior-1')).toBe(true);
+
+    a.realtime.emit('family_senior-1', 'emergency_notification', { level: 'high' });
+    await a.realtime.flush();
+    expect(caregiverSocket.received).toEqual([]);
+
+    // Neither side can message the other through the old connection
+    await seniorSocket.send('send-message', { roomId: 'user_carer-1', text: 'still there?' });
+    await a.realtime.flush();
+    expect(caregiverSocket.received).toEqual([]);
+  });
+
+  test('disconnects only the sockets opened with a revoked token', async () => {
+    const { a, b } = await start();
+    const revoked = await b.io.connect('carer-token');
+    const other = await b.io.connect('carer-other-token');
+
+    await a.realtime.revokeToken({ userId: 'carer-1' }, 'carer-token');
+    await settle();
+
+    expect(revoked.connected).toBe(false);
+    expect(other.connected).toBe(true);
+  });
+});
@@ -0,0 +1,326 @@
+jest.mock('../utils/logger', () => ({
+  logger: { info: jest.fn(), warn: jest.fn(), error: jest.fn(), debug: jest.fn() }
+}));
+jest.mock('../config/database', () => ({ getDB: jest.fn() }));
+jest.mock('../config/firebase', () => ({
+  medicationNotifications: {},
+  isFirebaseInitialized: () => false
+}));
+jest.mock('../services/medicationSchedule', () => ({
+  medicationSchedule: { COLLECTION: 'medication_reminders', REMINDER_SHARDS: 4 }
+}));
+jest.mock('../services/medicationAdherence', () => ({
+  medicationAdherence: { refresh: jest.fn() }
+}));
+jest.mock('../services/caregiverFeed', () => ({
+  caregiverFeed: { publish: jest.fn() }
+}));
+
+const { createReminderDispatcher } = require('../services/reminderDispatcher');
+const { caregiverFeed } = require('../services/caregiverFeed');
+const { medicationAdherence } = require('../services/medicationAdherence');
+
+const MINUTE = 60 * 1000;
+const START = Date.UTC(2026, 0, 5, 8, 0, 0);
+
+// In-memory stand-in for the handful of MongoDB calls the dispatcher and
+// loaders make: equality, null, $in, $gt/$gte/$lt/$lte and top-level $or
+const comparable = (value) => (value instanceof Date ? value.getTime() : value);
+
+const matchesCondition = (actual, condition) => {
+  if (condition === null) {
+    return actual === null || actual === undefined;
+  }
+  if (typeof condition !== 'object' || condition instanceof Date) {
+    return comparable(actual) === comparable(condition);
+  }
+  return Object.entries(condition).every(([operator, operand]) => {
+    const a = comparable(actual);
+    const b = comparable(operand);
+    switch (operator) {
+      case '$in': return operand.some(item => comparable(item) === a);
+      case '$gt': return a > b;
+      case '$gte': return a >= b;
+      case '$lt': return a < b;
+      case '$lte': return a <= b;
+      default: throw new Error(`Unsupported operator ${operator}`);
+    }
+  });
+};
+
+const matches = (doc, filter) => Object.entries(filter).every(([field, condition]) => (
+  field === '$or'
+    ? condition.some(branch => matches(doc, branch))
+    : matchesCondition(doc[field], condition)
+));
+
+const fakeCollection = (docs = []) => ({
+  docs,
+  failNextUpdateMany: false,
+
+  find(filter) {
+    let results = docs.filter(doc => matches(doc, filter));
+    const cursor = {
+      sort(spec) {
+        const [[field, direction]] = Object.entries(spec);
+        results = [...results].sort((a, b) => direction * (comparable(a[field]) - comparable(b[field])));
+        return cursor;
+      },
+      limit(n) {
+        results = results.slice(0, n);
+        return cursor;
+      },
+      toArray: async () => results.map(doc => ({ ...doc }))
+    };
+    return cursor;
+  },
+
+  async updateMany(filter, { $set }) {
+    if (this.failNextUpdateMany) {
+      this.failNextUpdateMany = false;
+      throw new Error('connection reset');
+    }
+    const matched = docs.filter(doc => matches(doc, filter));
+    for (const doc of matched) Object.assign(doc, $set);
+    return { matchedCount: matched.length, modifiedCount: matched.length };
+  },
+
+  async bulkWrite(operations) {
+    for (const { updateOne: { filter, update } } of operations) {
+      const doc = docs.find(existing => matches(existing, filter));
+      if (doc) {
+        Object.assign(doc, update.$set);
+      } else {
+        docs.push({ ...filter, ...update.$set });
+      }
+    }
+  }
+});
+
+const fakeDb = (collections) => {
+  const all = {};
+  return {
+    collections: all,
+    collection(name) {
+      if (!all[name]) all[name] = fakeCollection(collections[name] || []);
+      return all[name];
+    }
+  };
+};
+
+const fakeClock = (now = START) => ({
+  time: now,
+  now() { return this.time; },
+  advance(ms) { this.time += ms; }
+});
+
+const stubSender = () => ({
+  sendReminder: jest.fn(async () => 1),
+  sendMissed: jest.fn(async caregivers => caregivers.length)
+});
+
+const reminder = (id, scheduledAt, fields = {}) => ({
+  id,
+  user_id: 'senior-1',
+  medication_id: 'med-1',
+  shard: 0,
+  scheduled_time: new Date(scheduledAt),
+  notified_at: null,
+  taken_at: null,
+  skipped: false,
+  missed_at: null,
+  ...fields
+});
+
+const seed = (reminders) => fakeDb({
+  medication_reminders: reminders,
+  users: [
+    { id: 'senior-1', first_name: 'Ada', is_active: true, device_tokens: ['senior-token'] },
+    { id: 'carer-1', first_name: 'Bo', is_active: true, device_tokens: ['carer-token'] },
+    { id: 'carer-2', first_name: 'Cy', is_active: false, device_tokens: ['old-token'] }
+  ],
+  medications: [{ id: 'med-1', name: 'Aspirin', dosage: '81mg', is_active: true }],
+  family_connections: [
+    { senior_id: 'senior-1', caregiver_id: 'carer-1', status: 'active' },
+    { senior_id: 'senior-1', caregiver_id: 'carer-2', status: 'active' }
+  ]
+});
+
+const sentIds = sender => sender.sendReminder.mock.calls.map(([, , sent]) => sent.id);
+
+describe('reminderDispatcher', () => {
+  beforeEach(() => {
+    jest.clearAllMocks();
+  });
+
+  test('pushes a reminder at its scheduled time and not before', async () => {
+    const db = seed([reminder('r1', START + 2 * MINUTE)]);
+    const clock = fakeClock();
+    const sender = stubSender();
+    const dispatcher = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    expect(await dispatcher.load(db)).toBe(1);
+
+    clock.advance(2 * MINUTE - 1000);
+    await dispatcher.tick(db);
+    expect(sender.sendReminder).not.toHaveBeenCalled();
+
+    clock.advance(1000);
+    await dispatcher.tick(db);
+    expect(sentIds(sender)).toEqual(['r1']);
+    expect(sender.sendReminder.mock.calls[0][0].id).toBe('senior-1');
+
+    const stored = db.collection('medication_reminders').docs[0];
+    expect(stored.notified_at).toEqual(new Date(clock.now()));
+    expect(stored.notified_by).toEqual(expect.any(String));
+  });
+
+  test('ignores reminders of shards it does not own', async () => {
+    const db = seed([reminder('r1', START + MINUTE, { shard: 1 })]);
+    const clock = fakeClock();
+    const sender = stubSender();
+    const dispatcher = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    expect(await dispatcher.load(db)).toBe(0);
+    clock.advance(MINUTE);
+    await dispatcher.tick(db);
+    expect(sender.sendReminder).not.toHaveBeenCalled();
+  });
+
+  test('never pushes a reminder twice across reloads or processes', async () => {
+    const db = seed([
+      reminder('r1', START + MINUTE),
+      reminder('r2', START + MINUTE),
+      reminder('r3', START + 2 * MINUTE)
+    ]);
+    const clock = fakeClock();
+    const sender = stubSender();
+    const first = createReminderDispatcher({ clock, sender, shards: [0] });
+    const second = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    // Both processes hold the same reminders
+    await Promise.all([first.load(db), second.load(db)]);
+
+    // One after the other
+    clock.advance(MINUTE);
+    await first.tick(db);
+    await second.tick(db);
+
+    // Racing
+    clock.advance(MINUTE);
+    await Promise.all([first.tick(db), second.tick(db)]);
+
+    // Reloading after the pushes finds nothing left to send
+    expect(await first.load(db)).toBe(0);
+    clock.advance(MINUTE);
+    await first.tick(db);
+
+    expect(sentIds(sender).sort()).toEqual(['r1', 'r2', 'r3']);
+    expect(first.stats().fired + second.stats().fired).toBe(3);
+  });
+
+  test('retries a batch whose claim failed without sending it twice', async () => {
+    const db = seed([reminder('r1', START + MINUTE)]);
+    const clock = fakeClock();
+    const sender = stubSender();
+    const dispatcher = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    await dispatcher.load(db);
+    clock.advance(MINUTE);
+    db.collection('medication_reminders').failNextUpdateMany = true;
+    await dispatcher.tick(db);
+    expect(sender.sendReminder).not.toHaveBeenCalled();
+    expect(dispatcher.stats().retrying).toBe(1);
+
+    // A reload while the retry is pending does not schedule it again
+    expect(await dispatcher.load(db)).toBe(0);
+
+    clock.advance(5000);
+    await dispatcher.tick(db);
+    expect(sentIds(sender)).toEqual(['r1']);
+    expect(dispatcher.stats().retrying).toBe(0);
+  });
+
+  test('resumes from its checkpoint after a restart', async () => {
+    const db = seed([
+      // Before the checkpoint: left alone even though it was never notified
+      reminder('before', START - 2 * MINUTE),
+      reminder('fired', START + MINUTE),
+      // Came due while the dispatcher was stopped
+      reminder('while-down', START + 5 * MINUTE)
+    ]);
+    const clock = fakeClock();
+    const sender = stubSender();
+    const dispatcher = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    // Start from a checkpoint just before START
+    await db.collection('reminder_dispatch_checkpoints').bulkWrite([{
+      updateOne: { filter: { _id: 'shard:0' }, update: { $set: { dispatched_through: new Date(START - MINUTE) } } }
+    }]);
+    await dispatcher.load(db);
+    clock.advance(MINUTE);
+    await dispatcher.tick(db);
+    await dispatcher.stop(db);
+    expect(sentIds(sender)).toEqual(['fired']);
+
+    const [checkpoint] = db.collection('reminder_dispatch_checkpoints').docs;
+    expect(checkpoint.dispatched_through).toEqual(new Date(START + MINUTE));
+
+    // Restart ten minutes later
+    clock.advance(10 * MINUTE);
+    const restarted = createReminderDispatcher({ clock, sender, shards: [0] });
+    expect(await restarted.load(db)).toBe(1);
+    await restarted.tick(db);
+
+    expect(sentIds(sender)).toEqual(['fired', 'while-down']);
+  });
+
+  test('does not push reminders more than the allowed lateness behind', async () => {
+    const db = seed([reminder('stale', START - 45 * MINUTE), reminder('recent', START - 10 * MINUTE)]);
+    const clock = fakeClock();
+    const sender = stubSender();
+    const dispatcher = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    await dispatcher.load(db);
+    await dispatcher.tick(db);
+
+    expect(sentIds(sender)).toEqual(['recent']);
+  });
+
+  test('marks untaken reminders missed once and tells active caregivers', async () => {
+    const db = seed([
+      reminder('untaken', START),
+      reminder('taken', START, { taken_at: new Date(START + MINUTE) }),
+      reminder('not-yet', START + 30 * MINUTE)
+    ]);
+    const clock = fakeClock(START + 60 * MINUTE + 1000);
+    const sender = stubSender();
+    const dispatcher = createReminderDispatcher({ clock, sender, shards: [0] });
+
+    expect(await dispatcher.sweepMissed(db)).toBe(1);
+
+    const byId = Object.fromEntries(db.collection('medication_reminders').docs.map(doc => [doc.id, doc]));
+    expect(byId.untaken.missed_at).toEqual(new Date(clock.now()));
+    expect(byId.taken.missed_at).toBeNull();
+    expect(byId['not-yet'].missed_at).toBeNull();
+
+    expect(medicationAdherence.refresh).toHaveBeenCalledWith(db, [expect.objectContaining({ id: 'untaken' })]);
+    expect(caregiverFeed.publish).toHaveBeenCalledWith(db, 'senior-1', expect.objectContaining({
+      type: 'medication_missed',
+      dedupeKey: 'missed:untaken',
+      caregiverIds: ['carer-1', 'carer-2']
+    }));
+    expect(sender.sendMissed).toHaveBeenCalledTimes(1);
+    expect(sender.sendMissed.mock.calls[0][0].map(caregiver => caregiver.id)).toEqual(['carer-1']);
+
+    // A later sweep neither re-marks nor re-notifies
+    clock.advance(MINUTE);
+    expect(await dispatcher.sweepMissed(db)).toBe(0);
+    expect(sender.sendMissed).toHaveBeenCalledTimes(1);
+
+    // ...and picks up the next reminder once it is overdue
+    clock.advance(30 * MINUTE);
+    expect(await dispatcher.sweepMissed(db)).toBe(1);
+    expect(byId['not-yet'].missed_at).toEqual(new Date(clock.now()));
+  });
+});
@@ -0,0 +1,71 @@
+const { TimerWheel } = require('../utils/timerWheel');
+
+// Keys of the timers that fall due when the wheel reaches `now`
+const firedAt = (wheel, now) => wheel.advance(now).map(timer => timer.key);
+
+describe('TimerWheel', () => {
+  test('fires a timer once it is due, not before', () => {
+    const wheel = new TimerWheel({ tickMs: 1000, startTime: 0 });
+    wheel.schedule('a', 5000, 'value');
+
+    expect(wheel.advance(4999)).toEqual([]);
+    expect(wheel.advance(5000)).toEqual([{ key: 'a', at: 5000, value: 'value' }]);
+    expect(wheel.advance(10000)).toEqual([]);
+    expect(wheel.size).toBe(0);
+  });
+
+  test('returns timers that fell due together earliest first', () => {
+    const wheel = new TimerWheel({ tickMs: 1000, startTime: 0 });
+    wheel.schedule('late', 3000);
+    wheel.schedule('early', 1000);
+    wheel.schedule('middle', 2000);
+
+    expect(firedAt(wheel, 3000)).toEqual(['early', 'middle', 'late']);
+  });
+
+  test('cascades timers from the upper levels and overflow down to their tick', () => {
+    // 4 slots x 2 levels: level 0 covers 4 ticks, level 1 covers 16,
+    // anything further waits in overflow
+    const wheel = new TimerWheel({ tickMs: 1, wheelSize: 4, levels: 2, startTime: 0 });
+    const due = [3, 4, 7, 15, 16, 17, 40, 63];
+    for (const at of due) {
+      wheel.schedule(`t${at}`, at);
+    }
+
+    for (let now = 1; now <= 64; now++) {
+      const expected = due.includes(now) ? [`t${now}`] : [];
+      expect(firedAt(wheel, now)).toEqual(expected);
+    }
+    expect(wheel.size).toBe(0);
+  });
+
+  test('fires everything passed over when advanced in one jump', () => {
+    const wheel = new TimerWheel({ tickMs: 1, wheelSize: 4, levels: 2, startTime: 0 });
+    for (const at of [2, 9, 30, 100]) {
+      wheel.schedule(`t${at}`, at);
+    }
+
+    expect(firedAt(wheel, 50)).toEqual(['t2', 't9', 't30']);
+    expect(firedAt(wheel, 99)).toEqual([]);
+    expect(firedAt(wheel, 100)).toEqual(['t100']);
+  });
+
+  test('timers already due fire on the next advance', () => {
+    const wheel = new TimerWheel({ tickMs: 1000, startTime: 10000 });
+    wheel.schedule('overdue', 2000);
+
+    expect(firedAt(wheel, 10000)).toEqual(['overdue']);
+  });
+
+  test('rescheduling replaces the timer and cancel removes it', () => {
+    const wheel = new TimerWheel({ tickMs: 1000, startTime: 0 });
+    wheel.schedule('a', 2000);
+    wheel.schedule('a', 6000);
+    wheel.schedule('b', 3000);
+
+    expect(wheel.cancel('b')).toBe(true);
+    expect(wheel.cancel('b')).toBe(false);
+    expect(firedAt(wheel, 5000)).toEqual([]);
+    expect(firedAt(wheel, 6000)).toEqual(['a']);
+  });
+});
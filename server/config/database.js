@@ -3,6 +3,7 @@ const { logger } = require('../utils/logger');
 
 let db = null;
 let client = null;
+let transactionsSupported = true;
 
 // MongoDB connection function
 const connectDB = async () => {
@@ -47,10 +48,32 @@ const initializeCollections = async () => {
     // Daily check-ins collection
     const checkInsCollection = db.collection('daily_checkins');
     await checkInsCollection.createIndex({ user_id: 1, check_date: 1 }, { unique: true });
+    await checkInsCollection.createIndex({ user_id: 1, check_date: -1, id: -1 });
+
+    // Check-in streaks, one document per user (see services/checkinStreaks.js)
+    await db.collection('checkin_streaks').createIndex({ user_id: 1 }, { unique: true });
+
+    // Weekly and monthly check-in rollups (see services/checkinAnalytics.js)
+    await db.collection('checkin_rollups').createIndex({ user_id: 1, unit: 1, bucket_start: 1 }, { unique: true });
     
     // Medications collection
     const medicationsCollection = db.collection('medications');
     await medicationsCollection.createIndex({ user_id: 1 });
+    await medicationsCollection.createIndex({ id: 1 }, { unique: true });
+    await medicationsCollection.createIndex({ is_active: 1, reminders_through: 1 });
+    
+    // Medication reminders, a rolling window expanded from each medication's
+    // schedule (see services/medicationSchedule.js)
+    const remindersCollection = db.collection('medication_reminders');
+    await remindersCollection.createIndex({ id: 1 }, { unique: true });
+    await remindersCollection.createIndex({ medication_id: 1, scheduled_time: 1 }, { unique: true });
+    await remindersCollection.createIndex({ user_id: 1, scheduled_time: 1 });
+    await remindersCollection.createIndex({ shard: 1, scheduled_time: 1 });
+    await remindersCollection.createIndex({ medication_id: 1, local_date: 1 });
+    
+    // Daily adherence counters (see services/medicationAdherence.js)
+    const adherenceCollection = db.collection('medication_adherence_daily');
+    await adherenceCollection.createIndex({ user_id: 1, date: 1 });
     
     // Medication logs collection
     const medicationLogsCollection = db.collection('medication_logs');
@@ -61,10 +84,36 @@ const initializeCollections = async () => {
     const messagesCollection = db.collection('messages');
     await messagesCollection.createIndex({ recipient_id: 1 });
     await messagesCollection.createIndex({ sender_id: 1 });
+    await messagesCollection.createIndex({ conversation_id: 1, created_at: -1 });
+    await messagesCollection.createIndex({ recipient_id: 1, is_read: 1 });
+
+    // Conversation summaries for the inbox (see services/conversations.js)
+    const conversationSummariesCollection = db.collection('conversation_summaries');
+    await conversationSummariesCollection.createIndex({ id: 1 }, { unique: true });
+    await conversationSummariesCollection.createIndex({ participants: 1, last_message_at: -1, id: -1 });
+
+    // Message search index (see services/messageSearch.js)
+    const messageSearchCollection = db.collection('message_search_terms');
+    await messageSearchCollection.createIndex({ user_id: 1, terms: 1, created_at: -1, message_id: -1 });
+    await messageSearchCollection.createIndex({ message_id: 1 });
     
     // Vitals collection
     const vitalsCollection = db.collection('vitals');
     await vitalsCollection.createIndex({ user_id: 1 });
+    await vitalsCollection.createIndex({ user_id: 1, reading_type: 1, reading_time: -1, id: -1 });
+    await vitalsCollection.createIndex({ user_id: 1, reading_time: -1, id: -1 });
+    
+    // Vitals rollups collection (hourly/daily aggregates)
+    const vitalsRollupsCollection = db.collection('vitals_rollups');
+    await vitalsRollupsCollection.createIndex(
+      { user_id: 1, reading_type: 1, granularity: 1, bucket_start: 1 },
+      { unique: true }
+    );
+    await vitalsRollupsCollection.createIndex({ user_id: 1, granularity: 1, bucket_start: 1 });
+    
+    // Per-user vital thresholds collection
+    const vitalThresholdsCollection = db.collection('vital_thresholds');
+    await vitalThresholdsCollection.createIndex({ user_id: 1, reading_type: 1 }, { unique: true });
     
     // Journal entries collection
     const journalCollection = db.collection('journal_entries');
@@ -77,10 +126,48 @@ const initializeCollections = async () => {
     // Emergency alerts collection
     const emergencyAlertsCollection = db.collection('emergency_alerts');
     await emergencyAlertsCollection.createIndex({ user_id: 1 });
+    await emergencyAlertsCollection.createIndex({ user_id: 1, created_at: -1, id: -1 });
+    await emergencyAlertsCollection.createIndex({ user_id: 1, status: 1, created_at: -1, id: -1 });
+    
+    // Background alert jobs (see services/jobQueue.js)
+    const alertJobsCollection = db.collection('alert_jobs');
+    await alertJobsCollection.createIndex({ status: 1, priority: -1, run_at: 1 });
+    await alertJobsCollection.createIndex({ status: 1, locked_until: 1 });
+    await alertJobsCollection.createIndex({ dedupe_key: 1 }, { unique: true, sparse: true });
+    await alertJobsCollection.createIndex(
+      { completed_at: 1 },
+      { expireAfterSeconds: 7 * 24 * 60 * 60, partialFilterExpression: { status: 'completed' } }
+    );
+    
+    // Revoked JWTs, kept until the token would have expired
+    const revokedTokensCollection = db.collection('revoked_tokens');
+    await revokedTokensCollection.createIndex({ jti: 1 }, { unique: true });
+    await revokedTokensCollection.createIndex({ revoked_at: 1 });
+    await revokedTokensCollection.createIndex({ expires_at: 1 }, { expireAfterSeconds: 0 });
+    
+    // Caregiver activity feeds (see services/caregiverFeed.js)
+    const caregiverFeedCollection = db.collection('caregiver_feed');
+    await caregiverFeedCollection.createIndex({ caregiver_id: 1, created_at: -1, id: -1 });
+    await caregiverFeedCollection.createIndex({ caregiver_id: 1, type: 1, created_at: -1, id: -1 });
+    await caregiverFeedCollection.createIndex({ caregiver_id: 1, senior_id: 1, created_at: -1, id: -1 });
+    await caregiverFeedCollection.createIndex(
+      { caregiver_id: 1, dedupe_key: 1 },
+      { unique: true, partialFilterExpression: { dedupe_key: { $type: 'string' } } }
+    );
+    await caregiverFeedCollection.createIndex({ expires_at: 1 }, { expireAfterSeconds: 0 });
+    
+    // System counters and per-minute event buckets (see services/systemCounters.js)
+    const counterBucketsCollection = db.collection('system_counter_buckets');
+    await counterBucketsCollection.createIndex({ minute: 1 });
+    await counterBucketsCollection.createIndex({ expires_at: 1 }, { expireAfterSeconds: 0 });
+    
+    // Materialized senior dashboards (see services/seniorDashboard.js)
+    const seniorDashboardsCollection = db.collection('senior_dashboards');
+    await seniorDashboardsCollection.createIndex({ user_id: 1 }, { unique: true });
     
     // Wellness scores collection
     const wellnessScoresCollection = db.collection('wellness_scores');
-    await wellnessScoresCollection.createIndex({ user_id: 1 });
+    await wellnessScoresCollection.createIndex({ user_id: 1, date: -1 }, { unique: true });
     
     logger.info('MongoDB collections and indexes initialized successfully');
   } catch (error) {
@@ -111,6 +198,34 @@ const getDB = () => {
   return db;
 };
 
+// Run fn(session) in a transaction. The driver retries it on transient
+// errors, so fn must only write through the session. A standalone server
+// (local development) cannot run transactions; there fn runs without one.
+const runTransaction = async (fn) => {
+  if (!transactionsSupported) {
+    return fn(undefined);
+  }
+
+  const session = client.startSession();
+  try {
+    let result;
+    await session.withTransaction(async () => {
+      result = await fn(session);
+    });
+    return result;
+  } catch (error) {
+    // IllegalOperation, raised by the first statement before anything is written
+    if (error.code === 20 && /replica set|mongos/i.test(error.message)) {
+      transactionsSupported = false;
+      logger.warn('MongoDB transactions are not supported by this deployment; writing without them');
+      return fn(undefined);
+    }
+    throw error;
+  } finally {
+    await session.endSession();
+  }
+};
+
 // Graceful shutdown
 const closeDB = async () => {
   try {
@@ -127,5 +242,6 @@ module.exports = {
   connectDB,
   checkDBHealth,
   getDB,
+  runTransaction,
   closeDB
 };
\ No newline at end of file
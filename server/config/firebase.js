@@ -421,6 +421,9 @@ const emergencyNotifications = {
   }
 };
 
+// Whether push notifications can be sent
+const isFirebaseInitialized = () => Boolean(firebaseApp);
+
 // Health check function
 const checkFirebaseHealth = async () => {
   try {
@@ -443,5 +446,6 @@ module.exports = {
   messagingHelpers,
   medicationNotifications,
   emergencyNotifications,
+  isFirebaseInitialized,
   checkFirebaseHealth
 };
\ No newline at end of file
@@ -1,25 +1,150 @@
 const redis = require('redis');
 const { logger } = require('../utils/logger');
 
-let redisClient;
+const { v4: uuidv4 } = require('uuid');
+const { LRUCache } = require('../utils/lruCache');
+const { MemoryStore } = require('../utils/memoryStore');
 
-const initializeRedis = async () => {
+// Two-tier cache. With Redis configured (REDIS_URL or REDIS_HOST) values
+// live in Redis and a small per-process LRU sits in front of it; writes
+// publish the changed keys so other instances drop their local copies.
+// Without Redis, or if it cannot be reached, the same helpers run on an
+// in-process MemoryStore and the local tier is skipped.
+const INVALIDATION_CHANNEL = 'cache:invalidate';
+const INSTANCE_ID = uuidv4();
+const LOCAL_TTL_MS = parseInt(process.env.LOCAL_CACHE_TTL_MS) || 5000;
+
+const memoryStore = new MemoryStore();
+let redisClient = memoryStore;
+let subscriber = null;
+let mode = 'memory';
+
+const localTier = new LRUCache({
+  max: parseInt(process.env.LOCAL_CACHE_MAX) || 5000,
+  ttlMs: LOCAL_TTL_MS
+});
+
+const remoteStats = { hits: 0, misses: 0, singleFlightJoins: 0 };
+
+// Pub/sub listeners by channel, re-subscribed whenever the backend changes
+const channelListeners = new Map();
+// Other per-process caches to clear on invalidation, by key prefix
+const invalidationHandlers = new Map();
+const inFlight = new Map();
+
+const useLocalTier = () => mode === 'redis';
+
+const buildRedisUrl = () => {
+  if (process.env.REDIS_URL) {
+    return process.env.REDIS_URL;
+  }
+  if (process.env.REDIS_HOST) {
+    return `redis://${process.env.REDIS_HOST}:${process.env.REDIS_PORT || 6379}`;
+  }
+  return null;
+};
+
+// Drop keys that another instance changed
+const handleInvalidation = (message) => {
+  try {
+    const { origin, keys } = JSON.parse(message);
+    if (origin === INSTANCE_ID) return;
+    for (const key of keys) {
+      localTier.delete(key);
+      for (const [prefix, handler] of invalidationHandlers) {
+        if (key.startsWith(prefix)) handler(key.slice(prefix.length));
+      }
+    }
+  } catch (error) {
+    logger.error('Invalid cache invalidation message:', error);
+  }
+};
+
+const publishInvalidation = async (keys) => {
+  if (!useLocalTier()) return;
   try {
-    // Skip Redis if not available
-    logger.warn('Redis initialization skipped for development');
+    await redisClient.publish(INVALIDATION_CHANNEL, JSON.stringify({ origin: INSTANCE_ID, keys }));
+  } catch (error) {
+    logger.error('Error publishing cache invalidation:', error);
+  }
+};
+
+const fallBackToMemory = (reason) => {
+  if (mode !== 'redis') return;
+  logger.warn(`Redis unavailable (${reason}), falling back to in-memory cache`);
+  redisClient = memoryStore;
+  subscriber = null;
+  mode = 'memory';
+  localTier.clear();
+  for (const [channel, listener] of channelListeners) {
+    memoryStore.subscribe(channel, listener);
+  }
+};
+
+const initializeRedis = async () => {
+  const url = buildRedisUrl();
+  if (!url) {
+    logger.info('Redis not configured - using in-memory cache');
     return null;
+  }
+
+  const client = redis.createClient({
+    url,
+    password: process.env.REDIS_PASSWORD || undefined,
+    socket: {
+      connectTimeout: 5000,
+      reconnectStrategy: (retries) => (
+        retries >= 5 ? new Error('Redis reconnect attempts exhausted') : Math.min(retries * 200, 2000)
+      )
+    }
+  });
+  client.on('error', (error) => logger.error('Redis client error:', error));
+
+  try {
+    await client.connect();
+
+    const sub = client.duplicate();
+    sub.on('error', (error) => logger.error('Redis subscriber error:', error));
+    await sub.connect();
+    await sub.subscribe(INVALIDATION_CHANNEL, handleInvalidation);
+    for (const [channel, listener] of channelListeners) {
+      await memoryStore.unsubscribe(channel, listener);
+      await sub.subscribe(channel, listener);
+    }
+
+    client.on('end', () => {
+      if (redisClient === client) fallBackToMemory('connection closed');
+    });
+
+    redisClient = client;
+    subscriber = sub;
+    mode = 'redis';
+    return client;
   } catch (error) {
     logger.error('Redis initialization failed:', error);
+    await client.disconnect().catch(() => {});
     throw error;
   }
 };
 
+const closeRedis = async () => {
+  if (mode !== 'redis') return;
+  const client = redisClient;
+  const sub = subscriber;
+  fallBackToMemory('shutting down');
+  await Promise.allSettled([sub && sub.quit(), client.quit()]);
+};
+
 // Cache helper functions
 const cacheHelpers = {
   // Set cache with expiration
   async set(key, value, expirationInSeconds = 3600) {
     try {
       await redisClient.setEx(key, expirationInSeconds, JSON.stringify(value));
+      if (useLocalTier()) {
+        localTier.set(key, value, Math.min(expirationInSeconds * 1000, LOCAL_TTL_MS));
+        await publishInvalidation([key]);
+      }
       return true;
     } catch (error) {
       logger.error(`Error setting cache for key ${key}:`, error);
@@ -29,9 +154,23 @@ const cacheHelpers = {
 
   // Get cache
   async get(key) {
+    if (useLocalTier()) {
+      const local = localTier.get(key);
+      if (local !== undefined) return local;
+    }
+
     try {
       const value = await redisClient.get(key);
-      return value ? JSON.parse(value) : null;
+      if (!value) {
+        remoteStats.misses++;
+        return null;
+      }
+      remoteStats.hits++;
+      const parsed = JSON.parse(value);
+      if (useLocalTier()) {
+        localTier.set(key, parsed);
+      }
+      return parsed;
     } catch (error) {
       logger.error(`Error getting cache for key ${key}:`, error);
       return null;
@@ -41,7 +180,9 @@ const cacheHelpers = {
   // Delete cache
   async del(key) {
     try {
+      localTier.delete(key);
       await redisClient.del(key);
+      await publishInvalidation([key]);
       return true;
     } catch (error) {
       logger.error(`Error deleting cache for key ${key}:`, error);
@@ -49,6 +190,55 @@ const cacheHelpers = {
     }
   },
 
+  // Return the cached value for key, or load, cache and return it.
+  // Concurrent misses for the same key share a single loader call.
+  async wrap(key, expirationInSeconds, loader) {
+    const cached = await cacheHelpers.get(key);
+    if (cached !== null) {
+      return cached;
+    }
+
+    if (inFlight.has(key)) {
+      remoteStats.singleFlightJoins++;
+      return inFlight.get(key);
+    }
+
+    const load = (async () => {
+      const value = await loader();
+      if (value !== null && value !== undefined) {
+        await cacheHelpers.set(key, value, expirationInSeconds);
+      }
+      return value;
+    })().finally(() => inFlight.delete(key));
+
+    inFlight.set(key, load);
+    return load;
+  },
+
+  // Tell every other instance to drop keys from its local caches,
+  // leaving stored values alone
+  async invalidate(keys) {
+    for (const key of keys) {
+      localTier.delete(key);
+    }
+    await publishInvalidation(keys);
+  },
+
+  // Run handler(rest of key) when another instance invalidates a key
+  // starting with prefix
+  onInvalidate(prefix, handler) {
+    invalidationHandlers.set(prefix, handler);
+  },
+
+  stats() {
+    return {
+      mode,
+      local: useLocalTier() ? localTier.stats() : null,
+      remote: { ...remoteStats },
+      inFlight: inFlight.size
+    };
+  },
+
   // Check if key exists
   async exists(key) {
     try {
@@ -161,6 +351,29 @@ const cacheHelpers = {
   }
 };
 
+// Pub/sub across instances (in-process without Redis)
+const pubsubHelpers = {
+  async publish(channel, message) {
+    return redisClient.publish(channel, message);
+  },
+
+  // One listener per channel
+  async subscribe(channel, listener) {
+    if (channelListeners.has(channel)) {
+      throw new Error(`Channel ${channel} already has a listener`);
+    }
+    channelListeners.set(channel, listener);
+    await (subscriber || memoryStore).subscribe(channel, listener);
+  },
+
+  async unsubscribe(channel) {
+    const listener = channelListeners.get(channel);
+    if (!listener) return;
+    channelListeners.delete(channel);
+    await (subscriber || memoryStore).unsubscribe(channel, listener).catch(() => {});
+  }
+};
+
 // Session management
 const sessionHelpers = {
   // Create user session
@@ -206,8 +419,12 @@ const rateLimitHelpers = {
   // Get current rate limit count
   async getRateLimitCount(identifier) {
     const key = `rate_limit:${identifier}`;
-    const count = await cacheHelpers.get(key);
-    return count || 0;
+    try {
+      return parseInt(await redisClient.get(key), 10) || 0;
+    } catch (error) {
+      logger.error(`Error reading rate limit count for ${identifier}:`, error);
+      return 0;
+    }
   }
 };
 
@@ -224,8 +441,11 @@ const checkRedisHealth = async () => {
 
 module.exports = {
   initializeRedis,
+  closeRedis,
+  getCacheMode: () => mode,
   redisClient: () => redisClient,
   cacheHelpers,
+  pubsubHelpers,
   sessionHelpers,
   rateLimitHelpers,
   checkRedisHealth
@@ -9,9 +9,17 @@ require('dotenv').config();
 
 const { logger } = require('./utils/logger');
 const { errorHandler } = require('./middleware/errorHandler');
-const { connectDB } = require('./config/database');
-const { initializeRedis } = require('./config/redis');
+const { attachLoaders } = require('./middleware/loaders');
+const { connectDB, getDB } = require('./config/database');
+const { initializeRedis, closeRedis } = require('./config/redis');
 const { initializeFirebase } = require('./config/firebase');
+const { alertPipeline } = require('./services/alertPipeline');
+const { tokenRevocation } = require('./services/tokenRevocation');
+const { caregiverFeed } = require('./services/caregiverFeed');
+const { systemCounters } = require('./services/systemCounters');
+const { medicationSchedule } = require('./services/medicationSchedule');
+const { reminderDispatcher } = require('./services/reminderDispatcher');
+const { realtime } = require('./services/realtime');
 
 // Routes
 const authRoutes = require('./routes/auth');
@@ -23,6 +31,7 @@ const dashboardRoutes = require('./routes/dashboard');
 const emergencyRoutes = require('./routes/emergency');
 const vitalsRoutes = require('./routes/vitals');
 const premiumRoutes = require('./routes/premium');
+const adminRoutes = require('./routes/admin');
 
 const app = express();
 const server = createServer(app);
@@ -51,7 +60,7 @@ app.use(helmet({
 // Rate limiting
 const limiter = rateLimit({
   windowMs: 15 * 60 * 1000, // 15 minutes
-  max: 100, // limit each IP to 100 requests per windowMs
+  max: parseInt(process.env.RATE_LIMIT_MAX) || 100, // limit each IP to 100 requests per windowMs
   message: 'Too many requests from this IP, please try again later.',
   standardHeaders: true,
   legacyHeaders: false,
@@ -84,6 +93,9 @@ app.get('/api/health', (req, res) => {
   });
 });
 
+// Request-scoped batched lookups (req.loaders)
+app.use('/api', attachLoaders);
+
 // API Routes
 app.use('/api/auth', authRoutes);
 app.use('/api/users', userRoutes);
@@ -94,28 +106,10 @@ app.use('/api/dashboard', dashboardRoutes);
 app.use('/api/emergency', emergencyRoutes);
 app.use('/api/vitals', vitalsRoutes);
 app.use('/api/premium', premiumRoutes);
+app.use('/api/admin', adminRoutes);
 
-// Socket.io for real-time messaging
-io.on('connection', (socket) => {
-  logger.info(`User connected: ${socket.id}`);
-  
-  socket.on('join-room', (roomId) => {
-    socket.join(roomId);
-    logger.info(`User ${socket.id} joined room ${roomId}`);
-  });
-  
-  socket.on('send-message', (data) => {
-    socket.to(data.roomId).emit('receive-message', data);
-  });
-  
-  socket.on('emergency-alert', (data) => {
-    socket.to(data.roomId).emit('emergency-notification', data);
-  });
-  
-  socket.on('disconnect', () => {
-    logger.info(`User disconnected: ${socket.id}`);
-  });
-});
+// Socket.io for real-time messaging (authenticated, cluster-wide rooms)
+realtime.attach(io);
 
 // Error handling middleware
 app.use(errorHandler);
@@ -137,12 +131,13 @@ async function startServer() {
     await connectDB();
     logger.info('Database connected successfully');
     
-    // Initialize Redis (optional)
+    // Initialize Redis (optional, falls back to an in-memory cache)
     try {
-      await initializeRedis();
-      logger.info('Redis connected successfully');
+      if (await initializeRedis()) {
+        logger.info('Redis connected successfully');
+      }
     } catch (error) {
-      logger.warn('Redis connection failed, continuing without Redis:', error);
+      logger.warn('Redis connection failed, continuing with in-memory cache:', error);
     }
     
     // Initialize Firebase (optional)
@@ -153,6 +148,21 @@ async function startServer() {
       logger.warn('Firebase initialization failed, continuing without Firebase:', error);
     }
     
+    // Cross-instance socket broadcasts (over Redis when connected)
+    await realtime.start();
+    
+    // Start background alert workers and feed maintenance
+    alertPipeline.start(getDB);
+    caregiverFeed.start(getDB);
+    systemCounters.start(getDB);
+    medicationSchedule.start(getDB);
+    if (process.env.REMINDER_DISPATCHER_ENABLED !== 'false') {
+      reminderDispatcher.start(getDB);
+    }
+    
+    // Load revoked tokens before accepting requests
+    await tokenRevocation.start(getDB);
+    
     // Start server
     server.listen(PORT, () => {
       logger.info(`SeniorCare Hub server running on port ${PORT}`);
@@ -167,6 +177,14 @@ async function startServer() {
 // Graceful shutdown
 process.on('SIGINT', async () => {
   logger.info('Shutting down server...');
+  await alertPipeline.stop();
+  tokenRevocation.stop();
+  caregiverFeed.stop();
+  medicationSchedule.stop();
+  await reminderDispatcher.stop(getDB());
+  await systemCounters.stop(getDB());
+  await realtime.stop();
+  await closeRedis();
   server.close(() => {
     logger.info('Server closed');
     process.exit(0);
@@ -1,6 +1,10 @@
 const jwt = require('jsonwebtoken');
+const { v4: uuidv4 } = require('uuid');
 const { getDB } = require('../config/database');
 const { logger } = require('../utils/logger');
+const { principalCache } = require('../services/principalCache');
+const { tokenRevocation } = require('../services/tokenRevocation');
+const { systemCounters } = require('../services/systemCounters');
 const { 
   AuthenticationError, 
   AuthorizationError, 
@@ -11,10 +15,11 @@ const {
 const JWT_SECRET = process.env.JWT_SECRET || 'default-secret';
 const JWT_EXPIRES_IN = process.env.JWT_EXPIRES_IN || '24h';
 
-// Generate JWT token
+// Generate JWT token (jti identifies it for revocation)
 const generateToken = (payload) => {
   return jwt.sign(payload, JWT_SECRET, {
-    expiresIn: JWT_EXPIRES_IN
+    expiresIn: JWT_EXPIRES_IN,
+    jwtid: uuidv4()
   });
 };
 
@@ -45,8 +50,13 @@ const extractToken = (req) => {
   return token;
 };
 
-// Get user from database
+// Get user from database (through the principal cache)
 const getUserFromDatabase = async (userId) => {
+  const cached = principalCache.get(userId);
+  if (cached) {
+    return cached;
+  }
+
   try {
     const db = getDB();
     
@@ -72,6 +82,7 @@ const getUserFromDatabase = async (userId) => {
     // Add family connections to user object
     user.family_connections = familyConnections;
     
+    principalCache.set(userId, user);
     return user;
   } catch (error) {
     logger.error('Error fetching user from database:', error);
@@ -93,8 +104,11 @@ const authenticate = asyncHandler(async (req, res, next) => {
     // Verify JWT token
     const decoded = verifyToken(token);
     
-    // Skip Redis blacklist check for now (Redis not available)
-    // TODO: Implement blacklist checking when Redis is available
+    // Reject revoked tokens (no I/O unless the revocation filter matches)
+    if (await tokenRevocation.isRevoked(getDB(), decoded, token)) {
+      logger.auth('Revoked token used', decoded.userId, { ip: req.ip });
+      throw new AuthenticationError('Token has been revoked');
+    }
     
     // Get user from database
     const user = await getUserFromDatabase(decoded.userId);
@@ -117,16 +131,21 @@ const authenticate = asyncHandler(async (req, res, next) => {
         user.subscription_tier = 'free';
         // Update in database
         const db = getDB();
-        await db.collection('users').updateOne(
-          { id: user.id },
+        const result = await db.collection('users').updateOne(
+          { id: user.id, subscription_tier: 'premium' },
           { $set: { subscription_tier: 'free', updated_at: new Date() } }
         );
+        if (result.modifiedCount > 0) {
+          systemCounters.tierChanged('premium', 'free');
+        }
+        principalCache.invalidate(user.id);
       }
     }
     
     // Attach user to request
     req.user = user;
     req.token = token;
+    req.tokenPayload = decoded;
     
     // Log successful authentication
     logger.auth('User authenticated successfully', user.id, { 
@@ -162,11 +181,16 @@ const optionalAuthenticate = asyncHandler(async (req, res, next) => {
   
   try {
     const decoded = verifyToken(token);
+    if (await tokenRevocation.isRevoked(getDB(), decoded, token)) {
+      return next();
+    }
+
     const user = await getUserFromDatabase(decoded.userId);
     
     if (user && user.is_active) {
       req.user = user;
       req.token = token;
+      req.tokenPayload = decoded;
     }
   } catch (error) {
     // Ignore errors for optional authentication
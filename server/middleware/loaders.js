@@ -0,0 +1,62 @@
+const { getDB } = require('../config/database');
+const { DataLoader, orderByKeys, groupByKeys } = require('../utils/dataLoader');
+
+// Fields never handed out by the users loader
+const USER_PROJECTION = { _id: 0, password_hash: 0 };
+
+// Batched lookups shared by everything that handles one request.
+// Each loader is created on first use.
+const createLoaders = (db) => {
+  const loaders = {};
+  const define = (name, create) => {
+    let loader = null;
+    Object.defineProperty(loaders, name, {
+      enumerable: true,
+      get: () => loader || (loader = create())
+    });
+  };
+
+  // User by id, without credentials
+  define('users', () => new DataLoader(async (ids) => {
+    const users = await db.collection('users')
+      .find({ id: { $in: ids } }, { projection: USER_PROJECTION })
+      .toArray();
+    return orderByKeys(ids, users);
+  }));
+
+  // Every family connection a user is on either side of
+  define('connections', () => new DataLoader(async (userIds) => {
+    const connections = await db.collection('family_connections')
+      .find(
+        { $or: [{ senior_id: { $in: userIds } }, { caregiver_id: { $in: userIds } }] },
+        { projection: { _id: 0 } }
+      )
+      .toArray();
+    return groupByKeys(userIds, connections, ['senior_id', 'caregiver_id']);
+  }));
+
+  // Medication by id
+  define('medications', () => new DataLoader(async (ids) => {
+    const medications = await db.collection('medications')
+      .find({ id: { $in: ids } }, { projection: { _id: 0 } })
+      .toArray();
+    return orderByKeys(ids, medications);
+  }));
+
+  return loaders;
+};
+
+// Give each request its own loaders as req.loaders
+const attachLoaders = (req, res, next) => {
+  let loaders = null;
+  Object.defineProperty(req, 'loaders', {
+    configurable: true,
+    get: () => loaders || (loaders = createLoaders(getDB()))
+  });
+  next();
+};
+
+module.exports = {
+  createLoaders,
+  attachLoaders
+};
@@ -0,0 +1,29 @@
+const express = require('express');
+const { authenticate, authorize } = require('../middleware/auth');
+const { cacheHelpers } = require('../config/redis');
+const { principalCache } = require('../services/principalCache');
+const { tokenRevocation } = require('../services/tokenRevocation');
+const { reminderDispatcher } = require('../services/reminderDispatcher');
+const { realtime } = require('../services/realtime');
+
+const router = express.Router();
+
+/**
+ * @route GET /api/admin/stats
+ * @desc Get this instance's cache, dispatcher and socket counters
+ * @access Private (Admins only)
+ */
+router.get('/stats', authenticate, authorize('admin'), (req, res) => {
+  res.json({
+    timestamp: new Date().toISOString(),
+    caches: {
+      authPrincipals: principalCache.stats(),
+      shared: cacheHelpers.stats(),
+      tokenRevocation: tokenRevocation.stats()
+    },
+    reminderDispatcher: reminderDispatcher.stats(),
+    realtime: realtime.stats()
+  });
+});
+
+module.exports = router;
@@ -1,12 +1,15 @@
 const express = require('express');
 const bcrypt = require('bcrypt');
-const jwt = require('jsonwebtoken');
 const Joi = require('joi');
 const { v4: uuidv4 } = require('uuid');
 const { getDB } = require('../config/database');
-const { authenticate } = require('../middleware/auth');
+const { authenticate, generateToken } = require('../middleware/auth');
 const { asyncHandler, ValidationError, AuthenticationError, ConflictError } = require('../middleware/errorHandler');
 const { logger } = require('../utils/logger');
+const { tokenRevocation } = require('../services/tokenRevocation');
+const { realtime } = require('../services/realtime');
+const { systemCounters } = require('../services/systemCounters');
+const { isValidTimeZone } = require('../utils/time');
 
 const router = express.Router();
 
@@ -19,6 +22,9 @@ const registerSchema = Joi.object({
   role: Joi.string().valid('senior', 'caregiver', 'admin').default('senior'),
   phone: Joi.string().pattern(/^\+?[\d\s\-\(\)]+$/).optional(),
   dateOfBirth: Joi.date().max('now').optional(),
+  timezone: Joi.string().custom((value, helpers) => (
+    isValidTimeZone(value) ? value : helpers.error('any.invalid')
+  )).optional(),
   emergencyContacts: Joi.array().items(Joi.object({
     name: Joi.string().required(),
     phone: Joi.string().required(),
@@ -33,13 +39,6 @@ const loginSchema = Joi.object({
   rememberMe: Joi.boolean().default(false)
 });
 
-// Helper function to generate JWT token
-const generateTokenLocal = (payload) => {
-  return jwt.sign(payload, process.env.JWT_SECRET || 'default-secret', {
-    expiresIn: process.env.JWT_EXPIRES_IN || '24h'
-  });
-};
-
 // Register new user
 router.post('/register', asyncHandler(async (req, res) => {
   const { error, value } = registerSchema.validate(req.body);
@@ -47,7 +46,7 @@ router.post('/register', asyncHandler(async (req, res) => {
     throw new ValidationError('Validation failed', error.details);
   }
 
-  const { email, password, firstName, lastName, role, phone, dateOfBirth, emergencyContacts } = value;
+  const { email, password, firstName, lastName, role, phone, dateOfBirth, timezone, emergencyContacts } = value;
   const db = getDB();
   
   // Check if user already exists
@@ -70,6 +69,7 @@ router.post('/register', asyncHandler(async (req, res) => {
     last_name: lastName,
     phone: phone || null,
     date_of_birth: dateOfBirth ? new Date(dateOfBirth) : null,
+    timezone: timezone || null,
     profile_picture_url: null,
     subscription_tier: 'free',
     subscription_expires_at: null,
@@ -82,9 +82,11 @@ router.post('/register', asyncHandler(async (req, res) => {
   };
 
   await db.collection('users').insertOne(userDoc);
+  systemCounters.userActivated(userDoc);
+  systemCounters.recordEvent('registrations');
 
   // Generate token
-  const token = generateTokenLocal({
+  const token = generateToken({
     userId,
     email,
     role: role || 'senior'
@@ -123,7 +125,7 @@ router.post('/login', asyncHandler(async (req, res) => {
   }
 
   // Generate token
-  const token = generateTokenLocal({
+  const token = generateToken({
     userId: user.id,
     email: user.email,
     role: user.role
@@ -148,8 +150,9 @@ router.get('/profile', authenticate, asyncHandler(async (req, res) => {
 
 // Logout user
 router.post('/logout', authenticate, asyncHandler(async (req, res) => {
-  // For now, just send success (client should discard token)
-  // TODO: Implement token blacklisting when Redis is available
+  // Revoke this token until it expires
+  await tokenRevocation.revoke(getDB(), req.tokenPayload, req.token);
+  await realtime.revokeToken(req.tokenPayload, req.token);
   logger.auth('User logged out', req.user.id, { email: req.user.email });
   
   res.json({
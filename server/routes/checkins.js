@@ -5,6 +5,14 @@ const { getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
 const { asyncHandler, ValidationError } = require('../middleware/errorHandler');
 const { logger } = require('../utils/logger');
+const { parseLimit, applyCursor, buildCursorPage } = require('../utils/pagination');
+const { seniorDashboard } = require('../services/seniorDashboard');
+const { caregiverFeed } = require('../services/caregiverFeed');
+const { systemCounters } = require('../services/systemCounters');
+const { checkinStreaks } = require('../services/checkinStreaks');
+const { checkinAnalytics } = require('../services/checkinAnalytics');
+const { localDate, resolveTimeZone } = require('../utils/time');
+const { quietly } = require('../utils/quietly');
 
 const router = express.Router();
 
@@ -29,9 +37,14 @@ const checkInSchema = Joi.object({
  * @access Private
  */
 router.get('/', authenticate, asyncHandler(async (req, res) => {
-  const { page = 1, limit = 30, start_date, end_date } = req.query;
-  const skip = (page - 1) * limit;
+  const { page = 1, cursor, start_date, end_date } = req.query;
+  const limit = parseLimit(req.query.limit, 30);
   const userId = req.user.id;
+  // Passing cursor (empty for the first page) switches to keyset paging
+  const cursorMode = cursor !== undefined;
+  const includeTotal = req.query.include_total !== undefined
+    ? req.query.include_total === 'true'
+    : !cursorMode;
   
   const db = getDB();
   
@@ -44,26 +57,32 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
     if (end_date) filter.check_date.$lte = end_date;
   }
 
-  // Get check-ins with pagination
-  const checkIns = await db.collection('daily_checkins')
-    .find(filter)
-    .sort({ check_date: -1 })
-    .skip(skip)
-    .limit(parseInt(limit))
-    .toArray();
+  // Get check-ins, fetching one extra row to know whether another page exists
+  let query = db.collection('daily_checkins')
+    .find(cursorMode ? applyCursor(filter, cursor, 'check_date') : filter)
+    .sort({ check_date: -1, id: -1 });
 
-  // Get total count for pagination
-  const total = await db.collection('daily_checkins').countDocuments(filter);
+  if (!cursorMode) {
+    query = query.skip((parseInt(page) - 1) * limit);
+  }
+
+  const fetched = await query.limit(limit + 1).toArray();
+  const { items: checkIns, hasNextPage, nextCursor } = buildCursorPage(fetched, limit, 'check_date');
+
+  const pagination = cursorMode
+    ? { limit, nextCursor, hasNextPage }
+    : { currentPage: parseInt(page), nextCursor, hasNextPage, hasPrevPage: page > 1 };
+
+  // Exact totals cost a count over the whole range, so they are optional
+  if (includeTotal) {
+    const total = await db.collection('daily_checkins').countDocuments(filter);
+    pagination.totalCount = total;
+    if (!cursorMode) pagination.totalPages = Math.ceil(total / limit);
+  }
 
   res.json({
     checkIns,
-    pagination: {
-      currentPage: parseInt(page),
-      totalPages: Math.ceil(total / limit),
-      totalCount: total,
-      hasNextPage: page * limit < total,
-      hasPrevPage: page > 1
-    }
+    pagination
   });
 }));
 
@@ -74,25 +93,19 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
  */
 router.get('/today', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const today = new Date().toISOString().split('T')[0];
-
-  const result = await pool.query(
-    `SELECT 
-      id, user_id, date, mood_rating, energy_level, pain_level, 
-      sleep_quality, appetite_rating, hydration_glasses, medications_taken,
-      exercise_minutes, social_interaction, notes, voice_note_url,
-      completed_at, created_at, updated_at
-    FROM daily_checkins 
-    WHERE user_id = $1 AND date = $2`,
-    [userId, today]
+  const today = localDate(new Date(), resolveTimeZone(req.user.timezone));
+
+  const checkIn = await getDB().collection('daily_checkins').findOne(
+    { user_id: userId, check_date: today },
+    { projection: { _id: 0 } }
   );
 
-  if (result.rows.length === 0) {
+  if (!checkIn) {
     return res.json({ checkIn: null, hasCheckedIn: false });
   }
 
   res.json({
-    checkIn: result.rows[0],
+    checkIn,
     hasCheckedIn: true
   });
 }));
@@ -109,7 +122,8 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
   }
 
   const userId = req.user.id;
-  const today = new Date().toISOString().split('T')[0];
+  // Check-ins belong to the user's local day
+  const today = localDate(new Date(), resolveTimeZone(req.user.timezone));
 
   const {
     mood_rating, energy_level, pain_level, sleep_quality, appetite_rating,
@@ -157,10 +171,36 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
     checkInData.created_at = new Date();
     await db.collection('daily_checkins').insertOne(checkInData);
     checkIn = checkInData;
+    systemCounters.increment('daily_checkins');
+    systemCounters.recordEvent('checkins');
+    await quietly(
+      () => checkinStreaks.record(db, userId, today, req.user.timezone),
+      `Failed to update check-in streak for ${userId}`
+    );
   }
+  await quietly(() => checkinAnalytics.refresh(db, userId, [today]), `Failed to refresh check-in rollups for ${userId}`);
+
+  await seniorDashboard.refresh(db, userId, 'checkins');
+
+  const concerning = mood_rating <= 2 || energy_level <= 2 || pain_level >= 4;
+
+  await caregiverFeed.publish(db, userId, {
+    type: 'checkin',
+    title: `${req.user.first_name} ${existingCheckIn ? 'updated' : 'completed'} their daily check-in`,
+    severity: concerning ? 'medium' : null,
+    data: {
+      check_in_id: checkIn.id,
+      check_date: today,
+      senior_name: `${req.user.first_name} ${req.user.last_name}`,
+      mood_rating,
+      energy_level,
+      pain_level
+    },
+    dedupeKey: `checkin:${checkIn.id}`
+  });
 
   // Simple alert logic - if concerning metrics, log for potential caregiver notification
-  if (mood_rating <= 2 || energy_level <= 2 || pain_level >= 4) {
+  if (concerning) {
     logger.warn('Concerning check-in metrics detected', {
       userId,
       mood_rating,
@@ -183,146 +223,20 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
  * @access Private
  */
 router.get('/streak', authenticate, asyncHandler(async (req, res) => {
-  const userId = req.user.id;
-
-  // Get last 30 days of check-ins
-  const result = await pool.query(
-    `SELECT date, completed_at
-     FROM daily_checkins 
-     WHERE user_id = $1 
-     AND date >= CURRENT_DATE - INTERVAL '30 days'
-     ORDER BY date DESC`,
-    [userId]
-  );
-
-  let currentStreak = 0;
-  let longestStreak = 0;
-  let tempStreak = 0;
-
-  const today = new Date().toISOString().split('T')[0];
-  const checkInDates = result.rows.map(row => row.date);
-
-  // Calculate current streak
-  for (let i = 0; i < 30; i++) {
-    const date = new Date();
-    date.setDate(date.getDate() - i);
-    const dateStr = date.toISOString().split('T')[0];
-
-    if (checkInDates.includes(dateStr)) {
-      if (i === 0 || currentStreak > 0) {
-        currentStreak++;
-      }
-      tempStreak++;
-    } else {
-      if (i === 0) {
-        currentStreak = 0;
-      }
-      if (tempStreak > longestStreak) {
-        longestStreak = tempStreak;
-      }
-      tempStreak = 0;
-    }
-  }
+  const streak = await checkinStreaks.get(getDB(), req.user.id, req.user.timezone);
 
-  if (tempStreak > longestStreak) {
-    longestStreak = tempStreak;
-  }
-
-  res.json({
-    currentStreak,
-    longestStreak,
-    totalCheckIns: result.rows.length,
-    lastCheckIn: result.rows.length > 0 ? result.rows[0].date : null
-  });
+  res.json(streak);
 }));
 
 /**
  * @route GET /api/checkins/analytics
- * @desc Get analytics data for check-ins
+ * @desc Get analytics data for check-ins, bucketed by day, week or month
  * @access Private
  */
 router.get('/analytics', authenticate, asyncHandler(async (req, res) => {
-  const userId = req.user.id;
-  const { days = 30 } = req.query;
-
-  const result = await pool.query(
-    `SELECT 
-      date, mood_rating, energy_level, pain_level, sleep_quality, 
-      appetite_rating, hydration_glasses, exercise_minutes,
-      medications_taken, social_interaction
-     FROM daily_checkins 
-     WHERE user_id = $1 
-     AND date >= CURRENT_DATE - INTERVAL '${days} days'
-     ORDER BY date DESC`,
-    [userId]
-  );
-
-  const analytics = {
-    totalCheckIns: result.rows.length,
-    averages: {
-      mood: 0,
-      energy: 0,
-      pain: 0,
-      sleep: 0,
-      appetite: 0,
-      hydration: 0,
-      exercise: 0
-    },
-    trends: {
-      mood: [],
-      energy: [],
-      pain: [],
-      sleep: [],
-      appetite: [],
-      hydration: [],
-      exercise: []
-    },
-    medicationCompliance: 0,
-    socialInteractionDays: 0
-  };
+  const window = checkinAnalytics.windowFromQuery(req.query, req.user.timezone, 30);
 
-  if (result.rows.length > 0) {
-    const totals = result.rows.reduce((acc, row) => {
-      acc.mood += row.mood_rating || 0;
-      acc.energy += row.energy_level || 0;
-      acc.pain += row.pain_level || 0;
-      acc.sleep += row.sleep_quality || 0;
-      acc.appetite += row.appetite_rating || 0;
-      acc.hydration += row.hydration_glasses || 0;
-      acc.exercise += row.exercise_minutes || 0;
-      acc.medicationsTaken += row.medications_taken ? 1 : 0;
-      acc.socialInteraction += row.social_interaction ? 1 : 0;
-      return acc;
-    }, {
-      mood: 0, energy: 0, pain: 0, sleep: 0, appetite: 0,
-      hydration: 0, exercise: 0, medicationsTaken: 0, socialInteraction: 0
-    });
-
-    const count = result.rows.length;
-    analytics.averages = {
-      mood: (totals.mood / count).toFixed(1),
-      energy: (totals.energy / count).toFixed(1),
-      pain: (totals.pain / count).toFixed(1),
-      sleep: (totals.sleep / count).toFixed(1),
-      appetite: (totals.appetite / count).toFixed(1),
-      hydration: (totals.hydration / count).toFixed(1),
-      exercise: (totals.exercise / count).toFixed(0)
-    };
-
-    analytics.medicationCompliance = ((totals.medicationsTaken / count) * 100).toFixed(1);
-    analytics.socialInteractionDays = totals.socialInteraction;
-
-    // Create trend data
-    result.rows.reverse().forEach(row => {
-      analytics.trends.mood.push({ date: row.date, value: row.mood_rating });
-      analytics.trends.energy.push({ date: row.date, value: row.energy_level });
-      analytics.trends.pain.push({ date: row.date, value: row.pain_level });
-      analytics.trends.sleep.push({ date: row.date, value: row.sleep_quality });
-      analytics.trends.appetite.push({ date: row.date, value: row.appetite_rating });
-      analytics.trends.hydration.push({ date: row.date, value: row.hydration_glasses });
-      analytics.trends.exercise.push({ date: row.date, value: row.exercise_minutes });
-    });
-  }
+  const analytics = await checkinAnalytics.summary(getDB(), req.user.id, window);
 
   res.json(analytics);
 }));
@@ -336,15 +250,24 @@ router.delete('/:id', authenticate, asyncHandler(async (req, res) => {
   const { id } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    'DELETE FROM daily_checkins WHERE id = $1 AND user_id = $2 RETURNING *',
-    [id, userId]
-  );
+  const db = getDB();
+
+  const checkIn = await db.collection('daily_checkins').findOneAndDelete({ id, user_id: userId });
 
-  if (result.rows.length === 0) {
+  if (!checkIn) {
     return res.status(404).json({ error: 'Check-in not found' });
   }
 
+  systemCounters.increment('daily_checkins', -1);
+  // A removed day can split a run, so recount
+  await checkinStreaks.rebuild(db, userId, req.user.timezone);
+  await quietly(
+    () => checkinAnalytics.refresh(db, userId, [checkIn.check_date]),
+    `Failed to refresh check-in rollups for ${userId}`
+  );
+
+  await seniorDashboard.refresh(db, userId, 'checkins');
+
   logger.info(`Check-in ${id} deleted by user ${userId}`);
 
   res.json({ message: 'Check-in deleted successfully' });
@@ -1,8 +1,17 @@
 const express = require('express');
 const { getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
-const { asyncHandler } = require('../middleware/errorHandler');
+const { asyncHandler, ValidationError } = require('../middleware/errorHandler');
 const { logger } = require('../utils/logger');
+const { seniorDashboard } = require('../services/seniorDashboard');
+const { caregiverFeed } = require('../services/caregiverFeed');
+const { systemCounters } = require('../services/systemCounters');
+const { checkinAnalytics } = require('../services/checkinAnalytics');
+const { parseLimit } = require('../utils/pagination');
+
+// Seniors listed inline on the caregiver dashboard; the full roster is
+// paged through /api/users/family-connections
+const DASHBOARD_ROSTER_LIMIT = 50;
 
 const router = express.Router();
 
@@ -15,12 +24,14 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
   const userRole = req.user.role;
 
+  if (userRole === 'senior') {
+    return sendSeniorDashboard(req, res, userId);
+  }
+
   let dashboardData;
 
-  if (userRole === 'senior') {
-    dashboardData = await getSeniorDashboard(userId);
-  } else if (userRole === 'caregiver') {
-    dashboardData = await getCaregiverDashboard(userId);
+  if (userRole === 'caregiver') {
+    dashboardData = await getCaregiverDashboard(req.user, req.loaders);
   } else {
     dashboardData = await getAdminDashboard(userId);
   }
@@ -28,6 +39,29 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
   res.json(dashboardData);
 }));
 
+/**
+ * @route GET /api/dashboard/feed
+ * @desc Get the caregiver's activity feed (cursor paged)
+ * @access Private
+ */
+router.get('/feed', authenticate, asyncHandler(async (req, res) => {
+  const limit = parseLimit(req.query.limit, 20);
+  const { cursor, senior_id: seniorId, type } = req.query;
+
+  if (type && !caregiverFeed.FEED_TYPES.includes(type)) {
+    throw new ValidationError(`Invalid feed type. Must be one of: ${caregiverFeed.FEED_TYPES.join(', ')}`);
+  }
+
+  const { items, hasNextPage, nextCursor } = await caregiverFeed.page(getDB(), req.user.id, {
+    cursor, limit, seniorId, type
+  });
+
+  res.json({
+    items,
+    pagination: { limit, nextCursor, hasNextPage }
+  });
+}));
+
 /**
  * @route GET /api/dashboard/senior/:seniorId
  * @desc Get specific senior's dashboard data (for caregivers)
@@ -38,17 +72,17 @@ router.get('/senior/:seniorId', authenticate, asyncHandler(async (req, res) => {
   const caregiverId = req.user.id;
 
   // Verify caregiver has access to this senior
-  const connection = await pool.query(
-    'SELECT id FROM family_connections WHERE senior_id = $1 AND caregiver_id = $2 AND status = $3',
-    [seniorId, caregiverId, 'active']
+  const hasConnection = req.user.family_connections?.some(connection =>
+    connection.senior_id === seniorId &&
+    connection.caregiver_id === caregiverId &&
+    connection.status === 'active'
   );
 
-  if (connection.rows.length === 0) {
+  if (!hasConnection) {
     return res.status(403).json({ error: 'Access denied to this senior\'s data' });
   }
 
-  const dashboardData = await getSeniorDashboard(seniorId);
-  res.json(dashboardData);
+  await sendSeniorDashboard(req, res, seniorId);
 }));
 
 /**
@@ -57,32 +91,9 @@ router.get('/senior/:seniorId', authenticate, asyncHandler(async (req, res) => {
  * @access Private
  */
 router.get('/wellness-summary', authenticate, asyncHandler(async (req, res) => {
-  const userId = req.user.id;
-  const { days = 7 } = req.query;
+  const window = checkinAnalytics.windowFromQuery(req.query, req.user.timezone, 7);
 
-  const result = await pool.query(
-    `SELECT 
-      date,
-      mood_rating,
-      energy_level,
-      pain_level,
-      sleep_quality,
-      appetite_rating,
-      hydration_glasses,
-      exercise_minutes,
-      medications_taken,
-      social_interaction
-    FROM daily_checkins 
-    WHERE user_id = $1 
-    AND date >= CURRENT_DATE - INTERVAL '${days} days'
-    ORDER BY date DESC`,
-    [userId]
-  );
-
-  const checkIns = result.rows;
-  
-  // Calculate averages and trends
-  const summary = calculateWellnessSummary(checkIns);
+  const summary = await checkinAnalytics.summary(getDB(), req.user.id, window);
 
   res.json(summary);
 }));
@@ -130,96 +141,52 @@ router.get('/upcoming-events', authenticate, asyncHandler(async (req, res) => {
 }));
 
 /**
- * Get senior dashboard data
+ * Helper function: send a senior's materialized dashboard, or 304 when the
+ * client's copy is still current
  */
-// Helper function: Get senior dashboard data
-async function getSeniorDashboard(userId) {
-  try {
-    const db = getDB();
-    const today = new Date().toISOString().split('T')[0];
-
-    // Get today's check-in status
-    const todayCheckIn = await db.collection('daily_checkins').findOne({
-      user_id: userId,
-      check_date: today
-    });
-
-    // Get recent medications
-    const medications = await db.collection('medications').find({
-      user_id: userId,
-      is_active: true
-    }).limit(5).toArray();
-
-    // Get unread messages count
-    const unreadMessagesCount = await db.collection('messages').countDocuments({
-      recipient_id: userId,
-      is_read: false
-    });
-
-    // Get recent check-ins for trend
-    const recentCheckIns = await db.collection('daily_checkins').find({
-      user_id: userId
-    }).sort({ check_date: -1 }).limit(7).toArray();
+async function sendSeniorDashboard(req, res, seniorId) {
+  const { dashboard, etag } = await seniorDashboard.get(getDB(), seniorId);
 
-    return {
-      user: { id: userId, role: 'senior' },
-      checkInStatus: {
-        completedToday: !!todayCheckIn,
-        lastCheckIn: todayCheckIn,
-        streak: recentCheckIns.length
-      },
-      medications: {
-        totalActive: medications.length,
-        upcomingReminders: medications.slice(0, 3)
-      },
-      messages: {
-        unreadCount: unreadMessagesCount
-      },
-      wellness: {
-        overallScore: todayCheckIn?.mood_rating || null,
-        trend: recentCheckIns.length > 0 ? 'improving' : 'stable'
-      },
-      recentActivity: recentCheckIns.slice(0, 3),
-      alerts: []
-    };
-  } catch (error) {
-    logger.error('Error getting senior dashboard:', error);
-    throw error;
+  res.set('ETag', etag);
+  res.set('Cache-Control', 'private, no-cache');
+
+  if (req.fresh) {
+    return res.status(304).end();
   }
+
+  res.json(dashboard);
 }
 
-// Helper function: Get caregiver dashboard data  
-async function getCaregiverDashboard(userId) {
+// Helper function: Get caregiver dashboard data. Connections come from the
+// authenticated principal and activity from the caregiver's feed, so the
+// cost does not grow with the number of seniors followed.
+async function getCaregiverDashboard(user, loaders) {
   try {
     const db = getDB();
 
-    // Get family connections for this caregiver
-    const familyConnections = await db.collection('family_connections').find({
-      caregiver_id: userId,
-      status: 'active'
-    }).toArray();
-
-    const seniorIds = familyConnections.map(fc => fc.senior_id);
+    const seniorIds = (user.family_connections || [])
+      .filter(connection => connection.caregiver_id === user.id && connection.status === 'active')
+      .map(connection => connection.senior_id);
 
-    // Get seniors info
-    const seniors = await db.collection('users').find({
-      id: { $in: seniorIds },
-      is_active: true
-    }).toArray();
-
-    // Get recent check-ins from seniors
-    const recentCheckIns = await db.collection('daily_checkins').find({
-      user_id: { $in: seniorIds }
-    }).sort({ created_at: -1 }).limit(10).toArray();
+    const [seniors, activity, alerts] = await Promise.all([
+      loaders.users.loadMany(seniorIds.slice(0, DASHBOARD_ROSTER_LIMIT)),
+      caregiverFeed.page(db, user.id, { limit: 10 }),
+      caregiverFeed.page(db, user.id, { limit: 5, type: 'emergency_alert' })
+    ]);
 
     return {
-      user: { id: userId, role: 'caregiver' },
-      familyMembers: seniors,
-      recentActivity: recentCheckIns,
-      alerts: [],
+      user: { id: user.id, role: 'caregiver' },
+      familyMembers: seniors
+        .filter(senior => senior && senior.is_active)
+        .map(({ id, first_name, last_name, profile_picture_url, role }) => (
+          { id, first_name, last_name, profile_picture_url, role }
+        )),
+      recentActivity: activity.items,
+      alerts: alerts.items,
+      feedCursor: activity.nextCursor,
       summary: {
-        totalSeniors: seniors.length,
-        recentCheckIns: recentCheckIns.length
+        totalSeniors: seniorIds.length,
+        recentCheckIns: activity.items.filter(item => item.type === 'checkin').length
       }
     };
   } catch (error) {
@@ -229,21 +196,34 @@ async function getCaregiverDashboard(userId) {
 }
 
 // Helper function: Get admin dashboard data
+// Served from the maintained system counters rather than collection scans
 async function getAdminDashboard(userId) {
   try {
     const db = getDB();
+    const { totals, rates, reconciledAt } = await systemCounters.snapshot(db);
 
-    // Get basic stats
-    const totalUsers = await db.collection('users').countDocuments({ is_active: true });
-    const totalCheckIns = await db.collection('daily_checkins').countDocuments();
-    const totalMedications = await db.collection('medications').countDocuments({ is_active: true });
+    const split = (prefix) => Object.fromEntries(
+      Object.entries(totals)
+        .filter(([name]) => name.startsWith(prefix))
+        .map(([name, value]) => [name.slice(prefix.length), value])
+    );
+    const rate = (name) => rates[name] || { perHour: 0, perMinute: 0 };
 
     return {
       user: { id: userId, role: 'admin' },
       systemStats: {
-        totalUsers,
-        totalCheckIns,
-        totalMedications
+        totalUsers: totals['users.active'] || 0,
+        totalCheckIns: totals.daily_checkins || 0,
+        totalMedications: totals['medications.active'] || 0,
+        totalVitals: totals.vitals || 0,
+        usersByRole: split('users.active.role.'),
+        usersByTier: split('users.active.tier.'),
+        rates: {
+          checkinsPerHour: rate('checkins').perHour,
+          vitalsPerMinute: rate('vitals').perMinute,
+          registrationsPerHour: rate('registrations').perHour
+        },
+        countersReconciledAt: reconciledAt
       },
       systemHealth: 'operational',
       alerts: []
@@ -254,8 +234,4 @@ async function getAdminDashboard(userId) {
   }
 }
 
-
-
-
-
 module.exports = router;
\ No newline at end of file
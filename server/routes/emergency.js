@@ -1,10 +1,17 @@
 const express = require('express');
 const Joi = require('joi');
-const { pool } = require('../config/database');
+const { v4: uuidv4 } = require('uuid');
+const { pool, getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
 const { asyncHandler, ValidationError } = require('../middleware/errorHandler');
 const { messagingHelpers, emergencyNotifications } = require('../config/firebase');
-const logger = require('../utils/logger');
+const { logger } = require('../utils/logger');
+const { parseLimit, applyCursor, buildCursorPage } = require('../utils/pagination');
+const { principalCache } = require('../services/principalCache');
+const { caregiverFeed } = require('../services/caregiverFeed');
+const { seniorDashboard } = require('../services/seniorDashboard');
+const { conversations } = require('../services/conversations');
+const { realtime } = require('../services/realtime');
 
 const router = express.Router();
 
@@ -36,111 +43,111 @@ router.post('/alert', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
   const { alert_type, severity, message, location_data, vitals_data } = value;
 
-  const client = await pool.connect();
-  try {
-    await client.query('BEGIN');
-
-    // Create emergency alert
-    const alertResult = await client.query(
-      `INSERT INTO emergency_alerts 
-       (user_id, alert_type, severity, message, location_data, vitals_data)
-       VALUES ($1, $2, $3, $4, $5, $6)
-       RETURNING *`,
-      [userId, alert_type, severity, message, 
-       JSON.stringify(location_data || {}), JSON.stringify(vitals_data || {})]
-    );
-
-    const alert = alertResult.rows[0];
-
-    // Get emergency contacts and caregivers
-    const contacts = await client.query(
-      `SELECT DISTINCT
-        u.id, u.first_name, u.last_name, u.email, u.phone,
-        'caregiver' as contact_type
-       FROM users u
-       JOIN family_connections fc ON u.id = fc.caregiver_id
-       WHERE fc.senior_id = $1 AND fc.status = 'active'
-       
-       UNION
-       
-       SELECT DISTINCT
-        NULL as id, ec.name as first_name, '' as last_name, 
-        NULL as email, ec.phone, 'emergency_contact' as contact_type
-       FROM users u, jsonb_array_elements(u.emergency_contacts) as ec
-       WHERE u.id = $1 AND ec->>'isPrimary' = 'true'`,
-      [userId]
-    );
+  const db = getDB();
+  const now = new Date();
+
+  // Get caregivers and primary emergency contacts
+  const caregiverIds = req.user.family_connections
+    .filter(connection => connection.senior_id === userId && connection.status === 'active')
+    .map(connection => connection.caregiver_id);
+
+  const caregivers = await db.collection('users')
+    .find(
+      { id: { $in: caregiverIds } },
+      { projection: { _id: 0, id: 1, first_name: 1, last_name: 1, email: 1, phone: 1, device_tokens: 1 } }
+    )
+    .toArray();
+
+  const primaryContacts = (req.user.emergency_contacts || []).filter(contact => contact.isPrimary);
+
+  const contactsNotified = [
+    ...caregivers.map(caregiver => ({
+      id: caregiver.id,
+      type: 'caregiver',
+      name: `${caregiver.first_name} ${caregiver.last_name}`.trim(),
+      phone: caregiver.phone,
+      notified_at: now.toISOString()
+    })),
+    ...primaryContacts.map(contact => ({
+      type: 'emergency_contact',
+      name: contact.name,
+      phone: contact.phone,
+      notified_at: now.toISOString()
+    }))
+  ];
+
+  // Create emergency alert
+  const alert = {
+    id: uuidv4(),
+    user_id: userId,
+    alert_type,
+    severity,
+    message,
+    location_data: location_data || {},
+    vitals_data: vitals_data || {},
+    status: 'active',
+    contacts_notified: contactsNotified,
+    created_at: now
+  };
+  await db.collection('emergency_alerts').insertOne(alert);
+
+  // Send emergency message to each caregiver
+  if (caregivers.length > 0) {
+    await conversations.send(db, caregivers.map(caregiver => conversations.newMessage({
+      sender_id: userId,
+      recipient_id: caregiver.id,
+      message_text: `🚨 EMERGENCY: ${message}`,
+      message_type: 'emergency',
+      created_at: now
+    })));
+    await Promise.all(caregivers.map(caregiver => seniorDashboard.refresh(db, caregiver.id, 'messages')));
+  }
 
-    // Send notifications to all contacts
-    const notificationPromises = [];
-    const caregiverTokens = []; // This would come from user device tokens in real implementation
-
-    for (const contact of contacts.rows) {
-      if (contact.contact_type === 'caregiver' && contact.id) {
-        // Send push notification to caregiver
-        notificationPromises.push(
-          emergencyNotifications.sendEmergencyAlert(
-            [contact.id], // This would be their device token
-            req.user,
-            alert_type,
-            message
-          ).catch(err => logger.error('Failed to send emergency notification:', err))
-        );
-
-        // Send emergency message
-        const conversationId = [userId, contact.id].sort().join('-');
-        await client.query(
-          `INSERT INTO messages 
-           (conversation_id, sender_id, recipient_id, message_text, message_type)
-           VALUES ($1, $2, $3, $4, 'emergency')`,
-          [conversationId, userId, contact.id, `🚨 EMERGENCY: ${message}`]
-        );
-      }
-
-      // Log contact notification
-      await client.query(
-        `UPDATE emergency_alerts 
-         SET contacts_notified = contacts_notified || $1
-         WHERE id = $2`,
-        [JSON.stringify([{
-          type: contact.contact_type,
-          name: `${contact.first_name} ${contact.last_name}`.trim(),
-          phone: contact.phone,
-          notified_at: new Date().toISOString()
-        }]), alert.id]
-      );
-    }
+  realtime.emit(realtime.familyRoom(userId), 'emergency_notification', {
+    alertId: alert.id,
+    alertType: alert_type,
+    severity,
+    seniorId: userId,
+    seniorName: `${req.user.first_name} ${req.user.last_name}`,
+    message,
+    location: location_data || {}
+  }, { urgent: true, coalesceKey: alert.id });
+
+  await caregiverFeed.publish(db, userId, {
+    type: 'emergency_alert',
+    title: message,
+    severity,
+    data: { alert_id: alert.id, alert_type, senior_name: `${req.user.first_name} ${req.user.last_name}` },
+    dedupeKey: `alert:${alert.id}`,
+    occurredAt: now,
+    caregiverIds: caregivers.map(caregiver => caregiver.id)
+  });
 
-    await client.query('COMMIT');
+  // Send push notifications to caregivers (don't wait for completion)
+  const caregiverTokens = caregivers.flatMap(caregiver => caregiver.device_tokens || []);
+  if (caregiverTokens.length > 0) {
+    emergencyNotifications.sendEmergencyAlert(caregiverTokens, req.user, alert_type, message)
+      .catch(err => logger.error('Failed to send emergency notification:', err));
+  }
 
-    // Execute notifications (don't wait for completion)
-    Promise.all(notificationPromises);
+  // If no contacts found, log warning
+  if (contactsNotified.length === 0) {
+    logger.warn(`Emergency alert created but no contacts found for user ${userId}`);
+  }
 
-    // If no contacts found, log warning
-    if (contacts.rows.length === 0) {
-      logger.warn(`Emergency alert created but no contacts found for user ${userId}`);
+  logger.info(`Emergency alert created: ${alert.id} for user ${userId}, type: ${alert_type}`);
+
+  res.status(201).json({
+    message: 'Emergency alert created and notifications sent',
+    alert: {
+      id: alert.id,
+      alertType: alert.alert_type,
+      severity: alert.severity,
+      message: alert.message,
+      createdAt: alert.created_at,
+      contactsNotified: contactsNotified.length
     }
-
-    logger.info(`Emergency alert created: ${alert.id} for user ${userId}, type: ${alert_type}`);
-
-    res.status(201).json({
-      message: 'Emergency alert created and notifications sent',
-      alert: {
-        id: alert.id,
-        alertType: alert.alert_type,
-        severity: alert.severity,
-        message: alert.message,
-        createdAt: alert.created_at,
-        contactsNotified: contacts.rows.length
-      }
-    });
-
-  } catch (error) {
-    await client.query('ROLLBACK');
-    throw error;
-  } finally {
-    client.release();
-  }
+  });
 }));
 
 /**
@@ -150,43 +157,49 @@ router.post('/alert', authenticate, asyncHandler(async (req, res) => {
  */
 router.get('/alerts', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const { page = 1, limit = 20, status = 'all' } = req.query;
-  const offset = (page - 1) * limit;
+  const { page = 1, cursor, status = 'all' } = req.query;
+  const limit = parseLimit(req.query.limit, 20);
+  // Passing cursor (empty for the first page) switches to keyset paging
+  const cursorMode = cursor !== undefined;
+  const includeTotal = req.query.include_total !== undefined
+    ? req.query.include_total === 'true'
+    : !cursorMode;
+
+  const db = getDB();
 
-  let whereClause = 'WHERE user_id = $1';
-  let params = [userId];
+  const filter = { user_id: userId };
 
   if (status !== 'all') {
-    params.push(status);
-    whereClause += ` AND status = $${params.length}`;
+    filter.status = status;
   }
 
-  const result = await pool.query(
-    `SELECT 
-      id, user_id, alert_type, severity, message, location_data,
-      vitals_data, status, contacts_notified, acknowledged_by,
-      acknowledged_at, resolved_at, created_at
-     FROM emergency_alerts 
-     ${whereClause}
-     ORDER BY created_at DESC
-     LIMIT $${params.length + 1} OFFSET $${params.length + 2}`,
-    [...params, limit, offset]
-  );
+  let query = db.collection('emergency_alerts')
+    .find(cursorMode ? applyCursor(filter, cursor, 'created_at') : filter, {
+      projection: { _id: 0 }
+    })
+    .sort({ created_at: -1, id: -1 });
 
-  // Get total count
-  const countResult = await pool.query(
-    `SELECT COUNT(*) as total FROM emergency_alerts ${whereClause}`,
-    params
-  );
+  if (!cursorMode) {
+    query = query.skip((parseInt(page) - 1) * limit);
+  }
+
+  const fetched = await query.limit(limit + 1).toArray();
+  const { items: alerts, hasNextPage, nextCursor } = buildCursorPage(fetched, limit, 'created_at');
+
+  const pagination = cursorMode
+    ? { limit, nextCursor, hasNextPage }
+    : { page: parseInt(page), limit, nextCursor, hasNextPage };
+
+  // Exact totals cost a count over the whole range, so they are optional
+  if (includeTotal) {
+    const total = await db.collection('emergency_alerts').countDocuments(filter);
+    pagination.total = total;
+    if (!cursorMode) pagination.totalPages = Math.ceil(total / limit);
+  }
 
   res.json({
-    alerts: result.rows,
-    pagination: {
-      page: parseInt(page),
-      limit: parseInt(limit),
-      total: parseInt(countResult.rows[0].total),
-      totalPages: Math.ceil(countResult.rows[0].total / limit)
-    }
+    alerts,
+    pagination
   });
 }));
 
@@ -333,19 +346,18 @@ router.put('/contacts', authenticate, asyncHandler(async (req, res) => {
     return res.status(400).json({ error: 'Only one primary contact is allowed' });
   }
 
-  const result = await pool.query(
-    `UPDATE users 
-     SET emergency_contacts = $1, updated_at = CURRENT_TIMESTAMP
-     WHERE id = $2
-     RETURNING emergency_contacts`,
-    [JSON.stringify(value), userId]
+  const db = getDB();
+  await db.collection('users').updateOne(
+    { id: userId },
+    { $set: { emergency_contacts: value, updated_at: new Date() } }
   );
+  principalCache.invalidate(userId);
 
   logger.info(`Emergency contacts updated for user ${userId}`);
 
   res.json({
     message: 'Emergency contacts updated successfully',
-    emergencyContacts: result.rows[0].emergency_contacts
+    emergencyContacts: value
   });
 }));
 
@@ -445,20 +457,18 @@ router.put('/panic-button-settings', authenticate, asyncHandler(async (req, res)
   }
 
   // Update user preferences
-  const result = await pool.query(
-    `UPDATE users 
-     SET preferences = COALESCE(preferences, '{}') || $1,
-         updated_at = CURRENT_TIMESTAMP
-     WHERE id = $2
-     RETURNING preferences`,
-    [JSON.stringify({ panicButton: value }), userId]
+  const db = getDB();
+  await db.collection('users').updateOne(
+    { id: userId },
+    { $set: { 'preferences.panicButton': value, updated_at: new Date() } }
   );
+  principalCache.invalidate(userId);
 
   logger.info(`Panic button settings updated for user ${userId}`);
 
   res.json({
     message: 'Panic button settings updated successfully',
-    settings: result.rows[0].preferences.panicButton
+    settings: value
   });
 }));
 
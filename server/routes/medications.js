@@ -5,6 +5,12 @@ const { getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
 const { asyncHandler, ValidationError } = require('../middleware/errorHandler');
 const { logger } = require('../utils/logger');
+const { seniorDashboard } = require('../services/seniorDashboard');
+const { systemCounters } = require('../services/systemCounters');
+const { medicationSchedule } = require('../services/medicationSchedule');
+const { medicationAdherence } = require('../services/medicationAdherence');
+const { resolveTimeZone, localDate, zonedTime, addDays } = require('../utils/time');
+const { quietly } = require('../utils/quietly');
 
 const router = express.Router();
 
@@ -65,7 +71,41 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
 }));
 
 /**
- * @route POST /api/medications
+ * @route GET /api/medications/adherence
+ * @desc Get medication adherence statistics
+ * @access Private
+ */
+router.get('/adherence', authenticate, asyncHandler(async (req, res) => {
+  const userId = req.user.id;
+  const days = Math.min(Math.max(parseInt(req.query.days) || 30, 1), 365);
+  const timeZone = resolveTimeZone(req.user.timezone);
+  const today = localDate(new Date(), timeZone);
+
+  const db = getDB();
+
+  const medicationIds = await db.collection('medications')
+    .distinct('id', { user_id: userId, is_active: true });
+
+  // One counter row per medication per day
+  const stats = await medicationAdherence.summary(db, userId, {
+    fromDate: addDays(today, -days),
+    toDate: today,
+    medicationIds
+  });
+
+  res.json({
+    adherenceRate: stats.adherenceRate,
+    statistics: {
+      totalReminders: stats.scheduled,
+      takenCount: stats.taken,
+      skippedCount: stats.skipped,
+      missedCount: stats.missed
+    }
+  });
+}));
+
+/**
+ * @route GET /api/medications/:id
  * @desc Get specific medication by ID
  * @access Private
  */
@@ -73,23 +113,14 @@ router.get('/:id', authenticate, asyncHandler(async (req, res) => {
   const { id } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    `SELECT 
-      id, user_id, name, dosage, frequency, times, instructions,
-      prescriber_name, prescription_number, refills_remaining,
-      side_effects, photo_url, is_active, start_date, end_date,
-      created_at, updated_at
-    FROM medications 
-    WHERE id = $1 AND user_id = $2`,
-    [id, userId]
-  );
+  const medication = await req.loaders.medications.load(id);
 
-  if (result.rows.length === 0) {
+  if (!medication || medication.user_id !== userId) {
     return res.status(404).json({ error: 'Medication not found' });
   }
 
   res.json({
-    medication: result.rows[0]
+    medication
   });
 }));
 
@@ -130,15 +161,20 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
     start_date: start_date ? new Date(start_date) : new Date(),
     end_date: end_date ? new Date(end_date) : null,
     photo_url: photo_url || null,
+    timezone: req.user.timezone || null,
     is_active: true,
+    schedule_version: 0,
+    reminders_through: null,
     created_at: new Date(),
     updated_at: new Date()
   };
 
   // Insert medication into database
   await db.collection('medications').insertOne(medicationDoc);
+  systemCounters.increment('medications.active');
+  await seniorDashboard.refresh(db, userId, 'medications');
+  await medicationSchedule.extend(db, medicationDoc);
 
-  // TODO: Create medication reminders (simplified for now)
   logger.info(`Medication created: ${name} for user ${userId}`);
 
   res.status(201).json({
@@ -161,51 +197,41 @@ router.put('/:id', authenticate, asyncHandler(async (req, res) => {
 
   const userId = req.user.id;
 
-  // Check if medication exists and belongs to user
-  const existingMed = await pool.query(
-    'SELECT id FROM medications WHERE id = $1 AND user_id = $2',
-    [id, userId]
-  );
-
-  if (existingMed.rows.length === 0) {
-    return res.status(404).json({ error: 'Medication not found' });
-  }
-
-  const updateFields = [];
-  const updateValues = [];
-  let paramCount = 1;
-
+  const updateFields = {};
   Object.keys(value).forEach(key => {
     if (value[key] !== undefined) {
-      updateFields.push(`${key} = $${paramCount}`);
-      updateValues.push(
-        key === 'times' ? JSON.stringify(value[key]) : value[key]
-      );
-      paramCount++;
+      updateFields[key] = value[key];
     }
   });
 
-  if (updateFields.length === 0) {
+  if (Object.keys(updateFields).length === 0) {
     return res.status(400).json({ error: 'No fields to update' });
   }
 
-  updateFields.push('updated_at = CURRENT_TIMESTAMP');
-  updateValues.push(id, userId);
+  const db = getDB();
 
-  const query = `
-    UPDATE medications 
-    SET ${updateFields.join(', ')} 
-    WHERE id = $${paramCount} AND user_id = $${paramCount + 1}
-    RETURNING *
-  `;
+  const medication = await db.collection('medications').findOneAndUpdate(
+    { id, user_id: userId },
+    { $set: { ...updateFields, updated_at: new Date() } },
+    { returnDocument: 'after', projection: { _id: 0 } }
+  );
 
-  const result = await pool.query(query, updateValues);
+  if (!medication) {
+    return res.status(404).json({ error: 'Medication not found' });
+  }
+
+  // Only a schedule change touches the reminders
+  if (medicationSchedule.SCHEDULE_FIELDS.some(field => field in updateFields)) {
+    await medicationSchedule.reschedule(db, id);
+  }
+
+  await seniorDashboard.refresh(db, userId, 'medications');
 
   logger.info(`Medication updated: ${id} by user ${userId}`);
 
   res.json({
     message: 'Medication updated successfully',
-    medication: result.rows[0]
+    medication
   });
 }));
 
@@ -218,15 +244,25 @@ router.delete('/:id', authenticate, asyncHandler(async (req, res) => {
   const { id } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    'UPDATE medications SET is_active = false, updated_at = CURRENT_TIMESTAMP WHERE id = $1 AND user_id = $2 RETURNING *',
-    [id, userId]
+  const db = getDB();
+
+  const previous = await db.collection('medications').findOneAndUpdate(
+    { id, user_id: userId },
+    { $set: { is_active: false, updated_at: new Date() } },
+    { returnDocument: 'before', projection: { _id: 0, is_active: 1 } }
   );
 
-  if (result.rows.length === 0) {
+  if (!previous) {
     return res.status(404).json({ error: 'Medication not found' });
   }
 
+  if (previous.is_active) {
+    systemCounters.increment('medications.active', -1);
+    await medicationSchedule.cancel(db, id);
+  }
+
+  await seniorDashboard.refresh(db, userId, 'medications');
+
   logger.info(`Medication deactivated: ${id} by user ${userId}`);
 
   res.json({ message: 'Medication deactivated successfully' });
@@ -239,24 +275,19 @@ router.delete('/:id', authenticate, asyncHandler(async (req, res) => {
  */
 router.get('/reminders/today', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const today = new Date().toISOString().split('T')[0];
-
-  const result = await pool.query(
-    `SELECT 
-      mr.id, mr.medication_id, mr.scheduled_time, mr.taken_at, mr.skipped,
-      mr.confirmation_method, mr.photo_url, mr.notes,
-      m.name, m.dosage, m.instructions, m.photo_url as medication_photo
-    FROM medication_reminders mr
-    JOIN medications m ON mr.medication_id = m.id
-    WHERE mr.user_id = $1 
-    AND DATE(mr.scheduled_time) = $2
-    AND m.is_active = true
-    ORDER BY mr.scheduled_time ASC`,
-    [userId, today]
-  );
+  const timeZone = resolveTimeZone(req.user.timezone);
+  const today = localDate(new Date(), timeZone);
+
+  const reminders = await findReminders(req, {
+    user_id: userId,
+    scheduled_time: {
+      $gte: zonedTime(today, '00:00', timeZone),
+      $lt: zonedTime(addDays(today, 1), '00:00', timeZone)
+    }
+  });
 
   res.json({
-    reminders: result.rows
+    reminders
   });
 }));
 
@@ -267,26 +298,19 @@ router.get('/reminders/today', authenticate, asyncHandler(async (req, res) => {
  */
 router.get('/reminders/upcoming', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const { hours = 24 } = req.query;
-
-  const result = await pool.query(
-    `SELECT 
-      mr.id, mr.medication_id, mr.scheduled_time, mr.taken_at, mr.skipped,
-      mr.confirmation_method, mr.photo_url, mr.notes,
-      m.name, m.dosage, m.instructions, m.photo_url as medication_photo
-    FROM medication_reminders mr
-    JOIN medications m ON mr.medication_id = m.id
-    WHERE mr.user_id = $1 
-    AND mr.scheduled_time BETWEEN NOW() AND NOW() + INTERVAL '${hours} hours'
-    AND mr.taken_at IS NULL
-    AND mr.skipped = false
-    AND m.is_active = true
-    ORDER BY mr.scheduled_time ASC`,
-    [userId]
-  );
+  // Reminders only exist as far ahead as the schedule horizon
+  const hours = Math.min(Math.max(parseInt(req.query.hours) || 24, 1), medicationSchedule.HORIZON_HOURS);
+  const now = new Date();
+
+  const reminders = await findReminders(req, {
+    user_id: userId,
+    scheduled_time: { $gte: now, $lte: new Date(now.getTime() + hours * 60 * 60 * 1000) },
+    taken_at: null,
+    skipped: false
+  });
 
   res.json({
-    reminders: result.rows
+    reminders
   });
 }));
 
@@ -300,23 +324,32 @@ router.post('/reminders/:id/take', authenticate, asyncHandler(async (req, res) =
   const userId = req.user.id;
   const { confirmation_method = 'tap', photo_url, notes } = req.body;
 
-  const result = await pool.query(
-    `UPDATE medication_reminders 
-     SET taken_at = CURRENT_TIMESTAMP, confirmation_method = $1, photo_url = $2, notes = $3
-     WHERE id = $4 AND user_id = $5 AND taken_at IS NULL
-     RETURNING *`,
-    [confirmation_method, photo_url, notes, id, userId]
+  const db = getDB();
+
+  const reminder = await db.collection('medication_reminders').findOneAndUpdate(
+    { id, user_id: userId, taken_at: null },
+    {
+      $set: {
+        taken_at: new Date(),
+        confirmation_method,
+        photo_url: photo_url || null,
+        notes: notes || null
+      }
+    },
+    { returnDocument: 'after', projection: { _id: 0 } }
   );
 
-  if (result.rows.length === 0) {
+  if (!reminder) {
     return res.status(404).json({ error: 'Reminder not found or already taken' });
   }
 
+  await quietly(() => medicationAdherence.refresh(db, [reminder]), 'Failed to refresh medication adherence counters');
+
   logger.info(`Medication reminder ${id} marked as taken by user ${userId}`);
 
   res.json({
     message: 'Medication marked as taken',
-    reminder: result.rows[0]
+    reminder
   });
 }));
 
@@ -330,95 +363,57 @@ router.post('/reminders/:id/skip', authenticate, asyncHandler(async (req, res) =
   const userId = req.user.id;
   const { notes } = req.body;
 
-  const result = await pool.query(
-    `UPDATE medication_reminders 
-     SET skipped = true, notes = $1
-     WHERE id = $2 AND user_id = $3 AND taken_at IS NULL
-     RETURNING *`,
-    [notes, id, userId]
+  const db = getDB();
+
+  const reminder = await db.collection('medication_reminders').findOneAndUpdate(
+    { id, user_id: userId, taken_at: null },
+    { $set: { skipped: true, notes: notes || null } },
+    { returnDocument: 'after', projection: { _id: 0 } }
   );
 
-  if (result.rows.length === 0) {
+  if (!reminder) {
     return res.status(404).json({ error: 'Reminder not found or already taken' });
   }
 
+  await quietly(() => medicationAdherence.refresh(db, [reminder]), 'Failed to refresh medication adherence counters');
+
   logger.info(`Medication reminder ${id} marked as skipped by user ${userId}`);
 
   res.json({
     message: 'Medication marked as skipped',
-    reminder: result.rows[0]
+    reminder
   });
 }));
 
 /**
- * @route GET /api/medications/adherence
- * @desc Get medication adherence statistics
- * @access Private
+ * Helper function: reminders matching a filter, in time order, with the
+ * details of their (active) medications
  */
-router.get('/adherence', authenticate, asyncHandler(async (req, res) => {
-  const userId = req.user.id;
-  const { days = 30 } = req.query;
-
-  const result = await pool.query(
-    `SELECT 
-      COUNT(*) as total_reminders,
-      COUNT(CASE WHEN taken_at IS NOT NULL THEN 1 END) as taken_count,
-      COUNT(CASE WHEN skipped = true THEN 1 END) as skipped_count,
-      COUNT(CASE WHEN taken_at IS NULL AND skipped = false AND scheduled_time < NOW() THEN 1 END) as missed_count
-    FROM medication_reminders mr
-    JOIN medications m ON mr.medication_id = m.id
-    WHERE mr.user_id = $1 
-    AND mr.scheduled_time >= NOW() - INTERVAL '${days} days'
-    AND m.is_active = true`,
-    [userId]
-  );
-
-  const stats = result.rows[0];
-  const totalReminders = parseInt(stats.total_reminders);
-  const takenCount = parseInt(stats.taken_count);
-  const skippedCount = parseInt(stats.skipped_count);
-  const missedCount = parseInt(stats.missed_count);
-
-  const adherenceRate = totalReminders > 0 ? ((takenCount / totalReminders) * 100).toFixed(1) : 0;
+async function findReminders(req, filter) {
+  const reminders = await getDB().collection('medication_reminders')
+    .find(filter, {
+      projection: {
+        _id: 0, id: 1, medication_id: 1, scheduled_time: 1, taken_at: 1, skipped: 1,
+        confirmation_method: 1, photo_url: 1, notes: 1
+      }
+    })
+    .sort({ scheduled_time: 1 })
+    .toArray();
 
-  res.json({
-    adherenceRate: parseFloat(adherenceRate),
-    statistics: {
-      totalReminders,
-      takenCount,
-      skippedCount,
-      missedCount
-    }
-  });
-}));
+  const medications = await req.loaders.medications.loadMany(
+    reminders.map(reminder => reminder.medication_id)
+  );
 
-/**
- * Helper function to create medication reminders
- */
-async function createMedicationReminders(client, medication) {
-  const { id: medicationId, user_id: userId, times, start_date, end_date } = medication;
-  const timesArray = JSON.parse(times);
-  
-  // Create reminders for the next 30 days
-  const startDate = new Date(start_date);
-  const endDate = end_date ? new Date(end_date) : new Date(Date.now() + 30 * 24 * 60 * 60 * 1000);
-  
-  for (let date = new Date(startDate); date <= endDate; date.setDate(date.getDate() + 1)) {
-    for (const time of timesArray) {
-      const [hours, minutes] = time.split(':');
-      const reminderTime = new Date(date);
-      reminderTime.setHours(parseInt(hours), parseInt(minutes), 0, 0);
-      
-      // Only create reminders for future times
-      if (reminderTime > new Date()) {
-        await client.query(
-          `INSERT INTO medication_reminders (medication_id, user_id, scheduled_time)
-           VALUES ($1, $2, $3)`,
-          [medicationId, userId, reminderTime]
-        );
-      }
-    }
-  }
+  return reminders
+    .map((reminder, i) => ({ reminder, medication: medications[i] }))
+    .filter(({ medication }) => medication && medication.is_active)
+    .map(({ reminder, medication }) => ({
+      ...reminder,
+      name: medication.name,
+      dosage: medication.dosage,
+      instructions: medication.instructions,
+      medication_photo: medication.photo_url
+    }));
 }
 
 module.exports = router;
\ No newline at end of file
@@ -1,11 +1,18 @@
 const express = require('express');
 const Joi = require('joi');
 const crypto = require('crypto');
-const { pool } = require('../config/database');
+const { v4: uuidv4 } = require('uuid');
+const { getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
 const { asyncHandler, ValidationError } = require('../middleware/errorHandler');
 const { messagingHelpers } = require('../config/firebase');
-const logger = require('../utils/logger');
+const { logger } = require('../utils/logger');
+const { seniorDashboard } = require('../services/seniorDashboard');
+const { caregiverFeed } = require('../services/caregiverFeed');
+const { conversations } = require('../services/conversations');
+const { messageSearch } = require('../services/messageSearch');
+const { realtime } = require('../services/realtime');
+const { parseLimit, applyCursor, decodeCursor, buildCursorPage } = require('../utils/pagination');
 
 const router = express.Router();
 
@@ -31,71 +38,43 @@ const messageSchema = Joi.object({
  */
 router.get('/conversations', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const { page = 1, limit = 20 } = req.query;
-  const offset = (page - 1) * limit;
+  const { page = 1, cursor } = req.query;
+  const limit = parseLimit(req.query.limit, 20);
+  // Passing cursor (empty for the first page) switches to keyset paging
+  const cursorMode = cursor !== undefined;
 
-  const result = await pool.query(
-    `SELECT DISTINCT
-      CASE 
-        WHEN m.sender_id = $1 THEN m.recipient_id 
-        ELSE m.sender_id 
-      END as other_user_id,
-      CASE 
-        WHEN m.sender_id = $1 THEN recipient.first_name 
-        ELSE sender.first_name 
-      END as first_name,
-      CASE 
-        WHEN m.sender_id = $1 THEN recipient.last_name 
-        ELSE sender.last_name 
-      END as last_name,
-      CASE 
-        WHEN m.sender_id = $1 THEN recipient.profile_picture_url 
-        ELSE sender.profile_picture_url 
-      END as profile_picture_url,
-      latest.message_text as last_message,
-      latest.message_type as last_message_type,
-      latest.created_at as last_message_time,
-      latest.sender_id as last_sender_id,
-      unread.unread_count
-    FROM messages m
-    LEFT JOIN users sender ON m.sender_id = sender.id
-    LEFT JOIN users recipient ON m.recipient_id = recipient.id
-    LEFT JOIN LATERAL (
-      SELECT message_text, message_type, created_at, sender_id
-      FROM messages m2 
-      WHERE (m2.sender_id = m.sender_id AND m2.recipient_id = m.recipient_id) 
-         OR (m2.sender_id = m.recipient_id AND m2.recipient_id = m.sender_id)
-      ORDER BY created_at DESC 
-      LIMIT 1
-    ) latest ON true
-    LEFT JOIN LATERAL (
-      SELECT COUNT(*) as unread_count
-      FROM messages m3
-      WHERE m3.recipient_id = $1 
-      AND m3.read_at IS NULL
-      AND ((m3.sender_id = m.sender_id AND m3.recipient_id = m.recipient_id) 
-           OR (m3.sender_id = m.recipient_id AND m3.recipient_id = m.sender_id))
-    ) unread ON true
-    WHERE (m.sender_id = $1 OR m.recipient_id = $1)
-    AND m.deleted_by_sender = false 
-    AND m.deleted_by_recipient = false
-    ORDER BY latest.created_at DESC
-    LIMIT $2 OFFSET $3`,
-    [userId, limit, offset]
-  );
+  const filter = { participants: userId };
+
+  // Most recently active first, fetching one extra to know whether another page exists
+  let query = getDB().collection(conversations.COLLECTION)
+    .find(cursorMode ? applyCursor(filter, cursor, 'last_message_at') : filter, { projection: { _id: 0 } })
+    .sort({ last_message_at: -1, id: -1 });
+
+  if (!cursorMode) {
+    query = query.skip((parseInt(page) - 1) * limit);
+  }
+
+  const fetched = await query.limit(limit + 1).toArray();
+  const { items: summaries, hasNextPage, nextCursor } = buildCursorPage(fetched, limit, 'last_message_at');
+
+  const otherUserIds = summaries.map(summary => summary.participants.find(id => id !== userId) || userId);
+  const otherUsers = await req.loaders.users.loadMany(otherUserIds);
 
   res.json({
-    conversations: result.rows.map(row => ({
-      otherUserId: row.other_user_id,
-      firstName: row.first_name,
-      lastName: row.last_name,
-      profilePictureUrl: row.profile_picture_url,
-      lastMessage: row.last_message,
-      lastMessageType: row.last_message_type,
-      lastMessageTime: row.last_message_time,
-      lastSenderId: row.last_sender_id,
-      unreadCount: parseInt(row.unread_count) || 0
-    }))
+    conversations: summaries.map((summary, i) => ({
+      otherUserId: otherUserIds[i],
+      firstName: otherUsers[i]?.first_name,
+      lastName: otherUsers[i]?.last_name,
+      profilePictureUrl: otherUsers[i]?.profile_picture_url,
+      lastMessage: summary.last_message.preview,
+      lastMessageType: summary.last_message.message_type,
+      lastMessageTime: summary.last_message.created_at,
+      lastSenderId: summary.last_message.sender_id,
+      unreadCount: summary.unread?.[userId] || 0
+    })),
+    pagination: cursorMode
+      ? { limit, nextCursor, hasNextPage }
+      : { currentPage: parseInt(page), nextCursor, hasNextPage, hasPrevPage: page > 1 }
   });
 }));
 
@@ -110,52 +89,54 @@ router.get('/conversations/:userId', authenticate, asyncHandler(async (req, res)
   const { page = 1, limit = 50 } = req.query;
   const offset = (page - 1) * limit;
 
+  const db = getDB();
+
   // Verify the other user exists and is connected
-  const otherUser = await pool.query(
-    `SELECT u.id, u.first_name, u.last_name, u.profile_picture_url, u.role
-     FROM users u
-     LEFT JOIN family_connections fc ON 
-       (fc.senior_id = u.id AND fc.caregiver_id = $1) OR 
-       (fc.caregiver_id = u.id AND fc.senior_id = $1)
-     WHERE u.id = $2 AND u.is_active = true
-     AND (fc.status = 'active' OR u.role = 'admin')`,
-    [currentUserId, otherUserId]
-  );
+  const otherUser = await findMessageableUser(req, otherUserId, [
+    'id', 'first_name', 'last_name', 'profile_picture_url', 'role'
+  ]);
 
-  if (otherUser.rows.length === 0) {
+  if (!otherUser) {
     return res.status(403).json({ error: 'Not authorized to message this user' });
   }
 
   // Get messages between these two users
-  const messages = await pool.query(
-    `SELECT 
-      id, sender_id, recipient_id, message_text, voice_message_url,
-      attachments, message_type, read_at, created_at,
-      sender.first_name as sender_first_name,
-      sender.last_name as sender_last_name,
-      sender.profile_picture_url as sender_profile_picture
-    FROM messages m
-    LEFT JOIN users sender ON m.sender_id = sender.id
-    WHERE ((m.sender_id = $1 AND m.recipient_id = $2) OR 
-           (m.sender_id = $2 AND m.recipient_id = $1))
-    AND m.deleted_by_sender = false 
-    AND m.deleted_by_recipient = false
-    ORDER BY m.created_at DESC
-    LIMIT $3 OFFSET $4`,
-    [currentUserId, otherUserId, limit, offset]
-  );
+  const messages = await db.collection('messages')
+    .find(
+      {
+        conversation_id: conversations.conversationIdFor(currentUserId, otherUserId),
+        deleted_by_sender: false,
+        deleted_by_recipient: false
+      },
+      {
+        projection: {
+          _id: 0, id: 1, sender_id: 1, recipient_id: 1, message_text: 1, voice_message_url: 1,
+          attachments: 1, message_type: 1, read_at: 1, created_at: 1
+        }
+      }
+    )
+    .sort({ created_at: -1 })
+    .skip(offset)
+    .limit(parseInt(limit))
+    .toArray();
+
+  const participants = { [currentUserId]: req.user, [otherUserId]: otherUser };
+  for (const message of messages) {
+    const sender = participants[message.sender_id] || {};
+    message.sender_first_name = sender.first_name;
+    message.sender_last_name = sender.last_name;
+    message.sender_profile_picture = sender.profile_picture_url;
+  }
 
   // Mark messages as read
-  await pool.query(
-    `UPDATE messages 
-     SET read_at = CURRENT_TIMESTAMP 
-     WHERE sender_id = $1 AND recipient_id = $2 AND read_at IS NULL`,
-    [otherUserId, currentUserId]
-  );
+  const markedRead = await conversations.markConversationRead(db, currentUserId, otherUserId);
+  if (markedRead > 0) {
+    await seniorDashboard.refresh(db, currentUserId, 'messages');
+  }
 
   res.json({
-    otherUser: otherUser.rows[0],
-    messages: messages.rows.reverse() // Return in chronological order
+    otherUser,
+    messages: messages.reverse() // Return in chronological order
   });
 }));
 
@@ -176,116 +157,90 @@ router.post('/send', authenticate, asyncHandler(async (req, res) => {
     message_type, reply_to_id
   } = value;
 
+  const db = getDB();
+
   // Verify recipient exists and connection is allowed
-  const recipient = await pool.query(
-    `SELECT u.id, u.first_name, u.last_name, u.role
-     FROM users u
-     LEFT JOIN family_connections fc ON 
-       (fc.senior_id = u.id AND fc.caregiver_id = $1) OR 
-       (fc.caregiver_id = u.id AND fc.senior_id = $1)
-     WHERE u.id = $2 AND u.is_active = true
-     AND (fc.status = 'active' OR u.role = 'admin')`,
-    [senderId, recipient_id]
-  );
+  const recipient = await findMessageableUser(req, recipient_id, [
+    'id', 'first_name', 'last_name', 'role', 'device_tokens'
+  ]);
 
-  if (recipient.rows.length === 0) {
+  if (!recipient) {
     return res.status(403).json({ error: 'Not authorized to message this user' });
   }
 
-  const client = await pool.connect();
-  try {
-    await client.query('BEGIN');
-
-    // Generate conversation ID (consistent for both directions)
-    const conversationId = [senderId, recipient_id].sort().join('-');
-
-    // Encrypt message if contains sensitive data
-    let encryptedText = message_text;
-    let encryptionKey = null;
-    
-    if (message_text && process.env.ENABLE_MESSAGE_ENCRYPTION === 'true') {
-      const key = crypto.randomBytes(32);
-      const iv = crypto.randomBytes(16);
-      const cipher = crypto.createCipher('aes-256-cbc', key);
-      encryptedText = cipher.update(message_text, 'utf8', 'hex') + cipher.final('hex');
-      encryptionKey = key.toString('hex');
-    }
+  // Encrypt message if contains sensitive data
+  let encryptedText = message_text;
+  let encryptionKey = null;
+  
+  if (message_text && process.env.ENABLE_MESSAGE_ENCRYPTION === 'true') {
+    const key = crypto.randomBytes(32);
+    const iv = crypto.randomBytes(16);
+    const cipher = crypto.createCipher('aes-256-cbc', key);
+    encryptedText = cipher.update(message_text, 'utf8', 'hex') + cipher.final('hex');
+    encryptionKey = key.toString('hex');
+  }
 
-    // Insert message
-    const messageResult = await client.query(
-      `INSERT INTO messages 
-       (conversation_id, sender_id, recipient_id, message_text, voice_message_url,
-        attachments, message_type, is_encrypted)
-       VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-       RETURNING id, conversation_id, sender_id, recipient_id, message_text,
-                 voice_message_url, attachments, message_type, created_at`,
-      [
-        conversationId, senderId, recipient_id, encryptedText,
-        voice_message_url, JSON.stringify(attachments || []), message_type,
-        !!encryptionKey
-      ]
-    );
-
-    await client.query('COMMIT');
-
-    const message = messageResult.rows[0];
-
-    // Send real-time notification via socket
-    const io = req.app.get('io');
-    if (io) {
-      io.to(`user_${recipient_id}`).emit('new_message', {
-        id: message.id,
-        senderId: senderId,
-        senderName: `${req.user.first_name} ${req.user.last_name}`,
-        messageText: message_text, // Send unencrypted for real-time
-        messageType: message_type,
-        createdAt: message.created_at
-      });
+  // Insert message
+  const message = conversations.newMessage({
+    sender_id: senderId,
+    recipient_id,
+    message_text: encryptedText || null,
+    voice_message_url: voice_message_url || null,
+    attachments: attachments || [],
+    message_type,
+    reply_to_id: reply_to_id || null,
+    is_encrypted: !!encryptionKey
+  });
+  await conversations.send(db, [message]);
+
+  await seniorDashboard.refresh(db, recipient_id, 'messages');
+
+  // Send real-time notification via socket
+  realtime.emit(realtime.userRoom(recipient_id), 'new_message', {
+    id: message.id,
+    senderId: senderId,
+    senderName: `${req.user.first_name} ${req.user.last_name}`,
+    messageText: message_text, // Send unencrypted for real-time
+    messageType: message_type,
+    createdAt: message.created_at
+  }, { urgent: message_type === 'emergency' });
+
+  // Send push notification for emergency messages
+  if (message_type === 'emergency' && recipient.device_tokens?.length > 0) {
+    try {
+      await messagingHelpers.sendToMultipleDevices(
+        recipient.device_tokens,
+        {
+          title: '🚨 Emergency Message',
+          body: `${req.user.first_name} ${req.user.last_name} sent an emergency message`
+        },
+        {
+          type: 'emergency_message',
+          senderId: senderId,
+          messageId: message.id
+        }
+      );
+    } catch (notificationError) {
+      logger.error('Failed to send push notification:', notificationError);
     }
+  }
 
-    // Send push notification for emergency messages
-    if (message_type === 'emergency') {
-      try {
-        await messagingHelpers.sendToDevice(
-          'recipient_device_token', // This would come from user preferences
-          {
-            title: '🚨 Emergency Message',
-            body: `${req.user.first_name} ${req.user.last_name} sent an emergency message`
-          },
-          {
-            type: 'emergency_message',
-            senderId: senderId,
-            messageId: message.id
-          }
-        );
-      } catch (notificationError) {
-        logger.error('Failed to send push notification:', notificationError);
-      }
+  logger.info(`Message sent from ${senderId} to ${recipient_id}`);
+
+  res.status(201).json({
+    message: 'Message sent successfully',
+    messageData: {
+      id: message.id,
+      conversationId: message.conversation_id,
+      senderId: message.sender_id,
+      recipientId: message.recipient_id,
+      messageText: message_text, // Return unencrypted
+      voiceMessageUrl: message.voice_message_url,
+      attachments: message.attachments,
+      messageType: message.message_type,
+      createdAt: message.created_at
     }
-
-    logger.info(`Message sent from ${senderId} to ${recipient_id}`);
-
-    res.status(201).json({
-      message: 'Message sent successfully',
-      messageData: {
-        id: message.id,
-        conversationId: message.conversation_id,
-        senderId: message.sender_id,
-        recipientId: message.recipient_id,
-        messageText: message_text, // Return unencrypted
-        voiceMessageUrl: message.voice_message_url,
-        attachments: JSON.parse(message.attachments),
-        messageType: message.message_type,
-        createdAt: message.created_at
-      }
-    });
-
-  } catch (error) {
-    await client.query('ROLLBACK');
-    throw error;
-  } finally {
-    client.release();
-  }
+  });
 }));
 
 /**
@@ -297,19 +252,19 @@ router.delete('/:messageId', authenticate, asyncHandler(async (req, res) => {
   const { messageId } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    `UPDATE messages 
-     SET deleted_by_sender = CASE WHEN sender_id = $2 THEN true ELSE deleted_by_sender END,
-         deleted_by_recipient = CASE WHEN recipient_id = $2 THEN true ELSE deleted_by_recipient END
-     WHERE id = $1 AND (sender_id = $2 OR recipient_id = $2)
-     RETURNING id, deleted_by_sender, deleted_by_recipient`,
-    [messageId, userId]
-  );
+  const db = getDB();
+
+  const message = await conversations.remove(db, messageId, userId);
 
-  if (result.rows.length === 0) {
+  if (!message) {
     return res.status(404).json({ error: 'Message not found' });
   }
 
+  // Deleting an unread message changes the recipient's unread count
+  if (!message.is_read) {
+    await seniorDashboard.refresh(db, message.recipient_id, 'messages');
+  }
+
   logger.info(`Message ${messageId} deleted by user ${userId}`);
 
   res.json({ message: 'Message deleted successfully' });
@@ -324,18 +279,16 @@ router.post('/:messageId/read', authenticate, asyncHandler(async (req, res) => {
   const { messageId } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    `UPDATE messages 
-     SET read_at = CURRENT_TIMESTAMP 
-     WHERE id = $1 AND recipient_id = $2 AND read_at IS NULL
-     RETURNING id`,
-    [messageId, userId]
-  );
+  const db = getDB();
 
-  if (result.rows.length === 0) {
+  const marked = await conversations.markRead(db, messageId, userId);
+
+  if (!marked) {
     return res.status(404).json({ error: 'Message not found or already read' });
   }
 
+  await seniorDashboard.refresh(db, userId, 'messages');
+
   res.json({ message: 'Message marked as read' });
 }));
 
@@ -347,55 +300,80 @@ router.post('/:messageId/read', authenticate, asyncHandler(async (req, res) => {
 router.get('/unread-count', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
 
-  const result = await pool.query(
-    'SELECT COUNT(*) as unread_count FROM messages WHERE recipient_id = $1 AND read_at IS NULL',
-    [userId]
-  );
+  const unreadCount = await getDB().collection('messages').countDocuments({
+    recipient_id: userId,
+    is_read: false,
+    deleted_by_recipient: { $ne: true }
+  });
 
   res.json({
-    unreadCount: parseInt(result.rows[0].unread_count)
+    unreadCount
   });
 }));
 
 /**
  * @route GET /api/messaging/search
- * @desc Search messages
+ * @desc Search messages, best matches first
  * @access Private
  */
 router.get('/search', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const { query, page = 1, limit = 20 } = req.query;
-  const offset = (page - 1) * limit;
+  const { query, cursor } = req.query;
+  const limit = parseLimit(req.query.limit, 20);
 
   if (!query || query.trim().length < 2) {
     return res.status(400).json({ error: 'Search query must be at least 2 characters' });
   }
 
-  const result = await pool.query(
-    `SELECT 
-      m.id, m.sender_id, m.recipient_id, m.message_text, m.message_type, 
-      m.created_at,
-      sender.first_name as sender_first_name,
-      sender.last_name as sender_last_name,
-      recipient.first_name as recipient_first_name,
-      recipient.last_name as recipient_last_name
-    FROM messages m
-    LEFT JOIN users sender ON m.sender_id = sender.id
-    LEFT JOIN users recipient ON m.recipient_id = recipient.id
-    WHERE (m.sender_id = $1 OR m.recipient_id = $1)
-    AND m.message_text ILIKE $2
-    AND m.deleted_by_sender = false 
-    AND m.deleted_by_recipient = false
-    ORDER BY m.created_at DESC
-    LIMIT $3 OFFSET $4`,
-    [userId, `%${query}%`, limit, offset]
-  );
+  const terms = messageSearch.queryTerms(query);
+  if (terms.length === 0) {
+    return res.json({ results: [], query, pagination: { limit, nextCursor: null, hasNextPage: false, truncated: false } });
+  }
+
+  const db = getDB();
+
+  // Candidates: the newest matching messages, up to the ranking window
+  const hits = await db.collection(messageSearch.COLLECTION)
+    .find(messageSearch.filterFor(userId, terms), { projection: { _id: 0, message_id: 1 } })
+    .sort({ created_at: -1, message_id: -1 })
+    .limit(messageSearch.RANK_WINDOW)
+    .toArray();
+
+  const messages = await db.collection('messages')
+    .find(
+      { id: { $in: hits.map(hit => hit.message_id) }, deleted_by_sender: false, deleted_by_recipient: false },
+      { projection: { _id: 0, id: 1, sender_id: 1, recipient_id: 1, message_text: 1, message_type: 1, created_at: 1 } }
+    )
+    .toArray();
+
+  // Rank by score, newest first on ties, and page through the ranking
+  const after = cursor ? decodeCursor(cursor) : null;
+  const ranked = messages
+    .map((message) => {
+      const match = messageSearch.highlight(message.message_text, terms);
+      return { ...message, ...match, rank: messageSearch.rankKey(match.score, message.created_at) };
+    })
+    .filter(item => !after || item.rank < after.sortValue || (item.rank === after.sortValue && item.id < after.id))
+    .sort(messageSearch.compareRanked)
+    .slice(0, limit + 1);
+  const { items: page, hasNextPage, nextCursor } = buildCursorPage(ranked, limit, 'rank', 'id');
+
+  const results = await Promise.all(page.map(async ({ rank, ...message }) => {
+    const [sender, recipient] = await req.loaders.users.loadMany([message.sender_id, message.recipient_id]);
+    return {
+      ...message,
+      sender_first_name: sender?.first_name,
+      sender_last_name: sender?.last_name,
+      recipient_first_name: recipient?.first_name,
+      recipient_last_name: recipient?.last_name
+    };
+  }));
 
   res.json({
-    results: result.rows,
+    results,
     query,
-    page: parseInt(page),
-    limit: parseInt(limit)
+    // truncated: older matches beyond the ranking window were not considered
+    pagination: { limit, nextCursor, hasNextPage, truncated: hits.length === messageSearch.RANK_WINDOW }
   });
 }));
 
@@ -413,90 +391,126 @@ router.post('/emergency', authenticate, asyncHandler(async (req, res) => {
     return res.status(403).json({ error: 'Only seniors can send emergency messages' });
   }
 
-  // Get all active caregivers for this senior
-  const caregivers = await pool.query(
-    `SELECT u.id, u.first_name, u.last_name, u.email
-     FROM users u
-     JOIN family_connections fc ON u.id = fc.caregiver_id
-     WHERE fc.senior_id = $1 AND fc.status = 'active' AND u.is_active = true`,
-    [userId]
-  );
+  const db = getDB();
 
-  if (caregivers.rows.length === 0) {
+  // Get all active caregivers for this senior
+  const caregiverIds = req.user.family_connections
+    .filter(connection => connection.senior_id === userId && connection.status === 'active')
+    .map(connection => connection.caregiver_id);
+
+  const caregivers = await db.collection('users')
+    .find(
+      { id: { $in: caregiverIds }, is_active: true },
+      { projection: { _id: 0, id: 1, first_name: 1, last_name: 1, email: 1, device_tokens: 1 } }
+    )
+    .toArray();
+
+  if (caregivers.length === 0) {
     return res.status(400).json({ error: 'No active caregivers found' });
   }
 
-  const client = await pool.connect();
-  try {
-    await client.query('BEGIN');
-
-    const emergencyMessage = message || 'Emergency assistance needed!';
-    const messages = [];
-
-    // Send emergency message to each caregiver
-    for (const caregiver of caregivers.rows) {
-      const conversationId = [userId, caregiver.id].sort().join('-');
-      
-      const messageResult = await client.query(
-        `INSERT INTO messages 
-         (conversation_id, sender_id, recipient_id, message_text, message_type)
-         VALUES ($1, $2, $3, $4, 'emergency')
-         RETURNING id, created_at`,
-        [conversationId, userId, caregiver.id, emergencyMessage]
-      );
+  const emergencyMessage = message || 'Emergency assistance needed!';
+  const now = new Date();
+
+  // Send emergency message to each caregiver
+  const messageDocs = caregivers.map(caregiver => conversations.newMessage({
+    sender_id: userId,
+    recipient_id: caregiver.id,
+    message_text: emergencyMessage,
+    message_type: 'emergency',
+    created_at: now
+  }));
+  await conversations.send(db, messageDocs);
+
+  const messages = messageDocs.map((doc, i) => ({
+    messageId: doc.id,
+    caregiverId: caregivers[i].id,
+    caregiverName: `${caregivers[i].first_name} ${caregivers[i].last_name}`
+  }));
+
+  // Log emergency alert
+  const alertId = uuidv4();
+  await db.collection('emergency_alerts').insertOne({
+    id: alertId,
+    user_id: userId,
+    alert_type: 'manual',
+    severity: 'high',
+    message: emergencyMessage,
+    location_data: location || {},
+    status: 'active',
+    contacts_notified: [],
+    created_at: now
+  });
 
-      messages.push({
-        messageId: messageResult.rows[0].id,
-        caregiverId: caregiver.id,
-        caregiverName: `${caregiver.first_name} ${caregiver.last_name}`
-      });
-    }
+  await Promise.all(caregivers.map(caregiver => seniorDashboard.refresh(db, caregiver.id, 'messages')));
+
+  realtime.emit(realtime.familyRoom(userId), 'emergency_notification', {
+    alertId,
+    seniorId: userId,
+    seniorName: `${req.user.first_name} ${req.user.last_name}`,
+    message: emergencyMessage,
+    location: location || {}
+  }, { urgent: true, coalesceKey: alertId });
+
+  await caregiverFeed.publish(db, userId, {
+    type: 'emergency_alert',
+    title: emergencyMessage,
+    severity: 'high',
+    data: { alert_id: alertId, alert_type: 'manual', senior_name: `${req.user.first_name} ${req.user.last_name}` },
+    dedupeKey: `alert:${alertId}`,
+    occurredAt: now,
+    caregiverIds: caregivers.map(caregiver => caregiver.id)
+  });
 
-    // Log emergency alert
-    await client.query(
-      `INSERT INTO emergency_alerts 
-       (user_id, alert_type, severity, message, location_data)
-       VALUES ($1, 'manual', 'high', $2, $3)`,
-      [userId, emergencyMessage, JSON.stringify(location || {})]
-    );
-
-    await client.query('COMMIT');
-
-    // Send push notifications to all caregivers
-    const caregiverTokens = []; // This would come from user device tokens
-    if (caregiverTokens.length > 0) {
-      try {
-        await messagingHelpers.sendToMultipleDevices(
-          caregiverTokens,
-          {
-            title: '🚨 Emergency Alert',
-            body: `${req.user.first_name} ${req.user.last_name} needs immediate assistance`
-          },
-          {
-            type: 'emergency_alert',
-            seniorId: userId,
-            message: emergencyMessage,
-            location: JSON.stringify(location || {})
-          }
-        );
-      } catch (notificationError) {
-        logger.error('Failed to send emergency push notifications:', notificationError);
-      }
+  // Send push notifications to all caregivers
+  const caregiverTokens = caregivers.flatMap(caregiver => caregiver.device_tokens || []);
+  if (caregiverTokens.length > 0) {
+    try {
+      await messagingHelpers.sendToMultipleDevices(
+        caregiverTokens,
+        {
+          title: '🚨 Emergency Alert',
+          body: `${req.user.first_name} ${req.user.last_name} needs immediate assistance`
+        },
+        {
+          type: 'emergency_alert',
+          seniorId: userId,
+          message: emergencyMessage,
+          location: JSON.stringify(location || {})
+        }
+      );
+    } catch (notificationError) {
+      logger.error('Failed to send emergency push notifications:', notificationError);
     }
+  }
 
-    logger.info(`Emergency message sent by user ${userId} to ${caregivers.rows.length} caregivers`);
+  logger.info(`Emergency message sent by user ${userId} to ${caregivers.length} caregivers`);
 
-    res.json({
-      message: 'Emergency messages sent successfully',
-      sentTo: messages
-    });
+  res.json({
+    message: 'Emergency messages sent successfully',
+    sentTo: messages
+  });
+}));
 
-  } catch (error) {
-    await client.query('ROLLBACK');
-    throw error;
-  } finally {
-    client.release();
+/**
+ * Helper function: the requested fields of the other user if they are
+ * active and the current user may message them (an active family
+ * connection, or an admin)
+ */
+async function findMessageableUser(req, otherUserId, fields) {
+  const user = await req.loaders.users.load(otherUserId);
+
+  if (!user || !user.is_active) {
+    return null;
   }
-}));
+
+  const otherUser = Object.fromEntries(fields.map(field => [field, user[field]]));
+  const connected = req.user.family_connections?.some(connection =>
+    (connection.senior_id === otherUserId || connection.caregiver_id === otherUserId) &&
+    connection.status === 'active'
+  );
+
+  return connected || user.role === 'admin' ? otherUser : null;
+}
 
 module.exports = router;
\ No newline at end of file
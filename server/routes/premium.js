@@ -1,10 +1,13 @@
 const express = require('express');
 const Joi = require('joi');
-const { pool } = require('../config/database');
+const { pool, getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
 const { asyncHandler, ValidationError, ForbiddenError } = require('../middleware/errorHandler');
 const { cacheHelpers } = require('../config/redis');
-const logger = require('../utils/logger');
+const { logger } = require('../utils/logger');
+const { vitalsStatistics } = require('../services/vitalsStatistics');
+const { medicationAdherence } = require('../services/medicationAdherence');
+const { checkinAnalytics } = require('../services/checkinAnalytics');
 
 const router = express.Router();
 
@@ -23,96 +26,13 @@ const requirePremium = (req, res, next) => {
  */
 router.get('/wellness-score', authenticate, requirePremium, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const { days = 7 } = req.query;
+  const days = Math.min(Math.max(parseInt(req.query.days) || 7, 1), 90);
 
-  // Check cache first
+  // Concurrent requests for the same score share one calculation
   const cacheKey = `wellness_score:${userId}:${days}`;
-  const cachedScore = await cacheHelpers.get(cacheKey);
-  if (cachedScore) {
-    return res.json(cachedScore);
-  }
-
-  const client = await pool.connect();
-  try {
-    // Get recent check-ins
-    const checkIns = await client.query(
-      `SELECT 
-        date, mood_rating, energy_level, pain_level, sleep_quality,
-        appetite_rating, hydration_glasses, exercise_minutes,
-        medications_taken, social_interaction
-       FROM daily_checkins
-       WHERE user_id = $1 
-       AND date >= CURRENT_DATE - INTERVAL '${days} days'
-       ORDER BY date DESC`,
-      [userId]
-    );
+  const wellnessScore = await cacheHelpers.wrap(cacheKey, 3600, () => buildWellnessScore(userId, days));
 
-    // Get medication adherence
-    const medicationStats = await client.query(
-      `SELECT 
-        COUNT(*) as total_reminders,
-        COUNT(CASE WHEN taken_at IS NOT NULL THEN 1 END) as taken_count
-       FROM medication_reminders mr
-       JOIN medications m ON mr.medication_id = m.id
-       WHERE mr.user_id = $1 
-       AND mr.scheduled_time >= CURRENT_DATE - INTERVAL '${days} days'
-       AND mr.scheduled_time < NOW()
-       AND m.is_active = true`,
-      [userId]
-    );
-
-    // Get vitals data
-    const vitals = await client.query(
-      `SELECT reading_type, value, is_abnormal, reading_time
-       FROM vitals_readings
-       WHERE user_id = $1 
-       AND reading_time >= CURRENT_DATE - INTERVAL '${days} days'
-       ORDER BY reading_time DESC`,
-      [userId]
-    );
-
-    // Calculate wellness score using AI algorithm (mock implementation)
-    const wellnessScore = calculateWellnessScore(
-      checkIns.rows,
-      medicationStats.rows[0],
-      vitals.rows
-    );
-
-    // Store score in database
-    const today = new Date().toISOString().split('T')[0];
-    await client.query(
-      `INSERT INTO wellness_scores 
-       (user_id, date, overall_score, mood_score, physical_score, social_score, 
-        medication_compliance_score, trend_direction, ai_insights, recommendations)
-       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-       ON CONFLICT (user_id, date) 
-       DO UPDATE SET 
-         overall_score = EXCLUDED.overall_score,
-         mood_score = EXCLUDED.mood_score,
-         physical_score = EXCLUDED.physical_score,
-         social_score = EXCLUDED.social_score,
-         medication_compliance_score = EXCLUDED.medication_compliance_score,
-         trend_direction = EXCLUDED.trend_direction,
-         ai_insights = EXCLUDED.ai_insights,
-         recommendations = EXCLUDED.recommendations`,
-      [
-        userId, today, wellnessScore.overall, wellnessScore.mood,
-        wellnessScore.physical, wellnessScore.social, wellnessScore.medication,
-        wellnessScore.trend, JSON.stringify(wellnessScore.insights),
-        JSON.stringify(wellnessScore.recommendations)
-      ]
-    );
-
-    // Cache for 1 hour
-    await cacheHelpers.set(cacheKey, wellnessScore, 3600);
-
-    logger.info(`Wellness score calculated for user ${userId}: ${wellnessScore.overall}`);
-
-    res.json(wellnessScore);
-
-  } finally {
-    client.release();
-  }
+  res.json(wellnessScore);
 }));
 
 /**
@@ -298,49 +218,101 @@ router.get('/ai-insights', authenticate, requirePremium, asyncHandler(async (req
 router.get('/predictive-analytics', authenticate, requirePremium, asyncHandler(async (req, res) => {
   const userId = req.user.id;
 
-  const client = await pool.connect();
-  try {
-    // Get historical data for prediction models
-    const historicalData = await client.query(
-      `SELECT 
-        date, mood_rating, energy_level, pain_level, sleep_quality,
-        appetite_rating, exercise_minutes
-       FROM daily_checkins
-       WHERE user_id = $1 
-       AND date >= CURRENT_DATE - INTERVAL '90 days'
-       ORDER BY date ASC`,
-      [userId]
-    );
+  const db = getDB();
+  const since = new Date(Date.now() - 90 * 24 * 60 * 60 * 1000);
+
+  // Get historical data for prediction models
+  const historicalData = await db.collection('daily_checkins')
+    .find(
+      { user_id: userId, check_date: { $gte: since.toISOString().split('T')[0] } },
+      {
+        projection: {
+          _id: 0, check_date: 1, mood_rating: 1, energy_level: 1, pain_level: 1,
+          sleep_quality: 1, appetite_rating: 1, exercise_minutes: 1
+        }
+      }
+    )
+    .sort({ check_date: 1 })
+    .toArray();
+
+  // Vitals statistics come from the daily rollups rather than raw readings
+  const vitalsStats = await vitalsStatistics.fromRollups(db, userId, since, 'day');
+
+  // Generate predictive analytics (mock implementation)
+  const predictions = generatePredictiveAnalytics(historicalData, vitalsStats);
 
-    // Get vitals trends
-    const vitalsData = await client.query(
-      `SELECT 
-        reading_type, value, reading_time, is_abnormal
-       FROM vitals_readings
-       WHERE user_id = $1 
-       AND reading_time >= CURRENT_DATE - INTERVAL '90 days'
-       ORDER BY reading_time ASC`,
-      [userId]
-    );
+  res.json({
+    ...predictions,
+    vitalsStatistics: vitalsStats
+  });
+}));
 
-    // Generate predictive analytics (mock implementation)
-    const predictions = generatePredictiveAnalytics(
-      historicalData.rows,
-      vitalsData.rows
-    );
+/**
+ * Helper function to load inputs for, calculate and store a wellness score
+ */
+async function buildWellnessScore(userId, days) {
+  const db = getDB();
+  const now = new Date();
+  const since = new Date(now);
+  since.setUTCHours(0, 0, 0, 0);
+  since.setUTCDate(since.getUTCDate() - days);
+
+  const activeMedicationIds = db.collection('medications')
+    .distinct('id', { user_id: userId, is_active: true });
+
+  const [analytics, medicationIds] = await Promise.all([
+    checkinAnalytics.summary(db, userId, {
+      fromDate: since.toISOString().split('T')[0],
+      toDate: now.toISOString().split('T')[0]
+    }),
+    activeMedicationIds
+  ]);
+
+  // Get medication adherence from the daily counters
+  const adherence = await medicationAdherence.summary(db, userId, {
+    fromDate: since.toISOString().split('T')[0],
+    toDate: now.toISOString().split('T')[0],
+    medicationIds
+  });
+  const medicationStats = {
+    total_reminders: adherence.taken + adherence.skipped + adherence.missed,
+    taken_count: adherence.taken
+  };
 
-    res.json(predictions);
+  // Calculate wellness score using AI algorithm (mock implementation)
+  const wellnessScore = calculateWellnessScore(analytics, medicationStats);
+
+  // Store score in database
+  const today = now.toISOString().split('T')[0];
+  await db.collection('wellness_scores').updateOne(
+    { user_id: userId, date: today },
+    {
+      $set: {
+        overall_score: wellnessScore.overall,
+        mood_score: wellnessScore.mood,
+        physical_score: wellnessScore.physical,
+        social_score: wellnessScore.social,
+        medication_compliance_score: wellnessScore.medication,
+        trend_direction: wellnessScore.trend,
+        ai_insights: wellnessScore.insights,
+        recommendations: wellnessScore.recommendations,
+        updated_at: now
+      },
+      $setOnInsert: { created_at: now }
+    },
+    { upsert: true }
+  );
 
-  } finally {
-    client.release();
-  }
-}));
+  logger.info(`Wellness score calculated for user ${userId}: ${wellnessScore.overall}`);
+
+  return wellnessScore;
+}
 
 /**
  * Helper function to calculate wellness score
  */
-function calculateWellnessScore(checkIns, medicationStats, vitals) {
-  if (checkIns.length === 0) {
+function calculateWellnessScore(analytics, medicationStats) {
+  if (analytics.totalCheckIns === 0) {
     return {
       overall: 0,
       mood: 0,
@@ -353,19 +325,19 @@ function calculateWellnessScore(checkIns, medicationStats, vitals) {
     };
   }
 
+  const { averages, trends } = analytics;
+
   // Calculate mood score (1-100)
-  const avgMood = checkIns.reduce((sum, c) => sum + (c.mood_rating || 0), 0) / checkIns.length;
-  const moodScore = Math.round((avgMood / 5) * 100);
+  const moodScore = Math.round(((averages.mood || 0) / 5) * 100);
 
   // Calculate physical score
-  const avgEnergy = checkIns.reduce((sum, c) => sum + (c.energy_level || 0), 0) / checkIns.length;
-  const avgPain = checkIns.reduce((sum, c) => sum + (c.pain_level || 0), 0) / checkIns.length;
-  const avgSleep = checkIns.reduce((sum, c) => sum + (c.sleep_quality || 0), 0) / checkIns.length;
+  const avgEnergy = averages.energy || 0;
+  const avgPain = averages.pain || 0;
+  const avgSleep = averages.sleep || 0;
   const physicalScore = Math.round(((avgEnergy + avgSleep + (5 - avgPain)) / 15) * 100);
 
   // Calculate social score
-  const socialDays = checkIns.filter(c => c.social_interaction).length;
-  const socialScore = Math.round((socialDays / checkIns.length) * 100);
+  const socialScore = Math.round((analytics.socialInteractionDays / analytics.totalCheckIns) * 100);
 
   // Calculate medication compliance score
   const totalReminders = parseInt(medicationStats.total_reminders) || 0;
@@ -377,9 +349,10 @@ function calculateWellnessScore(checkIns, medicationStats, vitals) {
     (moodScore * 0.3) + (physicalScore * 0.35) + (socialScore * 0.15) + (medicationScore * 0.2)
   );
 
-  // Determine trend
-  const recentScores = checkIns.slice(0, 3).map(c => (c.mood_rating + c.energy_level + c.sleep_quality) / 3);
-  const olderScores = checkIns.slice(-3).map(c => (c.mood_rating + c.energy_level + c.sleep_quality) / 3);
+  // Determine trend from the daily trend points, oldest first
+  const dailyScores = trends.mood.map((point, i) => (point.value + trends.energy[i].value + trends.sleep[i].value) / 3);
+  const recentScores = dailyScores.slice(-3);
+  const olderScores = dailyScores.slice(0, 3);
   
   const recentAvg = recentScores.reduce((sum, s) => sum + s, 0) / recentScores.length;
   const olderAvg = olderScores.reduce((sum, s) => sum + s, 0) / olderScores.length;
@@ -5,6 +5,9 @@ const { getDB } = require('../config/database');
 const { authenticate } = require('../middleware/auth');
 const { asyncHandler, ValidationError, ForbiddenError } = require('../middleware/errorHandler');
 const { logger } = require('../utils/logger');
+const { principalCache } = require('../services/principalCache');
+const { realtime } = require('../services/realtime');
+const { systemCounters } = require('../services/systemCounters');
 
 const router = express.Router();
 
@@ -32,73 +35,40 @@ router.get('/family-connections', authenticate, asyncHandler(async (req, res) =>
   const userId = req.user.id;
   const userRole = req.user.role;
 
-  const db = getDB();
   let familyConnections = [];
 
-  if (userRole === 'senior') {
-    // Get all caregivers connected to this senior
-    const connections = await db.collection('family_connections').find({
-      senior_id: userId
-    }).toArray();
-
-    // Get caregiver details for each connection
-    for (const connection of connections) {
-      const caregiver = await db.collection('users').findOne(
-        { id: connection.caregiver_id },
-        { projection: { password_hash: 0 } }
-      );
-      
-      if (caregiver) {
-        familyConnections.push({
-          id: connection.id,
-          relationship: connection.relationship,
-          permissions: connection.permissions,
-          status: connection.status,
-          created_at: connection.created_at,
-          user_id: caregiver.id,
-          first_name: caregiver.first_name,
-          last_name: caregiver.last_name,
-          email: caregiver.email,
-          phone: caregiver.phone,
-          profile_picture_url: caregiver.profile_picture_url,
-          role: caregiver.role,
-          connection_type: 'caregiver'
-        });
-      }
-    }
-  } else if (userRole === 'caregiver') {
-    // Get all seniors this caregiver is connected to
-    const connections = await db.collection('family_connections').find({
-      caregiver_id: userId
-    }).toArray();
-
-    // Get senior details for each connection
-    for (const connection of connections) {
-      const senior = await db.collection('users').findOne(
-        { id: connection.senior_id },
-        { projection: { password_hash: 0 } }
-      );
-      
-      if (senior) {
+  if (userRole === 'senior' || userRole === 'caregiver') {
+    // Connections and the users on the other side, one query each
+    const otherSide = userRole === 'senior' ? 'caregiver' : 'senior';
+    const connections = (await req.loaders.connections.load(userId))
+      .filter(connection => connection[`${userRole}_id`] === userId);
+    const others = await req.loaders.users.loadMany(
+      connections.map(connection => connection[`${otherSide}_id`])
+    );
+
+    connections.forEach((connection, i) => {
+      const other = others[i];
+      if (other) {
         familyConnections.push({
           id: connection.id,
           relationship: connection.relationship,
           permissions: connection.permissions,
           status: connection.status,
           created_at: connection.created_at,
-          user_id: senior.id,
-          first_name: senior.first_name,
-          last_name: senior.last_name,
-          email: senior.email,
-          phone: senior.phone,
-          profile_picture_url: senior.profile_picture_url,
-          role: senior.role,
-          connection_type: 'senior'
+          user_id: other.id,
+          first_name: other.first_name,
+          last_name: other.last_name,
+          email: other.email,
+          phone: other.phone,
+          profile_picture_url: other.profile_picture_url,
+          role: other.role,
+          connection_type: otherSide
         });
       }
-    }
+    });
   } else {
     // Admin users can see all connections (simplified)
+    const db = getDB();
     const allConnections = await db.collection('family_connections').find({}).limit(50).toArray();
     familyConnections = allConnections;
   }
@@ -128,111 +98,107 @@ router.post('/invite-family-member', authenticate, asyncHandler(async (req, res)
   const inviterRole = req.user.role;
   const { senior_email, caregiver_email, relationship, permissions } = value;
 
-  const client = await pool.connect();
-  try {
-    await client.query('BEGIN');
-
-    let seniorId, caregiverId, inviteeEmail;
-
-    if (inviterRole === 'senior') {
-      // Senior is inviting a caregiver
-      seniorId = inviterId;
-      inviteeEmail = caregiver_email;
-      
-      // Check if caregiver exists, if not create account
-      let caregiverResult = await client.query(
-        'SELECT id, first_name, last_name FROM users WHERE email = $1',
-        [caregiver_email]
-      );
-
-      if (caregiverResult.rows.length === 0) {
-        // Create pending caregiver account
-        caregiverResult = await client.query(
-          `INSERT INTO users (email, password_hash, first_name, last_name, role, is_active)
-           VALUES ($1, 'PENDING', 'Pending', 'User', 'caregiver', false)
-           RETURNING id, first_name, last_name`,
-          [caregiver_email]
-        );
-      }
-
-      caregiverId = caregiverResult.rows[0].id;
-    } else if (inviterRole === 'caregiver') {
-      // Caregiver is requesting to connect to a senior
-      caregiverId = inviterId;
-      inviteeEmail = senior_email;
-      
-      // Senior must already exist
-      const seniorResult = await client.query(
-        'SELECT id, first_name, last_name FROM users WHERE email = $1 AND role = $2',
-        [senior_email, 'senior']
-      );
-
-      if (seniorResult.rows.length === 0) {
-        throw new ValidationError('Senior with this email not found');
-      }
+  const db = getDB();
+  let seniorId, caregiverId, inviteeEmail;
+
+  if (inviterRole === 'senior') {
+    // Senior is inviting a caregiver
+    seniorId = inviterId;
+    inviteeEmail = caregiver_email;
+    
+    // Check if caregiver exists, if not create account
+    let caregiver = await db.collection('users').findOne(
+      { email: caregiver_email },
+      { projection: { id: 1, first_name: 1, last_name: 1 } }
+    );
 
-      seniorId = seniorResult.rows[0].id;
-    } else {
-      throw new ForbiddenError('Only seniors and caregivers can create family connections');
+    if (!caregiver) {
+      // Create pending caregiver account
+      caregiver = {
+        id: uuidv4(),
+        email: caregiver_email,
+        password_hash: 'PENDING',
+        first_name: 'Pending',
+        last_name: 'User',
+        role: 'caregiver',
+        is_active: false,
+        created_at: new Date(),
+        updated_at: new Date()
+      };
+      await db.collection('users').insertOne(caregiver);
     }
 
-    // Check if connection already exists
-    const existingConnection = await client.query(
-      'SELECT id, status FROM family_connections WHERE senior_id = $1 AND caregiver_id = $2',
-      [seniorId, caregiverId]
+    caregiverId = caregiver.id;
+  } else if (inviterRole === 'caregiver') {
+    // Caregiver is requesting to connect to a senior
+    caregiverId = inviterId;
+    inviteeEmail = senior_email;
+    
+    // Senior must already exist
+    const senior = await db.collection('users').findOne(
+      { email: senior_email, role: 'senior' },
+      { projection: { id: 1, first_name: 1, last_name: 1 } }
     );
 
-    if (existingConnection.rows.length > 0) {
-      if (existingConnection.rows[0].status === 'active') {
-        throw new ValidationError('Family connection already exists');
-      } else {
-        // Reactivate existing connection
-        await client.query(
-          `UPDATE family_connections 
-           SET status = 'pending', relationship = $1, permissions = $2, updated_at = CURRENT_TIMESTAMP
-           WHERE id = $3`,
-          [relationship, JSON.stringify(permissions), existingConnection.rows[0].id]
-        );
-      }
-    } else {
-      // Create new family connection
-      await client.query(
-        `INSERT INTO family_connections 
-         (senior_id, caregiver_id, relationship, permissions, status)
-         VALUES ($1, $2, $3, $4, 'pending')`,
-        [seniorId, caregiverId, relationship, JSON.stringify(permissions)]
-      );
+    if (!senior) {
+      throw new ValidationError('Senior with this email not found');
     }
 
-    await client.query('COMMIT');
-
-    // Send invitation email/notification to invitee
-    try {
-      const inviterName = `${req.user.first_name} ${req.user.last_name}`;
-      const subject = `Family Connection Invitation - SeniorCare Hub`;
-      const message = `${inviterName} has invited you to connect on SeniorCare Hub as their ${relationship}.`;
-      
-      // This would integrate with your email service
-      logger.info(`Family connection invitation sent to ${inviteeEmail} from ${inviterName}`);
-    } catch (emailError) {
-      logger.error('Failed to send invitation email:', emailError);
-    }
+    seniorId = senior.id;
+  } else {
+    throw new ForbiddenError('Only seniors and caregivers can create family connections');
+  }
 
-    logger.info(`Family connection invitation created: ${inviterRole} ${inviterId} inviting ${inviteeEmail}`);
+  // Check if connection already exists
+  const existingConnection = await db.collection('family_connections').findOne(
+    { senior_id: seniorId, caregiver_id: caregiverId },
+    { projection: { id: 1, status: 1 } }
+  );
 
-    res.status(201).json({
-      message: 'Family member invitation sent successfully',
-      inviteeEmail,
+  if (existingConnection) {
+    if (existingConnection.status === 'active') {
+      throw new ValidationError('Family connection already exists');
+    }
+
+    // Reactivate existing connection
+    await db.collection('family_connections').updateOne(
+      { id: existingConnection.id },
+      { $set: { status: 'pending', relationship, permissions, updated_at: new Date() } }
+    );
+  } else {
+    // Create new family connection
+    await db.collection('family_connections').insertOne({
+      id: uuidv4(),
+      senior_id: seniorId,
+      caregiver_id: caregiverId,
       relationship,
-      status: 'pending'
+      permissions,
+      status: 'pending',
+      created_at: new Date(),
+      updated_at: new Date()
     });
+  }
 
-  } catch (error) {
-    await client.query('ROLLBACK');
-    throw error;
-  } finally {
-    client.release();
+  // Send invitation email/notification to invitee
+  try {
+    const inviterName = `${req.user.first_name} ${req.user.last_name}`;
+    const subject = `Family Connection Invitation - SeniorCare Hub`;
+    const message = `${inviterName} has invited you to connect on SeniorCare Hub as their ${relationship}.`;
+    
+    // This would integrate with your email service
+    logger.info(`Family connection invitation sent to ${inviteeEmail} from ${inviterName}`);
+  } catch (emailError) {
+    logger.error('Failed to send invitation email:', emailError);
   }
+
+  logger.info(`Family connection invitation created: ${inviterRole} ${inviterId} inviting ${inviteeEmail}`);
+
+  res.status(201).json({
+    message: 'Family member invitation sent successfully',
+    inviteeEmail,
+    relationship,
+    status: 'pending'
+  });
 }));
 
 /**
@@ -244,60 +210,48 @@ router.post('/family-connections/:connectionId/accept', authenticate, asyncHandl
   const { connectionId } = req.params;
   const userId = req.user.id;
 
-  const client = await pool.connect();
-  try {
-    await client.query('BEGIN');
-
-    // Get connection details
-    const connection = await client.query(
-      `SELECT fc.*, s.first_name as senior_name, c.first_name as caregiver_name
-       FROM family_connections fc
-       JOIN users s ON fc.senior_id = s.id
-       JOIN users c ON fc.caregiver_id = c.id
-       WHERE fc.id = $1 AND (fc.senior_id = $2 OR fc.caregiver_id = $2)
-       AND fc.status = 'pending'`,
-      [connectionId, userId]
-    );
+  const db = getDB();
 
-    if (connection.rows.length === 0) {
-      return res.status(404).json({ error: 'Connection invitation not found or already processed' });
-    }
+  // Update connection status to active
+  const conn = await db.collection('family_connections').findOneAndUpdate(
+    {
+      id: connectionId,
+      $or: [{ senior_id: userId }, { caregiver_id: userId }],
+      status: 'pending'
+    },
+    { $set: { status: 'active', updated_at: new Date() } },
+    { returnDocument: 'after' }
+  );
 
-    const conn = connection.rows[0];
+  if (!conn) {
+    return res.status(404).json({ error: 'Connection invitation not found or already processed' });
+  }
 
-    // Update connection status to active
-    await client.query(
-      'UPDATE family_connections SET status = $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
-      ['active', connectionId]
+  // If the caregiver was a pending user, activate their account
+  if (conn.caregiver_id === userId) {
+    const activated = await db.collection('users').findOneAndUpdate(
+      { id: userId, is_active: false },
+      { $set: { is_active: true, updated_at: new Date() } },
+      { projection: { _id: 0, role: 1, subscription_tier: 1 } }
     );
-
-    // If the caregiver was a pending user, activate their account
-    if (conn.caregiver_id === userId) {
-      await client.query(
-        'UPDATE users SET is_active = true WHERE id = $1 AND is_active = false',
-        [userId]
-      );
+    if (activated) {
+      systemCounters.userActivated(activated);
     }
+  }
 
-    await client.query('COMMIT');
-
-    logger.info(`Family connection accepted: ${connectionId} by user ${userId}`);
+  // Both ends now have a new active connection
+  principalCache.invalidate(conn.senior_id, conn.caregiver_id);
 
-    res.json({
-      message: 'Family connection accepted successfully',
-      connection: {
-        id: conn.id,
-        relationship: conn.relationship,
-        status: 'active'
-      }
-    });
+  logger.info(`Family connection accepted: ${connectionId} by user ${userId}`);
 
-  } catch (error) {
-    await client.query('ROLLBACK');
-    throw error;
-  } finally {
-    client.release();
-  }
+  res.json({
+    message: 'Family connection accepted successfully',
+    connection: {
+      id: conn.id,
+      relationship: conn.relationship,
+      status: 'active'
+    }
+  });
 }));
 
 /**
@@ -309,15 +263,17 @@ router.post('/family-connections/:connectionId/decline', authenticate, asyncHand
   const { connectionId } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    `UPDATE family_connections 
-     SET status = 'declined', updated_at = CURRENT_TIMESTAMP 
-     WHERE id = $1 AND (senior_id = $2 OR caregiver_id = $2) AND status = 'pending'
-     RETURNING *`,
-    [connectionId, userId]
+  const db = getDB();
+  const result = await db.collection('family_connections').updateOne(
+    {
+      id: connectionId,
+      $or: [{ senior_id: userId }, { caregiver_id: userId }],
+      status: 'pending'
+    },
+    { $set: { status: 'declined', updated_at: new Date() } }
   );
 
-  if (result.rows.length === 0) {
+  if (result.matchedCount === 0) {
     return res.status(404).json({ error: 'Connection invitation not found or already processed' });
   }
 
@@ -352,24 +308,31 @@ router.put('/family-connections/:connectionId/permissions', authenticate, asyncH
     throw new ValidationError('Validation failed', error.details);
   }
 
+  // Merge the given flags into the stored permissions
+  const update = { updated_at: new Date() };
+  for (const [key, flag] of Object.entries(value)) {
+    update[`permissions.${key}`] = flag;
+  }
+
   // Only the senior can update caregiver permissions
-  const result = await pool.query(
-    `UPDATE family_connections 
-     SET permissions = permissions || $1, updated_at = CURRENT_TIMESTAMP
-     WHERE id = $2 AND senior_id = $3 AND status = 'active'
-     RETURNING *`,
-    [JSON.stringify(value), connectionId, userId]
+  const db = getDB();
+  const connection = await db.collection('family_connections').findOneAndUpdate(
+    { id: connectionId, senior_id: userId, status: 'active' },
+    { $set: update },
+    { returnDocument: 'after' }
   );
 
-  if (result.rows.length === 0) {
+  if (!connection) {
     return res.status(404).json({ error: 'Connection not found or not authorized' });
   }
 
+  principalCache.invalidate(connection.senior_id, connection.caregiver_id);
+
   logger.info(`Family connection permissions updated: ${connectionId} by user ${userId}`);
 
   res.json({
     message: 'Permissions updated successfully',
-    permissions: result.rows[0].permissions
+    permissions: connection.permissions
   });
 }));
 
@@ -382,18 +345,20 @@ router.delete('/family-connections/:connectionId', authenticate, asyncHandler(as
   const { connectionId } = req.params;
   const userId = req.user.id;
 
-  const result = await pool.query(
-    `UPDATE family_connections 
-     SET status = 'revoked', updated_at = CURRENT_TIMESTAMP
-     WHERE id = $1 AND (senior_id = $2 OR caregiver_id = $2)
-     RETURNING *`,
-    [connectionId, userId]
+  const db = getDB();
+  const connection = await db.collection('family_connections').findOneAndUpdate(
+    { id: connectionId, $or: [{ senior_id: userId }, { caregiver_id: userId }] },
+    { $set: { status: 'revoked', updated_at: new Date() } }
   );
 
-  if (result.rows.length === 0) {
+  if (!connection) {
     return res.status(404).json({ error: 'Connection not found' });
   }
 
+  // Revoking must take effect for both users immediately, open sockets included
+  principalCache.invalidate(connection.senior_id, connection.caregiver_id);
+  await realtime.revokeConnection(connection);
+
   logger.info(`Family connection removed: ${connectionId} by user ${userId}`);
 
   res.json({
@@ -463,35 +428,35 @@ router.get('/:userId/profile', authenticate, asyncHandler(async (req, res) => {
 
   // Check if requester has access to this user's profile
   if (userId !== requesterId) {
-    const accessCheck = await pool.query(
-      `SELECT fc.id 
-       FROM family_connections fc
-       WHERE ((fc.senior_id = $1 AND fc.caregiver_id = $2) OR 
-              (fc.senior_id = $2 AND fc.caregiver_id = $1))
-       AND fc.status = 'active'`,
-      [userId, requesterId]
+    const connected = req.user.family_connections?.some(connection =>
+      (connection.senior_id === userId || connection.caregiver_id === userId) &&
+      connection.status === 'active'
     );
 
-    if (accessCheck.rows.length === 0 && req.user.role !== 'admin') {
+    if (!connected && req.user.role !== 'admin') {
       throw new ForbiddenError('Not authorized to view this profile');
     }
   }
 
-  const result = await pool.query(
-    `SELECT 
-      id, first_name, last_name, email, phone, date_of_birth,
-      profile_picture_url, role, subscription_tier, created_at
-     FROM users 
-     WHERE id = $1 AND is_active = true`,
-    [userId]
-  );
+  const user = await req.loaders.users.load(userId);
 
-  if (result.rows.length === 0) {
+  if (!user || !user.is_active) {
     return res.status(404).json({ error: 'User not found' });
   }
 
   res.json({
-    user: result.rows[0]
+    user: {
+      id: user.id,
+      first_name: user.first_name,
+      last_name: user.last_name,
+      email: user.email,
+      phone: user.phone,
+      date_of_birth: user.date_of_birth,
+      profile_picture_url: user.profile_picture_url,
+      role: user.role,
+      subscription_tier: user.subscription_tier,
+      created_at: user.created_at
+    }
   });
 }));
 
@@ -2,18 +2,29 @@ const express = require('express');
 const Joi = require('joi');
 const { v4: uuidv4 } = require('uuid');
 const { getDB } = require('../config/database');
-const { authenticate } = require('../middleware/auth');
+const { authenticate, authorizeFamily } = require('../middleware/auth');
 const { asyncHandler, ValidationError } = require('../middleware/errorHandler');
 const { logger } = require('../utils/logger');
+const { latestVitalsCache } = require('../services/latestVitalsCache');
+const { vitalsRollups } = require('../services/vitalsRollups');
+const { vitalsStatistics } = require('../services/vitalsStatistics');
+const { alertPipeline } = require('../services/alertPipeline');
+const { vitalRules } = require('../services/vitalRules');
+const { seniorDashboard } = require('../services/seniorDashboard');
+const { systemCounters } = require('../services/systemCounters');
+const { lttb } = require('../utils/lttb');
+const { readLines, parseCsvLine } = require('../utils/streamParsers');
+const { parseLimit, applyCursor, buildCursorPage } = require('../utils/pagination');
+const { quietly } = require('../utils/quietly');
 
 const router = express.Router();
 
+const VITAL_TYPES = ['blood_pressure', 'heart_rate', 'blood_glucose', 'weight', 
+                     'oxygen_saturation', 'temperature', 'respiratory_rate'];
+
 // Validation schemas
 const vitalReadingSchema = Joi.object({
-  reading_type: Joi.string().valid(
-    'blood_pressure', 'heart_rate', 'blood_glucose', 'weight', 
-    'oxygen_saturation', 'temperature', 'respiratory_rate'
-  ).required(),
+  reading_type: Joi.string().valid(...VITAL_TYPES).required(),
   value: Joi.object().required(), // Flexible structure for different reading types
   unit: Joi.string().min(1).max(20).required(),
   device_id: Joi.string().max(100).optional(),
@@ -22,18 +33,30 @@ const vitalReadingSchema = Joi.object({
   notes: Joi.string().max(500).allow('').optional()
 });
 
-// Define normal ranges for different vital signs
-const VITAL_RANGES = {
-  blood_pressure: {
-    systolic: { min: 90, max: 140, unit: 'mmHg' },
-    diastolic: { min: 60, max: 90, unit: 'mmHg' }
-  },
-  heart_rate: { min: 60, max: 100, unit: 'bpm' },
-  blood_glucose: { min: 70, max: 140, unit: 'mg/dL' },
-  oxygen_saturation: { min: 95, max: 100, unit: '%' },
-  temperature: { min: 36.1, max: 37.2, unit: '°C' },
-  respiratory_rate: { min: 12, max: 20, unit: 'breaths/min' }
-};
+const thresholdBandSchema = Joi.object({
+  min: Joi.number().required(),
+  max: Joi.number().greater(Joi.ref('min')).required()
+});
+
+const thresholdSchema = Joi.object({
+  metrics: Joi.object().pattern(
+    Joi.string().valid('value', 'systolic', 'diastolic'),
+    thresholdBandSchema.keys({
+      high: thresholdBandSchema.optional(),
+      critical: thresholdBandSchema.optional()
+    })
+  ).min(1).required()
+});
+
+// Bulk import limits
+const BULK_IMPORT_MAX = parseInt(process.env.VITALS_BULK_IMPORT_MAX) || 50000;
+const BULK_INSERT_CHUNK_SIZE = 1000;
+const STREAM_IMPORT_BATCH_SIZE = 500;
+const STREAM_IMPORT_MAX_ERRORS = 100;
+// Reading ids carried by an import's summary alert
+const IMPORT_ALERT_MAX_READING_IDS = 100;
+// Longest trend window served from raw readings instead of rollups
+const RAW_TREND_MAX_DAYS = 2;
 
 /**
  * @route POST /api/vitals
@@ -52,10 +75,11 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
     device_name, reading_time, notes
   } = value;
 
-  // Check if reading is abnormal
-  const isAbnormal = checkIfAbnormal(reading_type, readingValue);
-
   const db = getDB();
+
+  // Check the reading against the user's thresholds
+  const rules = await vitalRules.forUser(db, userId);
+  const { isAbnormal, severity } = rules.evaluate(reading_type, readingValue);
   
   try {
     // Create vital reading document
@@ -75,55 +99,22 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
 
     // Insert vital reading
     await db.collection('vitals').insertOne(vitalReading);
+    systemCounters.increment('vitals');
+    systemCounters.recordEvent('vitals');
+    latestVitalsCache.recordReadings(userId, [vitalReading]);
 
-    // If abnormal, create alert and notify caregivers
+    // If abnormal, queue an alert straight after the insert; caregivers are
+    // notified in the background
+    let alertId = null;
     if (isAbnormal) {
-      const alertId = uuidv4();
-      const alert = {
-        id: alertId,
-        user_id: userId,
-        alert_type: 'vitals_abnormal',
-        severity: getVitalSeverity(reading_type, readingValue),
-        message: `Abnormal ${reading_type.replace('_', ' ')} reading: ${formatVitalValue(reading_type, readingValue)} ${unit}`,
-        vitals_data: vitalReading,
-        created_at: new Date(),
-        status: 'active'
-      };
-
-      await db.collection('emergency_alerts').insertOne(alert);
-
-      // Get caregivers for notification
-      const caregivers = await db.collection('family_connections').aggregate([
-        {
-          $match: { senior_id: userId, status: 'active' }
-        },
-        {
-          $lookup: {
-            from: 'users',
-            localField: 'caregiver_id',
-            foreignField: 'id',
-            as: 'caregiver'
-          }
-        },
-        {
-          $unwind: '$caregiver'
-        },
-        {
-          $project: {
-            id: '$caregiver.id',
-            first_name: '$caregiver.first_name',
-            last_name: '$caregiver.last_name',
-            email: '$caregiver.email'
-          }
-        }
-      ]).toArray();
-
-      // Log notification attempt (actual notification system would be implemented here)
-      if (caregivers.length > 0) {
-        logger.info(`Would send vitals alert to ${caregivers.length} caregivers for user ${userId}`);
-      }
+      alertId = await alertPipeline.enqueueReadingAlert(db, vitalReading, {
+        severity,
+        message: `Abnormal ${reading_type.replace('_', ' ')} reading: ${formatVitalValue(reading_type, readingValue)} ${unit}`
+      });
     }
 
+    await applyDerivedUpdates(db, userId, [vitalReading]);
+
     logger.info(`Vital reading recorded: ${reading_type} for user ${userId}, abnormal: ${isAbnormal}`);
 
     res.status(201).json({
@@ -140,7 +131,8 @@ router.post('/', authenticate, asyncHandler(async (req, res) => {
         notes: vitalReading.notes,
         createdAt: vitalReading.created_at
       },
-      alertCreated: isAbnormal
+      alertCreated: isAbnormal,
+      alertId
     });
 
   } catch (error) {
@@ -161,10 +153,15 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
     start_date, 
     end_date, 
     page = 1, 
-    limit = 50,
+    cursor,
     abnormal_only = 'false'
   } = req.query;
-  const skip = (page - 1) * limit;
+  const limit = parseLimit(req.query.limit, 50);
+  // Passing cursor (empty for the first page) switches to keyset paging
+  const cursorMode = cursor !== undefined;
+  const includeTotal = req.query.include_total !== undefined
+    ? req.query.include_total === 'true'
+    : !cursorMode;
 
   const db = getDB();
   
@@ -185,16 +182,29 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
     filter.is_abnormal = true;
   }
 
-  // Get vitals with pagination
-  const vitals = await db.collection('vitals')
-    .find(filter)
-    .sort({ reading_time: -1 })
-    .skip(skip)
-    .limit(parseInt(limit))
-    .toArray();
+  // Get vitals, fetching one extra row to know whether another page exists
+  let query = db.collection('vitals')
+    .find(cursorMode ? applyCursor(filter, cursor, 'reading_time') : filter)
+    .sort({ reading_time: -1, id: -1 });
+
+  if (!cursorMode) {
+    query = query.skip((parseInt(page) - 1) * limit);
+  }
 
-  // Get total count for pagination
-  const total = await db.collection('vitals').countDocuments(filter);
+  const fetched = await query.limit(limit + 1).toArray();
+  const { items: vitals, hasNextPage, nextCursor } = buildCursorPage(fetched, limit, 'reading_time');
+
+  // Exact totals cost a count over the whole range, so they are optional
+  const total = includeTotal ? await db.collection('vitals').countDocuments(filter) : undefined;
+
+  const pagination = cursorMode
+    ? { limit, nextCursor, hasNextPage }
+    : { page: parseInt(page), limit, nextCursor, hasNextPage, hasPrevPage: page > 1 };
+
+  if (includeTotal) {
+    pagination.total = total;
+    if (!cursorMode) pagination.totalPages = Math.ceil(total / limit);
+  }
 
   res.json({
     readings: vitals.map(vital => ({
@@ -209,16 +219,10 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
       notes: vital.notes,
       createdAt: vital.created_at
     })),
-    pagination: {
-      page: parseInt(page),
-      limit: parseInt(limit),
-      total: total,
-      totalPages: Math.ceil(total / limit),
-      hasNextPage: page * limit < total,
-      hasPrevPage: page > 1
-    }
+    pagination
   });
 }));
+
 /**
  * @route GET /api/vitals/latest
  * @desc Get latest readings for each vital type
@@ -226,33 +230,7 @@ router.get('/', authenticate, asyncHandler(async (req, res) => {
  */
 router.get('/latest', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
-  const db = getDB();
-
-  // Get latest reading for each vital type
-  const latestReadings = {};
-  
-  const vitalTypes = ['blood_pressure', 'heart_rate', 'blood_glucose', 'weight', 
-                     'oxygen_saturation', 'temperature', 'respiratory_rate'];
-
-  for (const type of vitalTypes) {
-    const latest = await db.collection('vitals')
-      .findOne(
-        { user_id: userId, reading_type: type },
-        { sort: { reading_time: -1 } }
-      );
-
-    if (latest) {
-      latestReadings[type] = {
-        id: latest.id,
-        value: latest.value,
-        unit: latest.unit,
-        deviceName: latest.device_name,
-        readingTime: latest.reading_time,
-        isAbnormal: latest.is_abnormal,
-        notes: latest.notes
-      };
-    }
-  }
+  const latestReadings = await latestVitalsCache.load(getDB(), userId);
 
   res.json({
     latestReadings
@@ -267,37 +245,78 @@ router.get('/latest', authenticate, asyncHandler(async (req, res) => {
 router.get('/trends/:reading_type', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
   const { reading_type } = req.params;
-  const { days = 30 } = req.query;
+  const { days = 30, granularity, points } = req.query;
   const db = getDB();
 
   const startDate = new Date();
   startDate.setDate(startDate.getDate() - parseInt(days));
 
-  const readings = await db.collection('vitals')
-    .find({
-      user_id: userId,
-      reading_type: reading_type,
-      reading_time: { $gte: startDate }
-    })
-    .sort({ reading_time: 1 })
-    .toArray();
+  const resolution = resolveTrendGranularity(parseInt(days), granularity);
+  let trendData;
+  let stats;
 
-  const trendData = readings.map(reading => ({
-    value: reading.value,
-    unit: reading.unit,
-    timestamp: reading.reading_time,
-    isAbnormal: reading.is_abnormal
-  }));
+  if (resolution === 'raw') {
+    const accumulators = vitalsStatistics.createAccumulators(reading_type);
+    const cursor = db.collection('vitals')
+      .find({
+        user_id: userId,
+        reading_type: reading_type,
+        reading_time: { $gte: startDate }
+      })
+      .sort({ reading_time: 1 });
 
-  // Calculate statistics
-  const stats = calculateVitalStats(reading_type, trendData);
+    // Build the series and its statistics in the same pass
+    trendData = [];
+    for await (const reading of cursor) {
+      trendData.push({
+        value: reading.value,
+        unit: reading.unit,
+        timestamp: reading.reading_time,
+        isAbnormal: reading.is_abnormal
+      });
+      vitalsStatistics.addReading(accumulators, reading.value, reading.is_abnormal);
+    }
+
+    stats = vitalsStatistics.summarize(accumulators);
+  } else {
+    // Long windows are served from pre-aggregated buckets
+    const rollups = await vitalsRollups.fetch(db, userId, reading_type, resolution, startDate);
+
+    trendData = rollups.map(bucket => ({
+      value: bucketMeanValue(reading_type, bucket),
+      unit: bucket.unit,
+      timestamp: bucket.bucket_start,
+      isAbnormal: bucket.abnormal_count > 0,
+      count: bucket.count,
+      abnormalCount: bucket.abnormal_count,
+      range: bucketRange(bucket)
+    }));
+
+    const accumulators = vitalsStatistics.createAccumulators(reading_type);
+    for (const bucket of rollups) {
+      vitalsStatistics.addRollup(accumulators, bucket);
+    }
+    stats = vitalsStatistics.summarize(accumulators);
+  }
+
+  // Optional shape-preserving downsampling to a fixed number of points
+  const maxPoints = parseInt(points);
+  if (maxPoints > 0) {
+    trendData = lttb(
+      trendData.filter(point => Number.isFinite(primaryTrendValue(reading_type, point.value))),
+      maxPoints,
+      point => new Date(point.timestamp).getTime(),
+      point => primaryTrendValue(reading_type, point.value)
+    );
+  }
 
   res.json({
     readingType: reading_type,
     timeRange: `${days} days`,
+    granularity: resolution,
     trendData,
     statistics: stats,
-    normalRange: VITAL_RANGES[reading_type] || null
+    normalRange: (await vitalRules.forUser(db, userId)).normalRange(reading_type)
   });
 }));
 
@@ -314,31 +333,50 @@ router.get('/summary', authenticate, asyncHandler(async (req, res) => {
   const startDate = new Date();
   startDate.setDate(startDate.getDate() - parseInt(days));
 
-  const vitalTypes = ['blood_pressure', 'heart_rate', 'blood_glucose', 'weight', 
-                     'oxygen_saturation', 'temperature', 'respiratory_rate'];
+  // One aggregation over hourly rollups covers every vital type
+  const totals = await db.collection(vitalsRollups.COLLECTION).aggregate([
+    {
+      $match: {
+        user_id: userId,
+        granularity: 'hour',
+        bucket_start: { $gte: vitalsRollups.bucketStart(startDate, 'hour') }
+      }
+    },
+    {
+      $group: {
+        _id: '$reading_type',
+        totalReadings: { $sum: '$count' },
+        abnormalReadings: { $sum: '$abnormal_count' },
+        lastReadingTime: { $max: '$last_reading_time' },
+        ...metricPartialGroupFields(['value', 'systolic', 'diastolic'])
+      }
+    }
+  ]).toArray();
 
   const summary = {};
 
-  for (const type of vitalTypes) {
-    const readings = await db.collection('vitals')
-      .find({
-        user_id: userId,
-        reading_type: type,
-        reading_time: { $gte: startDate }
-      })
-      .toArray();
-
-    if (readings.length > 0) {
-      const abnormalCount = readings.filter(r => r.is_abnormal).length;
-      const latestReading = readings.reduce((latest, current) => 
-        current.reading_time > latest.reading_time ? current : latest
-      );
+  for (const type of VITAL_TYPES) {
+    const total = totals.find(t => t._id === type);
+
+    if (total && total.totalReadings > 0) {
+      // Merge the per-metric partials summed in the database
+      const accumulators = vitalsStatistics.createAccumulators(type);
+      vitalsStatistics.addRollup(accumulators, {
+        count: total.totalReadings,
+        abnormal_count: total.abnormalReadings,
+        metrics: {
+          value: metricPartial(total, 'value'),
+          systolic: metricPartial(total, 'systolic'),
+          diastolic: metricPartial(total, 'diastolic')
+        }
+      });
 
       summary[type] = {
-        totalReadings: readings.length,
-        abnormalReadings: abnormalCount,
-        abnormalPercentage: Math.round((abnormalCount / readings.length) * 100),
-        lastReadingTime: latestReading.reading_time
+        totalReadings: total.totalReadings,
+        abnormalReadings: total.abnormalReadings,
+        abnormalPercentage: Math.round((total.abnormalReadings / total.totalReadings) * 100),
+        lastReadingTime: total.lastReadingTime,
+        statistics: vitalsStatistics.summarize(accumulators, { percentiles: false })
       };
     }
   }
@@ -349,6 +387,100 @@ router.get('/summary', authenticate, asyncHandler(async (req, res) => {
   });
 }));
 
+/**
+ * @route GET /api/vitals/thresholds/:userId
+ * @desc Get effective vital thresholds for a user
+ * @access Private (self or connected family)
+ */
+router.get('/thresholds/:userId', authenticate, authorizeFamily, asyncHandler(async (req, res) => {
+  const { userId } = req.params;
+  const db = getDB();
+
+  const [rules, overrides] = await Promise.all([
+    vitalRules.forUser(db, userId),
+    vitalRules.listOverrides(db, userId)
+  ]);
+
+  const overridesByType = Object.fromEntries(overrides.map(override => [override.reading_type, override]));
+
+  const thresholds = {};
+  for (const readingType of VITAL_TYPES) {
+    const override = overridesByType[readingType];
+    thresholds[readingType] = {
+      normalRange: rules.normalRange(readingType),
+      rules: rules.rules[readingType] || null,
+      overridden: Boolean(override),
+      updatedBy: override ? override.updated_by : null,
+      updatedAt: override ? override.updated_at : null
+    };
+  }
+
+  res.json({ userId, thresholds });
+}));
+
+/**
+ * @route PUT /api/vitals/thresholds/:userId/:reading_type
+ * @desc Set per-user thresholds for a vital type
+ * @access Private (self or connected family)
+ */
+router.put('/thresholds/:userId/:reading_type', authenticate, authorizeFamily, asyncHandler(async (req, res) => {
+  const { userId, reading_type } = req.params;
+
+  if (!VITAL_TYPES.includes(reading_type)) {
+    throw new ValidationError('Invalid reading type');
+  }
+
+  const { error, value } = thresholdSchema.validate(req.body);
+  if (error) {
+    throw new ValidationError('Validation failed', error.details);
+  }
+
+  const defaults = vitalRules.DEFAULT_RULES[reading_type];
+  if (!defaults) {
+    throw new ValidationError(`Thresholds are not supported for ${reading_type}`);
+  }
+
+  const allowedMetrics = Object.keys(defaults);
+  const unknownMetrics = Object.keys(value.metrics).filter(name => !allowedMetrics.includes(name));
+  if (unknownMetrics.length > 0) {
+    throw new ValidationError(`Metrics not applicable to ${reading_type}: ${unknownMetrics.join(', ')}`);
+  }
+
+  const db = getDB();
+  await vitalRules.setOverride(db, userId, reading_type, value.metrics, req.user.id);
+
+  const rules = await vitalRules.forUser(db, userId);
+
+  logger.info(`Vital thresholds for ${reading_type} updated for user ${userId} by ${req.user.id}`);
+
+  res.json({
+    message: 'Vital thresholds updated successfully',
+    readingType: reading_type,
+    normalRange: rules.normalRange(reading_type),
+    rules: rules.rules[reading_type]
+  });
+}));
+
+/**
+ * @route DELETE /api/vitals/thresholds/:userId/:reading_type
+ * @desc Revert a vital type to the default thresholds
+ * @access Private (self or connected family)
+ */
+router.delete('/thresholds/:userId/:reading_type', authenticate, authorizeFamily, asyncHandler(async (req, res) => {
+  const { userId, reading_type } = req.params;
+
+  const db = getDB();
+  const removed = await vitalRules.removeOverride(db, userId, reading_type);
+
+  if (!removed) {
+    return res.status(404).json({ error: 'No custom thresholds for this reading type' });
+  }
+
+  logger.info(`Vital thresholds for ${reading_type} reset for user ${userId} by ${req.user.id}`);
+
+  res.json({ message: 'Vital thresholds reset to defaults' });
+}));
+
 /**
  * @route DELETE /api/vitals/:id
  * @desc Delete a vital reading
@@ -359,15 +491,20 @@ router.delete('/:id', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
   const db = getDB();
 
-  const result = await db.collection('vitals').deleteOne({
+  const deleted = await db.collection('vitals').findOneAndDelete({
     id: id,
     user_id: userId
   });
 
-  if (result.deletedCount === 0) {
+  if (!deleted) {
     return res.status(404).json({ error: 'Vital reading not found' });
   }
 
+  latestVitalsCache.invalidate(userId);
+  systemCounters.increment('vitals', -1);
+  await vitalsRollups.removeReading(db, deleted);
+  await seniorDashboard.refresh(db, userId, 'vitals');
+
   logger.info(`Vital reading ${id} deleted by user ${userId}`);
 
   res.json({ message: 'Vital reading deleted successfully' });
@@ -382,8 +519,10 @@ router.post('/bulk-import', authenticate, asyncHandler(async (req, res) => {
   const userId = req.user.id;
   const { readings, device_id, device_name } = req.body;
 
+  // Validate the envelope once; readings are validated one by one below so
+  // a single bad item does not reject the whole batch
   const bulkSchema = Joi.object({
-    readings: Joi.array().items(vitalReadingSchema).min(1).max(100).required(),
+    readings: Joi.array().min(1).max(BULK_IMPORT_MAX).required(),
     device_id: Joi.string().max(100).required(),
     device_name: Joi.string().max(100).required()
   });
@@ -396,62 +535,86 @@ router.post('/bulk-import', authenticate, asyncHandler(async (req, res) => {
   const db = getDB();
   
   try {
-    const insertedReadings = [];
-    const abnormalReadings = [];
-
-    for (const reading of value.readings) {
-      const isAbnormal = checkIfAbnormal(reading.reading_type, reading.value);
-      
-      const vitalReading = {
-        id: uuidv4(),
-        user_id: userId,
-        reading_type: reading.reading_type,
-        value: reading.value,
-        unit: reading.unit,
-        device_id: device_id,
-        device_name: device_name,
-        reading_time: reading.reading_time || new Date(),
-        is_abnormal: isAbnormal,
-        notes: reading.notes || null,
-        created_at: new Date()
-      };
+    const results = new Array(value.readings.length);
+    const candidates = [];
+
+    value.readings.forEach((item, index) => {
+      const { error: itemError, value: reading } = vitalReadingSchema.validate(item);
+      if (itemError) {
+        results[index] = {
+          index,
+          status: 'rejected',
+          errors: itemError.details.map(detail => detail.message)
+        };
+        return;
+      }
 
-      await db.collection('vitals').insertOne(vitalReading);
-      insertedReadings.push(vitalReading);
+      candidates.push({
+        index,
+        doc: buildVitalReading(userId, {
+          ...reading,
+          device_id: value.device_id,
+          device_name: value.device_name
+        })
+      });
+    });
 
-      if (isAbnormal) {
-        abnormalReadings.push(vitalReading);
-      }
+    // One rule lookup for the whole batch
+    const rules = await vitalRules.forUser(db, userId);
+    applyVitalRules(rules, candidates);
+
+    const { inserted, failed } = await persistReadings(db, userId, candidates);
+
+    for (const { index, doc } of inserted) {
+      results[index] = { index, status: 'accepted', id: doc.id };
     }
+    for (const { index, message } of failed) {
+      results[index] = { index, status: 'rejected', errors: [message] };
+    }
+
+    const insertedReadings = inserted.map(({ doc }) => doc);
+    const abnormalCandidates = inserted.filter(({ doc }) => doc.is_abnormal);
+    const abnormalReadings = abnormalCandidates.map(({ doc }) => doc);
 
-    // Create alerts for abnormal readings
+    // Queue one summary alert for the abnormal readings; ids and
+    // severities both come from the stored abnormal readings
     if (abnormalReadings.length > 0) {
-      const alertMessage = abnormalReadings.length === 1
-        ? `Abnormal ${abnormalReadings[0].reading_type.replace('_', ' ')} reading detected`
-        : `${abnormalReadings.length} abnormal vital readings detected`;
+      await alertPipeline.enqueueImportAlert(
+        db,
+        userId,
+        abnormalReadings.slice(0, IMPORT_ALERT_MAX_READING_IDS).map(doc => doc.id),
+        {
+          count: abnormalReadings.length,
+          severities: abnormalCandidates.map(({ severity }) => severity),
+          message: abnormalReadings.length === 1
+            ? `Abnormal ${abnormalReadings[0].reading_type.replace('_', ' ')} reading detected`
+            : `${abnormalReadings.length} abnormal vital readings detected`
+        }
+      );
+    }
 
-      const alert = {
-        id: uuidv4(),
-        user_id: userId,
-        alert_type: 'vitals_abnormal',
-        severity: 'medium',
-        message: alertMessage,
-        vitals_data: abnormalReadings,
-        created_at: new Date(),
-        status: 'active'
-      };
+    await applyDerivedUpdates(db, userId, insertedReadings);
 
-      await db.collection('emergency_alerts').insertOne(alert);
-    }
+    const rejectedCount = results.length - insertedReadings.length;
 
-    logger.info(`Bulk imported ${insertedReadings.length} vital readings for user ${userId}, ${abnormalReadings.length} abnormal`);
+    logger.info(`Bulk imported ${insertedReadings.length} vital readings for user ${userId}, ${abnormalReadings.length} abnormal, ${rejectedCount} rejected`);
 
-    res.status(201).json({
-      message: 'Vital readings imported successfully',
+    // 201 when everything was stored, 207 for partial acceptance
+    const statusCode = insertedReadings.length === 0 ? 400
+      : rejectedCount > 0 ? 207 : 201;
+
+    res.status(statusCode).json({
+      message: insertedReadings.length === 0
+        ? 'No vital readings could be imported'
+        : rejectedCount > 0
+          ? 'Vital readings partially imported'
+          : 'Vital readings imported successfully',
       imported: insertedReadings.length,
+      rejected: rejectedCount,
       abnormalDetected: abnormalReadings.length,
       deviceId: device_id,
-      deviceName: device_name
+      deviceName: device_name,
+      results
     });
 
   } catch (error) {
@@ -461,48 +624,278 @@ router.post('/bulk-import', authenticate, asyncHandler(async (req, res) => {
 }));
 
 /**
- * Helper function to check if a vital reading is abnormal
+ * @route POST /api/vitals/stream-import
+ * @desc Stream NDJSON or CSV vital readings (for large device exports)
+ * @access Private
  */
-function checkIfAbnormal(readingType, value) {
-  const range = VITAL_RANGES[readingType];
-  if (!range) return false;
+router.post('/stream-import', authenticate, asyncHandler(async (req, res) => {
+  const userId = req.user.id;
+  const format = req.is('text/csv') ? 'csv'
+    : req.is('application/x-ndjson', 'application/ndjson', 'application/jsonl') ? 'ndjson'
+    : null;
+
+  if (!format) {
+    return res.status(415).json({
+      error: 'Unsupported content type',
+      message: 'Send application/x-ndjson or text/csv'
+    });
+  }
 
-  switch (readingType) {
-    case 'blood_pressure':
-      const systolic = value.systolic || 0;
-      const diastolic = value.diastolic || 0;
-      return systolic < range.systolic.min || systolic > range.systolic.max ||
-             diastolic < range.diastolic.min || diastolic > range.diastolic.max;
-    
-    default:
-      const numValue = typeof value === 'object' ? value.value : value;
-      return numValue < range.min || numValue > range.max;
+  const deviceSchema = Joi.object({
+    device_id: Joi.string().max(100).required(),
+    device_name: Joi.string().max(100).required()
+  });
+
+  const { error: deviceError, value: device } = deviceSchema.validate({
+    device_id: req.query.device_id || req.get('x-device-id'),
+    device_name: req.query.device_name || req.get('x-device-name')
+  });
+  if (deviceError) {
+    throw new ValidationError('Validation failed', deviceError.details);
+  }
+
+  const db = getDB();
+  const rules = await vitalRules.forUser(db, userId);
+  const errors = [];
+  const abnormalSample = [];
+  const abnormalSeverities = new Set();
+  let header = null;
+  let batch = [];
+  let linesProcessed = 0;
+  let imported = 0;
+  let rejected = 0;
+  let abnormalDetected = 0;
+
+  const reject = (lineNumber, messages) => {
+    rejected++;
+    if (errors.length < STREAM_IMPORT_MAX_ERRORS) {
+      errors.push({ line: lineNumber, errors: messages });
+    }
+  };
+
+  // Writing a batch is awaited inside the read loop, so the request stream
+  // is not read (and the socket is throttled) until the batch is stored
+  const flush = async () => {
+    if (batch.length === 0) return;
+
+    applyVitalRules(rules, batch);
+    const { inserted, failed } = await persistReadings(db, userId, batch);
+    batch = [];
+    await applyDerivedUpdates(db, userId, inserted.map(({ doc }) => doc));
+
+    imported += inserted.length;
+    for (const { index, message } of failed) {
+      reject(index, [message]);
+    }
+    for (const { doc, severity } of inserted) {
+      if (doc.is_abnormal) {
+        abnormalDetected++;
+        abnormalSeverities.add(severity);
+        if (abnormalSample.length < IMPORT_ALERT_MAX_READING_IDS) {
+          abnormalSample.push(doc.id);
+        }
+      }
+    }
+  };
+
+  for await (const { line, lineNumber, tooLong } of readLines(req)) {
+    if (tooLong) {
+      reject(lineNumber, ['Line exceeds maximum length']);
+      continue;
+    }
+    if (line.trim() === '') continue;
+
+    let item;
+    try {
+      if (format === 'csv') {
+        const fields = parseCsvLine(line);
+        if (!header) {
+          header = fields.map(field => field.trim().toLowerCase());
+          continue;
+        }
+        item = csvRecordToReading(header, fields);
+      } else {
+        item = JSON.parse(line);
+      }
+    } catch (parseError) {
+      reject(lineNumber, [`Could not parse line: ${parseError.message}`]);
+      continue;
+    }
+
+    linesProcessed++;
+
+    const { error, value: reading } = vitalReadingSchema.validate(item);
+    if (error) {
+      reject(lineNumber, error.details.map(detail => detail.message));
+      continue;
+    }
+
+    batch.push({
+      index: lineNumber,
+      doc: buildVitalReading(userId, { ...reading, ...device })
+    });
+
+    if (batch.length >= STREAM_IMPORT_BATCH_SIZE) {
+      await flush();
+    }
+  }
+
+  await flush();
+
+  if (abnormalDetected > 0) {
+    await alertPipeline.enqueueImportAlert(db, userId, abnormalSample, {
+      count: abnormalDetected,
+      severities: [...abnormalSeverities],
+      message: `${abnormalDetected} abnormal vital readings detected`
+    });
+  }
+
+  logger.info(`Stream imported ${imported} vital readings (${format}) for user ${userId}, ${abnormalDetected} abnormal, ${rejected} rejected`);
+
+  const statusCode = imported === 0 ? 400 : rejected > 0 ? 207 : 201;
+
+  res.status(statusCode).json({
+    message: imported === 0
+      ? 'No vital readings could be imported'
+      : rejected > 0
+        ? 'Vital readings partially imported'
+        : 'Vital readings imported successfully',
+    format,
+    linesProcessed,
+    imported,
+    rejected,
+    abnormalDetected,
+    deviceId: device.device_id,
+    deviceName: device.device_name,
+    errors,
+    errorsTruncated: rejected > errors.length
+  });
+}));
+
+/**
+ * Build a vitals document from a validated reading. is_abnormal is set
+ * afterwards by applyVitalRules.
+ */
+function buildVitalReading(userId, reading) {
+  return {
+    id: uuidv4(),
+    user_id: userId,
+    reading_type: reading.reading_type,
+    value: reading.value,
+    unit: reading.unit,
+    device_id: reading.device_id || null,
+    device_name: reading.device_name || null,
+    reading_time: reading.reading_time || new Date(),
+    is_abnormal: false,
+    notes: reading.notes || null,
+    created_at: new Date()
+  };
+}
+
+/**
+ * Insert readings with unordered insertMany in bounded chunks, then update
+ * the latest-values cache and counters for whatever was stored. Rollups and
+ * the dashboard are left to applyDerivedUpdates, after any alert is queued.
+ * `candidates` are { index, doc } pairs; returns the inserted and failed ones.
+ */
+async function persistReadings(db, userId, candidates) {
+  const inserted = [];
+  const failed = [];
+
+  for (let start = 0; start < candidates.length; start += BULK_INSERT_CHUNK_SIZE) {
+    const chunk = candidates.slice(start, start + BULK_INSERT_CHUNK_SIZE);
+    const failedInChunk = new Map();
+
+    try {
+      await db.collection('vitals').insertMany(
+        chunk.map(({ doc }) => doc),
+        { ordered: false }
+      );
+    } catch (error) {
+      if (!error.writeErrors) {
+        throw error;
+      }
+      const writeErrors = Array.isArray(error.writeErrors) ? error.writeErrors : [error.writeErrors];
+      for (const writeError of writeErrors) {
+        failedInChunk.set(writeError.index, writeError.errmsg || 'Write failed');
+      }
+    }
+
+    chunk.forEach((candidate, i) => {
+      if (failedInChunk.has(i)) {
+        failed.push({ index: candidate.index, message: failedInChunk.get(i) });
+      } else {
+        inserted.push(candidate);
+      }
+    });
+  }
+
+  const insertedReadings = inserted.map(({ doc }) => doc);
+  latestVitalsCache.recordReadings(userId, insertedReadings);
+  if (insertedReadings.length > 0) {
+    systemCounters.increment('vitals', insertedReadings.length);
+    systemCounters.recordEvent('vitals', insertedReadings.length);
   }
+
+  return { inserted, failed };
 }
 
 /**
- * Helper function to get severity based on how far outside normal range
+ * Update rollups and the senior dashboard for stored readings. Best-effort:
+ * the readings and their alert are already durable, and a failure here is
+ * repaired by the next dashboard refresh or a rollup backfill.
  */
-function getVitalSeverity(readingType, value) {
-  const range = VITAL_RANGES[readingType];
-  if (!range) return 'medium';
+async function applyDerivedUpdates(db, userId, readings) {
+  if (readings.length === 0) return;
 
-  // Simple severity calculation - can be enhanced
-  switch (readingType) {
-    case 'blood_pressure':
-      const systolic = value.systolic || 0;
-      if (systolic > 180 || systolic < 70) return 'critical';
-      if (systolic > 160 || systolic < 80) return 'high';
-      return 'medium';
-    
-    case 'heart_rate':
-      const hr = typeof value === 'object' ? value.value : value;
-      if (hr > 120 || hr < 50) return 'high';
-      return 'medium';
-    
-    default:
-      return 'medium';
+  await quietly(() => vitalsRollups.applyReadings(db, readings), `Failed to update vitals rollups for user ${userId}`);
+  await seniorDashboard.refresh(db, userId, 'vitals');
+}
+
+/**
+ * Map a CSV record onto the vital reading shape accepted by vitalReadingSchema.
+ * Columns: reading_type, value | systolic + diastolic, unit, reading_time, notes.
+ * Blood pressure may also be given as a single "120/80" value.
+ */
+function csvRecordToReading(header, fields) {
+  const record = {};
+  header.forEach((column, i) => {
+    const field = (fields[i] || '').trim();
+    if (field !== '') record[column] = field;
+  });
+
+  let value;
+  if (record.systolic !== undefined || record.diastolic !== undefined) {
+    value = { systolic: Number(record.systolic), diastolic: Number(record.diastolic) };
+  } else if (record.reading_type === 'blood_pressure' && record.value && record.value.includes('/')) {
+    const [systolic, diastolic] = record.value.split('/');
+    value = { systolic: Number(systolic), diastolic: Number(diastolic) };
+  } else if (record.value !== undefined) {
+    value = { value: Number(record.value) };
   }
+
+  const reading = {
+    reading_type: record.reading_type,
+    value,
+    unit: record.unit
+  };
+  if (record.reading_time || record.timestamp) reading.reading_time = record.reading_time || record.timestamp;
+  if (record.notes) reading.notes = record.notes;
+
+  return reading;
+}
+
+/**
+ * Evaluate a batch of { index, doc } candidates against a compiled rule set,
+ * setting is_abnormal on each doc and the severity on each candidate
+ */
+function applyVitalRules(rules, candidates) {
+  const evaluations = rules.evaluateBatch(candidates.map(({ doc }) => doc));
+  candidates.forEach((candidate, i) => {
+    candidate.doc.is_abnormal = evaluations[i].isAbnormal;
+    candidate.severity = evaluations[i].severity;
+  });
+  return candidates;
 }
 
 /**
@@ -518,47 +911,82 @@ function formatVitalValue(readingType, value) {
 }
 
 /**
- * Calculate statistics for vital trends
+ * Pick trend resolution: raw readings for short windows, rollups otherwise
  */
-function calculateVitalStats(readingType, trendData) {
-  if (trendData.length === 0) return null;
+function resolveTrendGranularity(days, requested) {
+  if (requested === 'hour' || requested === 'day') {
+    return requested;
+  }
+  // Raw readings only for short windows, even when asked for
+  if (days <= RAW_TREND_MAX_DAYS) return 'raw';
+  if (days <= 90) return 'hour';
+  return 'day';
+}
+
+/**
+ * Mean value of a rollup bucket, shaped like a raw reading value
+ */
+function bucketMeanValue(readingType, bucket) {
+  const mean = (metric) => metric && metric.count > 0
+    ? parseFloat((metric.sum / metric.count).toFixed(2))
+    : null;
 
-  let values;
   if (readingType === 'blood_pressure') {
-    const systolicValues = trendData.map(d => d.value.systolic).filter(v => v);
-    const diastolicValues = trendData.map(d => d.value.diastolic).filter(v => v);
-    
-    return {
-      systolic: calculateNumericStats(systolicValues),
-      diastolic: calculateNumericStats(diastolicValues),
-      totalReadings: trendData.length,
-      abnormalCount: trendData.filter(d => d.isAbnormal).length
-    };
-  } else {
-    values = trendData.map(d => typeof d.value === 'object' ? d.value.value : d.value).filter(v => v);
     return {
-      ...calculateNumericStats(values),
-      totalReadings: trendData.length,
-      abnormalCount: trendData.filter(d => d.isAbnormal).length
+      systolic: mean(bucket.metrics.systolic),
+      diastolic: mean(bucket.metrics.diastolic)
     };
   }
+  return { value: mean(bucket.metrics.value) };
 }
 
 /**
- * Calculate numeric statistics
+ * Min/max per metric of a rollup bucket
  */
-function calculateNumericStats(values) {
-  if (values.length === 0) return { min: 0, max: 0, average: 0 };
-  
-  const min = Math.min(...values);
-  const max = Math.max(...values);
-  const average = values.reduce((sum, val) => sum + val, 0) / values.length;
-  
+function bucketRange(bucket) {
+  const range = {};
+  for (const [name, metric] of Object.entries(bucket.metrics || {})) {
+    range[name] = { min: metric.min, max: metric.max };
+  }
+  return range;
+}
+
+/**
+ * Numeric value used to plot (and downsample) a trend point
+ */
+function primaryTrendValue(readingType, value) {
+  if (readingType === 'blood_pressure') {
+    return value ? Number(value.systolic) : NaN;
+  }
+  return Number(typeof value === 'object' && value !== null ? value.value : value);
+}
+
+/**
+ * $group fields summing rollup partials for the given metrics
+ */
+function metricPartialGroupFields(names) {
+  const fields = {};
+  for (const name of names) {
+    fields[`${name}_count`] = { $sum: `$metrics.${name}.count` };
+    fields[`${name}_sum`] = { $sum: `$metrics.${name}.sum` };
+    fields[`${name}_sum_sq`] = { $sum: `$metrics.${name}.sum_sq` };
+    fields[`${name}_min`] = { $min: `$metrics.${name}.min` };
+    fields[`${name}_max`] = { $max: `$metrics.${name}.max` };
+  }
+  return fields;
+}
+
+/**
+ * Read one metric's merged partial back out of a $group result
+ */
+function metricPartial(group, name) {
   return {
-    min: parseFloat(min.toFixed(2)),
-    max: parseFloat(max.toFixed(2)),
-    average: parseFloat(average.toFixed(2))
+    count: group[`${name}_count`],
+    sum: group[`${name}_sum`],
+    sum_sq: group[`${name}_sum_sq`],
+    min: group[`${name}_min`],
+    max: group[`${name}_max`]
   };
 }
 
-module.exports = router;
\ No newline at end of file
+module.exports = router;
@@ -0,0 +1,29 @@
+// One-off job: build weekly/monthly check-in rollups from existing check-ins.
+// Usage: node server/scripts/backfillCheckinRollups.js [userId]
+require('dotenv').config();
+
+const { connectDB, getDB, closeDB } = require('../config/database');
+const { checkinAnalytics } = require('../services/checkinAnalytics');
+const { logger } = require('../utils/logger');
+
+const run = async () => {
+  await connectDB();
+  const db = getDB();
+
+  const userIds = process.argv[2]
+    ? [process.argv[2]]
+    : await db.collection('daily_checkins').distinct('user_id');
+
+  for (const userId of userIds) {
+    await checkinAnalytics.rebuildUser(db, userId);
+  }
+
+  logger.info(`Check-in rollup backfill complete for ${userIds.length} users`);
+};
+
+run()
+  .catch((error) => {
+    logger.error('Check-in rollup backfill failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(closeDB);
@@ -0,0 +1,30 @@
+// One-off job: compute check-in streaks from existing check-ins.
+// Usage: node server/scripts/backfillCheckinStreaks.js [userId]
+require('dotenv').config();
+
+const { connectDB, getDB, closeDB } = require('../config/database');
+const { checkinStreaks } = require('../services/checkinStreaks');
+const { logger } = require('../utils/logger');
+
+const run = async () => {
+  await connectDB();
+  const db = getDB();
+
+  const userIds = process.argv[2]
+    ? [process.argv[2]]
+    : await db.collection('daily_checkins').distinct('user_id');
+
+  for (const userId of userIds) {
+    const user = await db.collection('users').findOne({ id: userId }, { projection: { timezone: 1 } });
+    await checkinStreaks.rebuild(db, userId, user?.timezone);
+  }
+
+  logger.info(`Check-in streak backfill complete for ${userIds.length} users`);
+};
+
+run()
+  .catch((error) => {
+    logger.error('Check-in streak backfill failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(closeDB);
@@ -0,0 +1,30 @@
+// One-off job: build inbox conversation summaries from existing messages.
+// Usage: node server/scripts/backfillConversationSummaries.js [userId]
+require('dotenv').config();
+
+const { connectDB, getDB, closeDB } = require('../config/database');
+const { conversations } = require('../services/conversations');
+const { logger } = require('../utils/logger');
+
+const run = async () => {
+  await connectDB();
+  const db = getDB();
+
+  const filter = process.argv[2]
+    ? { $or: [{ sender_id: process.argv[2] }, { recipient_id: process.argv[2] }] }
+    : {};
+  const conversationIds = await db.collection('messages').distinct('conversation_id', filter);
+
+  for (const conversationId of conversationIds) {
+    await conversations.rebuild(db, conversationId);
+  }
+
+  logger.info(`Conversation summary backfill complete for ${conversationIds.length} conversations`);
+};
+
+run()
+  .catch((error) => {
+    logger.error('Conversation summary backfill failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(closeDB);
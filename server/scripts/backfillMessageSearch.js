@@ -0,0 +1,48 @@
+// One-off job: build the message search index from existing messages.
+// Usage: node server/scripts/backfillMessageSearch.js [userId]
+require('dotenv').config();
+
+const { connectDB, getDB, closeDB } = require('../config/database');
+const { messageSearch } = require('../services/messageSearch');
+const { logger } = require('../utils/logger');
+
+const BATCH_SIZE = 1000;
+
+const run = async () => {
+  await connectDB();
+  const db = getDB();
+
+  const filter = process.argv[2]
+    ? { $or: [{ sender_id: process.argv[2] }, { recipient_id: process.argv[2] }] }
+    : {};
+  const cursor = db.collection('messages').find(filter, {
+    projection: {
+      _id: 0, id: 1, conversation_id: 1, sender_id: 1, recipient_id: 1, message_text: 1,
+      is_encrypted: 1, deleted_by_sender: 1, deleted_by_recipient: 1, created_at: 1
+    }
+  });
+
+  let batch = [];
+  let count = 0;
+  for await (const message of cursor) {
+    batch.push(message);
+    if (batch.length >= BATCH_SIZE) {
+      await messageSearch.reindexMessages(db, batch);
+      count += batch.length;
+      batch = [];
+    }
+  }
+  if (batch.length > 0) {
+    await messageSearch.reindexMessages(db, batch);
+    count += batch.length;
+  }
+
+  logger.info(`Message search backfill complete for ${count} messages`);
+};
+
+run()
+  .catch((error) => {
+    logger.error('Message search backfill failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(closeDB);
@@ -0,0 +1,29 @@
+// One-off job: build hourly/daily vitals rollups from existing raw readings.
+// Usage: node server/scripts/backfillVitalsRollups.js [userId]
+require('dotenv').config();
+
+const { connectDB, getDB, closeDB } = require('../config/database');
+const { vitalsRollups } = require('../services/vitalsRollups');
+const { logger } = require('../utils/logger');
+
+const run = async () => {
+  await connectDB();
+  const db = getDB();
+
+  const userIds = process.argv[2]
+    ? [process.argv[2]]
+    : await db.collection('vitals').distinct('user_id');
+
+  for (const userId of userIds) {
+    await vitalsRollups.rebuildUser(db, userId);
+  }
+
+  logger.info(`Vitals rollup backfill complete for ${userIds.length} users`);
+};
+
+run()
+  .catch((error) => {
+    logger.error('Vitals rollup backfill failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(closeDB);
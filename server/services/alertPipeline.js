@@ -0,0 +1,208 @@
+const { v4: uuidv4 } = require('uuid');
+const { JobQueue } = require('./jobQueue');
+const { emergencyNotifications, isFirebaseInitialized } = require('../config/firebase');
+const { logger } = require('../utils/logger');
+const { caregiverFeed } = require('./caregiverFeed');
+
+// Background alert pipeline for abnormal vitals.
+// The ingest path only records the reading and enqueues an alert job; the
+// alert document, caregiver lookup and notification fan-out happen in
+// workers, so ingest latency does not depend on how many caregivers a
+// senior has. Jobs live in the durable `alert_jobs` queue and are claimed
+// most severe first.
+const SEVERITY_PRIORITY = {
+  critical: 40,
+  high: 30,
+  medium: 20,
+  low: 10
+};
+
+const SEVERITY_ORDER = ['low', 'medium', 'high', 'critical'];
+
+const alertQueue = new JobQueue({
+  collection: 'alert_jobs',
+  lockMs: parseInt(process.env.ALERT_JOB_LOCK_MS) || 60 * 1000,
+  maxAttempts: parseInt(process.env.ALERT_JOB_MAX_ATTEMPTS) || 8
+});
+
+// Most severe of a list of severities
+const maxSeverity = (severities) => severities.reduce(
+  (max, severity) => (SEVERITY_ORDER.indexOf(severity) > SEVERITY_ORDER.indexOf(max) ? severity : max),
+  'low'
+);
+
+// Active caregivers of a senior, with any registered push tokens
+const resolveCaregivers = (db, seniorId) => db.collection('family_connections').aggregate([
+  {
+    $match: { senior_id: seniorId, status: 'active' }
+  },
+  {
+    $lookup: {
+      from: 'users',
+      localField: 'caregiver_id',
+      foreignField: 'id',
+      as: 'caregiver'
+    }
+  },
+  {
+    $unwind: '$caregiver'
+  },
+  {
+    $project: {
+      _id: 0,
+      id: '$caregiver.id',
+      first_name: '$caregiver.first_name',
+      last_name: '$caregiver.last_name',
+      email: '$caregiver.email',
+      device_tokens: { $ifNull: ['$caregiver.device_tokens', []] }
+    }
+  }
+]).toArray();
+
+// Job handler: store the alert, then notify the senior's caregivers.
+// Safe to re-run after a crash: the alert is keyed by a pre-assigned id and
+// caregivers already recorded in contacts_notified are skipped.
+const processVitalsAlert = async (db, { alert }) => {
+  const alerts = db.collection('emergency_alerts');
+
+  await alerts.updateOne(
+    { id: alert.id },
+    {
+      $setOnInsert: {
+        ...alert,
+        created_at: new Date(alert.created_at),
+        status: 'active',
+        contacts_notified: []
+      }
+    },
+    { upsert: true }
+  );
+
+  const [stored, senior, caregivers] = await Promise.all([
+    alerts.findOne({ id: alert.id }, { projection: { contacts_notified: 1 } }),
+    db.collection('users').findOne(
+      { id: alert.user_id },
+      { projection: { _id: 0, id: 1, first_name: 1, last_name: 1 } }
+    ),
+    resolveCaregivers(db, alert.user_id)
+  ]);
+
+  await caregiverFeed.publish(db, alert.user_id, {
+    type: 'vitals_abnormal',
+    title: alert.message,
+    severity: alert.severity,
+    data: { alert_id: alert.id, senior_name: senior ? `${senior.first_name} ${senior.last_name}` : null },
+    dedupeKey: `alert:${alert.id}`,
+    occurredAt: new Date(alert.created_at),
+    caregiverIds: caregivers.map(caregiver => caregiver.id)
+  });
+
+  const alreadyNotified = new Set((stored.contacts_notified || []).map(contact => contact.id));
+  const pending = caregivers.filter(caregiver => !alreadyNotified.has(caregiver.id));
+
+  if (pending.length === 0) {
+    if (caregivers.length === 0) {
+      logger.warn(`Vitals alert ${alert.id} created but no caregivers found for user ${alert.user_id}`);
+    }
+    return;
+  }
+
+  const tokens = pending.flatMap(caregiver => caregiver.device_tokens);
+  if (tokens.length > 0 && isFirebaseInitialized() && senior) {
+    await emergencyNotifications.sendEmergencyAlert(tokens, senior, alert.alert_type, alert.message);
+  } else {
+    logger.info(`Would send vitals alert ${alert.id} to ${pending.length} caregivers for user ${alert.user_id}`);
+  }
+
+  const notifiedAt = new Date().toISOString();
+  await alerts.updateOne(
+    { id: alert.id },
+    {
+      $push: {
+        contacts_notified: {
+          $each: pending.map(caregiver => ({
+            id: caregiver.id,
+            type: 'caregiver',
+            name: `${caregiver.first_name} ${caregiver.last_name}`.trim(),
+            notified_at: notifiedAt
+          }))
+        }
+      }
+    }
+  );
+};
+
+const alertPipeline = {
+  SEVERITY_PRIORITY,
+  queue: alertQueue,
+
+  // Queue an alert for one abnormal reading. Returns the alert id the
+  // worker will create, so callers can report it straight away.
+  async enqueueReadingAlert(db, reading, { severity, message }) {
+    const alertId = uuidv4();
+
+    await alertQueue.enqueue(db, [{
+      type: 'vitals_abnormal',
+      priority: SEVERITY_PRIORITY[severity] || 0,
+      dedupeKey: `vitals_abnormal:${reading.id}`,
+      payload: {
+        alert: {
+          id: alertId,
+          user_id: reading.user_id,
+          alert_type: 'vitals_abnormal',
+          severity,
+          message,
+          vitals_data: reading,
+          created_at: new Date()
+        }
+      }
+    }]);
+    alertQueue.poke();
+
+    return alertId;
+  },
+
+  // Queue a single summary alert for the abnormal readings of an import.
+  // Only the count and a sample of reading ids are carried, so the job and
+  // alert documents stay small however large the import was.
+  async enqueueImportAlert(db, userId, readingIds, { count, severities, message }) {
+    const alertId = uuidv4();
+    const severity = maxSeverity(severities);
+
+    await alertQueue.enqueue(db, [{
+      type: 'vitals_abnormal',
+      priority: SEVERITY_PRIORITY[severity] || 0,
+      payload: {
+        alert: {
+          id: alertId,
+          user_id: userId,
+          alert_type: 'vitals_abnormal',
+          severity,
+          message,
+          vitals_data: {
+            abnormal_count: count,
+            reading_ids: readingIds,
+            reading_ids_truncated: count > readingIds.length
+          },
+          created_at: new Date()
+        }
+      }
+    }]);
+    alertQueue.poke();
+
+    return alertId;
+  },
+
+  start(getDB) {
+    alertQueue.start(getDB, { vitals_abnormal: processVitalsAlert }, {
+      concurrency: parseInt(process.env.ALERT_WORKER_CONCURRENCY) || 4,
+      pollIntervalMs: parseInt(process.env.ALERT_WORKER_POLL_MS) || 1000
+    });
+  },
+
+  stop() {
+    return alertQueue.stop();
+  }
+};
+
+module.exports = { alertPipeline };
@@ -0,0 +1,160 @@
+const cron = require('node-cron');
+const { v4: uuidv4 } = require('uuid');
+const { logger } = require('../utils/logger');
+const { applyCursor, buildCursorPage } = require('../utils/pagination');
+
+// Per-caregiver activity feed, written on fan-out.
+// When something happens to a senior (check-in, abnormal vitals, missed
+// medication, emergency alert) one `caregiver_feed` entry is written for
+// each of their active caregivers, so reading a caregiver's feed is an
+// indexed range scan on (caregiver_id, created_at) however many seniors
+// they follow. Entries expire after CAREGIVER_FEED_TTL_DAYS, and an hourly
+// job trims every feed to CAREGIVER_FEED_MAX_ITEMS.
+const COLLECTION = 'caregiver_feed';
+
+const TTL_DAYS = parseInt(process.env.CAREGIVER_FEED_TTL_DAYS) || 30;
+const MAX_ITEMS = parseInt(process.env.CAREGIVER_FEED_MAX_ITEMS) || 500;
+
+const FEED_TYPES = ['checkin', 'vitals_abnormal', 'medication_missed', 'emergency_alert'];
+
+let trimTask = null;
+
+const caregiverIdsFor = async (db, seniorId) => {
+  const connections = await db.collection('family_connections')
+    .find({ senior_id: seniorId, status: 'active' }, { projection: { _id: 0, caregiver_id: 1 } })
+    .toArray();
+  return connections.map(connection => connection.caregiver_id);
+};
+
+// Delete everything past the newest MAX_ITEMS entries of one feed
+const trimFeed = async (db, caregiverId) => {
+  const [boundary] = await db.collection(COLLECTION)
+    .find({ caregiver_id: caregiverId }, { projection: { _id: 0, created_at: 1, id: 1 } })
+    .sort({ created_at: -1, id: -1 })
+    .skip(MAX_ITEMS - 1)
+    .limit(1)
+    .toArray();
+
+  if (!boundary) {
+    return 0;
+  }
+
+  const result = await db.collection(COLLECTION).deleteMany({
+    caregiver_id: caregiverId,
+    $or: [
+      { created_at: { $lt: boundary.created_at } },
+      { created_at: boundary.created_at, id: { $lt: boundary.id } }
+    ]
+  });
+  return result.deletedCount;
+};
+
+const caregiverFeed = {
+  COLLECTION,
+  FEED_TYPES,
+
+  // Fan an event about a senior out to their caregivers' feeds. With a
+  // dedupeKey, publishing the same event again updates the existing
+  // entries instead of adding new ones (check-in edits, job retries).
+  // Callers that already resolved the caregivers can pass caregiverIds.
+  async publish(db, seniorId, {
+    type, title, severity = null, data = {}, dedupeKey = null, occurredAt = new Date(), caregiverIds
+  }) {
+    try {
+      caregiverIds = caregiverIds || await caregiverIdsFor(db, seniorId);
+      if (caregiverIds.length === 0) {
+        return 0;
+      }
+
+      const entry = {
+        senior_id: seniorId,
+        type,
+        title,
+        severity,
+        data,
+        updated_at: new Date()
+      };
+
+      const operations = caregiverIds.map(caregiverId => {
+        const insert = {
+          id: uuidv4(),
+          caregiver_id: caregiverId,
+          created_at: occurredAt,
+          expires_at: new Date(occurredAt.getTime() + TTL_DAYS * 24 * 60 * 60 * 1000)
+        };
+
+        if (!dedupeKey) {
+          return { insertOne: { document: { ...insert, ...entry } } };
+        }
+
+        return {
+          updateOne: {
+            filter: { caregiver_id: caregiverId, dedupe_key: dedupeKey },
+            update: { $set: entry, $setOnInsert: { ...insert, dedupe_key: dedupeKey } },
+            upsert: true
+          }
+        };
+      });
+
+      await db.collection(COLLECTION).bulkWrite(operations, { ordered: false });
+      return caregiverIds.length;
+    } catch (error) {
+      logger.error(`Failed to publish ${type} feed entry for senior ${seniorId}:`, error);
+      return 0;
+    }
+  },
+
+  // One page of a caregiver's feed, newest first
+  async page(db, caregiverId, { cursor, limit, seniorId, type } = {}) {
+    const filter = { caregiver_id: caregiverId };
+    if (seniorId) filter.senior_id = seniorId;
+    if (type) filter.type = type;
+
+    const fetched = await db.collection(COLLECTION)
+      .find(applyCursor(filter, cursor, 'created_at'), {
+        projection: { _id: 0, caregiver_id: 0, dedupe_key: 0, expires_at: 0 }
+      })
+      .sort({ created_at: -1, id: -1 })
+      .limit(limit + 1)
+      .toArray();
+
+    return buildCursorPage(fetched, limit, 'created_at');
+  },
+
+  // Trim feeds that have grown past MAX_ITEMS
+  async trim(db) {
+    const oversized = await db.collection(COLLECTION).aggregate([
+      { $group: { _id: '$caregiver_id', count: { $sum: 1 } } },
+      { $match: { count: { $gt: MAX_ITEMS } } }
+    ]).toArray();
+
+    let deleted = 0;
+    for (const { _id: caregiverId } of oversized) {
+      deleted += await trimFeed(db, caregiverId);
+    }
+
+    if (deleted > 0) {
+      logger.info(`Trimmed ${deleted} caregiver feed entries across ${oversized.length} feeds`);
+    }
+    return deleted;
+  },
+
+  start(getDB) {
+    if (trimTask) {
+      return;
+    }
+
+    trimTask = cron.schedule('17 * * * *', () => {
+      caregiverFeed.trim(getDB()).catch(error => logger.error('Caregiver feed trim failed:', error));
+    });
+  },
+
+  stop() {
+    if (trimTask) {
+      trimTask.stop();
+      trimTask = null;
+    }
+  }
+};
+
+module.exports = { caregiverFeed };
@@ -0,0 +1,220 @@
+const { logger } = require('../utils/logger');
+const { addDays, localDate, resolveTimeZone, periodStart, nextPeriodStart } = require('../utils/time');
+
+// Check-in analytics computed by the database.
+// Averages and trends are built from mergeable partials (per-metric sum and
+// count, plus medication and social day counts) grouped by day, week or
+// month. Daily partials are grouped straight from `daily_checkins`; weekly
+// and monthly partials are kept in `checkin_rollups` and recounted from the
+// handful of check-ins in the period whenever one of them is written, so a
+// year of weekly analytics reads about 52 rollup rows. Periods cut by the
+// edges of a window are grouped from the check-ins themselves.
+const COLLECTION = 'checkin_rollups';
+
+const BUCKETS = ['day', 'week', 'month'];
+const ROLLUP_UNITS = ['week', 'month'];
+const MAX_DAYS = 365;
+
+// Averaged check-in fields, by the name used in responses
+const METRICS = {
+  mood: 'mood_rating',
+  energy: 'energy_level',
+  pain: 'pain_level',
+  sleep: 'sleep_quality',
+  appetite: 'appetite_rating',
+  hydration: 'hydration_glasses',
+  exercise: 'exercise_minutes'
+};
+
+const isSet = (field) => ({ $cond: [{ $ne: [{ $ifNull: [`$${field}`, null] }, null] }, 1, 0] });
+
+const PARTIAL_FIELDS = {
+  count: { $sum: 1 },
+  medications_taken: { $sum: { $cond: ['$medications_taken', 1, 0] } },
+  social_interaction: { $sum: { $cond: ['$social_interaction', 1, 0] } }
+};
+for (const [name, field] of Object.entries(METRICS)) {
+  PARTIAL_FIELDS[`${name}_sum`] = { $sum: `$${field}` };
+  PARTIAL_FIELDS[`${name}_count`] = { $sum: isSet(field) };
+}
+
+const emptyPartial = () => {
+  const partial = { count: 0, medications_taken: 0, social_interaction: 0, metrics: {} };
+  for (const name of Object.keys(METRICS)) {
+    partial.metrics[name] = { sum: 0, count: 0 };
+  }
+  return partial;
+};
+
+// Partial from a $group result
+const toPartial = (group) => {
+  const partial = emptyPartial();
+  if (!group) {
+    return partial;
+  }
+  partial.count = group.count;
+  partial.medications_taken = group.medications_taken;
+  partial.social_interaction = group.social_interaction;
+  for (const name of Object.keys(METRICS)) {
+    partial.metrics[name] = { sum: group[`${name}_sum`], count: group[`${name}_count`] };
+  }
+  return partial;
+};
+
+const mergePartials = (partials) => {
+  const total = emptyPartial();
+  for (const partial of partials) {
+    total.count += partial.count;
+    total.medications_taken += partial.medications_taken;
+    total.social_interaction += partial.social_interaction;
+    for (const [name, metric] of Object.entries(partial.metrics)) {
+      total.metrics[name].sum += metric.sum;
+      total.metrics[name].count += metric.count;
+    }
+  }
+  return total;
+};
+
+const average = ({ sum, count }, digits = 1) => (
+  count > 0 ? parseFloat((sum / count).toFixed(digits)) : null
+);
+
+// Check-in partials for dates in [fromDate, toDate), grouped by groupId
+const groupCheckIns = (db, userId, fromDate, toDate, groupId) => db.collection('daily_checkins').aggregate([
+  { $match: { user_id: userId, check_date: { $gte: fromDate, $lt: toDate } } },
+  { $group: { _id: groupId, ...PARTIAL_FIELDS } },
+  { $sort: { _id: 1 } }
+]).toArray();
+
+// One partial for a date range, keyed by the period it belongs to
+const rangePartial = async (db, userId, fromDate, toDate, date) => {
+  if (fromDate >= toDate) {
+    return null;
+  }
+  const [group] = await groupCheckIns(db, userId, fromDate, toDate, null);
+  return group ? { date, partial: toPartial(group) } : null;
+};
+
+// Period partials covering [fromDate, toDate) for a rollup unit
+const periodPartials = async (db, userId, fromDate, toDate, unit) => {
+  const headStart = periodStart(fromDate, unit);
+  const firstFull = headStart === fromDate ? fromDate : nextPeriodStart(headStart, unit);
+  const tailStart = periodStart(toDate, unit);
+
+  const pieces = [rangePartial(db, userId, fromDate, firstFull < toDate ? firstFull : toDate, headStart)];
+  if (firstFull < toDate) {
+    pieces.push(
+      db.collection(COLLECTION)
+        .find({ user_id: userId, unit, bucket_start: { $gte: firstFull, $lt: tailStart }, count: { $gt: 0 } })
+        .sort({ bucket_start: 1 })
+        .toArray()
+        .then(rollups => rollups.map(rollup => ({ date: rollup.bucket_start, partial: rollup }))),
+      rangePartial(db, userId, tailStart > firstFull ? tailStart : firstFull, toDate, tailStart)
+    );
+  }
+
+  return (await Promise.all(pieces)).flat().filter(Boolean);
+};
+
+const checkinAnalytics = {
+  COLLECTION,
+  BUCKETS,
+
+  // Window and bucket from request query parameters, ending today in the
+  // user's time zone
+  windowFromQuery(query, timeZone, defaultDays) {
+    const days = Math.min(Math.max(parseInt(query.days) || defaultDays, 1), MAX_DAYS);
+    const toDate = localDate(new Date(), resolveTimeZone(timeZone));
+
+    return {
+      fromDate: addDays(toDate, -days),
+      toDate,
+      bucket: BUCKETS.includes(query.bucket) ? query.bucket : 'day'
+    };
+  },
+
+  // Recount the weekly and monthly rollups containing these dates
+  async refresh(db, userId, dates) {
+    const periods = new Map();
+    for (const date of dates) {
+      for (const unit of ROLLUP_UNITS) {
+        const start = periodStart(date, unit);
+        periods.set(`${unit}|${start}`, { unit, start });
+      }
+    }
+    if (periods.size === 0) {
+      return;
+    }
+
+    const countedAt = new Date();
+    const operations = await Promise.all([...periods.values()].map(async ({ unit, start }) => {
+      const [group] = await groupCheckIns(db, userId, start, nextPeriodStart(start, unit), null);
+      return {
+        updateOne: {
+          filter: { user_id: userId, unit, bucket_start: start, counted_at: { $not: { $gt: countedAt } } },
+          update: { $set: { ...toPartial(group), counted_at: countedAt, updated_at: new Date() } },
+          upsert: true
+        }
+      };
+    }));
+
+    try {
+      await db.collection(COLLECTION).bulkWrite(operations, { ordered: false });
+    } catch (error) {
+      // A newer recount won the row; the upsert then collides on the key
+      const writeErrors = error.writeErrors || [];
+      if (writeErrors.length === 0 || !writeErrors.every(e => e.code === 11000)) {
+        throw error;
+      }
+    }
+  },
+
+  // Rebuild every rollup for a user from their check-ins (backfill/repair)
+  async rebuildUser(db, userId) {
+    const dates = await db.collection('daily_checkins').distinct('check_date', { user_id: userId });
+
+    await db.collection(COLLECTION).deleteMany({ user_id: userId });
+    await checkinAnalytics.refresh(db, userId, dates);
+
+    logger.info(`Check-in rollups rebuilt for user ${userId}`);
+  },
+
+  // Averages, totals and per-bucket trends for check-ins from fromDate
+  // through toDate (local dates, inclusive)
+  async summary(db, userId, { fromDate, toDate, bucket = 'day' }) {
+    const endDate = addDays(toDate, 1);
+
+    const buckets = bucket === 'day'
+      ? (await groupCheckIns(db, userId, fromDate, endDate, '$check_date'))
+        .map(group => ({ date: group._id, partial: toPartial(group) }))
+      : await periodPartials(db, userId, fromDate, endDate, bucket);
+
+    const totals = mergePartials(buckets.map(({ partial }) => partial));
+
+    const averages = {};
+    const trends = {};
+    for (const name of Object.keys(METRICS)) {
+      averages[name] = average(totals.metrics[name], name === 'exercise' ? 0 : 1);
+      trends[name] = buckets.map(({ date, partial }) => ({
+        date,
+        value: average(partial.metrics[name]),
+        checkIns: partial.count
+      }));
+    }
+
+    return {
+      bucket,
+      fromDate,
+      toDate,
+      totalCheckIns: totals.count,
+      averages,
+      trends,
+      medicationCompliance: totals.count > 0
+        ? parseFloat(((totals.medications_taken / totals.count) * 100).toFixed(1))
+        : 0,
+      socialInteractionDays: totals.social_interaction
+    };
+  }
+};
+
+module.exports = { checkinAnalytics };
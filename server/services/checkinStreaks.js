@@ -0,0 +1,132 @@
+const { addDays, localDate, resolveTimeZone } = require('../utils/time');
+
+// Check-in streaks, maintained as check-ins are written.
+// One `checkin_streaks` document per user holds the run of consecutive
+// check-in days ending at `last_date`, the longest run ever and the total
+// number of check-in days, all in the user's local dates. A new day's
+// check-in extends or restarts the run with one atomic update, so reading
+// a streak is a single keyed lookup however long the history. Anything
+// that cannot be applied in order (a deleted or back-dated check-in)
+// falls back to recomputing the user's document from their check-ins.
+const COLLECTION = 'checkin_streaks';
+
+// Streak state from check-in dates in ascending order
+const computeStreaks = (dates) => {
+  const state = { current: 0, current_start: null, longest: 0, total: 0, last_date: null };
+
+  for (const date of dates) {
+    if (date === state.last_date) {
+      continue;
+    }
+    if (state.last_date && addDays(state.last_date, 1) === date) {
+      state.current++;
+    } else {
+      state.current = 1;
+      state.current_start = date;
+    }
+    state.longest = Math.max(state.longest, state.current);
+    state.total++;
+    state.last_date = date;
+  }
+
+  return state;
+};
+
+// Streak summary of a stored state as of today in the user's time zone.
+// The run stays alive until a full local day passes without a check-in.
+const summarize = (state, timeZone) => {
+  if (!state) {
+    return { currentStreak: 0, longestStreak: 0, totalCheckIns: 0, lastCheckIn: null };
+  }
+
+  const today = localDate(new Date(), resolveTimeZone(timeZone || state.timezone));
+  const alive = state.last_date === today || state.last_date === addDays(today, -1);
+
+  return {
+    currentStreak: alive ? state.current : 0,
+    longestStreak: state.longest,
+    totalCheckIns: state.total,
+    lastCheckIn: state.last_date
+  };
+};
+
+const checkinStreaks = {
+  COLLECTION,
+  computeStreaks,
+  summarize,
+
+  // Apply a check-in on a new local date, after it has been stored.
+  // Re-applying a date already counted changes nothing, so retried requests
+  // are safe.
+  async record(db, userId, date, timeZone) {
+    const continues = { $eq: ['$last_date', addDays(date, -1)] };
+
+    try {
+      const result = await db.collection(COLLECTION).updateOne(
+        { user_id: userId, $or: [{ last_date: { $lt: date } }, { last_date: null }] },
+        [
+          {
+            $set: {
+              user_id: userId,
+              timezone: timeZone || null,
+              current: { $cond: [continues, { $add: ['$current', 1] }, 1] },
+              current_start: { $cond: [continues, '$current_start', date] },
+              total: { $add: [{ $ifNull: ['$total', 0] }, 1] },
+              last_date: date,
+              updated_at: '$$NOW'
+            }
+          },
+          { $set: { longest: { $max: [{ $ifNull: ['$longest', 0] }, '$current'] } } }
+        ],
+        { upsert: true }
+      );
+      // First document for this user: they may have check-ins from before
+      // streaks were maintained, so count those too
+      if (result.upsertedId) {
+        await checkinStreaks.rebuild(db, userId, timeZone);
+      }
+    } catch (error) {
+      if (error.code !== 11000) {
+        throw error;
+      }
+      // The document is already at or past this date
+      const existing = await db.collection(COLLECTION).findOne({ user_id: userId }, { projection: { last_date: 1 } });
+      if (existing && existing.last_date !== date) {
+        await checkinStreaks.rebuild(db, userId, timeZone);
+      }
+    }
+  },
+
+  // Recompute a user's streaks from all of their check-ins
+  async rebuild(db, userId, timeZone) {
+    const cursor = db.collection('daily_checkins')
+      .find({ user_id: userId }, { projection: { _id: 0, check_date: 1 } })
+      .sort({ check_date: 1 });
+
+    const dates = [];
+    for await (const checkIn of cursor) {
+      dates.push(checkIn.check_date);
+    }
+
+    const state = computeStreaks(dates);
+    await db.collection(COLLECTION).updateOne(
+      { user_id: userId },
+      { $set: { ...state, timezone: timeZone || null, updated_at: new Date() } },
+      { upsert: true }
+    );
+    return state;
+  },
+
+  // Stored streak state, computed first for users from before streaks
+  // were maintained
+  async load(db, userId, timeZone) {
+    const state = await db.collection(COLLECTION).findOne({ user_id: userId }, { projection: { _id: 0 } });
+    return state || checkinStreaks.rebuild(db, userId, timeZone);
+  },
+
+  async get(db, userId, timeZone) {
+    return summarize(await checkinStreaks.load(db, userId, timeZone), timeZone);
+  }
+};
+
+module.exports = { checkinStreaks };
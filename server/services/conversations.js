@@ -0,0 +1,239 @@
+const { v4: uuidv4 } = require('uuid');
+const { runTransaction } = require('../config/database');
+const { messageSearch } = require('./messageSearch');
+
+// Messages and their per-conversation summaries.
+// Each conversation has one `conversation_summaries` document holding its
+// participants, a preview of the latest visible message, that message's
+// time and an unread count per participant. Every write that changes one
+// of those (sending, reading, deleting) updates the message and the summary
+// in one transaction, so the inbox is a range scan over a user's summaries
+// by last message time and never touches message history. The search index
+// (see messageSearch.js) is kept in the same transactions.
+const COLLECTION = 'conversation_summaries';
+
+const PREVIEW_LENGTH = 140;
+
+// Conversation id shared by both directions
+const conversationIdFor = (userId, otherUserId) => [userId, otherUserId].sort().join('-');
+
+// Summary of a message as shown in the inbox. Encrypted text is not copied
+// out of the message.
+const lastMessageOf = (message) => ({
+  id: message.id,
+  sender_id: message.sender_id,
+  message_type: message.message_type,
+  preview: message.is_encrypted || !message.message_text
+    ? null
+    : message.message_text.slice(0, PREVIEW_LENGTH),
+  created_at: message.created_at
+});
+
+const isVisible = (message) => !message.deleted_by_sender && !message.deleted_by_recipient;
+
+// Fold a new message into its conversation's summary
+const summaryWrites = (message) => [
+  {
+    updateOne: {
+      filter: { id: message.conversation_id },
+      update: {
+        $setOnInsert: {
+          participants: [message.sender_id, message.recipient_id].sort(),
+          created_at: message.created_at
+        },
+        $max: { last_message_at: message.created_at },
+        $inc: { [`unread.${message.recipient_id}`]: 1 }
+      },
+      upsert: true
+    }
+  },
+  {
+    // Messages written out of order leave the newer preview alone
+    updateOne: {
+      filter: { id: message.conversation_id, 'last_message.created_at': { $not: { $gt: message.created_at } } },
+      update: { $set: { last_message: lastMessageOf(message), updated_at: new Date() } }
+    }
+  }
+];
+
+const conversations = {
+  COLLECTION,
+  conversationIdFor,
+
+  // A new, unread message document
+  newMessage({
+    sender_id, recipient_id, message_text = null, voice_message_url = null, attachments = [],
+    message_type = 'text', reply_to_id = null, is_encrypted = false, created_at = new Date()
+  }) {
+    return {
+      id: uuidv4(),
+      conversation_id: conversationIdFor(sender_id, recipient_id),
+      sender_id,
+      recipient_id,
+      message_text,
+      voice_message_url,
+      attachments,
+      message_type,
+      reply_to_id,
+      is_encrypted,
+      is_read: false,
+      read_at: null,
+      deleted_by_sender: false,
+      deleted_by_recipient: false,
+      created_at
+    };
+  },
+
+  // Insert messages and update their conversations
+  async send(db, messages) {
+    await runTransaction(async (session) => {
+      await db.collection('messages').insertMany(messages, { session });
+      await db.collection(COLLECTION).bulkWrite(messages.flatMap(summaryWrites), { session });
+      await messageSearch.indexMessages(db, messages, session);
+    });
+  },
+
+  // Mark one message read by its recipient. False if there was no such
+  // unread message.
+  async markRead(db, messageId, userId) {
+    return runTransaction(async (session) => {
+      const message = await db.collection('messages').findOneAndUpdate(
+        { id: messageId, recipient_id: userId, is_read: false },
+        { $set: { is_read: true, read_at: new Date() } },
+        { session, projection: { _id: 0, conversation_id: 1, deleted_by_sender: 1, deleted_by_recipient: 1 } }
+      );
+      if (!message) {
+        return false;
+      }
+
+      // Deleted messages were already taken off the count
+      if (isVisible(message)) {
+        await db.collection(COLLECTION).updateOne(
+          { id: message.conversation_id },
+          { $inc: { [`unread.${userId}`]: -1 } },
+          { session }
+        );
+      }
+      return true;
+    });
+  },
+
+  // Mark everything the other user sent in a conversation read. Returns the
+  // number of messages marked.
+  async markConversationRead(db, userId, otherUserId) {
+    return runTransaction(async (session) => {
+      const result = await db.collection('messages').updateMany(
+        { sender_id: otherUserId, recipient_id: userId, is_read: false },
+        { $set: { is_read: true, read_at: new Date() } },
+        { session }
+      );
+
+      if (result.modifiedCount > 0) {
+        await db.collection(COLLECTION).updateOne(
+          { id: conversationIdFor(userId, otherUserId) },
+          { $set: { [`unread.${userId}`]: 0 } },
+          { session }
+        );
+      }
+      return result.modifiedCount;
+    });
+  },
+
+  // Delete a message for one of its participants, which hides it from the
+  // conversation. Returns the message as it was, or null if not found.
+  async remove(db, messageId, userId) {
+    return runTransaction(async (session) => {
+      const message = await db.collection('messages').findOneAndUpdate(
+        { id: messageId, $or: [{ sender_id: userId }, { recipient_id: userId }] },
+        [{
+          $set: {
+            deleted_by_sender: { $or: ['$deleted_by_sender', { $eq: ['$sender_id', userId] }] },
+            deleted_by_recipient: { $or: ['$deleted_by_recipient', { $eq: ['$recipient_id', userId] }] }
+          }
+        }],
+        {
+          session,
+          projection: {
+            _id: 0, id: 1, conversation_id: 1, recipient_id: 1, is_read: 1,
+            deleted_by_sender: 1, deleted_by_recipient: 1
+          }
+        }
+      );
+
+      if (!message || !isVisible(message)) {
+        return message;
+      }
+
+      await messageSearch.removeMessage(db, message.id, session);
+
+      const summaries = db.collection(COLLECTION);
+      const summary = await summaries.findOne(
+        { id: message.conversation_id },
+        { session, projection: { _id: 0, 'last_message.id': 1 } }
+      );
+
+      const update = {};
+      if (!message.is_read) {
+        update.$inc = { [`unread.${message.recipient_id}`]: -1 };
+      }
+
+      // The preview moves back to the latest message still visible
+      if (summary?.last_message?.id === message.id) {
+        const [latest] = await db.collection('messages')
+          .find(
+            { conversation_id: message.conversation_id, deleted_by_sender: false, deleted_by_recipient: false },
+            { session }
+          )
+          .sort({ created_at: -1 })
+          .limit(1)
+          .toArray();
+
+        if (!latest) {
+          await summaries.deleteOne({ id: message.conversation_id }, { session });
+          return message;
+        }
+        update.$set = { last_message: lastMessageOf(latest), last_message_at: latest.created_at, updated_at: new Date() };
+      }
+
+      if (Object.keys(update).length > 0) {
+        await summaries.updateOne({ id: message.conversation_id }, update, { session });
+      }
+      return message;
+    });
+  },
+
+  // Recompute a conversation's summary from its messages (backfill/repair)
+  async rebuild(db, conversationId) {
+    const visible = { conversation_id: conversationId, deleted_by_sender: false, deleted_by_recipient: false };
+
+    const [[latest], unreadCounts] = await Promise.all([
+      db.collection('messages').find(visible).sort({ created_at: -1 }).limit(1).toArray(),
+      db.collection('messages').aggregate([
+        { $match: { ...visible, is_read: false } },
+        { $group: { _id: '$recipient_id', count: { $sum: 1 } } }
+      ]).toArray()
+    ]);
+
+    if (!latest) {
+      await db.collection(COLLECTION).deleteOne({ id: conversationId });
+      return;
+    }
+
+    await db.collection(COLLECTION).updateOne(
+      { id: conversationId },
+      {
+        $set: {
+          participants: [latest.sender_id, latest.recipient_id].sort(),
+          last_message: lastMessageOf(latest),
+          last_message_at: latest.created_at,
+          unread: Object.fromEntries(unreadCounts.map(({ _id, count }) => [_id, count])),
+          updated_at: new Date()
+        },
+        $setOnInsert: { created_at: new Date() }
+      },
+      { upsert: true }
+    );
+  }
+};
+
+module.exports = { conversations };
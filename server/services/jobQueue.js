@@ -0,0 +1,241 @@
+const os = require('os');
+const { v4: uuidv4 } = require('uuid');
+const { logger } = require('../utils/logger');
+
+// Durable background job queue backed by a MongoDB collection.
+// Jobs survive restarts: a worker claims a job by atomically setting a lock
+// that expires, so work held by a crashed process is picked up again once
+// its lock lapses. Higher `priority` jobs are claimed first; failures are
+// retried with exponential backoff until max_attempts is reached.
+const DEFAULT_LOCK_MS = 60 * 1000;
+const DEFAULT_MAX_ATTEMPTS = 5;
+const DEFAULT_BACKOFF_MS = 5 * 1000;
+const MAX_BACKOFF_MS = 15 * 60 * 1000;
+
+class JobQueue {
+  constructor({
+    collection,
+    lockMs = DEFAULT_LOCK_MS,
+    maxAttempts = DEFAULT_MAX_ATTEMPTS,
+    backoffMs = DEFAULT_BACKOFF_MS
+  }) {
+    this.collection = collection;
+    this.lockMs = lockMs;
+    this.maxAttempts = maxAttempts;
+    this.backoffMs = backoffMs;
+    this.workerId = `${os.hostname()}:${process.pid}:${uuidv4().slice(0, 8)}`;
+    this.handlers = {};
+    this.running = false;
+    this.polling = false;
+    this.active = new Set();
+    this.timer = null;
+  }
+
+  // Persist jobs. Jobs whose dedupe_key is already queued are skipped, so
+  // retried requests do not produce duplicate work.
+  async enqueue(db, jobs) {
+    if (jobs.length === 0) {
+      return 0;
+    }
+
+    const now = new Date();
+    const docs = jobs.map(job => ({
+      id: uuidv4(),
+      type: job.type,
+      payload: job.payload,
+      priority: job.priority || 0,
+      ...(job.dedupeKey ? { dedupe_key: job.dedupeKey } : {}),
+      status: 'pending',
+      attempts: 0,
+      max_attempts: job.maxAttempts || this.maxAttempts,
+      run_at: job.runAt || now,
+      locked_until: null,
+      locked_by: null,
+      last_error: null,
+      created_at: now,
+      updated_at: now
+    }));
+
+    try {
+      const result = await db.collection(this.collection).insertMany(docs, { ordered: false });
+      return result.insertedCount;
+    } catch (error) {
+      const writeErrors = error.writeErrors || [];
+      if (writeErrors.length > 0 && writeErrors.every(e => e.code === 11000)) {
+        return docs.length - writeErrors.length;
+      }
+      throw error;
+    }
+  }
+
+  // Atomically take the highest-priority runnable job, or an abandoned one
+  // that still has attempts left
+  async claim(db) {
+    const now = new Date();
+
+    return db.collection(this.collection).findOneAndUpdate(
+      {
+        $or: [
+          { status: 'pending', run_at: { $lte: now } },
+          {
+            status: 'processing',
+            locked_until: { $lt: now },
+            $expr: { $lt: ['$attempts', '$max_attempts'] }
+          }
+        ]
+      },
+      {
+        $set: {
+          status: 'processing',
+          locked_by: this.workerId,
+          locked_until: new Date(now.getTime() + this.lockMs),
+          updated_at: now
+        },
+        $inc: { attempts: 1 }
+      },
+      { sort: { priority: -1, run_at: 1 }, returnDocument: 'after' }
+    );
+  }
+
+  // Fail abandoned jobs whose last attempt crashed or hung its worker, so
+  // they leave the queue instead of being reclaimed forever
+  async expireAbandoned(db) {
+    const now = new Date();
+    const result = await db.collection(this.collection).updateMany(
+      {
+        status: 'processing',
+        locked_until: { $lt: now },
+        $expr: { $gte: ['$attempts', '$max_attempts'] }
+      },
+      {
+        $set: {
+          status: 'failed',
+          locked_until: null,
+          last_error: 'Lock expired on the final attempt',
+          updated_at: now
+        }
+      }
+    );
+
+    if (result.modifiedCount > 0) {
+      logger.error(`${result.modifiedCount} ${this.collection} jobs failed permanently after their worker stopped responding`);
+    }
+    return result.modifiedCount;
+  }
+
+  async complete(db, job) {
+    await db.collection(this.collection).updateOne(
+      { id: job.id, locked_by: this.workerId },
+      {
+        $set: {
+          status: 'completed',
+          completed_at: new Date(),
+          locked_until: null,
+          updated_at: new Date()
+        }
+      }
+    );
+  }
+
+  async fail(db, job, error) {
+    const exhausted = job.attempts >= job.max_attempts;
+    const delay = Math.min(this.backoffMs * 2 ** (job.attempts - 1), MAX_BACKOFF_MS);
+
+    await db.collection(this.collection).updateOne(
+      { id: job.id, locked_by: this.workerId },
+      {
+        $set: {
+          status: exhausted ? 'failed' : 'pending',
+          run_at: new Date(Date.now() + delay),
+          locked_until: null,
+          last_error: error.message,
+          updated_at: new Date()
+        }
+      }
+    );
+
+    if (exhausted) {
+      logger.error(`Job ${job.id} (${job.type}) failed permanently after ${job.attempts} attempts:`, error);
+    } else {
+      logger.warn(`Job ${job.id} (${job.type}) failed, retrying in ${delay}ms: ${error.message}`);
+    }
+  }
+
+  // Run one claimed job through its handler
+  async process(db, job) {
+    const handler = this.handlers[job.type];
+    try {
+      if (!handler) {
+        throw new Error(`No handler registered for job type ${job.type}`);
+      }
+      await handler(db, job.payload, job);
+      await this.complete(db, job);
+    } catch (error) {
+      await this.fail(db, job, error);
+    }
+  }
+
+  // Start polling with up to `concurrency` jobs in flight
+  start(getDB, handlers, { concurrency = 4, pollIntervalMs = 1000 } = {}) {
+    if (this.running) {
+      return;
+    }
+
+    this.handlers = handlers;
+    this.running = true;
+
+    const tick = async () => {
+      this.timer = null;
+      if (this.polling) return;
+      this.polling = true;
+      try {
+        await this.expireAbandoned(getDB());
+        while (this.running && this.active.size < concurrency) {
+          const db = getDB();
+          const job = await this.claim(db);
+          if (!job) break;
+
+          const task = this.process(db, job).finally(() => {
+            this.active.delete(task);
+            this.poke();
+          });
+          this.active.add(task);
+        }
+      } catch (error) {
+        logger.error(`Job queue ${this.collection} poll failed:`, error);
+      } finally {
+        this.polling = false;
+      }
+      this.schedule(tick, pollIntervalMs);
+    };
+
+    this.tick = tick;
+    this.schedule(tick, 0);
+    logger.info(`Job queue ${this.collection} started (worker ${this.workerId}, concurrency ${concurrency})`);
+  }
+
+  schedule(tick, delay) {
+    if (this.running && !this.timer) {
+      this.timer = setTimeout(tick, delay);
+    }
+  }
+
+  // Check for work now instead of waiting for the next poll
+  poke() {
+    if (this.running && this.tick) {
+      clearTimeout(this.timer);
+      this.timer = null;
+      this.schedule(this.tick, 0);
+    }
+  }
+
+  // Stop claiming jobs and wait for in-flight ones to finish
+  async stop() {
+    this.running = false;
+    clearTimeout(this.timer);
+    this.timer = null;
+    await Promise.allSettled([...this.active]);
+  }
+}
+
+module.exports = { JobQueue };
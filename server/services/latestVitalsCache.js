@@ -0,0 +1,104 @@
+const { LRUCache } = require('../utils/lruCache');
+
+// Per-user cache of the latest reading for each vital type.
+// Entries are only ever populated from a full database load, and writes
+// merge newer readings into an existing entry. A user with no entry simply
+// misses and is reloaded, so the cache never serves a partial set of types.
+// The TTL bounds how stale another instance's cache can get.
+const cache = new LRUCache({
+  max: parseInt(process.env.LATEST_VITALS_CACHE_SIZE) || 10000,
+  ttlMs: parseInt(process.env.LATEST_VITALS_CACHE_TTL_MS) || 5 * 60 * 1000
+});
+
+// Shape a stored vitals document the way GET /api/vitals/latest returns it
+const formatLatestReading = (reading) => ({
+  id: reading.id,
+  value: reading.value,
+  unit: reading.unit,
+  deviceName: reading.device_name,
+  readingTime: reading.reading_time,
+  isAbnormal: reading.is_abnormal,
+  notes: reading.notes
+});
+
+// Latest reading for every vital type in one round-trip. The sort matches
+// the (user_id, reading_type, reading_time desc) index, so $group/$first
+// only has to touch the newest entry for each type.
+const loadLatestReadings = async (db, userId) => {
+  const latest = await db.collection('vitals').aggregate([
+    { $match: { user_id: userId } },
+    { $sort: { reading_type: 1, reading_time: -1 } },
+    {
+      $group: {
+        _id: '$reading_type',
+        id: { $first: '$id' },
+        value: { $first: '$value' },
+        unit: { $first: '$unit' },
+        device_name: { $first: '$device_name' },
+        reading_time: { $first: '$reading_time' },
+        is_abnormal: { $first: '$is_abnormal' },
+        notes: { $first: '$notes' }
+      }
+    }
+  ]).toArray();
+
+  const latestReadings = {};
+  for (const reading of latest) {
+    latestReadings[reading._id] = formatLatestReading(reading);
+  }
+  return latestReadings;
+};
+
+const latestVitalsCache = {
+  get(userId) {
+    return cache.get(userId);
+  },
+
+  // Cached latest-per-type map, loading it on a miss
+  async load(db, userId) {
+    const cached = cache.get(userId);
+    if (cached) {
+      return cached;
+    }
+
+    const latestReadings = await loadLatestReadings(db, userId);
+    cache.set(userId, latestReadings);
+    return latestReadings;
+  },
+
+  // Store the complete latest-per-type map loaded from the database
+  set(userId, latestReadings) {
+    cache.set(userId, latestReadings);
+  },
+
+  // Merge freshly written readings into a cached entry, if there is one
+  recordReadings(userId, readings) {
+    const latestReadings = cache.peek(userId);
+    if (!latestReadings) {
+      return;
+    }
+
+    const updated = { ...latestReadings };
+    for (const reading of readings) {
+      const current = updated[reading.reading_type];
+      if (!current || new Date(reading.reading_time) >= new Date(current.readingTime)) {
+        updated[reading.reading_type] = formatLatestReading(reading);
+      }
+    }
+
+    cache.set(userId, updated);
+  },
+
+  invalidate(userId) {
+    cache.delete(userId);
+  },
+
+  stats() {
+    return cache.stats();
+  }
+};
+
+module.exports = {
+  latestVitalsCache,
+  formatLatestReading
+};
@@ -0,0 +1,141 @@
+// Per-day medication adherence counters.
+// One `medication_adherence_daily` row per (medication, user-local date)
+// holds how many doses were scheduled, taken, skipped and missed. A row is
+// refreshed whenever one of its reminders is created, taken, skipped or
+// marked missed, by recounting that day's reminders (at most a handful)
+// and overwriting the row. Refreshing is idempotent, so retried or
+// concurrent writes cannot double count, and adherence for any window is a
+// sum over one row per medication per day. A recount that started before
+// the stored one does not overwrite it.
+const COLLECTION = 'medication_adherence_daily';
+
+const rowId = (medicationId, date) => `${medicationId}|${date}`;
+
+// A reminder counts once, in the first state that applies
+const STATUS_COUNTS = {
+  taken: { $cond: [{ $ne: [{ $ifNull: ['$taken_at', null] }, null] }, 1, 0] },
+  skipped: {
+    $cond: [{ $and: [{ $eq: [{ $ifNull: ['$taken_at', null] }, null] }, { $eq: ['$skipped', true] }] }, 1, 0]
+  },
+  missed: {
+    $cond: [{
+      $and: [
+        { $eq: [{ $ifNull: ['$taken_at', null] }, null] },
+        { $ne: ['$skipped', true] },
+        { $ne: [{ $ifNull: ['$missed_at', null] }, null] }
+      ]
+    }, 1, 0]
+  }
+};
+
+const medicationAdherence = {
+  COLLECTION,
+
+  // Recount the days touched by these reminders
+  async refresh(db, reminders) {
+    const days = new Map();
+    for (const reminder of reminders) {
+      if (reminder.local_date) {
+        days.set(rowId(reminder.medication_id, reminder.local_date), reminder);
+      }
+    }
+    if (days.size === 0) {
+      return 0;
+    }
+
+    const touched = [...days.values()];
+    const countedAt = new Date();
+    const counts = await db.collection('medication_reminders').aggregate([
+      {
+        $match: {
+          medication_id: { $in: [...new Set(touched.map(reminder => reminder.medication_id))] },
+          local_date: { $in: [...new Set(touched.map(reminder => reminder.local_date))] }
+        }
+      },
+      {
+        $group: {
+          _id: { medication_id: '$medication_id', local_date: '$local_date' },
+          user_id: { $first: '$user_id' },
+          scheduled: { $sum: 1 },
+          taken: { $sum: STATUS_COUNTS.taken },
+          skipped: { $sum: STATUS_COUNTS.skipped },
+          missed: { $sum: STATUS_COUNTS.missed }
+        }
+      }
+    ]).toArray();
+
+    const byId = new Map(counts.map(count => [rowId(count._id.medication_id, count._id.local_date), count]));
+    const operations = [...days].map(([_id, reminder]) => {
+      const count = byId.get(_id) || { scheduled: 0, taken: 0, skipped: 0, missed: 0 };
+      return {
+        updateOne: {
+          filter: { _id, counted_at: { $not: { $gt: countedAt } } },
+          update: {
+            $set: {
+              user_id: reminder.user_id,
+              medication_id: reminder.medication_id,
+              date: reminder.local_date,
+              scheduled: count.scheduled,
+              taken: count.taken,
+              skipped: count.skipped,
+              missed: count.missed,
+              counted_at: countedAt,
+              updated_at: new Date()
+            }
+          },
+          upsert: true
+        }
+      };
+    });
+
+    try {
+      await db.collection(COLLECTION).bulkWrite(operations, { ordered: false });
+    } catch (error) {
+      // A newer recount won the row; the upsert then collides on _id
+      const writeErrors = error.writeErrors || [];
+      if (writeErrors.length === 0 || !writeErrors.every(e => e.code === 11000)) {
+        throw error;
+      }
+    }
+    return operations.length;
+  },
+
+  // Totals for a user's medications from a local date onwards
+  async summary(db, userId, { fromDate, toDate, medicationIds } = {}) {
+    const match = { user_id: userId };
+    if (fromDate || toDate) {
+      match.date = {};
+      if (fromDate) match.date.$gte = fromDate;
+      if (toDate) match.date.$lte = toDate;
+    }
+    if (medicationIds) {
+      match.medication_id = { $in: medicationIds };
+    }
+
+    const [totals] = await db.collection(COLLECTION).aggregate([
+      { $match: match },
+      {
+        $group: {
+          _id: null,
+          scheduled: { $sum: '$scheduled' },
+          taken: { $sum: '$taken' },
+          skipped: { $sum: '$skipped' },
+          missed: { $sum: '$missed' }
+        }
+      }
+    ]).toArray();
+
+    const { scheduled = 0, taken = 0, skipped = 0, missed = 0 } = totals || {};
+    // Doses still ahead (or not yet overdue) do not count against adherence
+    const resolved = taken + skipped + missed;
+    return {
+      scheduled,
+      taken,
+      skipped,
+      missed,
+      adherenceRate: resolved > 0 ? parseFloat(((taken / resolved) * 100).toFixed(1)) : 0
+    };
+  }
+};
+
+module.exports = { medicationAdherence };
@@ -0,0 +1,286 @@
+const crypto = require('crypto');
+const cron = require('node-cron');
+const { v4: uuidv4 } = require('uuid');
+const { logger } = require('../utils/logger');
+const { resolveTimeZone, localDate, zonedTime, addDays, daysBetween } = require('../utils/time');
+const { medicationAdherence } = require('./medicationAdherence');
+
+// Medication reminder schedule.
+// The recurrence rule lives on the medication itself (frequency, times,
+// start/end date, time zone). Only a rolling window of occurrences - the
+// next MEDICATION_REMINDER_HORIZON_HOURS - is materialized as
+// `medication_reminders` rows, written with one bulk upsert keyed on
+// (medication_id, scheduled_time) so a retry never duplicates a reminder.
+// `reminders_through` on the medication records how far it has been
+// expanded; a background roller extends every active medication once less
+// than half the horizon is left. Editing the schedule bumps
+// `schedule_version` and replaces only future, still pending reminders.
+// Every change refreshes the affected days' adherence counters.
+const COLLECTION = 'medication_reminders';
+
+const HORIZON_HOURS = parseInt(process.env.MEDICATION_REMINDER_HORIZON_HOURS) || 48;
+const HORIZON_MS = HORIZON_HOURS * 60 * 60 * 1000;
+const ROLL_CRON = process.env.MEDICATION_SCHEDULE_CRON || '*/15 * * * *';
+const ROLL_BATCH_SIZE = 200;
+const WRITE_BATCH_SIZE = 1000;
+
+// Reminders are spread over a fixed number of shards by user id, so the
+// reminder dispatcher can split them between processes
+const REMINDER_SHARDS = 64;
+
+// Medication fields that change when reminders occur
+const SCHEDULE_FIELDS = ['frequency', 'times', 'start_date', 'end_date'];
+
+let rollTask = null;
+let rolling = null;
+
+const pendingFuture = (now) => ({
+  scheduled_time: { $gt: now },
+  taken_at: null,
+  skipped: false
+});
+
+const shardFor = (userId) => (
+  crypto.createHash('md5').update(String(userId)).digest().readUInt32BE(0) % REMINDER_SHARDS
+);
+
+const calendarDate = (value) => new Date(value).toISOString().split('T')[0];
+
+// Dose times of a medication in (from, to]
+const occurrences = (medication, from, to) => {
+  if (medication.frequency === 'as_needed' || !Array.isArray(medication.times)) {
+    return [];
+  }
+
+  const timeZone = resolveTimeZone(medication.timezone);
+  // Start and end dates are calendar dates, stored as UTC midnight
+  const startDate = calendarDate(medication.start_date || medication.created_at);
+  const endDate = medication.end_date ? calendarDate(medication.end_date) : null;
+
+  const results = [];
+  // A day either side covers zones far from UTC
+  const lastDay = addDays(localDate(to, timeZone), 1);
+  for (let day = addDays(localDate(from, timeZone), -1); day <= lastDay; day = addDays(day, 1)) {
+    if (day < startDate || (endDate && day > endDate)) {
+      continue;
+    }
+    if (medication.frequency === 'weekly' && daysBetween(startDate, day) % 7 !== 0) {
+      continue;
+    }
+
+    for (const time of medication.times) {
+      const at = zonedTime(day, time, timeZone);
+      if (at > from && at <= to) {
+        results.push(at);
+      }
+    }
+  }
+
+  return results.sort((a, b) => a - b);
+};
+
+// Delete future pending reminders, returning the days they were on
+const removePending = async (db, filter, now) => {
+  const query = { ...filter, ...pendingFuture(now) };
+  const removed = await db.collection(COLLECTION)
+    .find(query, { projection: { _id: 0, medication_id: 1, user_id: 1, local_date: 1 } })
+    .toArray();
+  if (removed.length > 0) {
+    await db.collection(COLLECTION).deleteMany(query);
+  }
+  return removed;
+};
+
+const writeInBatches = async (collection, operations) => {
+  for (let i = 0; i < operations.length; i += WRITE_BATCH_SIZE) {
+    await collection.bulkWrite(operations.slice(i, i + WRITE_BATCH_SIZE), { ordered: false });
+  }
+};
+
+// Materialize reminders up to now + HORIZON for a set of medications
+const extendMany = async (db, medications, now = new Date()) => {
+  const until = new Date(now.getTime() + HORIZON_MS);
+  const reminderOps = [];
+  const horizonOps = [];
+  const touched = [];
+
+  for (const medication of medications) {
+    const from = new Date(Math.max(now.getTime(), medication.reminders_through?.getTime() || 0));
+    const version = medication.schedule_version || 0;
+    const timeZone = resolveTimeZone(medication.timezone);
+
+    for (const scheduledTime of occurrences(medication, from, until)) {
+      const day = localDate(scheduledTime, timeZone);
+      touched.push({ medication_id: medication.id, user_id: medication.user_id, local_date: day });
+      reminderOps.push({
+        updateOne: {
+          filter: { medication_id: medication.id, scheduled_time: scheduledTime },
+          update: {
+            $setOnInsert: {
+              id: uuidv4(),
+              medication_id: medication.id,
+              user_id: medication.user_id,
+              shard: shardFor(medication.user_id),
+              scheduled_time: scheduledTime,
+              local_date: day,
+              schedule_version: version,
+              taken_at: null,
+              skipped: false,
+              confirmation_method: null,
+              photo_url: null,
+              notes: null,
+              notified_at: null,
+              missed_at: null,
+              created_at: now
+            }
+          },
+          upsert: true
+        }
+      });
+    }
+
+    horizonOps.push({
+      updateOne: {
+        filter: { id: medication.id, schedule_version: medication.schedule_version ?? null },
+        update: { $max: { reminders_through: until } }
+      }
+    });
+  }
+
+  if (horizonOps.length === 0) {
+    return 0;
+  }
+
+  await writeInBatches(db.collection(COLLECTION), reminderOps);
+  await writeInBatches(db.collection('medications'), horizonOps);
+
+  // A medication edited or stopped while we were writing keeps none of the
+  // reminders expanded from its old schedule
+  const current = await db.collection('medications')
+    .find(
+      { id: { $in: medications.map(medication => medication.id) } },
+      { projection: { _id: 0, id: 1, is_active: 1, schedule_version: 1 } }
+    )
+    .toArray();
+  const byId = new Map(current.map(medication => [medication.id, medication]));
+  const stale = medications.filter(medication => {
+    const latest = byId.get(medication.id);
+    return !latest || !latest.is_active || (latest.schedule_version ?? null) !== (medication.schedule_version ?? null);
+  });
+  for (const medication of stale) {
+    await removePending(db, { medication_id: medication.id, schedule_version: medication.schedule_version || 0 }, now);
+  }
+
+  await medicationAdherence.refresh(db, touched);
+  return reminderOps.length;
+};
+
+const medicationSchedule = {
+  COLLECTION,
+  HORIZON_HOURS,
+  SCHEDULE_FIELDS,
+  REMINDER_SHARDS,
+  shardFor,
+  occurrences,
+
+  // Materialize the upcoming reminders of one medication
+  async extend(db, medication, now = new Date()) {
+    if (!medication.is_active) {
+      return 0;
+    }
+    return extendMany(db, [medication], now);
+  },
+
+  // Replace the future pending reminders after a schedule change
+  async reschedule(db, medicationId, now = new Date()) {
+    const medication = await db.collection('medications').findOneAndUpdate(
+      { id: medicationId },
+      { $inc: { schedule_version: 1 }, $set: { reminders_through: now } },
+      { returnDocument: 'after', projection: { _id: 0 } }
+    );
+    if (!medication) {
+      return 0;
+    }
+
+    const removed = await removePending(db, { medication_id: medicationId }, now);
+    const created = await medicationSchedule.extend(db, medication, now);
+    await medicationAdherence.refresh(db, removed);
+    return created;
+  },
+
+  // Drop the future pending reminders of a stopped medication
+  async cancel(db, medicationId, now = new Date()) {
+    await db.collection('medications').updateOne(
+      { id: medicationId },
+      { $inc: { schedule_version: 1 }, $set: { reminders_through: null } }
+    );
+    const removed = await removePending(db, { medication_id: medicationId }, now);
+    await medicationAdherence.refresh(db, removed);
+    return removed.length;
+  },
+
+  // Extend every active medication with less than half the horizon left
+  async roll(db, now = new Date()) {
+    const threshold = new Date(now.getTime() + HORIZON_MS / 2);
+    const cursor = db.collection('medications').find(
+      {
+        is_active: true,
+        frequency: { $ne: 'as_needed' },
+        $or: [{ reminders_through: null }, { reminders_through: { $lt: threshold } }]
+      },
+      { projection: { _id: 0, id: 1, user_id: 1, frequency: 1, times: 1, start_date: 1, end_date: 1,
+        created_at: 1, timezone: 1, reminders_through: 1, schedule_version: 1 } }
+    );
+
+    let medications = 0;
+    let created = 0;
+    let batch = [];
+    for await (const medication of cursor) {
+      batch.push(medication);
+      if (batch.length === ROLL_BATCH_SIZE) {
+        created += await extendMany(db, batch, now);
+        medications += batch.length;
+        batch = [];
+      }
+    }
+    if (batch.length > 0) {
+      created += await extendMany(db, batch, now);
+      medications += batch.length;
+    }
+
+    if (medications > 0) {
+      logger.info(`Medication schedule rolled forward for ${medications} medications (${created} reminders)`);
+    }
+    return created;
+  },
+
+  start(getDB) {
+    if (rollTask) {
+      return;
+    }
+
+    const roll = () => {
+      if (rolling) {
+        return;
+      }
+      rolling = medicationSchedule.roll(getDB())
+        .catch(error => logger.error('Medication schedule roll failed:', error))
+        .finally(() => {
+          rolling = null;
+        });
+    };
+
+    rollTask = cron.schedule(ROLL_CRON, roll);
+    // Catch up on anything that lapsed while no instance was running
+    roll();
+  },
+
+  stop() {
+    if (rollTask) {
+      rollTask.stop();
+      rollTask = null;
+    }
+  }
+};
+
+module.exports = { medicationSchedule };
@@ -0,0 +1,140 @@
+// Inverted index for message search.
+// Every searchable message has one `message_search_terms` document per
+// participant holding the message's search terms: each word, lowercased and
+// stripped of accents, together with its prefixes from two characters up,
+// so typing the start of a word finds it. A search is an index range scan
+// over one user's documents containing the most selective query term,
+// newest first, that stops after RANK_WINDOW messages containing every
+// term, however long the user's history. Those candidates are ranked by
+// how many of their words match, newest first on ties. Encrypted messages
+// are not indexed.
+const COLLECTION = 'message_search_terms';
+
+const MIN_TERM_LENGTH = 2;
+const MAX_PREFIX_LENGTH = 15;
+const MAX_TERMS_PER_MESSAGE = 1000;
+const MAX_QUERY_TERMS = 8;
+const SNIPPET_LENGTH = 120;
+const RANK_WINDOW = parseInt(process.env.MESSAGE_SEARCH_RANK_WINDOW) || 500;
+
+const WORD = /[\p{L}\p{N}]+/gu;
+
+const normalize = (word) => word.normalize('NFKD').replace(/\p{M}/gu, '').toLowerCase();
+
+// Normalized words of a text, in order
+const words = (text) => (text || '').match(WORD)?.map(normalize) || [];
+
+// Index terms for a message text: every word prefix of a useful length
+const termsOf = (text) => {
+  const terms = new Set();
+  for (const word of words(text)) {
+    for (let length = MIN_TERM_LENGTH; length <= Math.min(word.length, MAX_PREFIX_LENGTH); length++) {
+      terms.add(word.slice(0, length));
+    }
+    if (terms.size >= MAX_TERMS_PER_MESSAGE) {
+      break;
+    }
+  }
+  return [...terms].slice(0, MAX_TERMS_PER_MESSAGE);
+};
+
+// Search terms for a query, most selective (longest) first
+const queryTerms = (query) => {
+  const terms = new Set(
+    words(query)
+      .filter(word => word.length >= MIN_TERM_LENGTH)
+      .map(word => word.slice(0, MAX_PREFIX_LENGTH))
+  );
+  return [...terms].sort((a, b) => b.length - a.length).slice(0, MAX_QUERY_TERMS);
+};
+
+const isSearchable = (message) => !message.is_encrypted && !!message.message_text;
+
+// A window of the message text around its first match, with the offsets of
+// every matching word inside the window, and how many words matched
+const highlight = (text, terms) => {
+  const matches = [];
+  for (const match of text.matchAll(WORD)) {
+    const word = normalize(match[0]);
+    if (terms.some(term => word.startsWith(term))) {
+      matches.push([match.index, match.index + match[0].length]);
+    }
+  }
+
+  const first = matches.length > 0 ? matches[0][0] : 0;
+  const start = Math.max(0, Math.min(first - Math.floor(SNIPPET_LENGTH / 3), text.length - SNIPPET_LENGTH));
+  const end = Math.min(text.length, start + SNIPPET_LENGTH);
+  const prefix = start > 0 ? '…' : '';
+
+  return {
+    snippet: `${prefix}${text.slice(start, end)}${end < text.length ? '…' : ''}`,
+    highlights: matches
+      .filter(([from, to]) => from >= start && to <= end)
+      .map(([from, to]) => [from - start + prefix.length, to - start + prefix.length]),
+    score: matches.length
+  };
+};
+
+// Sortable rank of a match: score first, then recency
+const rankKey = (score, createdAt) => `${String(score).padStart(6, '0')}|${new Date(createdAt).toISOString()}`;
+
+// Best ranked first, then by id, matching the (rank, id) cursor order
+const compareRanked = (a, b) => {
+  if (a.rank !== b.rank) return a.rank < b.rank ? 1 : -1;
+  if (a.id !== b.id) return a.id < b.id ? 1 : -1;
+  return 0;
+};
+
+const messageSearch = {
+  COLLECTION,
+  RANK_WINDOW,
+  rankKey,
+  compareRanked,
+  termsOf,
+  queryTerms,
+  highlight,
+
+  // Index new messages for their sender and recipient
+  async indexMessages(db, messages, session) {
+    const documents = [];
+    for (const message of messages.filter(isSearchable)) {
+      const terms = termsOf(message.message_text);
+      for (const userId of new Set([message.sender_id, message.recipient_id])) {
+        documents.push({
+          user_id: userId,
+          message_id: message.id,
+          conversation_id: message.conversation_id,
+          terms,
+          created_at: message.created_at
+        });
+      }
+    }
+
+    if (documents.length > 0) {
+      await db.collection(COLLECTION).insertMany(documents, { session });
+    }
+    return documents.length;
+  },
+
+  // Remove a message from every participant's index
+  async removeMessage(db, messageId, session) {
+    await db.collection(COLLECTION).deleteMany({ message_id: messageId }, { session });
+  },
+
+  // Index filter for a user's messages containing every term
+  filterFor(userId, terms) {
+    return { user_id: userId, terms: terms.length === 1 ? terms[0] : { $all: terms } };
+  },
+
+  // Rebuild the index for a batch of existing messages (backfill/repair)
+  async reindexMessages(db, messages) {
+    const ids = messages.map(message => message.id);
+    await db.collection(COLLECTION).deleteMany({ message_id: { $in: ids } });
+    return messageSearch.indexMessages(
+      db,
+      messages.filter(message => !message.deleted_by_sender && !message.deleted_by_recipient)
+    );
+  }
+};
+
+module.exports = { messageSearch };
@@ -0,0 +1,52 @@
+const { LRUCache } = require('../utils/lruCache');
+
+// Cache of authenticated principals (user document plus active family
+// connections) keyed by user id, so `authenticate` does not pay two
+// database round-trips on every request. Writes to a user's profile,
+// subscription or connections must call invalidate() for every user whose
+// principal they change; the short TTL bounds staleness across instances.
+// Set AUTH_CACHE_ENABLED=false to bypass the cache while debugging.
+const enabled = process.env.AUTH_CACHE_ENABLED !== 'false';
+
+const cache = new LRUCache({
+  max: parseInt(process.env.AUTH_CACHE_MAX) || 10000,
+  ttlMs: parseInt(process.env.AUTH_CACHE_TTL_MS) || 30 * 1000
+});
+
+// Callers may mutate req.user, so never hand out the cached object itself
+const clonePrincipal = (user) => ({
+  ...user,
+  family_connections: (user.family_connections || []).map(connection => ({ ...connection }))
+});
+
+const principalCache = {
+  enabled,
+
+  get(userId) {
+    if (!enabled) return undefined;
+    const user = cache.get(userId);
+    return user ? clonePrincipal(user) : undefined;
+  },
+
+  set(userId, user) {
+    if (!enabled) return;
+    cache.set(userId, clonePrincipal(user));
+  },
+
+  // Drop cached principals, e.g. both ends of a family connection
+  invalidate(...userIds) {
+    for (const userId of userIds) {
+      if (userId) cache.delete(userId);
+    }
+  },
+
+  clear() {
+    cache.clear();
+  },
+
+  stats() {
+    return { enabled, ...cache.stats() };
+  }
+};
+
+module.exports = { principalCache };
@@ -0,0 +1,391 @@
+const jwt = require('jsonwebtoken');
+const { v4: uuidv4 } = require('uuid');
+const { getDB } = require('../config/database');
+const { pubsubHelpers } = require('../config/redis');
+const { verifyToken, getUserFromDatabase } = require('../middleware/auth');
+const { logger } = require('../utils/logger');
+const { tokenRevocation } = require('./tokenRevocation');
+
+// Cluster-aware Socket.IO layer.
+// Sockets authenticate with their JWT at the handshake and are put in the
+// rooms their account entitles them to: their own user room and the family
+// room of every senior they are actively connected to. Broadcasts from
+// routes and sockets are queued and flushed every REALTIME_FLUSH_MS as one
+// pub/sub message that every instance delivers to its own sockets, so a
+// room reaches its members whichever instance they are connected to.
+// Queued events with the same coalesce key keep only the latest, and
+// urgent events (emergencies) flush on the next turn of the event loop
+// instead of waiting for the timer. Revoking a family connection or a
+// token is published on the same channel right away, and every instance
+// takes the affected rooms away from (or disconnects) its own sockets.
+// Without Redis the pub/sub channel is in-process, which is also what
+// tests run against.
+const CHANNEL = 'realtime:broadcast';
+
+const FLUSH_MS = parseInt(process.env.REALTIME_FLUSH_MS) || 25;
+const MAX_BATCH_EVENTS = parseInt(process.env.REALTIME_MAX_BATCH_EVENTS) || 500;
+// Minimum time between a socket's reloads of its user for join-room
+const ROOM_RELOAD_INTERVAL_MS = parseInt(process.env.REALTIME_ROOM_RELOAD_MS) || 5000;
+
+// Shape of the rooms a user can be entitled to
+const ROOM_PATTERN = /^(user|family)_[\w-]+$/;
+
+const userRoom = (userId) => `user_${userId}`;
+const familyRoom = (seniorId) => `family_${seniorId}`;
+
+// Rooms a user's sockets belong to
+const roomsFor = (user) => {
+  const rooms = new Set([userRoom(user.id)]);
+  if (user.role === 'senior') {
+    rooms.add(familyRoom(user.id));
+  }
+  for (const connection of user.family_connections || []) {
+    if (connection.status === 'active') {
+      rooms.add(familyRoom(connection.senior_id));
+    }
+  }
+  return rooms;
+};
+
+// Rooms a user's sockets may relay messages to: their own, plus the user
+// room of everyone they are connected to
+const sendableRoomsFor = (user) => {
+  const rooms = roomsFor(user);
+  for (const connection of user.family_connections || []) {
+    if (connection.status === 'active') {
+      rooms.add(userRoom(connection.senior_id));
+      rooms.add(userRoom(connection.caregiver_id));
+    }
+  }
+  return rooms;
+};
+
+const tokenFromHandshake = (handshake) => {
+  if (handshake.auth && handshake.auth.token) {
+    return handshake.auth.token;
+  }
+  const authorization = handshake.headers && handshake.headers.authorization;
+  if (authorization && authorization.startsWith('Bearer ')) {
+    return authorization.split(' ')[1];
+  }
+  return (handshake.query && handshake.query.token) || null;
+};
+
+// Default handshake check: a valid, unrevoked token for an active user
+const userForToken = async (token) => {
+  const decoded = verifyToken(token);
+  if (await tokenRevocation.isRevoked(getDB(), decoded, token)) {
+    return null;
+  }
+  const user = await getUserFromDatabase(decoded.userId);
+  return user && user.is_active ? user : null;
+};
+
+// A user with one family connection no longer active
+const withoutConnection = (user, { caregiverId, seniorId }) => ({
+  ...user,
+  family_connections: (user.family_connections || []).filter(connection => (
+    connection.caregiver_id !== caregiverId || connection.senior_id !== seniorId
+  ))
+});
+
+const chunk = (items, size) => {
+  const chunks = [];
+  for (let i = 0; i < items.length; i += size) {
+    chunks.push(items.slice(i, i + size));
+  }
+  return chunks;
+};
+
+const createRealtime = ({
+  pubsub = pubsubHelpers,
+  clock = { now: () => Date.now() },
+  flushMs = FLUSH_MS,
+  authenticate = userForToken,
+  loadUser = getUserFromDatabase
+} = {}) => {
+  const instanceId = uuidv4();
+  const counters = {
+    queued: 0, coalesced: 0, batches: 0, delivered: 0, received: 0, publishFailures: 0, maxLagMs: 0, revoked: 0
+  };
+
+  // Events waiting for the next flush, by coalesce key
+  const queue = new Map();
+  let sequence = 0;
+  let flushTimer = null;
+  let flushScheduled = false;
+  let io = null;
+
+  // Emit events to the sockets connected to this instance
+  const deliver = (events) => {
+    if (!io) {
+      return;
+    }
+    for (const { rooms, event, data, except } of events) {
+      let target = io.local.to(rooms);
+      if (except) {
+        target = target.except(except);
+      }
+      target.emit(event, data);
+      counters.delivered++;
+    }
+  };
+
+  // Apply a revocation to the sockets connected to this instance
+  const applyControl = async (control) => {
+    if (!io) {
+      return;
+    }
+
+    if (control.type === 'connection-revoked') {
+      const sockets = await io.local
+        .in([userRoom(control.caregiverId), userRoom(control.seniorId)])
+        .fetchSockets();
+      for (const socket of sockets) {
+        socket.data.user = withoutConnection(socket.data.user, control);
+        const allowed = roomsFor(socket.data.user);
+        for (const room of [...socket.rooms]) {
+          if (room !== socket.id && !allowed.has(room)) {
+            socket.leave(room);
+          }
+        }
+        counters.revoked++;
+      }
+    } else if (control.type === 'token-revoked') {
+      const sockets = await io.local.in(userRoom(control.userId)).fetchSockets();
+      for (const socket of sockets) {
+        if (socket.data.tokenKey === control.tokenKey) {
+          socket.disconnect(true);
+          counters.revoked++;
+        }
+      }
+    }
+  };
+
+  // Apply a revocation here, then on every other instance
+  const publishControl = async (control) => {
+    try {
+      await applyControl(control);
+    } catch (error) {
+      logger.error(`Realtime ${control.type} failed:`, error);
+    }
+
+    try {
+      await pubsub.publish(CHANNEL, JSON.stringify({ origin: instanceId, sentAt: clock.now(), control }));
+    } catch (error) {
+      counters.publishFailures++;
+      logger.error('Realtime revocation publish failed:', error);
+    }
+  };
+
+  const handleMessage = async (message) => {
+    try {
+      const { origin, sentAt, events, control } = JSON.parse(message);
+      if (origin === instanceId) {
+        return;
+      }
+      counters.maxLagMs = Math.max(counters.maxLagMs, clock.now() - sentAt);
+      if (control) {
+        await applyControl(control);
+        return;
+      }
+      counters.received += events.length;
+      deliver(events);
+    } catch (error) {
+      logger.error('Invalid realtime broadcast:', error);
+    }
+  };
+
+  const flush = async () => {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    flushScheduled = false;
+    if (queue.size === 0) {
+      return;
+    }
+
+    const events = [...queue.values()];
+    queue.clear();
+
+    // Local sockets do not wait for the round trip
+    deliver(events);
+
+    await Promise.all(chunk(events, MAX_BATCH_EVENTS).map(async (batch) => {
+      try {
+        await pubsub.publish(CHANNEL, JSON.stringify({ origin: instanceId, sentAt: clock.now(), events: batch }));
+        counters.batches++;
+      } catch (error) {
+        counters.publishFailures++;
+        logger.error('Realtime broadcast publish failed:', error);
+      }
+    }));
+  };
+
+  const scheduleFlush = (urgent) => {
+    if (urgent || queue.size >= MAX_BATCH_EVENTS) {
+      if (!flushScheduled) {
+        flushScheduled = true;
+        setImmediate(flush);
+      }
+    } else if (!flushTimer && !flushScheduled) {
+      flushTimer = setTimeout(flush, flushMs);
+      flushTimer.unref();
+    }
+  };
+
+  // Run a socket event handler, logging instead of throwing
+  const handle = (socket, handler) => async (...args) => {
+    try {
+      await handler(...args);
+    } catch (error) {
+      logger.error(`Realtime event from ${socket.data.user.id} failed:`, error);
+    }
+  };
+
+  const onConnection = (socket) => {
+    const userId = socket.data.user.id;
+    socket.join([...roomsFor(socket.data.user)]);
+    logger.info(`User ${userId} connected: ${socket.id}`);
+
+    // Rooms come from the user's family connections. A well-formed room
+    // they are not in is re-checked against fresh connections, in case one
+    // was just accepted, at most once per ROOM_RELOAD_INTERVAL_MS.
+    socket.data.reloadedAt = null;
+    socket.on('join-room', handle(socket, async (roomId, ack) => {
+      let rooms = roomsFor(socket.data.user);
+      const now = clock.now();
+      const mayReload = typeof roomId === 'string' && ROOM_PATTERN.test(roomId) && (
+        socket.data.reloadedAt === null || now - socket.data.reloadedAt >= ROOM_RELOAD_INTERVAL_MS
+      );
+      if (!rooms.has(roomId) && mayReload) {
+        socket.data.reloadedAt = now;
+        const user = await loadUser(userId);
+        if (user) {
+          socket.data.user = user;
+          rooms = roomsFor(user);
+          socket.join([...rooms]);
+        }
+      }
+
+      const joined = rooms.has(roomId);
+      if (!joined) {
+        logger.warn(`User ${userId} denied room ${roomId}`);
+      }
+      if (typeof ack === 'function') {
+        ack({ ok: joined });
+      }
+    }));
+
+    socket.on('leave-room', handle(socket, (roomId) => {
+      if (roomId !== userRoom(userId)) {
+        socket.leave(roomId);
+      }
+    }));
+
+    socket.on('send-message', handle(socket, (data = {}) => {
+      if (!sendableRoomsFor(socket.data.user).has(data.roomId)) {
+        logger.warn(`User ${userId} denied sending to ${data.roomId}`);
+        return;
+      }
+      realtime.emit(data.roomId, 'receive-message', { ...data, senderId: userId }, { except: socket.id });
+    }));
+
+    socket.on('emergency-alert', handle(socket, (data = {}) => {
+      if (socket.data.user.role !== 'senior') {
+        return;
+      }
+      const roomId = familyRoom(userId);
+      realtime.emit(roomId, 'emergency-notification', { ...data, roomId, userId }, { urgent: true, except: socket.id });
+    }));
+
+    socket.on('disconnect', () => {
+      logger.info(`User ${userId} disconnected: ${socket.id}`);
+    });
+  };
+
+  const realtime = {
+    userRoom,
+    familyRoom,
+    roomsFor,
+
+    // Authenticate and route the sockets of a Socket.IO server
+    attach(server) {
+      io = server;
+
+      io.use(async (socket, next) => {
+        try {
+          const token = tokenFromHandshake(socket.handshake);
+          const user = token && await authenticate(token);
+          if (!user) {
+            return next(new Error('Authentication required'));
+          }
+          socket.data.user = user;
+          // Identifies the token if it is revoked while the socket is open
+          socket.data.tokenKey = tokenRevocation.tokenKey(jwt.decode(token) || {}, token);
+          next();
+        } catch (error) {
+          next(new Error('Authentication required'));
+        }
+      });
+
+      io.on('connection', onConnection);
+    },
+
+    // Queue an event for everyone in the rooms, on every instance
+    emit(rooms, event, data, { coalesceKey = null, urgent = false, except = null } = {}) {
+      const targets = [].concat(rooms);
+      const key = coalesceKey === null
+        ? `#${sequence++}`
+        : `${event}|${targets.join(',')}|${coalesceKey}`;
+
+      if (queue.has(key)) {
+        counters.coalesced++;
+        queue.delete(key);
+      }
+      queue.set(key, { rooms: targets, event, data, except });
+      counters.queued++;
+
+      scheduleFlush(urgent);
+    },
+
+    flush,
+
+    // Take a revoked family connection's rooms away from both users' sockets
+    revokeConnection(connection) {
+      return publishControl({
+        type: 'connection-revoked',
+        caregiverId: connection.caregiver_id,
+        seniorId: connection.senior_id
+      });
+    },
+
+    // Disconnect every socket opened with a revoked token
+    revokeToken(decoded, token) {
+      return publishControl({
+        type: 'token-revoked',
+        userId: decoded.userId,
+        tokenKey: tokenRevocation.tokenKey(decoded, token)
+      });
+    },
+
+    async start() {
+      await pubsub.subscribe(CHANNEL, handleMessage);
+      logger.info(`Realtime broadcasts started (flush every ${flushMs}ms)`);
+    },
+
+    async stop() {
+      await flush();
+      await pubsub.unsubscribe(CHANNEL);
+    },
+
+    stats() {
+      return { pending: queue.size, ...counters };
+    }
+  };
+
+  return realtime;
+};
+
+const realtime = createRealtime();
+
+module.exports = { createRealtime, realtime };
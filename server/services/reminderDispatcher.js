@@ -0,0 +1,393 @@
+const { v4: uuidv4 } = require('uuid');
+const { medicationNotifications, isFirebaseInitialized } = require('../config/firebase');
+const { createLoaders } = require('../middleware/loaders');
+const { TimerWheel } = require('../utils/timerWheel');
+const { logger } = require('../utils/logger');
+const { quietly } = require('../utils/quietly');
+const { caregiverFeed } = require('./caregiverFeed');
+const { medicationAdherence } = require('./medicationAdherence');
+const { medicationSchedule } = require('./medicationSchedule');
+
+// Medication reminder dispatcher.
+// Each process owns a subset of the reminder shards (REMINDER_WORKER_INDEX
+// of REMINDER_WORKER_COUNT). Every REMINDER_LOAD_INTERVAL_MS it loads its
+// reminders due within the lookahead window into an in-memory timer wheel,
+// and every tick it fires whatever fell due in batches: a batch is first
+// claimed by stamping `notified_at` on reminders that are still pending,
+// then pushed, so a reminder is never sent twice - by a retry, a restart
+// or another process. A per-shard checkpoint records how far dispatch has
+// got, so a restart resumes from there (up to REMINDER_MAX_LATE_MS late).
+// The same loop marks reminders still untaken REMINDER_MISSED_AFTER_MS
+// after their time as missed and tells the senior's caregivers.
+const CHECKPOINTS = 'reminder_dispatch_checkpoints';
+
+const TICK_MS = parseInt(process.env.REMINDER_TICK_MS) || 1000;
+const LOAD_INTERVAL_MS = parseInt(process.env.REMINDER_LOAD_INTERVAL_MS) || 60 * 1000;
+const LOOKAHEAD_MS = parseInt(process.env.REMINDER_LOOKAHEAD_MS) || 5 * 60 * 1000;
+const MAX_LATE_MS = parseInt(process.env.REMINDER_MAX_LATE_MS) || 30 * 60 * 1000;
+const MISSED_AFTER_MS = parseInt(process.env.REMINDER_MISSED_AFTER_MS) || 60 * 60 * 1000;
+const BATCH_SIZE = parseInt(process.env.REMINDER_BATCH_SIZE) || 500;
+const LOAD_LIMIT = 10000;
+const RETRY_DELAY_MS = 5000;
+
+// Shards handled by this process
+const ownedShards = (
+  index = parseInt(process.env.REMINDER_WORKER_INDEX ?? process.env.NODE_APP_INSTANCE) || 0,
+  count = parseInt(process.env.REMINDER_WORKER_COUNT) || 1
+) => Array.from({ length: medicationSchedule.REMINDER_SHARDS }, (_, shard) => shard)
+  .filter(shard => shard % count === index % count);
+
+// Default push layer (Firebase). Tests pass their own sender.
+const pushSender = {
+  async sendReminder(user, medication, reminder) {
+    const tokens = user.device_tokens || [];
+    if (tokens.length === 0 || !isFirebaseInitialized()) {
+      return 0;
+    }
+    await Promise.all(tokens.map(token => (
+      medicationNotifications.sendMedicationReminder(token, medication, reminder.scheduled_time)
+    )));
+    return tokens.length;
+  },
+
+  async sendMissed(caregivers, senior, medication) {
+    const tokens = caregivers.flatMap(caregiver => caregiver.device_tokens || []);
+    if (tokens.length === 0 || !isFirebaseInitialized()) {
+      return 0;
+    }
+    await medicationNotifications.sendMissedMedicationAlert(tokens, senior, medication);
+    return tokens.length;
+  }
+};
+
+const chunk = (items, size) => {
+  const chunks = [];
+  for (let i = 0; i < items.length; i += size) {
+    chunks.push(items.slice(i, i + size));
+  }
+  return chunks;
+};
+
+// Atomically take the reminders matching filter for this run
+const claim = async (collection, ids, filter, fields, now) => {
+  const claimId = uuidv4();
+  await collection.updateMany(
+    { id: { $in: ids }, ...filter },
+    { $set: { [fields.at]: now, [fields.by]: claimId } }
+  );
+  return collection
+    .find({ id: { $in: ids }, [fields.by]: claimId }, { projection: { _id: 0 } })
+    .toArray();
+};
+
+const createReminderDispatcher = ({
+  clock = { now: () => Date.now() },
+  sender = pushSender,
+  shards = ownedShards()
+} = {}) => {
+  const wheel = new TimerWheel({ tickMs: TICK_MS, startTime: clock.now() });
+  const shardIds = shards.map(shard => `shard:${shard}`);
+  const counters = { loaded: 0, fired: 0, pushed: 0, pushFailures: 0, missed: 0 };
+
+  // Reminders whose claim failed, by id, with their scheduled time
+  const retrying = new Map();
+  // Everything scheduled up to firedThrough has been claimed; the wheel
+  // holds every pending reminder up to loadedThrough
+  let firedThrough = null;
+  let loadedThrough = null;
+  let lastLoadAt = null;
+  let tickTimer = null;
+  let loadTimer = null;
+
+  const readCheckpoints = async (db) => {
+    const docs = await db.collection(CHECKPOINTS).find({ _id: { $in: shardIds } }).toArray();
+    const earliest = (field) => (
+      docs.length === shardIds.length && docs.every(doc => doc[field])
+        ? Math.min(...docs.map(doc => doc[field].getTime()))
+        : null
+    );
+    return { dispatched: earliest('dispatched_through'), missed: earliest('missed_through') };
+  };
+
+  const writeCheckpoints = (db, fields) => db.collection(CHECKPOINTS).bulkWrite(
+    shardIds.map(_id => ({
+      updateOne: { filter: { _id }, update: { $set: { ...fields, updated_at: new Date(clock.now()) } }, upsert: true }
+    })),
+    { ordered: false }
+  );
+
+  // Push one claimed batch
+  const deliver = async (db, reminders) => {
+    const loaders = createLoaders(db);
+    const [users, medications] = await Promise.all([
+      loaders.users.loadMany(reminders.map(reminder => reminder.user_id)),
+      loaders.medications.loadMany(reminders.map(reminder => reminder.medication_id))
+    ]);
+
+    const results = await Promise.allSettled(reminders.map((reminder, i) => {
+      const user = users[i];
+      const medication = medications[i];
+      if (!user || !user.is_active || !medication || !medication.is_active) {
+        return 0;
+      }
+      return sender.sendReminder(user, medication, reminder);
+    }));
+
+    for (const result of results) {
+      if (result.status === 'fulfilled') {
+        counters.pushed += result.value || 0;
+      } else {
+        counters.pushFailures++;
+        logger.error('Medication reminder push failed:', result.reason);
+      }
+    }
+  };
+
+  const dispatcher = {
+    shards,
+
+    // Load reminders due before now + LOOKAHEAD into the wheel
+    async load(db) {
+      const now = clock.now();
+      if (firedThrough === null) {
+        // Starting up: resume from the durable checkpoint
+        const { dispatched } = await readCheckpoints(db);
+        firedThrough = Math.max(dispatched ?? 0, now - MAX_LATE_MS);
+      } else {
+        await writeCheckpoints(db, { dispatched_through: new Date(firedThrough) });
+      }
+      const from = Math.max(firedThrough, now - MAX_LATE_MS);
+      const until = now + LOOKAHEAD_MS;
+
+      const reminders = await db.collection(medicationSchedule.COLLECTION)
+        .find(
+          {
+            shard: { $in: shards },
+            scheduled_time: { $gt: new Date(from), $lte: new Date(until) },
+            notified_at: null,
+            taken_at: null,
+            skipped: false
+          },
+          { projection: { _id: 0, id: 1, user_id: 1, medication_id: 1, scheduled_time: 1 } }
+        )
+        .sort({ scheduled_time: 1 })
+        .limit(LOAD_LIMIT)
+        .toArray();
+
+      let added = 0;
+      for (const reminder of reminders) {
+        if (!wheel.has(reminder.id) && !retrying.has(reminder.id)) {
+          wheel.schedule(reminder.id, reminder.scheduled_time.getTime(), reminder);
+          added++;
+        }
+      }
+
+      loadedThrough = reminders.length === LOAD_LIMIT
+        ? reminders[reminders.length - 1].scheduled_time.getTime()
+        : until;
+      counters.loaded += added;
+      lastLoadAt = new Date(now);
+      return added;
+    },
+
+    // Fire everything that is due
+    async tick(db) {
+      const now = clock.now();
+      const due = wheel.advance(now).map(timer => timer.value);
+
+      for (const batch of chunk(due, BATCH_SIZE)) {
+        let claimed;
+        try {
+          claimed = await claim(
+            db.collection(medicationSchedule.COLLECTION),
+            batch.map(reminder => reminder.id),
+            { notified_at: null, taken_at: null, skipped: false },
+            { at: 'notified_at', by: 'notified_by' },
+            new Date(now)
+          );
+        } catch (error) {
+          logger.error('Failed to claim medication reminders:', error);
+          for (const reminder of batch) {
+            retrying.set(reminder.id, reminder.scheduled_time.getTime());
+            wheel.schedule(reminder.id, now + RETRY_DELAY_MS, reminder);
+          }
+          continue;
+        }
+
+        for (const reminder of batch) {
+          retrying.delete(reminder.id);
+        }
+        counters.fired += claimed.length;
+        if (claimed.length > 0) {
+          await deliver(db, claimed);
+        }
+      }
+
+      if (firedThrough !== null) {
+        // Retries and reminders not loaded yet hold the checkpoint back
+        const blocked = retrying.size > 0 ? Math.min(...retrying.values()) - 1 : Infinity;
+        firedThrough = Math.max(firedThrough, Math.min(now, loadedThrough, blocked));
+      }
+      return due.length;
+    },
+
+    // Mark reminders left untaken for MISSED_AFTER as missed
+    async sweepMissed(db) {
+      const now = clock.now();
+      const cutoff = now - MISSED_AFTER_MS;
+      const { missed: missedThrough } = await readCheckpoints(db);
+      const from = missedThrough ?? cutoff - MAX_LATE_MS;
+      const reminders = db.collection(medicationSchedule.COLLECTION);
+
+      const candidates = await reminders
+        .find(
+          {
+            shard: { $in: shards },
+            scheduled_time: { $gt: new Date(from), $lte: new Date(cutoff) },
+            taken_at: null,
+            skipped: false,
+            missed_at: null
+          },
+          { projection: { _id: 0, id: 1, scheduled_time: 1 } }
+        )
+        .sort({ scheduled_time: 1 })
+        .limit(LOAD_LIMIT)
+        .toArray();
+
+      let marked = 0;
+      for (const batch of chunk(candidates, BATCH_SIZE)) {
+        const claimed = await claim(
+          reminders,
+          batch.map(reminder => reminder.id),
+          { taken_at: null, skipped: false, missed_at: null },
+          { at: 'missed_at', by: 'missed_by' },
+          new Date(now)
+        );
+        await quietly(() => medicationAdherence.refresh(db, claimed), 'Failed to refresh medication adherence counters');
+        await dispatcher.notifyMissed(db, claimed);
+        marked += claimed.length;
+      }
+
+      // Only move past what was actually examined
+      const through = candidates.length === LOAD_LIMIT
+        ? candidates[candidates.length - 1].scheduled_time
+        : new Date(cutoff);
+      await writeCheckpoints(db, { missed_through: through });
+
+      counters.missed += marked;
+      return marked;
+    },
+
+    // Feed entries and caregiver pushes for newly missed reminders
+    async notifyMissed(db, reminders) {
+      const loaders = createLoaders(db);
+      const [seniors, medications, connections] = await Promise.all([
+        loaders.users.loadMany(reminders.map(reminder => reminder.user_id)),
+        loaders.medications.loadMany(reminders.map(reminder => reminder.medication_id)),
+        loaders.connections.loadMany(reminders.map(reminder => reminder.user_id))
+      ]);
+
+      const caregiverIds = connections.map((userConnections, i) => userConnections
+        .filter(connection => connection.senior_id === reminders[i].user_id && connection.status === 'active')
+        .map(connection => connection.caregiver_id));
+      const caregivers = await Promise.all(caregiverIds.map(ids => loaders.users.loadMany(ids)));
+
+      await Promise.all(reminders.map(async (reminder, i) => {
+        const senior = seniors[i];
+        const medication = medications[i];
+        if (!senior || !medication || !medication.is_active) {
+          return;
+        }
+
+        await caregiverFeed.publish(db, senior.id, {
+          type: 'medication_missed',
+          title: `${senior.first_name} missed ${medication.name}`,
+          severity: 'medium',
+          data: {
+            reminder_id: reminder.id,
+            medication_id: medication.id,
+            medication_name: medication.name,
+            dosage: medication.dosage,
+            scheduled_time: reminder.scheduled_time
+          },
+          dedupeKey: `missed:${reminder.id}`,
+          occurredAt: reminder.missed_at,
+          caregiverIds: caregiverIds[i]
+        });
+
+        try {
+          const active = caregivers[i].filter(caregiver => caregiver && caregiver.is_active);
+          counters.pushed += await sender.sendMissed(active, senior, medication) || 0;
+        } catch (error) {
+          counters.pushFailures++;
+          logger.error(`Missed medication alert failed for reminder ${reminder.id}:`, error);
+        }
+      }));
+    },
+
+    start(getDB) {
+      if (tickTimer) {
+        return;
+      }
+
+      // Skip a run while the previous one of the same task is in progress
+      const run = (task) => {
+        let busy = false;
+        return async () => {
+          if (busy) {
+            return;
+          }
+          busy = true;
+          try {
+            await task(getDB());
+          } catch (error) {
+            logger.error('Medication reminder dispatch failed:', error);
+          } finally {
+            busy = false;
+          }
+        };
+      };
+
+      const refresh = run(async (db) => {
+        await dispatcher.load(db);
+        await dispatcher.sweepMissed(db);
+      });
+
+      tickTimer = setInterval(run(db => dispatcher.tick(db)), TICK_MS);
+      tickTimer.unref();
+      loadTimer = setInterval(refresh, LOAD_INTERVAL_MS);
+      loadTimer.unref();
+      refresh();
+
+      logger.info(`Medication reminder dispatcher started for ${shards.length} shards`);
+    },
+
+    async stop(db) {
+      clearInterval(tickTimer);
+      clearInterval(loadTimer);
+      tickTimer = null;
+      loadTimer = null;
+      wheel.clear();
+      if (db && firedThrough !== null) {
+        await writeCheckpoints(db, { dispatched_through: new Date(firedThrough) });
+      }
+    },
+
+    stats() {
+      return {
+        shards: shards.length,
+        scheduled: wheel.size,
+        retrying: retrying.size,
+        lastLoadAt,
+        firedThrough: firedThrough && new Date(firedThrough),
+        ...counters
+      };
+    }
+  };
+
+  return dispatcher;
+};
+
+const reminderDispatcher = createReminderDispatcher();
+
+module.exports = { createReminderDispatcher, reminderDispatcher, pushSender };
@@ -0,0 +1,173 @@
+const { logger } = require('../utils/logger');
+const { latestVitalsCache } = require('./latestVitalsCache');
+const { checkinStreaks } = require('./checkinStreaks');
+const { localDate, resolveTimeZone } = require('../utils/time');
+
+// Materialized senior dashboards.
+// One `senior_dashboards` document per senior holds the inputs of
+// GET /api/dashboard, split into sections. Write paths call refresh() for
+// the section they changed, which recomputes just that section and bumps
+// the document's version, so a dashboard load is a single keyed read and
+// the version doubles as the ETag. A missing or old document is rebuilt
+// in full on read; the age limit bounds drift from writes that bypass the
+// hooks. The senior's time zone is stored with the document, so "today"
+// is the senior's day whoever is looking.
+const COLLECTION = 'senior_dashboards';
+
+const MAX_AGE_MS = parseInt(process.env.SENIOR_DASHBOARD_MAX_AGE_MS) || 15 * 60 * 1000;
+
+const SECTIONS = {
+  async checkins(db, userId, timeZone) {
+    const [recentCheckIns, streak] = await Promise.all([
+      db.collection('daily_checkins')
+        .find({ user_id: userId }, { projection: { _id: 0 } })
+        .sort({ check_date: -1 })
+        .limit(7)
+        .toArray(),
+      checkinStreaks.load(db, userId, timeZone)
+    ]);
+    return { recentCheckIns, streak };
+  },
+
+  async medications(db, userId) {
+    const medications = await db.collection('medications')
+      .find({ user_id: userId, is_active: true }, { projection: { _id: 0 } })
+      .limit(5)
+      .toArray();
+    return { medications };
+  },
+
+  async messages(db, userId) {
+    const unreadCount = await db.collection('messages').countDocuments({
+      recipient_id: userId,
+      is_read: false,
+      deleted_by_recipient: { $ne: true }
+    });
+    return { unreadCount };
+  },
+
+  async vitals(db, userId) {
+    const latestReadings = await latestVitalsCache.load(db, userId);
+    return { latestReadings };
+  }
+};
+
+const SECTION_NAMES = Object.keys(SECTIONS);
+
+// Today in the senior's time zone
+const today = (doc) => localDate(new Date(), resolveTimeZone(doc.timezone));
+
+const isComplete = (doc) => (
+  doc && SECTION_NAMES.every(name => doc.sections && doc.sections[name]) &&
+  Date.now() - doc.built_at.getTime() < MAX_AGE_MS
+);
+
+// Shape a stored document the way GET /api/dashboard returns it. Anything
+// that depends on the current date is derived here, not stored.
+const render = (doc) => {
+  const { checkins, medications, messages, vitals } = doc.sections;
+  const recentCheckIns = checkins.recentCheckIns;
+  const todayCheckIn = recentCheckIns[0] && recentCheckIns[0].check_date === today(doc)
+    ? recentCheckIns[0]
+    : null;
+  const latestReadings = vitals.latestReadings || {};
+
+  return {
+    user: { id: doc.user_id, role: 'senior' },
+    checkInStatus: {
+      completedToday: !!todayCheckIn,
+      lastCheckIn: todayCheckIn,
+      streak: checkinStreaks.summarize(checkins.streak).currentStreak
+    },
+    medications: {
+      totalActive: medications.medications.length,
+      upcomingReminders: medications.medications.slice(0, 3)
+    },
+    messages: {
+      unreadCount: messages.unreadCount
+    },
+    vitals: {
+      latestReadings,
+      abnormalCount: Object.values(latestReadings).filter(reading => reading.isAbnormal).length
+    },
+    wellness: {
+      overallScore: todayCheckIn?.mood_rating || null,
+      trend: recentCheckIns.length > 0 ? 'improving' : 'stable'
+    },
+    recentActivity: recentCheckIns.slice(0, 3),
+    alerts: []
+  };
+};
+
+const seniorDashboard = {
+  COLLECTION,
+  SECTION_NAMES,
+
+  // Recompute every section and replace the stored document
+  async rebuild(db, userId) {
+    const startedAt = new Date();
+    const senior = await db.collection('users').findOne({ id: userId }, { projection: { _id: 0, timezone: 1 } });
+    const timeZone = (senior && senior.timezone) || null;
+    const computed = await Promise.all(SECTION_NAMES.map(name => SECTIONS[name](db, userId, timeZone)));
+
+    const $set = { timezone: timeZone, built_at: startedAt, updated_at: new Date() };
+    SECTION_NAMES.forEach((name, i) => {
+      $set[`sections.${name}`] = computed[i];
+      $set[`section_times.${name}`] = startedAt;
+    });
+
+    return db.collection(COLLECTION).findOneAndUpdate(
+      { user_id: userId },
+      { $set, $inc: { version: 1 } },
+      { upsert: true, returnDocument: 'after', projection: { _id: 0 } }
+    );
+  },
+
+  // { dashboard, etag } for a senior; a single read unless a rebuild is due
+  async get(db, userId) {
+    let doc = await db.collection(COLLECTION).findOne({ user_id: userId }, { projection: { _id: 0 } });
+    if (!isComplete(doc)) {
+      doc = await seniorDashboard.rebuild(db, userId);
+    }
+
+    return {
+      dashboard: render(doc),
+      // The rendered dashboard also depends on today's date
+      etag: `"sd-${userId}-${doc.version}-${today(doc)}"`
+    };
+  },
+
+  // Recompute one section after a write. Called from request handlers, so
+  // failures are logged rather than thrown. A refresh that started before
+  // the stored section was computed does not overwrite it.
+  async refresh(db, userId, section) {
+    try {
+      const exists = await db.collection(COLLECTION).findOne({ user_id: userId }, { projection: { _id: 1, timezone: 1 } });
+      if (!exists) {
+        return;
+      }
+
+      const startedAt = new Date();
+      const value = await SECTIONS[section](db, userId, exists.timezone);
+
+      await db.collection(COLLECTION).updateOne(
+        {
+          user_id: userId,
+          [`section_times.${section}`]: { $not: { $gt: startedAt } }
+        },
+        {
+          $set: {
+            [`sections.${section}`]: value,
+            [`section_times.${section}`]: startedAt,
+            updated_at: new Date()
+          },
+          $inc: { version: 1 }
+        }
+      );
+    } catch (error) {
+      logger.error(`Failed to refresh ${section} dashboard section for ${userId}:`, error);
+    }
+  }
+};
+
+module.exports = { seniorDashboard };
@@ -0,0 +1,296 @@
+const os = require('os');
+const cron = require('node-cron');
+const { v4: uuidv4 } = require('uuid');
+const { logger } = require('../utils/logger');
+
+// System-wide counters and event rates for the admin dashboard.
+// Write paths call increment() for totals (active users by role and tier,
+// check-ins, active medications, vitals) and recordEvent() for rates.
+// Both only touch an in-process buffer; the buffer is flushed with one
+// bulkWrite every COUNTERS_FLUSH_MS. Rates are kept as per-minute buckets
+// that expire after a day. Totals are recomputed from the source
+// collections by a background job (COUNTERS_RECONCILE_CRON), which
+// corrects drift from failed flushes and writes that bypass the hooks.
+// Only the instance holding the reconcile lease runs it, and it applies
+// the difference between the computed and stored totals as an $inc, so
+// increments flushed meanwhile are kept. Writes made within one flush
+// interval of the count may still be off by that much until the next
+// reconcile. Unfiltered totals use the collection's estimated count
+// rather than a scan. Reading everything costs two small queries,
+// independent of database size.
+const COUNTERS = 'system_counters';
+const BUCKETS = 'system_counter_buckets';
+
+const FLUSH_INTERVAL_MS = parseInt(process.env.COUNTERS_FLUSH_MS) || 1000;
+const RECONCILE_CRON = process.env.COUNTERS_RECONCILE_CRON || '*/15 * * * *';
+const BUCKET_RETENTION_MS = 24 * 60 * 60 * 1000;
+const RECONCILE_LEASE_MS = 10 * 60 * 1000;
+const INSTANCE_ID = `${os.hostname()}:${process.pid}:${uuidv4().slice(0, 8)}`;
+
+const pendingCounters = new Map();
+const pendingBuckets = new Map();
+
+let flushTimer = null;
+let reconcileTask = null;
+let flushing = null;
+
+const minuteStart = (date = new Date()) => {
+  const minute = new Date(date);
+  minute.setUTCSeconds(0, 0);
+  return minute;
+};
+
+const addTo = (map, key, by) => {
+  map.set(key, (map.get(key) || 0) + by);
+};
+
+// Recompute every total from the source collections
+const computeTotals = async (db) => {
+  const [users, checkins, medications, vitals] = await Promise.all([
+    db.collection('users').aggregate([
+      { $match: { is_active: true } },
+      { $group: { _id: { role: '$role', tier: '$subscription_tier' }, count: { $sum: 1 } } }
+    ]).toArray(),
+    db.collection('daily_checkins').estimatedDocumentCount(),
+    db.collection('medications').countDocuments({ is_active: true }),
+    db.collection('vitals').estimatedDocumentCount()
+  ]);
+
+  const totals = {
+    'users.active': 0,
+    daily_checkins: checkins,
+    'medications.active': medications,
+    vitals
+  };
+  const add = (name, count) => {
+    totals[name] = (totals[name] || 0) + count;
+  };
+  for (const { _id, count } of users) {
+    add('users.active', count);
+    add(`users.active.role.${_id.role || 'unknown'}`, count);
+    add(`users.active.tier.${_id.tier || 'free'}`, count);
+  }
+  return totals;
+};
+
+// Take or renew the reconcile lease; false while another instance holds it
+const acquireReconcileLease = async (db, now) => {
+  try {
+    await db.collection(COUNTERS).updateOne(
+      {
+        _id: 'meta',
+        $or: [
+          { lease_until: { $lt: now } },
+          { lease_until: null },
+          { lease_by: INSTANCE_ID }
+        ]
+      },
+      { $set: { lease_by: INSTANCE_ID, lease_until: new Date(now.getTime() + RECONCILE_LEASE_MS) } },
+      { upsert: true }
+    );
+    return true;
+  } catch (error) {
+    // The upsert collides with a meta document whose lease is held elsewhere
+    if (error.code === 11000) {
+      return false;
+    }
+    throw error;
+  }
+};
+
+const systemCounters = {
+  COUNTERS,
+  BUCKETS,
+
+  // Buffer a change to a running total
+  increment(name, by = 1) {
+    addTo(pendingCounters, name, by);
+  },
+
+  // Buffer occurrences of an event for rate reporting
+  recordEvent(name, count = 1) {
+    if (count > 0) {
+      addTo(pendingBuckets, `${name}|${minuteStart().toISOString()}`, count);
+    }
+  },
+
+  // Helpers for the user counters, which are split by role and tier
+  userActivated(user, by = 1) {
+    systemCounters.increment('users.active', by);
+    systemCounters.increment(`users.active.role.${user.role || 'unknown'}`, by);
+    systemCounters.increment(`users.active.tier.${user.subscription_tier || 'free'}`, by);
+  },
+
+  tierChanged(fromTier, toTier) {
+    systemCounters.increment(`users.active.tier.${fromTier || 'free'}`, -1);
+    systemCounters.increment(`users.active.tier.${toTier || 'free'}`, 1);
+  },
+
+  // Write buffered changes. Failed batches are merged back for the next try.
+  async flush(db) {
+    if (flushing) {
+      return flushing;
+    }
+    if (pendingCounters.size === 0 && pendingBuckets.size === 0) {
+      return;
+    }
+
+    const counters = new Map(pendingCounters);
+    const buckets = new Map(pendingBuckets);
+    pendingCounters.clear();
+    pendingBuckets.clear();
+
+    const now = new Date();
+    const counterOps = [...counters]
+      .filter(([, by]) => by !== 0)
+      .map(([name, by]) => ({
+        updateOne: {
+          filter: { _id: name },
+          update: { $inc: { value: by }, $set: { updated_at: now } },
+          upsert: true
+        }
+      }));
+    const bucketOps = [...buckets].map(([key, count]) => {
+      const [name, minute] = key.split('|');
+      const minuteDate = new Date(minute);
+      return {
+        updateOne: {
+          filter: { _id: key },
+          update: {
+            $inc: { count },
+            $setOnInsert: { name, minute: minuteDate, expires_at: new Date(minuteDate.getTime() + BUCKET_RETENTION_MS) }
+          },
+          upsert: true
+        }
+      };
+    });
+
+    flushing = Promise.all([
+      counterOps.length > 0 && db.collection(COUNTERS).bulkWrite(counterOps, { ordered: false }),
+      bucketOps.length > 0 && db.collection(BUCKETS).bulkWrite(bucketOps, { ordered: false })
+    ]).catch(error => {
+      for (const [name, by] of counters) addTo(pendingCounters, name, by);
+      for (const [key, count] of buckets) addTo(pendingBuckets, key, count);
+      logger.error('Failed to flush system counters:', error);
+    }).finally(() => {
+      flushing = null;
+    });
+
+    return flushing;
+  },
+
+  // Correct the stored totals towards freshly computed ones. Returns null
+  // when another instance holds the reconcile lease.
+  async reconcile(db) {
+    const now = new Date();
+    if (!await acquireReconcileLease(db, now)) {
+      return null;
+    }
+
+    await systemCounters.flush(db);
+    // Computed and stored totals read together, as one point in time
+    const [totals, stored] = await Promise.all([
+      computeTotals(db),
+      db.collection(COUNTERS).find({ _id: { $ne: 'meta' } }, { projection: { _id: 1, value: 1 } }).toArray()
+    ]);
+
+    const storedValues = new Map(stored.map(({ _id, value }) => [_id, value || 0]));
+    // Any split (role, tier) that no longer has users goes to zero
+    for (const name of storedValues.keys()) {
+      if (!(name in totals)) totals[name] = 0;
+    }
+
+    const corrections = Object.entries(totals)
+      .map(([name, value]) => [name, value - (storedValues.get(name) || 0)])
+      .filter(([name, delta]) => delta !== 0 || !storedValues.has(name));
+
+    await db.collection(COUNTERS).bulkWrite([
+      ...corrections.map(([name, delta]) => ({
+        updateOne: { filter: { _id: name }, update: { $inc: { value: delta }, $set: { updated_at: now } }, upsert: true }
+      })),
+      { updateOne: { filter: { _id: 'meta' }, update: { $set: { reconciled_at: now } } } }
+    ], { ordered: false });
+
+    return totals;
+  },
+
+  // Totals and recent rates in two small queries
+  async snapshot(db) {
+    const now = new Date();
+    const hourAgo = new Date(now.getTime() - 60 * 60 * 1000);
+    // Rates per minute use the last five complete minutes
+    const currentMinute = minuteStart(now);
+    const fiveMinutesAgo = new Date(currentMinute.getTime() - 5 * 60 * 1000);
+
+    const [counterDocs, rateDocs] = await Promise.all([
+      db.collection(COUNTERS).find({}).toArray(),
+      db.collection(BUCKETS).aggregate([
+        { $match: { minute: { $gte: hourAgo } } },
+        {
+          $group: {
+            _id: '$name',
+            lastHour: { $sum: '$count' },
+            lastFiveMinutes: {
+              $sum: {
+                $cond: [
+                  { $and: [{ $gte: ['$minute', fiveMinutesAgo] }, { $lt: ['$minute', currentMinute] }] },
+                  '$count',
+                  0
+                ]
+              }
+            }
+          }
+        }
+      ]).toArray()
+    ]);
+
+    const totals = {};
+    let reconciledAt = null;
+    for (const doc of counterDocs) {
+      if (doc._id === 'meta') {
+        reconciledAt = doc.reconciled_at;
+      } else {
+        totals[doc._id] = doc.value;
+      }
+    }
+
+    const rates = {};
+    for (const { _id, lastHour, lastFiveMinutes } of rateDocs) {
+      rates[_id] = { perHour: lastHour, perMinute: parseFloat((lastFiveMinutes / 5).toFixed(2)) };
+    }
+
+    return { totals, rates, reconciledAt };
+  },
+
+  start(getDB) {
+    if (flushTimer) {
+      return;
+    }
+
+    flushTimer = setInterval(() => {
+      systemCounters.flush(getDB());
+    }, FLUSH_INTERVAL_MS);
+    flushTimer.unref();
+
+    const reconcile = () => systemCounters.reconcile(getDB())
+      .catch(error => logger.error('System counter reconciliation failed:', error));
+
+    reconcileTask = cron.schedule(RECONCILE_CRON, reconcile);
+    // Seed or correct the totals straight away without delaying startup
+    reconcile();
+  },
+
+  async stop(db) {
+    clearInterval(flushTimer);
+    flushTimer = null;
+    if (reconcileTask) {
+      reconcileTask.stop();
+      reconcileTask = null;
+    }
+    if (db) {
+      await systemCounters.flush(db);
+    }
+  }
+};
+
+module.exports = { systemCounters };
@@ -0,0 +1,194 @@
+const crypto = require('crypto');
+const { BloomFilter } = require('../utils/bloomFilter');
+const { LRUCache } = require('../utils/lruCache');
+const { logger } = require('../utils/logger');
+
+// Revoked JWTs (logout, forced sign-out).
+// Revocations are stored in `revoked_tokens` until the token would have
+// expired anyway (TTL index on expires_at). Each process keeps a Bloom
+// filter of every unexpired revoked token id, loaded at start and kept in
+// sync by polling for new revocations. A filter miss - the common case -
+// proves the token is not revoked without any I/O. Only filter hits are
+// confirmed against the collection, and the answer is cached until the
+// token expires. The filter cannot forget ids, so it is rebuilt from the
+// collection periodically to drop expired revocations.
+const COLLECTION = 'revoked_tokens';
+
+const SYNC_INTERVAL_MS = parseInt(process.env.TOKEN_REVOCATION_SYNC_MS) || 5000;
+const REBUILD_INTERVAL_MS = parseInt(process.env.TOKEN_REVOCATION_REBUILD_MS) || 60 * 60 * 1000;
+// Revocations written by other instances may carry slightly skewed clocks
+const SYNC_OVERLAP_MS = 60 * 1000;
+
+const newFilter = () => new BloomFilter({
+  expectedItems: parseInt(process.env.TOKEN_REVOCATION_EXPECTED) || 100000,
+  falsePositiveRate: 0.001
+});
+
+let filter = newFilter();
+// Filter being rebuilt in the background; it gets every new id as well
+let nextFilter = null;
+let running = false;
+let timer = null;
+let lastSeen = 0;
+let lastRebuild = 0;
+
+// Confirmed answers for filter hits: true (revoked) or false (false positive)
+const confirmed = new LRUCache({ max: parseInt(process.env.TOKEN_REVOCATION_CACHE_MAX) || 10000 });
+
+const counters = { checks: 0, filterHits: 0, remoteChecks: 0, syncs: 0, rebuilds: 0 };
+
+// Tokens issued before jti was added are identified by a hash of the token
+const tokenKey = (decoded, token) => (
+  decoded.jti || `sha256:${crypto.createHash('sha256').update(token).digest('hex')}`
+);
+
+// How long an answer about this token stays relevant
+const remainingMs = (decoded) => (
+  decoded.exp ? Math.max(decoded.exp * 1000 - Date.now(), 1) : 0
+);
+
+const remember = (key) => {
+  filter.add(key);
+  if (nextFilter) nextFilter.add(key);
+  // A cached false positive may have just become a real revocation
+  if (confirmed.peek(key) === false) {
+    confirmed.delete(key);
+  }
+};
+
+const loadSince = async (db, since, add = remember) => {
+  const query = { expires_at: { $gt: new Date() } };
+  if (since) {
+    query.revoked_at = { $gt: new Date(since - SYNC_OVERLAP_MS) };
+  }
+
+  const cursor = db.collection(COLLECTION)
+    .find(query, { projection: { _id: 0, jti: 1, revoked_at: 1 } });
+
+  let loaded = 0;
+  for await (const doc of cursor) {
+    add(doc.jti);
+    lastSeen = Math.max(lastSeen, doc.revoked_at.getTime());
+    loaded++;
+  }
+  return loaded;
+};
+
+// Load a fresh filter and swap it in once complete
+const rebuild = async (db) => {
+  const next = newFilter();
+  nextFilter = next;
+  try {
+    await loadSince(db, 0, key => next.add(key));
+  } finally {
+    nextFilter = null;
+  }
+  filter = next;
+  lastRebuild = Date.now();
+  counters.rebuilds++;
+};
+
+const sync = async (db) => {
+  if (Date.now() - lastRebuild >= REBUILD_INTERVAL_MS) {
+    await rebuild(db);
+  } else {
+    await loadSince(db, lastSeen);
+  }
+  counters.syncs++;
+};
+
+const tokenRevocation = {
+  COLLECTION,
+  tokenKey,
+
+  // Revoke a verified token until it expires
+  async revoke(db, decoded, token, { reason = 'logout' } = {}) {
+    const key = tokenKey(decoded, token);
+    const now = new Date();
+    const expiresAt = new Date(Date.now() + (remainingMs(decoded) || 24 * 60 * 60 * 1000));
+
+    await db.collection(COLLECTION).updateOne(
+      { jti: key },
+      {
+        $setOnInsert: {
+          jti: key,
+          user_id: decoded.userId,
+          reason,
+          revoked_at: now,
+          expires_at: expiresAt
+        }
+      },
+      { upsert: true }
+    );
+
+    remember(key);
+    confirmed.set(key, true, expiresAt.getTime() - Date.now());
+  },
+
+  async isRevoked(db, decoded, token) {
+    counters.checks++;
+    const key = tokenKey(decoded, token);
+
+    // Before the filter is loaded every check has to go to the collection
+    if (running && !filter.mightContain(key)) {
+      return false;
+    }
+    counters.filterHits++;
+
+    const known = confirmed.get(key);
+    if (known !== undefined) {
+      return known;
+    }
+
+    counters.remoteChecks++;
+    const revoked = Boolean(await db.collection(COLLECTION).findOne(
+      { jti: key, expires_at: { $gt: new Date() } },
+      { projection: { _id: 1 } }
+    ));
+    confirmed.set(key, revoked, remainingMs(decoded));
+    return revoked;
+  },
+
+  // Load the filter and poll for revocations made by other instances
+  async start(getDB) {
+    if (running) {
+      return;
+    }
+
+    await rebuild(getDB());
+    running = true;
+
+    const tick = async () => {
+      try {
+        await sync(getDB());
+      } catch (error) {
+        logger.error('Token revocation sync failed:', error);
+      }
+      if (running) {
+        timer = setTimeout(tick, SYNC_INTERVAL_MS);
+        timer.unref();
+      }
+    };
+    timer = setTimeout(tick, SYNC_INTERVAL_MS);
+    timer.unref();
+
+    logger.info(`Token revocation filter loaded (${filter.count} revoked tokens)`);
+  },
+
+  stop() {
+    running = false;
+    clearTimeout(timer);
+    timer = null;
+  },
+
+  stats() {
+    return {
+      running,
+      filter: filter.stats(),
+      confirmed: confirmed.stats(),
+      ...counters
+    };
+  }
+};
+
+module.exports = { tokenRevocation };
@@ -0,0 +1,209 @@
+const { cacheHelpers } = require('../config/redis');
+const { LRUCache } = require('../utils/lruCache');
+
+// Vitals threshold rule engine.
+// Global default ranges are merged with a user's overrides from the
+// `vital_thresholds` collection and compiled into one evaluator function
+// per reading type. Compiled rule sets are cached per user, so ingest does
+// at most one threshold query per user per TTL. When a user's overrides
+// change the entry is dropped here and, through the cache invalidation
+// channel, on every other instance; the TTL only bounds staleness if an
+// invalidation message is lost.
+const COLLECTION = 'vital_thresholds';
+const INVALIDATION_PREFIX = 'vital_rules:';
+
+// Normal ranges plus optional severity bands: a value outside `critical`
+// is critical, outside `high` is high, otherwise an abnormal value is medium
+const DEFAULT_RULES = {
+  blood_pressure: {
+    systolic: { min: 90, max: 140, unit: 'mmHg', high: { min: 80, max: 160 }, critical: { min: 70, max: 180 } },
+    diastolic: { min: 60, max: 90, unit: 'mmHg' }
+  },
+  heart_rate: {
+    value: { min: 60, max: 100, unit: 'bpm', high: { min: 50, max: 120 } }
+  },
+  blood_glucose: {
+    value: { min: 70, max: 140, unit: 'mg/dL' }
+  },
+  oxygen_saturation: {
+    value: { min: 95, max: 100, unit: '%' }
+  },
+  temperature: {
+    value: { min: 36.1, max: 37.2, unit: '°C' }
+  },
+  respiratory_rate: {
+    value: { min: 12, max: 20, unit: 'breaths/min' }
+  }
+};
+
+const SEVERITY_ORDER = ['medium', 'high', 'critical'];
+
+const NORMAL = Object.freeze({ isAbnormal: false, severity: null });
+
+const cache = new LRUCache({
+  max: parseInt(process.env.VITAL_RULES_CACHE_SIZE) || 10000,
+  ttlMs: parseInt(process.env.VITAL_RULES_CACHE_TTL_MS) || 10 * 60 * 1000
+});
+
+const outside = (x, band) => band && (x < band.min || x > band.max);
+
+// Metric values carried by a reading (blood pressure has two)
+const readMetric = (name, value) => {
+  if (name === 'value') {
+    return Number(value && typeof value === 'object' ? value.value : value);
+  }
+  return Number(value && value[name]);
+};
+
+// Compile one reading type's metric rules into an evaluator. Bounds are
+// captured in the closure, so evaluation is plain numeric comparisons.
+const compileType = (metrics) => {
+  const checks = Object.entries(metrics).map(([name, rule]) => ({ name, ...rule }));
+
+  return (value) => {
+    let severity = null;
+
+    for (const check of checks) {
+      const x = readMetric(check.name, value);
+      if (!Number.isFinite(x) || !outside(x, check)) continue;
+
+      const metricSeverity = outside(x, check.critical) ? 'critical'
+        : outside(x, check.high) ? 'high'
+          : 'medium';
+      if (!severity || SEVERITY_ORDER.indexOf(metricSeverity) > SEVERITY_ORDER.indexOf(severity)) {
+        severity = metricSeverity;
+      }
+    }
+
+    return severity ? { isAbnormal: true, severity } : NORMAL;
+  };
+};
+
+// Merge overrides ({ reading_type, metrics }) over the defaults
+const mergeRules = (overrides) => {
+  const rules = {};
+  for (const [readingType, metrics] of Object.entries(DEFAULT_RULES)) {
+    rules[readingType] = {};
+    for (const [name, rule] of Object.entries(metrics)) {
+      rules[readingType][name] = { ...rule };
+    }
+  }
+
+  for (const override of overrides) {
+    const metrics = rules[override.reading_type];
+    if (!metrics) continue;
+    for (const [name, rule] of Object.entries(override.metrics || {})) {
+      if (metrics[name]) {
+        metrics[name] = { ...metrics[name], ...rule };
+      }
+    }
+  }
+
+  return rules;
+};
+
+const compileRules = (overrides = []) => {
+  const rules = mergeRules(overrides);
+  const evaluators = {};
+  for (const [readingType, metrics] of Object.entries(rules)) {
+    evaluators[readingType] = compileType(metrics);
+  }
+
+  const overriddenTypes = new Set(overrides.map(override => override.reading_type));
+
+  return {
+    rules,
+    overriddenTypes,
+
+    // { isAbnormal, severity } for one reading
+    evaluate(readingType, value) {
+      const evaluator = evaluators[readingType];
+      return evaluator ? evaluator(value) : NORMAL;
+    },
+
+    // Evaluate a batch of { reading_type, value } readings in one pass
+    evaluateBatch(readings) {
+      return readings.map(reading => this.evaluate(reading.reading_type, reading.value));
+    },
+
+    // Effective normal range for a type, in the shape of the old VITAL_RANGES
+    normalRange(readingType) {
+      const metrics = rules[readingType];
+      if (!metrics) return null;
+      if (metrics.value) {
+        const { min, max, unit } = metrics.value;
+        return { min, max, unit };
+      }
+      return Object.fromEntries(
+        Object.entries(metrics).map(([name, { min, max, unit }]) => [name, { min, max, unit }])
+      );
+    }
+  };
+};
+
+const defaultRules = compileRules();
+
+cacheHelpers.onInvalidate(INVALIDATION_PREFIX, userId => cache.delete(userId));
+
+// Drop a user's compiled rules on this and every other instance
+const invalidate = async (userId) => {
+  cache.delete(userId);
+  await cacheHelpers.invalidate([`${INVALIDATION_PREFIX}${userId}`]);
+};
+
+const vitalRules = {
+  COLLECTION,
+  DEFAULT_RULES,
+  defaultRules,
+
+  // Compiled rule set for a user: defaults plus their overrides
+  async forUser(db, userId) {
+    const cached = cache.get(userId);
+    if (cached) {
+      return cached;
+    }
+
+    const overrides = await db.collection(COLLECTION)
+      .find({ user_id: userId }, { projection: { _id: 0, reading_type: 1, metrics: 1 } })
+      .toArray();
+
+    const compiled = overrides.length > 0 ? compileRules(overrides) : defaultRules;
+    cache.set(userId, compiled);
+    return compiled;
+  },
+
+  // Stored overrides for a user
+  async listOverrides(db, userId) {
+    return db.collection(COLLECTION)
+      .find({ user_id: userId }, { projection: { _id: 0 } })
+      .sort({ reading_type: 1 })
+      .toArray();
+  },
+
+  async setOverride(db, userId, readingType, metrics, updatedBy) {
+    const now = new Date();
+    await db.collection(COLLECTION).updateOne(
+      { user_id: userId, reading_type: readingType },
+      {
+        $set: { metrics, updated_by: updatedBy, updated_at: now },
+        $setOnInsert: { created_at: now }
+      },
+      { upsert: true }
+    );
+    await invalidate(userId);
+  },
+
+  async removeOverride(db, userId, readingType) {
+    const result = await db.collection(COLLECTION).deleteOne({ user_id: userId, reading_type: readingType });
+    await invalidate(userId);
+    return result.deletedCount > 0;
+  },
+
+  invalidate,
+
+  stats() {
+    return cache.stats();
+  }
+};
+
+module.exports = { vitalRules };
@@ -0,0 +1,208 @@
+const { logger } = require('../utils/logger');
+
+// Hourly and daily per-user, per-type aggregates of vital readings.
+// Each bucket keeps mergeable partials (count, min, max, sum, sum of
+// squares) per metric, so any window can be summarised from a handful of
+// bucket documents instead of every raw reading.
+const COLLECTION = 'vitals_rollups';
+
+const GRANULARITIES = {
+  hour: 60 * 60 * 1000,
+  day: 24 * 60 * 60 * 1000
+};
+
+// Numeric metrics carried by a reading value
+const extractMetrics = (readingType, value) => {
+  const metrics = {};
+
+  if (readingType === 'blood_pressure') {
+    if (value && Number.isFinite(Number(value.systolic))) metrics.systolic = Number(value.systolic);
+    if (value && Number.isFinite(Number(value.diastolic))) metrics.diastolic = Number(value.diastolic);
+    return metrics;
+  }
+
+  const numValue = value && typeof value === 'object' ? value.value : value;
+  if (numValue !== null && numValue !== undefined && Number.isFinite(Number(numValue))) {
+    metrics.value = Number(numValue);
+  }
+  return metrics;
+};
+
+// Start of the UTC bucket containing `date`
+const bucketStart = (date, granularity) => {
+  const size = GRANULARITIES[granularity];
+  const time = new Date(date).getTime();
+  return new Date(time - (time % size));
+};
+
+// Group readings into bucket partials in memory
+const accumulateBuckets = (readings, granularities = Object.keys(GRANULARITIES)) => {
+  const buckets = new Map();
+
+  for (const reading of readings) {
+    const metrics = extractMetrics(reading.reading_type, reading.value);
+
+    for (const granularity of granularities) {
+      const start = bucketStart(reading.reading_time, granularity);
+      const key = `${reading.user_id}|${reading.reading_type}|${granularity}|${start.getTime()}`;
+
+      let bucket = buckets.get(key);
+      if (!bucket) {
+        bucket = {
+          user_id: reading.user_id,
+          reading_type: reading.reading_type,
+          granularity,
+          bucket_start: start,
+          count: 0,
+          abnormal_count: 0,
+          unit: reading.unit,
+          last_reading_time: null,
+          metrics: {}
+        };
+        buckets.set(key, bucket);
+      }
+
+      bucket.count++;
+      if (reading.is_abnormal) bucket.abnormal_count++;
+
+      const readingTime = new Date(reading.reading_time);
+      if (!bucket.last_reading_time || readingTime >= bucket.last_reading_time) {
+        bucket.last_reading_time = readingTime;
+        bucket.unit = reading.unit;
+      }
+
+      for (const [name, metricValue] of Object.entries(metrics)) {
+        const metric = bucket.metrics[name] || (bucket.metrics[name] = {
+          count: 0, min: metricValue, max: metricValue, sum: 0, sum_sq: 0
+        });
+        metric.count++;
+        metric.min = Math.min(metric.min, metricValue);
+        metric.max = Math.max(metric.max, metricValue);
+        metric.sum += metricValue;
+        metric.sum_sq += metricValue * metricValue;
+      }
+    }
+  }
+
+  return [...buckets.values()];
+};
+
+const bucketFilter = (bucket) => ({
+  user_id: bucket.user_id,
+  reading_type: bucket.reading_type,
+  granularity: bucket.granularity,
+  bucket_start: bucket.bucket_start
+});
+
+// Incremental upsert merging a bucket partial into the stored document
+const toIncrementOp = (bucket) => {
+  const inc = { count: bucket.count, abnormal_count: bucket.abnormal_count };
+  const min = {};
+  const max = { last_reading_time: bucket.last_reading_time };
+
+  for (const [name, metric] of Object.entries(bucket.metrics)) {
+    inc[`metrics.${name}.count`] = metric.count;
+    inc[`metrics.${name}.sum`] = metric.sum;
+    inc[`metrics.${name}.sum_sq`] = metric.sum_sq;
+    min[`metrics.${name}.min`] = metric.min;
+    max[`metrics.${name}.max`] = metric.max;
+  }
+
+  const update = {
+    $inc: inc,
+    $max: max,
+    $set: { unit: bucket.unit, updated_at: new Date() }
+  };
+  if (Object.keys(min).length > 0) {
+    update.$min = min;
+  }
+
+  return { updateOne: { filter: bucketFilter(bucket), update, upsert: true } };
+};
+
+const vitalsRollups = {
+  COLLECTION,
+  GRANULARITIES,
+  extractMetrics,
+  bucketStart,
+
+  // Fold newly inserted readings into their hourly and daily buckets
+  async applyReadings(db, readings) {
+    if (readings.length === 0) {
+      return;
+    }
+
+    const ops = accumulateBuckets(readings).map(toIncrementOp);
+    await db.collection(COLLECTION).bulkWrite(ops, { ordered: false });
+  },
+
+  // Recompute the buckets that contained a removed reading. min/max cannot
+  // be decremented, so the affected buckets are rebuilt from raw readings.
+  async removeReading(db, reading) {
+    for (const granularity of Object.keys(GRANULARITIES)) {
+      const start = bucketStart(reading.reading_time, granularity);
+      const end = new Date(start.getTime() + GRANULARITIES[granularity]);
+
+      const remaining = await db.collection('vitals').find({
+        user_id: reading.user_id,
+        reading_type: reading.reading_type,
+        reading_time: { $gte: start, $lt: end }
+      }).toArray();
+
+      const filter = {
+        user_id: reading.user_id,
+        reading_type: reading.reading_type,
+        granularity,
+        bucket_start: start
+      };
+
+      if (remaining.length === 0) {
+        await db.collection(COLLECTION).deleteOne(filter);
+        continue;
+      }
+
+      const [bucket] = accumulateBuckets(remaining, [granularity]);
+      await db.collection(COLLECTION).replaceOne(
+        filter,
+        { ...bucket, updated_at: new Date() },
+        { upsert: true }
+      );
+    }
+  },
+
+  // Buckets for one user and type, oldest first
+  async fetch(db, userId, readingType, granularity, since) {
+    return db.collection(COLLECTION)
+      .find({
+        user_id: userId,
+        reading_type: readingType,
+        granularity,
+        bucket_start: { $gte: bucketStart(since, granularity) }
+      })
+      .sort({ bucket_start: 1 })
+      .toArray();
+  },
+
+  // Rebuild every bucket for a user from raw readings (backfill/repair)
+  async rebuildUser(db, userId) {
+    await db.collection(COLLECTION).deleteMany({ user_id: userId });
+
+    const cursor = db.collection('vitals')
+      .find({ user_id: userId })
+      .sort({ reading_time: 1 });
+
+    let batch = [];
+    for await (const reading of cursor) {
+      batch.push(reading);
+      if (batch.length >= 5000) {
+        await vitalsRollups.applyReadings(db, batch);
+        batch = [];
+      }
+    }
+    await vitalsRollups.applyReadings(db, batch);
+
+    logger.info(`Vitals rollups rebuilt for user ${userId}`);
+  }
+};
+
+module.exports = { vitalsRollups };
@@ -0,0 +1,93 @@
+const { StatsAccumulator } = require('../utils/statsAccumulator');
+const { vitalsRollups } = require('./vitalsRollups');
+
+// Vital-sign statistics built on StatsAccumulator. The same accumulators
+// are fed either raw readings (one pass over a cursor) or stored rollup
+// partials, so trends, summaries and premium analytics report the same
+// figures whichever source they read.
+const metricNames = (readingType) => (
+  readingType === 'blood_pressure' ? ['systolic', 'diastolic'] : ['value']
+);
+
+const createAccumulators = (readingType) => ({
+  readingType,
+  totalReadings: 0,
+  abnormalCount: 0,
+  metrics: Object.fromEntries(
+    metricNames(readingType).map(name => [name, new StatsAccumulator()])
+  )
+});
+
+const addReading = (accumulators, value, isAbnormal) => {
+  const extracted = vitalsRollups.extractMetrics(accumulators.readingType, value);
+  for (const [name, accumulator] of Object.entries(accumulators.metrics)) {
+    accumulator.add(extracted[name]);
+  }
+  accumulators.totalReadings++;
+  if (isAbnormal) accumulators.abnormalCount++;
+  return accumulators;
+};
+
+const addRollup = (accumulators, bucket) => {
+  for (const [name, accumulator] of Object.entries(accumulators.metrics)) {
+    accumulator.addPartial(bucket.metrics && bucket.metrics[name]);
+  }
+  accumulators.totalReadings += bucket.count;
+  accumulators.abnormalCount += bucket.abnormal_count;
+  return accumulators;
+};
+
+// Response shape: metric fields inline for single-metric types, nested
+// under systolic/diastolic for blood pressure
+const summarize = (accumulators, options) => {
+  if (accumulators.totalReadings === 0) return null;
+
+  const { totalReadings, abnormalCount, metrics } = accumulators;
+
+  if (accumulators.readingType === 'blood_pressure') {
+    return {
+      systolic: metrics.systolic.summary(options),
+      diastolic: metrics.diastolic.summary(options),
+      totalReadings,
+      abnormalCount
+    };
+  }
+
+  return {
+    ...metrics.value.summary(options),
+    totalReadings,
+    abnormalCount
+  };
+};
+
+const vitalsStatistics = {
+  createAccumulators,
+  addReading,
+  addRollup,
+  summarize,
+
+  // Statistics for every vital type of a user since `since`, from rollups
+  async fromRollups(db, userId, since, granularity = 'day') {
+    const cursor = db.collection(vitalsRollups.COLLECTION)
+      .find({
+        user_id: userId,
+        granularity,
+        bucket_start: { $gte: vitalsRollups.bucketStart(since, granularity) }
+      });
+
+    const byType = {};
+    for await (const bucket of cursor) {
+      const accumulators = byType[bucket.reading_type] ||
+        (byType[bucket.reading_type] = createAccumulators(bucket.reading_type));
+      addRollup(accumulators, bucket);
+    }
+
+    const statistics = {};
+    for (const [readingType, accumulators] of Object.entries(byType)) {
+      statistics[readingType] = summarize(accumulators);
+    }
+    return statistics;
+  }
+};
+
+module.exports = { vitalsStatistics };
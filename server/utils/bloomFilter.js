@@ -0,0 +1,70 @@
+// Fixed-size Bloom filter over string keys.
+// Sized from the expected number of items and the target false positive
+// rate; k bit positions per key come from two FNV-1a hashes combined by
+// double hashing (h1 + i * h2), so adding or testing a key costs two
+// passes over the string. Items cannot be removed - rebuild instead.
+const FNV_OFFSET = 0x811c9dc5;
+const FNV_PRIME = 0x01000193;
+
+const fnv1a = (key, seed) => {
+  let hash = (FNV_OFFSET ^ seed) >>> 0;
+  for (let i = 0; i < key.length; i++) {
+    hash ^= key.charCodeAt(i);
+    hash = Math.imul(hash, FNV_PRIME) >>> 0;
+  }
+  return hash;
+};
+
+class BloomFilter {
+  constructor({ expectedItems = 10000, falsePositiveRate = 0.001 } = {}) {
+    const bits = Math.ceil(-(expectedItems * Math.log(falsePositiveRate)) / (Math.LN2 * Math.LN2));
+    this.size = Math.max(bits, 8);
+    this.hashCount = Math.max(1, Math.round((this.size / expectedItems) * Math.LN2));
+    this.bits = new Uint8Array(Math.ceil(this.size / 8));
+    this.count = 0;
+  }
+
+  positions(key) {
+    const h1 = fnv1a(key, 0);
+    const h2 = fnv1a(key, 0x5bd1e995) | 1;
+    const positions = new Array(this.hashCount);
+    for (let i = 0; i < this.hashCount; i++) {
+      positions[i] = ((h1 + Math.imul(i, h2)) >>> 0) % this.size;
+    }
+    return positions;
+  }
+
+  add(key) {
+    for (const position of this.positions(key)) {
+      this.bits[position >> 3] |= 1 << (position & 7);
+    }
+    this.count++;
+    return this;
+  }
+
+  // false means definitely absent; true means probably present
+  mightContain(key) {
+    for (const position of this.positions(key)) {
+      if ((this.bits[position >> 3] & (1 << (position & 7))) === 0) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  clear() {
+    this.bits.fill(0);
+    this.count = 0;
+  }
+
+  stats() {
+    return {
+      items: this.count,
+      bits: this.size,
+      hashCount: this.hashCount,
+      bytes: this.bits.length
+    };
+  }
+}
+
+module.exports = { BloomFilter };
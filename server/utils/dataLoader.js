@@ -0,0 +1,102 @@
+// Request-scoped batching loader (DataLoader style).
+// Every load() made in the same tick is collected and handed to batchFn as
+// one array of distinct keys, so a handler that looks up N related records
+// with Promise.all issues a single query instead of N. batchFn must resolve
+// to values in key order (undefined for misses). Results are memoized per
+// key for the life of the loader, so loaders belong to one request and are
+// thrown away with it.
+class DataLoader {
+  constructor(batchFn, { maxBatchSize = 1000 } = {}) {
+    this.batchFn = batchFn;
+    this.maxBatchSize = maxBatchSize;
+    this.cache = new Map();
+    this.queue = [];
+  }
+
+  load(key) {
+    const cached = this.cache.get(key);
+    if (cached) {
+      return cached;
+    }
+
+    const promise = new Promise((resolve, reject) => {
+      this.queue.push({ key, resolve, reject });
+      if (this.queue.length === 1) {
+        // Wait for the current promise jobs so chained loads join the batch
+        Promise.resolve().then(() => process.nextTick(() => this.dispatch()));
+      }
+    });
+    this.cache.set(key, promise);
+    return promise;
+  }
+
+  loadMany(keys) {
+    return Promise.all(keys.map(key => this.load(key)));
+  }
+
+  // Seed a value already fetched some other way
+  prime(key, value) {
+    if (!this.cache.has(key)) {
+      this.cache.set(key, Promise.resolve(value));
+    }
+    return this;
+  }
+
+  clear(key) {
+    this.cache.delete(key);
+    return this;
+  }
+
+  clearAll() {
+    this.cache.clear();
+    return this;
+  }
+
+  dispatch() {
+    const queue = this.queue;
+    this.queue = [];
+
+    for (let i = 0; i < queue.length; i += this.maxBatchSize) {
+      this.runBatch(queue.slice(i, i + this.maxBatchSize));
+    }
+  }
+
+  async runBatch(batch) {
+    const keys = batch.map(item => item.key);
+    try {
+      const values = await this.batchFn(keys);
+      if (!Array.isArray(values) || values.length !== keys.length) {
+        throw new TypeError(`DataLoader batch function returned ${values?.length} values for ${keys.length} keys`);
+      }
+      batch.forEach((item, i) => item.resolve(values[i]));
+    } catch (error) {
+      // Let a later load retry instead of caching the failure
+      for (const item of batch) {
+        this.cache.delete(item.key);
+        item.reject(error);
+      }
+    }
+  }
+}
+
+// Order documents by the keys that requested them
+const orderByKeys = (keys, docs, field = 'id') => {
+  const byKey = new Map(docs.map(doc => [doc[field], doc]));
+  return keys.map(key => byKey.get(key));
+};
+
+// Group documents under every key they match (one-to-many lookups)
+const groupByKeys = (keys, docs, fields) => {
+  const groups = new Map(keys.map(key => [key, []]));
+  for (const doc of docs) {
+    for (const field of fields) {
+      const group = groups.get(doc[field]);
+      if (group && !group.includes(doc)) {
+        group.push(doc);
+      }
+    }
+  }
+  return keys.map(key => groups.get(key));
+};
+
+module.exports = { DataLoader, orderByKeys, groupByKeys };
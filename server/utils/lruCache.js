@@ -0,0 +1,88 @@
+// Small bounded LRU cache with per-entry TTL.
+// Relies on Map preserving insertion order: the first key is always the
+// least recently used one, so eviction is O(1).
+class LRUCache {
+  constructor({ max = 1000, ttlMs = 0 } = {}) {
+    this.max = max;
+    this.ttlMs = ttlMs;
+    this.entries = new Map();
+    this.hits = 0;
+    this.misses = 0;
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+
+    if (!entry) {
+      this.misses++;
+      return undefined;
+    }
+
+    if (entry.expiresAt && entry.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      this.misses++;
+      return undefined;
+    }
+
+    // Move to the most recently used position
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.hits++;
+    return entry.value;
+  }
+
+  // Read without touching recency or hit/miss counters
+  peek(key) {
+    const entry = this.entries.get(key);
+    if (!entry || (entry.expiresAt && entry.expiresAt <= Date.now())) {
+      return undefined;
+    }
+    return entry.value;
+  }
+
+  set(key, value, ttlMs = this.ttlMs) {
+    if (this.entries.has(key)) {
+      this.entries.delete(key);
+    }
+
+    this.entries.set(key, {
+      value,
+      expiresAt: ttlMs ? Date.now() + ttlMs : 0
+    });
+
+    while (this.entries.size > this.max) {
+      this.entries.delete(this.entries.keys().next().value);
+    }
+
+    return this;
+  }
+
+  has(key) {
+    return this.peek(key) !== undefined;
+  }
+
+  delete(key) {
+    return this.entries.delete(key);
+  }
+
+  clear() {
+    this.entries.clear();
+  }
+
+  get size() {
+    return this.entries.size;
+  }
+
+  stats() {
+    const total = this.hits + this.misses;
+    return {
+      size: this.entries.size,
+      max: this.max,
+      hits: this.hits,
+      misses: this.misses,
+      hitRate: total > 0 ? parseFloat((this.hits / total).toFixed(4)) : 0
+    };
+  }
+}
+
+module.exports = { LRUCache };
@@ -0,0 +1,58 @@
+// Largest-Triangle-Three-Buckets downsampling.
+// Reduces a time series to `threshold` points while keeping its visual
+// shape (peaks and troughs survive, flat stretches collapse). `getX` and
+// `getY` map a point to numbers; points are returned unchanged, in order.
+// Thresholds below 3 are raised to 3 (first, one picked point, last).
+const lttb = (data, requested, getX = (p) => p.x, getY = (p) => p.y) => {
+  const length = data.length;
+  const threshold = Math.max(requested, 3);
+
+  if (!requested || threshold >= length) {
+    return data;
+  }
+
+  const sampled = [data[0]];
+  const bucketSize = (length - 2) / (threshold - 2);
+  let a = 0;
+
+  for (let i = 0; i < threshold - 2; i++) {
+    // Average point of the next bucket, used as the third triangle vertex
+    const nextStart = Math.floor((i + 1) * bucketSize) + 1;
+    const nextEnd = Math.min(Math.floor((i + 2) * bucketSize) + 1, length);
+    let avgX = 0;
+    let avgY = 0;
+    for (let j = nextStart; j < nextEnd; j++) {
+      avgX += getX(data[j]);
+      avgY += getY(data[j]);
+    }
+    const nextCount = nextEnd - nextStart;
+    avgX /= nextCount;
+    avgY /= nextCount;
+
+    // Pick the point in the current bucket forming the largest triangle
+    const start = Math.floor(i * bucketSize) + 1;
+    const end = Math.floor((i + 1) * bucketSize) + 1;
+    const ax = getX(data[a]);
+    const ay = getY(data[a]);
+    let maxArea = -1;
+    let maxIndex = start;
+
+    for (let j = start; j < end; j++) {
+      const area = Math.abs(
+        (ax - avgX) * (getY(data[j]) - ay) - (ax - getX(data[j])) * (avgY - ay)
+      );
+      if (area > maxArea) {
+        maxArea = area;
+        maxIndex = j;
+      }
+    }
+
+    sampled.push(data[maxIndex]);
+    a = maxIndex;
+  }
+
+  sampled.push(data[length - 1]);
+  return sampled;
+};
+
+module.exports = { lttb };
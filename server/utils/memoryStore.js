@@ -0,0 +1,215 @@
+const { EventEmitter } = require('events');
+
+// In-process stand-in for the node-redis v4 client, used when no Redis
+// server is configured or reachable. It implements the subset of commands
+// the app uses, with the same method names and return values, so helpers
+// do not need to know which backend they are talking to. Expired keys are
+// dropped lazily on access and by a periodic sweep.
+const SWEEP_INTERVAL_MS = 60 * 1000;
+
+class MemoryStore {
+  constructor() {
+    this.data = new Map();
+    this.expiries = new Map();
+    this.channels = new EventEmitter();
+    this.channels.setMaxListeners(0);
+    this.isMemoryStore = true;
+
+    this.sweeper = setInterval(() => this.sweep(), SWEEP_INTERVAL_MS);
+    this.sweeper.unref();
+  }
+
+  expired(key) {
+    const expiresAt = this.expiries.get(key);
+    if (expiresAt !== undefined && expiresAt <= Date.now()) {
+      this.data.delete(key);
+      this.expiries.delete(key);
+      return true;
+    }
+    return false;
+  }
+
+  read(key) {
+    return this.expired(key) ? undefined : this.data.get(key);
+  }
+
+  write(key, value) {
+    this.data.set(key, value);
+  }
+
+  // Typed container for hash/set commands
+  container(key, Type) {
+    let value = this.read(key);
+    if (value === undefined) {
+      value = new Type();
+      this.data.set(key, value);
+    } else if (!(value instanceof Type)) {
+      throw new Error('WRONGTYPE Operation against a key holding the wrong kind of value');
+    }
+    return value;
+  }
+
+  sweep() {
+    const now = Date.now();
+    for (const [key, expiresAt] of this.expiries) {
+      if (expiresAt <= now) {
+        this.data.delete(key);
+        this.expiries.delete(key);
+      }
+    }
+  }
+
+  async ping() {
+    return 'PONG';
+  }
+
+  async get(key) {
+    const value = this.read(key);
+    return typeof value === 'string' ? value : null;
+  }
+
+  async set(key, value, options = {}) {
+    if (options.NX && this.read(key) !== undefined) {
+      return null;
+    }
+    this.write(key, String(value));
+    if (options.EX) {
+      this.expiries.set(key, Date.now() + options.EX * 1000);
+    } else if (options.PX) {
+      this.expiries.set(key, Date.now() + options.PX);
+    } else {
+      this.expiries.delete(key);
+    }
+    return 'OK';
+  }
+
+  async setEx(key, seconds, value) {
+    return this.set(key, value, { EX: seconds });
+  }
+
+  async del(keys) {
+    let removed = 0;
+    for (const key of [].concat(keys)) {
+      if (this.read(key) !== undefined) removed++;
+      this.data.delete(key);
+      this.expiries.delete(key);
+    }
+    return removed;
+  }
+
+  async exists(key) {
+    return this.read(key) !== undefined ? 1 : 0;
+  }
+
+  async incr(key) {
+    return this.incrBy(key, 1);
+  }
+
+  async incrBy(key, increment) {
+    const current = parseInt(this.read(key) || '0', 10);
+    const next = current + increment;
+    this.write(key, String(next));
+    return next;
+  }
+
+  async expire(key, seconds) {
+    if (this.read(key) === undefined) return false;
+    this.expiries.set(key, Date.now() + seconds * 1000);
+    return true;
+  }
+
+  async ttl(key) {
+    if (this.read(key) === undefined) return -2;
+    const expiresAt = this.expiries.get(key);
+    return expiresAt === undefined ? -1 : Math.ceil((expiresAt - Date.now()) / 1000);
+  }
+
+  async hSet(key, field, value) {
+    const hash = this.container(key, Map);
+    const isNew = !hash.has(field);
+    hash.set(field, String(value));
+    return isNew ? 1 : 0;
+  }
+
+  async hGet(key, field) {
+    const hash = this.read(key);
+    return hash instanceof Map && hash.has(field) ? hash.get(field) : null;
+  }
+
+  async hGetAll(key) {
+    const hash = this.read(key);
+    return hash instanceof Map ? Object.fromEntries(hash) : {};
+  }
+
+  async sAdd(key, members) {
+    const set = this.container(key, Set);
+    let added = 0;
+    for (const member of [].concat(members)) {
+      if (!set.has(member)) {
+        set.add(String(member));
+        added++;
+      }
+    }
+    return added;
+  }
+
+  async sRem(key, members) {
+    const set = this.read(key);
+    if (!(set instanceof Set)) return 0;
+    let removed = 0;
+    for (const member of [].concat(members)) {
+      if (set.delete(String(member))) removed++;
+    }
+    return removed;
+  }
+
+  async sMembers(key) {
+    const set = this.read(key);
+    return set instanceof Set ? [...set] : [];
+  }
+
+  async sIsMember(key, member) {
+    const set = this.read(key);
+    return set instanceof Set && set.has(String(member));
+  }
+
+  // Pub/sub within this process only
+  async publish(channel, message) {
+    const listeners = this.channels.listenerCount(channel);
+    this.channels.emit(channel, message, channel);
+    return listeners;
+  }
+
+  async subscribe(channel, listener) {
+    this.channels.on(channel, listener);
+  }
+
+  async unsubscribe(channel, listener) {
+    if (listener) {
+      this.channels.off(channel, listener);
+    } else {
+      this.channels.removeAllListeners(channel);
+    }
+  }
+
+  duplicate() {
+    return this;
+  }
+
+  async connect() {
+    return this;
+  }
+
+  async quit() {
+    clearInterval(this.sweeper);
+    return 'OK';
+  }
+
+  async flushAll() {
+    this.data.clear();
+    this.expiries.clear();
+    return 'OK';
+  }
+}
+
+module.exports = { MemoryStore };
@@ -0,0 +1,79 @@
+const { ValidationError } = require('../middleware/errorHandler');
+
+// Keyset (cursor) pagination helpers.
+// A cursor is an opaque base64url token holding the sort key and id of the
+// last item on a page. The next page seeks straight past that position with
+// a range predicate instead of skipping over every earlier row.
+const MAX_PAGE_SIZE = 200;
+
+const parseLimit = (limit, defaultLimit = 50) => {
+  const parsed = parseInt(limit);
+  if (!parsed || parsed < 1) return defaultLimit;
+  return Math.min(parsed, MAX_PAGE_SIZE);
+};
+
+const encodeCursor = (sortValue, id) => {
+  const payload = sortValue instanceof Date
+    ? { v: sortValue.toISOString(), d: true, id }
+    : { v: sortValue, id };
+  return Buffer.from(JSON.stringify(payload)).toString('base64url');
+};
+
+const decodeCursor = (cursor) => {
+  try {
+    const payload = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    // Only plain values, so a crafted cursor cannot smuggle in a query operator
+    const validValue = payload && (typeof payload.v === 'string'
+      || (typeof payload.v === 'number' && Number.isFinite(payload.v)));
+    if (!validValue || typeof payload.id !== 'string') {
+      throw new Error('Malformed cursor');
+    }
+
+    const sortValue = payload.d ? new Date(payload.v) : payload.v;
+    if (payload.d && (typeof payload.v !== 'string' || Number.isNaN(sortValue.getTime()))) {
+      throw new Error('Malformed cursor date');
+    }
+    return { sortValue, id: payload.id };
+  } catch (error) {
+    throw new ValidationError('Invalid cursor');
+  }
+};
+
+// Add the "after this cursor" predicate for a descending (sortField, id) order
+const applyCursor = (filter, cursor, sortField, idField = 'id') => {
+  if (!cursor) {
+    return filter;
+  }
+
+  const { sortValue, id } = decodeCursor(cursor);
+  const seek = {
+    $or: [
+      { [sortField]: { $lt: sortValue } },
+      { [sortField]: sortValue, [idField]: { $lt: id } }
+    ]
+  };
+
+  return { $and: [filter, seek] };
+};
+
+// Split a limit + 1 fetch into the page and the cursor for the next one
+const buildCursorPage = (items, limit, sortField, idField = 'id') => {
+  const hasNextPage = items.length > limit;
+  const page = hasNextPage ? items.slice(0, limit) : items;
+  const last = page[page.length - 1];
+
+  return {
+    items: page,
+    hasNextPage,
+    nextCursor: hasNextPage && last ? encodeCursor(last[sortField], last[idField]) : null
+  };
+};
+
+module.exports = {
+  MAX_PAGE_SIZE,
+  parseLimit,
+  encodeCursor,
+  decodeCursor,
+  applyCursor,
+  buildCursorPage
+};
@@ -0,0 +1,15 @@
+const { logger } = require('./logger');
+
+// Run a best-effort step that must not fail the caller, e.g. a derived
+// update after the primary write. Errors are logged under `label` and
+// swallowed; resolves to the step's result, or undefined if it failed.
+const quietly = async (fn, label) => {
+  try {
+    return await fn();
+  } catch (error) {
+    logger.error(`${label}:`, error);
+    return undefined;
+  }
+};
+
+module.exports = { quietly };
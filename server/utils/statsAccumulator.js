@@ -0,0 +1,239 @@
+// Single-pass, mergeable statistics.
+// StatsAccumulator keeps count/min/max/sum plus Welford's running mean and
+// M2 (sum of squared deviations), so variance is numerically stable and two
+// accumulators can be combined exactly (Chan et al.). Approximate
+// percentiles come from a merging t-digest. Values can be fed one at a time
+// (e.g. from a DB cursor) or as stored partials such as vitals rollup
+// buckets ({ count, min, max, sum, sum_sq }).
+
+// Merging t-digest: a sorted list of weighted centroids whose maximum size
+// shrinks towards the tails, so extreme quantiles stay accurate.
+class TDigest {
+  constructor(compression = 100) {
+    this.compression = compression;
+    this.centroids = [];
+    this.buffer = [];
+    this.count = 0;
+    this.min = Infinity;
+    this.max = -Infinity;
+  }
+
+  add(value, weight = 1) {
+    this.buffer.push({ mean: value, count: weight });
+    this.count += weight;
+    if (value < this.min) this.min = value;
+    if (value > this.max) this.max = value;
+
+    if (this.buffer.length >= this.compression * 5) {
+      this.compress();
+    }
+    return this;
+  }
+
+  merge(other) {
+    other.compress();
+    for (const centroid of other.centroids) {
+      this.buffer.push({ mean: centroid.mean, count: centroid.count });
+    }
+    this.count += other.count;
+    this.min = Math.min(this.min, other.min);
+    this.max = Math.max(this.max, other.max);
+    this.compress();
+    return this;
+  }
+
+  compress() {
+    if (this.buffer.length === 0) {
+      return;
+    }
+
+    const all = this.centroids.concat(this.buffer).sort((a, b) => a.mean - b.mean);
+    this.buffer = [];
+
+    const total = this.count;
+    const merged = [];
+    let current = { ...all[0] };
+    let weightBefore = 0;
+
+    for (let i = 1; i < all.length; i++) {
+      const next = all[i];
+      const combined = current.count + next.count;
+      const q = (weightBefore + combined / 2) / total;
+      const maxWeight = Math.max(1, (4 * total * q * (1 - q)) / this.compression);
+
+      if (combined <= maxWeight) {
+        current.mean += ((next.mean - current.mean) * next.count) / combined;
+        current.count = combined;
+      } else {
+        merged.push(current);
+        weightBefore += current.count;
+        current = { ...next };
+      }
+    }
+    merged.push(current);
+
+    this.centroids = merged;
+  }
+
+  quantile(q) {
+    this.compress();
+    const centroids = this.centroids;
+
+    if (centroids.length === 0) return null;
+    if (centroids.length === 1) return centroids[0].mean;
+
+    const target = q * this.count;
+    const first = centroids[0];
+    const last = centroids[centroids.length - 1];
+
+    if (target <= first.count / 2) {
+      return this.min + ((first.mean - this.min) * target) / (first.count / 2);
+    }
+    if (target >= this.count - last.count / 2) {
+      const tail = this.count - target;
+      return this.max - ((this.max - last.mean) * tail) / (last.count / 2);
+    }
+
+    // Interpolate between the centres of the two surrounding centroids
+    let cumulative = first.count / 2;
+    for (let i = 1; i < centroids.length; i++) {
+      const gap = (centroids[i - 1].count + centroids[i].count) / 2;
+      if (cumulative + gap >= target) {
+        const fraction = (target - cumulative) / gap;
+        return centroids[i - 1].mean + fraction * (centroids[i].mean - centroids[i - 1].mean);
+      }
+      cumulative += gap;
+    }
+    return last.mean;
+  }
+}
+
+const PERCENTILES = [50, 90, 95, 99];
+
+class StatsAccumulator {
+  constructor({ compression = 100 } = {}) {
+    this.count = 0;
+    this.sum = 0;
+    this.mean = 0;
+    this.m2 = 0;
+    this.min = Infinity;
+    this.max = -Infinity;
+    this.digest = new TDigest(compression);
+    // Partials only carry moments, so their percentiles are approximate
+    this.exactPercentiles = true;
+  }
+
+  // Add one observation; null, undefined and non-numeric values are
+  // ignored, zero is a legitimate value
+  add(value) {
+    if (value === null || value === undefined || value === '') return this;
+    const x = Number(value);
+    if (!Number.isFinite(x)) return this;
+
+    this.count++;
+    this.sum += x;
+    const delta = x - this.mean;
+    this.mean += delta / this.count;
+    this.m2 += delta * (x - this.mean);
+    if (x < this.min) this.min = x;
+    if (x > this.max) this.max = x;
+    this.digest.add(x);
+    return this;
+  }
+
+  // Fold in a stored partial ({ count, min, max, sum, sum_sq }). The digest
+  // only learns the partial's mean, weighted by its count.
+  addPartial(partial) {
+    if (!partial || !partial.count) return this;
+
+    const count = partial.count;
+    const mean = partial.sum / count;
+    const m2 = Math.max(0, partial.sum_sq - (partial.sum * partial.sum) / count);
+
+    this.mergeMoments(count, mean, m2, partial.sum, partial.min, partial.max);
+    this.digest.add(mean, count);
+    this.digest.min = Math.min(this.digest.min, partial.min);
+    this.digest.max = Math.max(this.digest.max, partial.max);
+    this.exactPercentiles = false;
+    return this;
+  }
+
+  merge(other) {
+    if (other.count === 0) return this;
+    this.mergeMoments(other.count, other.mean, other.m2, other.sum, other.min, other.max);
+    this.digest.merge(other.digest);
+    this.exactPercentiles = this.exactPercentiles && other.exactPercentiles;
+    return this;
+  }
+
+  mergeMoments(count, mean, m2, sum, min, max) {
+    const total = this.count + count;
+    const delta = mean - this.mean;
+
+    this.m2 += m2 + (delta * delta * this.count * count) / total;
+    this.mean += (delta * count) / total;
+    this.count = total;
+    this.sum += sum;
+    if (min < this.min) this.min = min;
+    if (max > this.max) this.max = max;
+  }
+
+  get variance() {
+    return this.count > 1 ? this.m2 / (this.count - 1) : 0;
+  }
+
+  quantile(q) {
+    return this.digest.quantile(q);
+  }
+
+  // Serialisable partial in the same shape as a rollup metric
+  toPartial() {
+    return {
+      count: this.count,
+      min: this.count ? this.min : null,
+      max: this.count ? this.max : null,
+      sum: this.sum,
+      sum_sq: this.m2 + (this.count ? (this.sum * this.sum) / this.count : 0)
+    };
+  }
+
+  summary({ precision = 2, percentiles = true } = {}) {
+    const round = (value) => (value === null ? null : parseFloat(value.toFixed(precision)));
+
+    if (this.count === 0) {
+      return { count: 0, min: 0, max: 0, average: 0 };
+    }
+
+    const result = {
+      count: this.count,
+      min: round(this.min),
+      max: round(this.max),
+      average: round(this.mean),
+      variance: round(this.variance),
+      stdDev: round(Math.sqrt(this.variance))
+    };
+
+    if (percentiles) {
+      for (const p of PERCENTILES) {
+        result[`p${p}`] = round(this.quantile(p / 100));
+      }
+      result.percentilesApproximate = !this.exactPercentiles || this.count > this.digest.compression;
+    }
+
+    return result;
+  }
+
+  // Consume an async iterable (e.g. a MongoDB cursor) in one pass
+  static async fromCursor(cursor, selectValue = (doc) => doc) {
+    const accumulator = new StatsAccumulator();
+    for await (const doc of cursor) {
+      accumulator.add(selectValue(doc));
+    }
+    return accumulator;
+  }
+}
+
+module.exports = {
+  StatsAccumulator,
+  TDigest
+};
@@ -0,0 +1,87 @@
+const { StringDecoder } = require('string_decoder');
+
+// Yield the lines of a readable stream one at a time.
+// Consumption is pull-based: while the caller is busy between iterations
+// no further chunks are read, so a slow consumer pauses the stream (and,
+// for an HTTP request, the client's socket) instead of buffering it.
+// Lines longer than maxLineLength are reported with tooLong and skipped.
+async function* readLines(stream, { maxLineLength = 64 * 1024 } = {}) {
+  const decoder = new StringDecoder('utf8');
+  let buffer = '';
+  let lineNumber = 0;
+  let discarding = false;
+
+  for await (const chunk of stream) {
+    buffer += typeof chunk === 'string' ? chunk : decoder.write(chunk);
+
+    let newlineIndex;
+    while ((newlineIndex = buffer.indexOf('\n')) !== -1) {
+      const line = buffer.slice(0, newlineIndex).replace(/\r$/, '');
+      buffer = buffer.slice(newlineIndex + 1);
+
+      if (discarding) {
+        // Tail of an over-long line that was already reported
+        discarding = false;
+        continue;
+      }
+      lineNumber++;
+      yield { line, lineNumber };
+    }
+
+    if (!discarding && buffer.length > maxLineLength) {
+      lineNumber++;
+      yield { line: null, lineNumber, tooLong: true };
+      discarding = true;
+    }
+    if (discarding) {
+      buffer = '';
+    }
+  }
+
+  buffer += decoder.end();
+  if (buffer.length > 0 && !discarding) {
+    lineNumber++;
+    yield { line: buffer.replace(/\r$/, ''), lineNumber };
+  }
+}
+
+// Split one CSV record into fields (RFC 4180 quoting, no embedded newlines)
+const parseCsvLine = (line) => {
+  const fields = [];
+  let field = '';
+  let inQuotes = false;
+
+  for (let i = 0; i < line.length; i++) {
+    const char = line[i];
+
+    if (inQuotes) {
+      if (char === '"' && line[i + 1] === '"') {
+        field += '"';
+        i++;
+      } else if (char === '"') {
+        inQuotes = false;
+      } else {
+        field += char;
+      }
+    } else if (char === '"') {
+      inQuotes = true;
+    } else if (char === ',') {
+      fields.push(field);
+      field = '';
+    } else {
+      field += char;
+    }
+  }
+
+  if (inQuotes) {
+    throw new Error('Unterminated quoted field');
+  }
+
+  fields.push(field);
+  return fields;
+};
+
+module.exports = {
+  readLines,
+  parseCsvLine
+};
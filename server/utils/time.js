@@ -0,0 +1,124 @@
+// Calendar helpers for user-local dates and wall-clock times.
+// Dates are 'YYYY-MM-DD' strings and times 'HH:MM', interpreted in an IANA
+// time zone. Users without a zone of their own fall back to
+// DEFAULT_TIMEZONE, then to the server's zone.
+const DEFAULT_TIMEZONE = process.env.DEFAULT_TIMEZONE ||
+  Intl.DateTimeFormat().resolvedOptions().timeZone || 'UTC';
+
+const formatters = new Map();
+
+const formatterFor = (timeZone) => {
+  let formatter = formatters.get(timeZone);
+  if (!formatter) {
+    formatter = new Intl.DateTimeFormat('en-US', {
+      timeZone,
+      hourCycle: 'h23',
+      year: 'numeric',
+      month: '2-digit',
+      day: '2-digit',
+      hour: '2-digit',
+      minute: '2-digit',
+      second: '2-digit'
+    });
+    formatters.set(timeZone, formatter);
+  }
+  return formatter;
+};
+
+const isValidTimeZone = (timeZone) => {
+  try {
+    formatterFor(timeZone);
+    return true;
+  } catch (error) {
+    return false;
+  }
+};
+
+const resolveTimeZone = (timeZone) => (
+  timeZone && isValidTimeZone(timeZone) ? timeZone : DEFAULT_TIMEZONE
+);
+
+// Wall-clock fields of an instant in a zone
+const zonedParts = (date, timeZone) => {
+  const parts = {};
+  for (const { type, value } of formatterFor(resolveTimeZone(timeZone)).formatToParts(date)) {
+    parts[type] = value;
+  }
+  return parts;
+};
+
+// Offset of the zone from UTC at an instant, in milliseconds
+const offsetAt = (date, timeZone) => {
+  const p = zonedParts(date, timeZone);
+  const wallClock = Date.UTC(+p.year, +p.month - 1, +p.day, +p.hour, +p.minute, +p.second);
+  return wallClock - Math.floor(date.getTime() / 1000) * 1000;
+};
+
+const wallClockOf = (ms, timeZone) => ms + offsetAt(new Date(ms), timeZone);
+
+// The user-local calendar date of an instant
+const localDate = (date, timeZone) => {
+  const p = zonedParts(date, timeZone);
+  return `${p.year}-${p.month}-${p.day}`;
+};
+
+// The instant a wall-clock time occurs on a local date. Times skipped by a
+// DST change resolve to the instant just after the gap.
+const zonedTime = (dateString, time, timeZone) => {
+  const [year, month, day] = dateString.split('-').map(Number);
+  const [hours, minutes] = time.split(':').map(Number);
+  const wallClock = Date.UTC(year, month - 1, day, hours, minutes);
+
+  const first = wallClock - offsetAt(new Date(wallClock), timeZone);
+  const second = wallClock - offsetAt(new Date(first), timeZone);
+  if (second === first || wallClockOf(second, timeZone) === wallClock) {
+    return new Date(second);
+  }
+  return new Date(Math.max(first, second));
+};
+
+const addDays = (dateString, days) => {
+  const date = new Date(`${dateString}T00:00:00Z`);
+  date.setUTCDate(date.getUTCDate() + days);
+  return date.toISOString().split('T')[0];
+};
+
+// Whole days from one local date to another
+const daysBetween = (fromDate, toDate) => (
+  Math.round((Date.parse(`${toDate}T00:00:00Z`) - Date.parse(`${fromDate}T00:00:00Z`)) / 86400000)
+);
+
+// First date of the day, ISO week (starting Monday) or month containing a date
+const periodStart = (dateString, unit) => {
+  if (unit === 'month') {
+    return `${dateString.slice(0, 7)}-01`;
+  }
+  if (unit === 'week') {
+    const weekday = new Date(`${dateString}T00:00:00Z`).getUTCDay();
+    return addDays(dateString, -((weekday + 6) % 7));
+  }
+  return dateString;
+};
+
+// First date of the following period
+const nextPeriodStart = (dateString, unit) => {
+  const start = periodStart(dateString, unit);
+  if (unit === 'month') {
+    const date = new Date(`${start}T00:00:00Z`);
+    date.setUTCMonth(date.getUTCMonth() + 1);
+    return date.toISOString().split('T')[0];
+  }
+  return addDays(start, unit === 'week' ? 7 : 1);
+};
+
+module.exports = {
+  DEFAULT_TIMEZONE,
+  isValidTimeZone,
+  resolveTimeZone,
+  localDate,
+  zonedTime,
+  addDays,
+  daysBetween,
+  periodStart,
+  nextPeriodStart
+};
@@ -0,0 +1,127 @@
+// Hierarchical timer wheel.
+// Level 0 has `wheelSize` slots of `tickMs`; each level above covers a
+// whole turn of the level below per slot. Scheduling and cancelling are
+// O(1); advancing one tick empties one level-0 slot and, once per turn,
+// cascades the next level's slot down. Timers further out than the top
+// level can hold wait in an overflow list that is re-examined as the top
+// level turns. The wheel never reads a clock itself: callers pass the
+// current time to advance(), so it runs the same under a fake clock.
+class TimerWheel {
+  constructor({ tickMs = 1000, wheelSize = 64, levels = 4, startTime = Date.now() } = {}) {
+    this.tickMs = tickMs;
+    this.wheelSize = wheelSize;
+    this.levels = Array.from({ length: levels }, () => Array.from({ length: wheelSize }, () => new Map()));
+    this.span = wheelSize ** levels;
+    this.overflow = new Map();
+    this.ready = new Map();
+    this.timers = new Map();
+    this.currentTick = Math.floor(startTime / tickMs);
+  }
+
+  get size() {
+    return this.timers.size;
+  }
+
+  has(key) {
+    return this.timers.has(key);
+  }
+
+  // Add or replace the timer for key, due at time `at` (ms)
+  schedule(key, at, value) {
+    this.cancel(key);
+    const timer = { key, at, value, tick: Math.ceil(at / this.tickMs), slot: null };
+    this.timers.set(key, timer);
+    this.place(timer);
+    return this;
+  }
+
+  cancel(key) {
+    const timer = this.timers.get(key);
+    if (!timer) {
+      return false;
+    }
+    timer.slot.delete(key);
+    this.timers.delete(key);
+    return true;
+  }
+
+  place(timer) {
+    const delta = timer.tick - this.currentTick;
+    let slot;
+
+    if (delta <= 0) {
+      slot = this.ready;
+    } else if (delta >= this.span) {
+      slot = this.overflow;
+    } else {
+      let level = 0;
+      while (delta >= this.wheelSize ** (level + 1)) {
+        level++;
+      }
+      const index = Math.floor(timer.tick / this.wheelSize ** level) % this.wheelSize;
+      slot = this.levels[level][index];
+    }
+
+    slot.set(timer.key, timer);
+    timer.slot = slot;
+  }
+
+  // Move every timer of a slot to where it belongs now
+  cascade(slot) {
+    const timers = [...slot.values()];
+    slot.clear();
+    for (const timer of timers) {
+      this.place(timer);
+    }
+  }
+
+  // Advance to `now` and return the timers that fell due, earliest first
+  advance(now) {
+    const targetTick = Math.floor(now / this.tickMs);
+
+    while (this.currentTick < targetTick) {
+      this.currentTick++;
+      const tick = this.currentTick;
+
+      for (let level = this.levels.length - 1; level > 0; level--) {
+        const width = this.wheelSize ** level;
+        if (tick % width === 0) {
+          if (level === this.levels.length - 1) {
+            this.cascade(this.overflow);
+          }
+          this.cascade(this.levels[level][Math.floor(tick / width) % this.wheelSize]);
+        }
+      }
+
+      const slot = this.levels[0][tick % this.wheelSize];
+      for (const timer of slot.values()) {
+        this.ready.set(timer.key, timer);
+        timer.slot = this.ready;
+      }
+      slot.clear();
+
+      // Nothing left to wait for: jump straight to the target
+      if (this.timers.size === this.ready.size) {
+        this.currentTick = targetTick;
+      }
+    }
+
+    const due = [...this.ready.values()].sort((a, b) => a.at - b.at);
+    this.ready.clear();
+    for (const timer of due) {
+      this.timers.delete(timer.key);
+    }
+    return due.map(({ key, at, value }) => ({ key, at, value }));
+  }
+
+  clear() {
+    for (const level of this.levels) {
+      for (const slot of level) slot.clear();
+    }
+    this.overflow.clear();
+    this.ready.clear();
+    this.timers.clear();
+  }
+}
+
+module.exports = { TimerWheel };
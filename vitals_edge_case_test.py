@@ -210,8 +210,10 @@ class VitalsEdgeCaseTester:
             try:
                 data = response.json()
                 if 'alertCreated' in data and data['alertCreated']:
-                    self.log_success("Extreme values - Alert properly created")
+                    self.log_success("Extreme values - Alert properly queued")
                     success_count += 1
+                    if data.get('alertId'):
+                        self.wait_for_alert(data['alertId'])
                 else:
                     self.log_success("Extreme values - Handled gracefully")
                     success_count += 1
@@ -258,6 +260,20 @@ class VitalsEdgeCaseTester:
         
         return success_count >= 2
     
+    def wait_for_alert(self, alert_id, timeout=15):
+        """Poll until a background-queued alert has been written"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            response = self.make_request('GET', '/emergency/alerts?limit=20')
+            if response and response.status_code == 200:
+                alerts = response.json().get('alerts', [])
+                if any(alert.get('id') == alert_id for alert in alerts):
+                    self.log_success("Alert pipeline - Queued alert written by worker")
+                    return True
+            time.sleep(0.5)
+        self.log_failure(f"Alert pipeline - Alert {alert_id} not written within {timeout}s")
+        return False
+
     def test_vitals_query_edge_cases(self):
         """Test edge cases for vitals query endpoints"""
         self.log(f"\n{Colors.BOLD}=== Testing Vitals Query Edge Cases ==={Colors.END}")
@@ -330,10 +346,10 @@ class VitalsEdgeCaseTester:
         else:
             self.log_failure(f"Empty readings array - Expected 400, got {response.status_code if response else 'No response'}")
         
-        # Test 2: Too many readings (over 100)
-        self.log(f"\n{Colors.BLUE}Testing too many readings{Colors.END}")
+        # Test 2: Large batch (previously capped at 100 readings)
+        self.log(f"\n{Colors.BLUE}Testing large batch{Colors.END}")
         large_readings = []
-        for i in range(101):  # Over the 100 limit
+        for i in range(1000):
             large_readings.append({
                 "reading_type": "heart_rate",
                 "value": {"value": 70 + i % 20},
@@ -347,11 +363,11 @@ class VitalsEdgeCaseTester:
         }
         
         response = self.make_request('POST', '/vitals/bulk-import', large_bulk_data)
-        if response and response.status_code == 400:
-            self.log_success("Too many readings - Properly rejected")
+        if response and response.status_code == 201 and response.json().get('imported') == 1000:
+            self.log_success("Large batch - All readings imported")
             success_count += 1
         else:
-            self.log_failure(f"Too many readings - Expected 400, got {response.status_code if response else 'No response'}")
+            self.log_failure(f"Large batch - Expected 201 with 1000 imported, got {response.status_code if response else 'No response'}")
         
         # Test 3: Mixed valid and invalid readings
         self.log(f"\n{Colors.BLUE}Testing mixed valid/invalid readings{Colors.END}")
@@ -375,13 +391,125 @@ class VitalsEdgeCaseTester:
         }
         
         response = self.make_request('POST', '/vitals/bulk-import', mixed_bulk_data)
+        if response and response.status_code == 207:
+            try:
+                data = response.json()
+                statuses = [result['status'] for result in data.get('results', [])]
+                if data.get('imported') == 1 and statuses == ['accepted', 'rejected']:
+                    self.log_success("Mixed readings - Valid reading accepted, invalid reading rejected")
+                    success_count += 1
+                else:
+                    self.log_failure(f"Mixed readings - Unexpected per-item results: {statuses}")
+            except json.JSONDecodeError:
+                self.log_failure("Mixed readings - Invalid JSON response")
+        else:
+            self.log_failure(f"Mixed readings - Expected 207, got {response.status_code if response else 'No response'}")
+        
+        return success_count >= 2
+    
+    def test_stream_import(self):
+        """Test streaming NDJSON/CSV import"""
+        self.log(f"\n{Colors.BOLD}=== Testing Stream Import ==={Colors.END}")
+        
+        if not self.auth_token:
+            self.log_warning("Skipping stream import tests - no auth token")
+            return False
+        
+        success_count = 0
+        url = f"{API_BASE}/vitals/stream-import?device_id=test_device&device_name=Test%20Device"
+        
+        # Test 1: NDJSON with one invalid line
+        self.log(f"\n{Colors.BLUE}Testing NDJSON stream{Colors.END}")
+        lines = [json.dumps({"reading_type": "heart_rate", "value": {"value": 70 + i % 20}, "unit": "bpm"}) for i in range(50)]
+        lines.append('{"reading_type": "invalid_type"')
+        
+        try:
+            response = self.session.post(url, data="\n".join(lines), timeout=30, headers={
+                'Authorization': f'Bearer {self.auth_token}',
+                'Content-Type': 'application/x-ndjson'
+            })
+            data = response.json()
+            if response.status_code == 207 and data.get('imported') == 50 and data.get('rejected') == 1:
+                self.log_success("NDJSON stream - Valid lines imported, invalid line rejected")
+                success_count += 1
+            else:
+                self.log_failure(f"NDJSON stream - Expected 207 with 50 imported, got {response.status_code}: {data}")
+        except Exception as e:
+            self.log_failure(f"NDJSON stream - Request error: {str(e)}")
+        
+        # Test 2: CSV with header row
+        self.log(f"\n{Colors.BLUE}Testing CSV stream{Colors.END}")
+        csv_body = "reading_type,value,unit,reading_time\n" \
+                   "blood_pressure,120/80,mmHg,2025-01-01T08:00:00Z\n" \
+                   "heart_rate,72,bpm,2025-01-01T08:01:00Z\n"
+        
+        try:
+            response = self.session.post(url, data=csv_body, timeout=30, headers={
+                'Authorization': f'Bearer {self.auth_token}',
+                'Content-Type': 'text/csv'
+            })
+            if response.status_code == 201 and response.json().get('imported') == 2:
+                self.log_success("CSV stream - All rows imported")
+                success_count += 1
+            else:
+                self.log_failure(f"CSV stream - Expected 201 with 2 imported, got {response.status_code}")
+        except Exception as e:
+            self.log_failure(f"CSV stream - Request error: {str(e)}")
+        
+        return success_count >= 2
+    
+    def test_vital_thresholds(self):
+        """Test per-user vital threshold overrides"""
+        self.log(f"\n{Colors.BOLD}=== Testing Vital Thresholds ==={Colors.END}")
+        
+        if not self.auth_token or not self.test_user_id:
+            self.log_warning("Skipping threshold tests - no auth token")
+            return False
+        
+        success_count = 0
+        endpoint = f"/vitals/thresholds/{self.test_user_id}/oxygen_saturation"
+        reading = {"reading_type": "oxygen_saturation", "value": {"value": 90}, "unit": "%"}
+        
+        # Test 1: 90% SpO2 is abnormal with the default floor of 95
+        response = self.make_request('POST', '/vitals', reading)
+        if response and response.status_code == 201 and response.json().get('alertCreated'):
+            self.log_success("Default thresholds - Low SpO2 flagged")
+            success_count += 1
+        else:
+            self.log_failure("Default thresholds - Low SpO2 not flagged")
+        
+        # Test 2: lower the floor for this patient
+        response = self.make_request('PUT', endpoint, {"metrics": {"value": {"min": 88, "max": 100}}})
+        if response and response.status_code == 200 and response.json().get('normalRange', {}).get('min') == 88:
+            self.log_success("Threshold override - Saved")
+            success_count += 1
+        else:
+            self.log_failure(f"Threshold override - Status {response.status_code if response else 'No response'}")
+        
+        response = self.make_request('POST', '/vitals', reading)
+        if response and response.status_code == 201 and not response.json().get('alertCreated'):
+            self.log_success("Threshold override - Applied to new readings")
+            success_count += 1
+        else:
+            self.log_failure("Threshold override - Reading still flagged after override")
+        
+        # Test 3: invalid range is rejected
+        response = self.make_request('PUT', endpoint, {"metrics": {"value": {"min": 100, "max": 88}}})
         if response and response.status_code == 400:
-            self.log_success("Mixed readings - Properly rejected")
+            self.log_success("Threshold override - Invalid range rejected")
             success_count += 1
         else:
-            self.log_failure(f"Mixed readings - Expected 400, got {response.status_code if response else 'No response'}")
+            self.log_failure("Threshold override - Invalid range accepted")
         
-        return success_count >= 2
+        # Test 4: reset to defaults
+        response = self.make_request('DELETE', endpoint)
+        if response and response.status_code == 200:
+            self.log_success("Threshold override - Reset to defaults")
+            success_count += 1
+        else:
+            self.log_failure("Threshold override - Reset failed")
+        
+        return success_count >= 4
     
     def test_unauthorized_vitals_access(self):
         """Test unauthorized access to vitals endpoints"""
@@ -442,6 +570,8 @@ class VitalsEdgeCaseTester:
             ("Vitals Edge Cases", self.test_vitals_edge_cases),
             ("Vitals Query Edge Cases", self.test_vitals_query_edge_cases),
             ("Bulk Import Edge Cases", self.test_bulk_import_edge_cases),
+            ("Stream Import", self.test_stream_import),
+            ("Vital Thresholds", self.test_vital_thresholds),
             ("Unauthorized Vitals Access", self.test_unauthorized_vitals_access)
         ]
         